@@ -0,0 +1,225 @@
+# Copyright (C) 2002 - 2015 The Board of Regents of the University of Wisconsin System
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of version 2 of the GNU General Public License as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""This module finds the offset between two recordings of the same event (such as two cameras in one classroom)
+by comparing the loudness of their sound over time."""
+
+__author__ = 'David Woods <dwoods@wcer.wisc.edu>'
+
+# import the numpy module
+import numpy
+
+# The number of loudness values per second used to compare whole files.  The offset found is accurate to about
+# one value, so it is then refined using ALIGN_FINE_RATE values per second over part of the files.
+ALIGN_COARSE_RATE = 20
+ALIGN_FINE_RATE = 500
+# The number of seconds of sound compared when refining the offset
+ALIGN_FINE_WINDOW = 120.0
+# The files must overlap by at least this many seconds, and by at least this fraction of the shorter file, for
+# an offset to be considered.  (Short overlaps can match well by chance.)
+ALIGN_MIN_OVERLAP = 10.0
+ALIGN_MIN_OVERLAP_FRACTION = 0.25
+# Offsets found with a confidence below this are probably wrong
+ALIGN_MIN_CONFIDENCE = 0.2
+# Loudness is compared to the average loudness over this many seconds around it, so slow changes in volume
+# (and recording levels that differ between the files) don't affect the comparison
+ALIGN_SMOOTHING = 1.0
+# The number of wave frames read from the wave file at a time
+READ_BLOCK_FRAMES = 1048576
+
+
+def Envelope(reader, rate, startFrame=0, frameCount=None):
+    """ Return a numpy array of the average loudness (the average absolute sample value, across all channels) of
+        a Wave Reader's wave file, rate times per second, for frameCount frames (or the rest of the file) from
+        startFrame on """
+    # Limit the range to the frames that exist
+    startFrame = max(0, min(startFrame, reader.frameCount))
+    if (frameCount == None) or (frameCount > reader.frameCount - startFrame):
+        frameCount = reader.frameCount - startFrame
+    # Determine the number of frames per loudness value.  This needn't be a whole number, so files with different
+    # frame rates give the same number of values per second.
+    framesPerValue = max(float(reader.frameRate) / rate, 1.0)
+    valueCount = int(frameCount / framesPerValue)
+    values = numpy.zeros(valueCount, dtype=numpy.float32)
+    # Calculate about READ_BLOCK_FRAMES frames' worth of values at a time
+    valuesPerBlock = max(int(READ_BLOCK_FRAMES / framesPerValue), 1)
+    for blockStart in range(0, valueCount, valuesPerBlock):
+        blockEnd = min(blockStart + valuesPerBlock, valueCount)
+        # Determine the frame where each of the block's values starts, and where the last one ends
+        edges = (numpy.arange(blockStart, blockEnd + 1) * framesPerValue).astype(numpy.int64)
+        # Get the loudness of each frame in the block
+        loudness = numpy.abs(reader.samples(startFrame + edges[0], edges[-1] - edges[0])).mean(axis=1)
+        if len(loudness) < edges[-1] - edges[0]:
+            break
+        # Average the loudness of each value's frames
+        values[blockStart:blockEnd] = numpy.add.reduceat(loudness, edges[:-1] - edges[0]) / numpy.diff(edges)
+    return values
+
+def NormalizeEnvelope(envelope, rate):
+    """ Prepare a loudness envelope with rate values per second for comparison.  Loudness is measured on a log
+        scale, compared to the average loudness around it, and scaled so its values vary by 1.0 on average. """
+    # Use a log scale, so quiet sounds count as well as loud ones.  (Silence is about 60 dB below full volume.)
+    values = numpy.log(envelope.astype(numpy.float64) + 0.001)
+    # Subtract the average of the values within ALIGN_SMOOTHING seconds of each value
+    width = max(int(ALIGN_SMOOTHING * rate), 1)
+    if len(values) > width:
+        sums = numpy.concatenate(([0.0], numpy.cumsum(values)))
+        lo = numpy.maximum(numpy.arange(len(values)) - width / 2, 0)
+        hi = numpy.minimum(lo + width, len(values))
+        values = values - (sums[hi] - sums[lo]) / (hi - lo)
+    else:
+        values = values - values.mean()
+    # Scale the values.  (If there's no variation at all, there's nothing to compare.)
+    deviation = values.std()
+    if deviation > 0:
+        values = values / deviation
+    return values
+
+def CrossCorrelate(a, b, minOverlap=1):
+    """ Compare a and b at every lag where at least minOverlap values overlap, using Fourier transforms so the
+        time taken is proportional to n log n rather than n squared.  Returns numpy arrays of the lags (a lag of
+        k compares a[i + k] to b[i]) and of the correlation coefficient for the overlapping values at each lag,
+        from -1.0 to 1.0. """
+    # If the arrays can't overlap by enough, there's nothing to compare
+    if min(len(a), len(b)) < minOverlap:
+        return (numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0))
+    # Use a transform size that's a power of two and long enough that the results don't wrap around
+    size = 1
+    while size < len(a) + len(b) - 1:
+        size *= 2
+    products = numpy.fft.irfft(numpy.fft.rfft(a, size) * numpy.conj(numpy.fft.rfft(b, size)), size)
+    # Negative lags end up at the end of the results.  Put them first.
+    products = numpy.concatenate((products[size - (len(b) - 1):], products[:len(a)]))
+    lags = numpy.arange(-(len(b) - 1), len(a))
+    # Determine the overlapping values of a and b at each lag
+    aStart = numpy.maximum(lags, 0)
+    aEnd = numpy.minimum(len(a), len(b) + lags)
+    bStart = aStart - lags
+    bEnd = aEnd - lags
+    # Scale each lag's sum of products by the size of the overlapping values, to get the correlation coefficient
+    aSquares = numpy.concatenate(([0.0], numpy.cumsum(a * a)))
+    bSquares = numpy.concatenate(([0.0], numpy.cumsum(b * b)))
+    scale = numpy.sqrt((aSquares[aEnd] - aSquares[aStart]) * (bSquares[bEnd] - bSquares[bStart]))
+    coefficients = numpy.where(scale > 0, products / numpy.maximum(scale, 1e-12), 0.0)
+    # Only keep lags with enough overlap
+    keep = (aEnd - aStart) >= minOverlap
+    return (lags[keep], coefficients[keep])
+
+def FindOffset(reader1, reader2):
+    """ Find the offset between the sound in two Wave Readers' files.  Returns (offset, confidence), where offset
+        is the time in milliseconds in the first file minus the time in the second file at which the same sound
+        occurs, and confidence is the correlation coefficient of the files' loudness at that offset, from -1.0 to 1.0.
+        (Above 0.5 is a good match.  Below ALIGN_MIN_CONFIDENCE, the offset is probably wrong.)  Returns (None, 0.0) if the files
+        are too short to compare. """
+    # Compare the loudness of the whole files, ALIGN_COARSE_RATE times per second
+    envelope1 = NormalizeEnvelope(Envelope(reader1, ALIGN_COARSE_RATE), ALIGN_COARSE_RATE)
+    envelope2 = NormalizeEnvelope(Envelope(reader2, ALIGN_COARSE_RATE), ALIGN_COARSE_RATE)
+    minOverlap = max(int(ALIGN_MIN_OVERLAP * ALIGN_COARSE_RATE), int(ALIGN_MIN_OVERLAP_FRACTION * min(len(envelope1), len(envelope2))))
+    (lags, coefficients) = CrossCorrelate(envelope1, envelope2, minOverlap)
+    if len(lags) == 0:
+        return (None, 0.0)
+    best = coefficients.argmax()
+    confidence = float(coefficients[best])
+    # Convert the best lag to seconds
+    offset = float(lags[best]) / ALIGN_COARSE_RATE
+
+    # Refine the offset, comparing up to ALIGN_FINE_WINDOW seconds from the middle of the part of the second file that
+    # overlaps the first, ALIGN_FINE_RATE times per second, within two coarse values of the offset found so far.
+    margin = 2.0 / ALIGN_COARSE_RATE
+    length1 = float(reader1.frameCount) / reader1.frameRate
+    length2 = float(reader2.frameCount) / reader2.frameRate
+    overlapStart = max(0.0, -offset)
+    overlapEnd = min(length2, length1 - offset)
+    window = min(ALIGN_FINE_WINDOW, overlapEnd - overlapStart)
+    start2 = (overlapStart + overlapEnd - window) / 2.0
+    start1 = max(start2 + offset - margin, 0.0)
+    end1 = min(start2 + window + offset + margin, length1)
+    fine2 = Envelope(reader2, ALIGN_FINE_RATE, int(start2 * reader2.frameRate), int(window * reader2.frameRate))
+    fine1 = Envelope(reader1, ALIGN_FINE_RATE, int(start1 * reader1.frameRate), int((end1 - start1) * reader1.frameRate))
+    (lags, coefficients) = CrossCorrelate(NormalizeEnvelope(fine1, ALIGN_FINE_RATE), NormalizeEnvelope(fine2, ALIGN_FINE_RATE),
+                                          int(min(ALIGN_MIN_OVERLAP, window / 2.0) * ALIGN_FINE_RATE))
+    # Convert the lags to offsets in seconds, and only consider those near the coarse offset
+    offsets = start1 - start2 + lags.astype(numpy.float64) / ALIGN_FINE_RATE
+    near = numpy.abs(offsets - offset) <= margin
+    if near.any():
+        candidates = numpy.where(near, coefficients, -numpy.inf)
+        best = candidates.argmax()
+        offset = offsets[best]
+        # Estimate the position of the peak between values by fitting a parabola through the best value and its neighbours
+        if (best > 0) and (best < len(candidates) - 1) and near[best - 1] and near[best + 1]:
+            (left, center, right) = coefficients[best - 1:best + 2]
+            curvature = left - 2.0 * center + right
+            if curvature < 0:
+                offset += 0.5 * (left - right) / curvature / ALIGN_FINE_RATE
+    return (int(round(offset * 1000.0)), confidence)
+
+
+# For testing purposes, this module can run stand-alone.
+if __name__ == '__main__':
+    import os
+    import random
+    import tempfile
+    import time
+    import wave
+
+    import WaveReader
+
+    # Create the sound of an hour-long classroom session:  bursts of speech of varying length and loudness, with pauses
+    rate = 2756
+    def Session(seed):
+        random.seed(seed)
+        numpy.random.seed(seed)
+        loudness = numpy.zeros(rate * 3700, dtype=numpy.float32)
+        position = 0
+        while position < len(loudness):
+            length = random.randint(rate / 5, rate * 4)
+            loudness[position:position + length] = random.uniform(0.1, 0.6)
+            position += length + random.randint(rate / 10, rate * 2)
+        return loudness * numpy.sin(numpy.arange(len(loudness)) * 0.7) * numpy.random.uniform(0.5, 1.0, len(loudness))
+    sound = Session(1)
+
+    # Record it with two cameras.  The second starts 73.456 seconds after the first, is quieter, and has more background noise.
+    def WriteWave(filename, samples):
+        waveFile = wave.open(filename, 'w')
+        waveFile.setnchannels(1)
+        waveFile.setsampwidth(1)
+        waveFile.setframerate(rate)
+        waveFile.writeframes(numpy.clip(samples * 127 + 128, 0, 255).astype(numpy.uint8).tostring())
+        waveFile.close()
+    filename1 = os.path.join(tempfile.gettempdir(), 'AudioAlignmentTest1.wav')
+    filename2 = os.path.join(tempfile.gettempdir(), 'AudioAlignmentTest2.wav')
+    delay = int(73.456 * rate)
+    WriteWave(filename1, sound[:rate * 3600] + numpy.random.normal(0, 0.01, rate * 3600))
+    WriteWave(filename2, 0.5 * sound[delay:delay + rate * 3500] + numpy.random.normal(0, 0.03, rate * 3500))
+
+    # Find the offset.  The first file's time is 73.456 seconds later than the second file's for the same sound.
+    reader1 = WaveReader.WaveReader(filename1)
+    reader2 = WaveReader.WaveReader(filename2)
+    startTime = time.time()
+    (offset, confidence) = FindOffset(reader1, reader2)
+    print "Offset %d ms (expected 73456), confidence %0.2f, found in %0.2f seconds" % (offset, confidence, time.time() - startTime)
+    # A recording of a different session shouldn't match well
+    filename3 = os.path.join(tempfile.gettempdir(), 'AudioAlignmentTest3.wav')
+    WriteWave(filename3, Session(2)[:rate * 3500])
+    reader3 = WaveReader.WaveReader(filename3)
+    (offset, confidence) = FindOffset(reader1, reader3)
+    print "Different session:  confidence %0.2f" % confidence
+    reader1.close()
+    reader2.close()
+    reader3.close()
+    os.remove(filename1)
+    os.remove(filename2)
+    os.remove(filename3)
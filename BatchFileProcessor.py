@@ -26,6 +26,8 @@ import wx
 import ctypes
 # import Transana's Common Dialogs
 import Dialogs
+# import Transana's Media Cache, which names wave files for the contents of their media files
+import MediaCache
 # Import Transana's Miscellaneous routines
 import Misc
 # import Transana's Constants
@@ -36,15 +38,11 @@ import TransanaGlobal
 import WaveformProgress
 # import Python's locale module
 import locale
-# import Python's multiprocessing module
-import multiprocessing
 # import Python's os module
 import os
 # import Python's sys module
 import sys
 
-ID_PROCESSTIMER = wx.NewId()
-
 class BatchFileProcessor(Dialogs.GenForm):
     """ Batch File Processor, used for Batch Waveform Generator and Batch Episode Creation """
     def __init__(self, parent, mode):
@@ -200,10 +198,6 @@ class BatchFileProcessor(Dialogs.GenForm):
         self.SetSizeHints(max(500, width), max(500, height))
         # Center the form on screen
         TransanaGlobal.CenterOnPrimary(self)
-        # Initialize the dictionary of running conversions
-        self.runningConversions = {}
-        # Initialize the process variable
-        self.process = None
 
     def get_input(self):
         """ Get the Input values from the Batch Waveform Generator form and process the selected files """
@@ -227,68 +221,39 @@ class BatchFileProcessor(Dialogs.GenForm):
             return None     # Cancel
 
     def AudioExtract(self, data):
-        """ Perform Audio Extraction using as many threads as possible """
-        # Set the list of data files to be processed
-        self.processFileList = data
-        # Create a Timer to control the multi-thread audio extraction process
-        self.processTimer = wx.Timer(self, ID_PROCESSTIMER)
-        wx.EVT_TIMER(self, ID_PROCESSTIMER, self.OnTimer)
-        # Run the time every half second
-        self.processTimer.Start(500)
-
-    def OnTimer(self, event):
-        """ Check the threads to see if we need to add more extraction processes """
-        # While there are processors free and files to process ...
-        while (len(self.runningConversions) < multiprocessing.cpu_count()) and (len(self.processFileList) > 0):
-            # Get the current filename
-            filename = self.processFileList[0]
-            # Remember the original File Name that is passed in
-            originalFilename = filename
-            # Split the path off of the file name
-            (path, filename) = os.path.split(filename)
-            # Split the extension off the file name
-            (filenameroot, extension) = os.path.splitext(filename)
-            # Build the progress box's label
+        """ Perform Audio Extraction, running several extractions at once """
+        # Create a Batch Progress Dialog, which runs the extractions and shows their progress.  When it's done, close this form.
+        batchDlg = WaveformProgress.BatchProgress(self, unicode(_('Batch Waveform Generator'), 'utf8'), onComplete=self.OnBatchComplete)
+        # Get the Media Cache for the Waveforms Directory
+        self.waveformCache = MediaCache.MediaCache(TransanaGlobal.configData.visualizationPath, TransanaGlobal.configData.waveformCacheLimit * 1048576)
+        # Keep track of the media files and wave files being created, so two media files with the same contents don't write
+        # to the same wave file at once, and the wave files can be added to the Media Cache when they're done
+        self.waveFiles = []
+        # For each file selected ...
+        for originalFilename in data:
+            # Build the progress label
             # Encode with UTF-8 rather than TransanaGlobal.encoding because this is a prompt, not DB Data.
             prompt = unicode(_("Extracting %s\nfrom %s"), 'utf8')
-            # Build the filename for the extracted audio out of the filename parts
-            self.waveFilename = os.path.join(TransanaGlobal.configData.visualizationPath, filenameroot + '.wav')
+            # Get the filename for the extracted audio, which depends on the media file's contents, and whether it exists
+            (waveFilename, waveFileExists) = self.waveformCache.WaveFilename(originalFilename)
             # If there is no extracted audio file, OR if we're over-writing extracted audio ...
-            if not(os.path.exists(self.waveFilename)) or self.overwrite.GetValue():
-                # Create the Progress Dialog, allowing MULTIPLE THREADS
-                progressDialog = WaveformProgress.WaveformProgress(self,
-                                                                   prompt % (self.waveFilename, originalFilename),
-                                                                   showModally=False)
-                # If there are NO currently-running conversions ...
-                if self.runningConversions == {}:
-                    # ... then set the index to 1
-                    indexNum = 1
-                # If there are currently-running conversions ...
-                else:
-                    # ... then set the index to 1 more than the largest current number
-                    indexNum = max(self.runningConversions) + 1
-                # Have the Progress Dialog remember its index number
-                progressDialog.indexNum = indexNum
-                # Have the Progress Dialog remember the name of the file being converted
-                progressDialog.originalFilename = originalFilename
-                # Add the Progress Dialog to the dictionary that holds the running conversions
-                self.runningConversions[indexNum] = progressDialog
-                # Tell the Waveform Progress Dialog to handle the audio extraction modally.
-                progressDialog.Extract(originalFilename, self.waveFilename)
-            # Remove the file from the list
-            self.processFileList = self.processFileList[1:]
-
-        # If we've requested extractio for all Files, we can stop the timer.
-        if len(self.processFileList) == 0:
-            self.processTimer.Stop()
-
-    def OnConvertComplete(self, progressDlg):
-        # Remove this conversion from the dictionary of running conversions
-        del(self.runningConversions[progressDlg.indexNum])
-        # If we have NO MORE running conversions ...
-        if len(self.runningConversions) == 0:
-            # Close and destroy the Batch File Processor
-            self.Close()
+            if ((not waveFileExists) or self.overwrite.GetValue()) and (not waveFilename in [waveFile for (mediaFile, waveFile) in self.waveFiles]):
+                # ... remember the extraction
+                self.waveFiles.append((originalFilename, waveFilename))
+                # ... add the extraction to the batch.  Streaming extraction writes the Peak File as it goes, rather than
+                #     reading each wave file again once it's written.
+                batchDlg.AddJob(originalFilename, waveFilename, mode='AudioExtraction-Stream', label=prompt % (waveFilename, originalFilename))
+        # Start the extractions.  (If there's nothing to extract, the batch finishes right away.)
+        batchDlg.Start()
+
+    def OnBatchComplete(self, batchDlg):
+        """ Called by the Batch Progress Dialog when all extractions are done """
+        # Add the wave files that were created to the Media Cache
+        for (mediaFile, waveFile) in self.waveFiles:
+            if os.path.exists(waveFile):
+                self.waveformCache.Add(mediaFile, waveFile)
+        # Close and destroy the Batch File Processor
+        self.Close()
 
     def OnBrowse(self, evt):
         """ Invoked when the user presses the Get Files button. """
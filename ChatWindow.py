@@ -75,6 +75,36 @@ import Snapshot
 # import Transana's Note object
 import Note
 
+# Messages from other users about changes to the database mean that results in the DBInterface Query Cache
+# may be out of date.  This maps each message header to the database tables the change affects.  Messages about
+# tables that are never cached map to an empty tuple.  Messages that aren't listed, such as Rename Node and
+# Delete Node, don't say which table changed, so they discard all cached results.  Changes to the keyword tables
+# also mean the DBInterface Keyword Index must be re-loaded.  (Update Keyword List messages say which object's
+# keywords changed, so only that object's keywords are re-read.)
+MESSAGE_TABLES = {'AS'    : ('Series2', ),
+                  'AE'    : ('Episodes2', 'ClipKeywords2'),
+                  'AD'    : ('Documents2', 'ClipKeywords2'),
+                  'AC'    : ('Collections2', ),
+                  'AKG'   : ('Keywords2', ),
+                  'AK'    : ('Keywords2', ),
+                  'AT'    : (),
+                  'AQ'    : ('ClipKeywords2', ),
+                  'ACl'   : ('Clips2', 'ClipKeywords2'),
+                  'AClSO' : ('Clips2', ),
+                  'ASnap' : ('Snapshots2', 'ClipKeywords2', 'SnapshotKeywords2'),
+                  'ASN'   : (),
+                  'ADN'   : (),
+                  'AEN'   : (),
+                  'ATN'   : (),
+                  'ACN'   : (),
+                  'AQN'   : (),
+                  'AClN'  : (),
+                  'ASnN'  : (),
+                  'AKE'   : (),
+                  'DQPOD' : (),
+                  'UKL'   : (),
+                  'UKV'   : ('Clips2', 'Snapshots2'),
+                  'US'    : ('Snapshots2', 'SnapshotKeywords2')}
 
 # We create a thread to listen for messages from the Message Server.  However,
 # only the Main program thread can interact with a wxPython GUI.  Therefore,
@@ -807,6 +837,19 @@ class ChatWindow(wx.Frame):
             else:
                 # The remaining messages should not be processed if this user was the message sender
                 if self.userName != messageSender:
+                    # Another user has changed the database, so discard any cached query results that may be out of date
+                    if MESSAGE_TABLES.has_key(messageHeader):
+                        for table in MESSAGE_TABLES[messageHeader]:
+                            DBInterface.InvalidateQueryCache(table)
+                    else:
+                        DBInterface.InvalidateQueryCache()
+                    # If another user has changed an object's keywords ...
+                    if messageHeader == 'UKL':
+                        # ... the Keyword Index needs to re-read that object's keywords
+                        try:
+                            DBInterface.InvalidateKeywordIndex(message.split(' ')[0], int(message.split(' ')[1]))
+                        except:
+                            DBInterface.InvalidateKeywordIndex()
                     # We can't have the tree selection changing because of the activity of other users.  That creates all kinds of
                     # problems if we're in the middle of editing something.  So let's note the current selection
                     currentSelection = self.ControlObject.DataWindow.DBTab.tree.GetSelections()
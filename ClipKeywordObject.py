@@ -120,6 +120,10 @@ class ClipKeyword(object):
         dbCursor.execute(SQLText, values)
         # Close the Database Cursor
         dbCursor.close()
+        # The object's keywords have changed, so the Keyword Index must re-read them
+        for (objType, objNum) in zip(['Document', 'Episode', 'Quote', 'Clip', 'Snapshot'], values[:5]):
+            if objNum > 0:
+                DBInterface.InvalidateKeywordIndex(objType, objNum)
     
     # Define Property getters and setters
     # Keyword Group Property
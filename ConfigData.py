@@ -108,6 +108,11 @@ class ConfigData(object):
         str += 'colorAsKeywords = %s\n' % self.colorAsKeywords
         str = str + 'colorConfigFilename = %s\n' % self.colorConfigFilename
         str = str + 'quickClipsWarning = %s\n' % self.quickClipWarning
+        str = str + 'queryProfiling = %s\n' % self.queryProfiling
+        str = str + 'slowQueryThreshold = %s\n' % self.slowQueryThreshold
+        str = str + 'sqliteProfile = %s\n' % self.sqliteProfile
+        str = str + 'conversionProcessLimit = %s\n' % self.conversionProcessLimit
+        str = str + 'waveformCacheLimit = %s\n' % self.waveformCacheLimit
         if 'wxMSW' in wx.PlatformInfo:
             str = str + 'mediaPlayer = %s\n\n' % self.mediaPlayer
         return str
@@ -378,6 +383,19 @@ class ConfigData(object):
         self.colorConfigFilename = config.Read('/2.0/ColorConfigFilename', '')
         # Load the Quick Clips Warning setting
         self.quickClipWarning = config.ReadInt('/2.0/QuickClipWarning', True)
+        # Load the Query Profiling setting, which is off unless the user turns it on
+        self.queryProfiling = config.ReadInt('/3.0/QueryProfiling', False)
+        # Load the Slow Query Threshold, in milliseconds
+        self.slowQueryThreshold = config.ReadInt('/3.0/SlowQueryThreshold', 250)
+        # Load the sqlite Performance Profile
+        self.sqliteProfile = config.Read('/3.0/SqliteProfile', TransanaConstants.SQLITE_PROFILE_DEFAULT)
+        # If the saved profile is not one we know about, use the default profile
+        if not self.sqliteProfile in TransanaConstants.SQLITE_PROFILE_NAMES:
+            self.sqliteProfile = TransanaConstants.SQLITE_PROFILE_DEFAULT
+        # Load the number of media conversions that may run at once.  0 means one per computer core.
+        self.conversionProcessLimit = config.ReadInt('/3.0/ConversionProcessLimit', 0)
+        # Load the size limit, in megabytes, for the wave files in the Waveform Directory.  0 means no limit.
+        self.waveformCacheLimit = config.ReadInt('/3.0/WaveformCacheLimit', 4096)
         # Load the Primary Screen setting
         self.primaryScreen = config.ReadInt('/2.0/PrimaryScreen', 0)
         # Check for screen set to higher than current number of monitors
@@ -596,6 +614,16 @@ class ConfigData(object):
         config.Write('/2.0/ColorConfigFilename', self.colorConfigFilename)
         # Save the Quick Clips Warning setting
         config.WriteInt('/2.0/QuickClipWarning', self.quickClipWarning)
+        # Save the Query Profiling setting
+        config.WriteInt('/3.0/QueryProfiling', self.queryProfiling)
+        # Save the Slow Query Threshold
+        config.WriteInt('/3.0/SlowQueryThreshold', self.slowQueryThreshold)
+        # Save the sqlite Performance Profile
+        config.Write('/3.0/SqliteProfile', self.sqliteProfile)
+        # Save the number of media conversions that may run at once
+        config.WriteInt('/3.0/ConversionProcessLimit', self.conversionProcessLimit)
+        # Save the size limit for the wave files in the Waveform Directory
+        config.WriteInt('/3.0/WaveformCacheLimit', self.waveformCacheLimit)
         # For Windows only ...
         if 'wxMSW' in wx.PlatformInfo:
             # ... save the Media Player selection
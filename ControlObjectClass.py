@@ -3357,74 +3357,80 @@ class ControlObject(object):
                                             unicode(_("%s Keyword Propagation"), 'utf8') % objType, noDefault = True)
             # Prompt the user.  If the user says YES ...
             if tmpDlg.LocalShowModal() == wx.ID_YES:
-                # Create a Progress Dialog
+                # Rather than loading, locking, saving, and unlocking every child, we lock all the children we can at
+                # once, skip the ones locked by others, and add the new keywords to all the others at once.
                 if objType == _('Document'):
-                    title = _('Document Keyword Propagation')
-                    prompt = unicode(_("Adding keywords to Document %s"), 'utf8')
+                    childType = 'Quote'
+                    childTable = 'Quotes2'
+                    childNumField = 'QuoteNum'
                 elif objType == _('Episode'):
-                    title = _('Episode Keyword Propagation')
-                    prompt = unicode(_("Adding keywords to Episode %s"), 'utf8')
-                progress = wx.ProgressDialog(title, prompt % tmpObj.id, parent=self.TranscriptWindow, style = wx.PD_APP_MODAL | wx.PD_AUTO_HIDE)
-                progress.Centre()
-                # That's not working.  Let's try this ...
-                TransanaGlobal.CenterOnPrimary(progress)
-                # Initialize the Object Counter for the progess dialog
-                objCount = 0.0
+                    childType = 'Clip'
+                    childTable = 'Clips2'
+                    childNumField = 'ClipNum'
+                # Get the Child Numbers
+                childNums = [childRec[childNumField] for childRec in childList]
+                # Lock all the Children that aren't locked by someone else
+                (claimed, locks) = DBInterface.claim_record_locks(childTable, childNumField, childNums)
+                # Initialize the list of Keywords to add
+                keywordList = []
+                # Iterate through the Children we locked ...
+                for childNum in claimed:
+                    # ... and add the new Keywords to each of them
+                    for kw in keywordsToAdd:
+                        keywordList.append((childType, childNum, kw.keywordGroup, kw.keyword, 0))
+                try:
+                    # Add the Keywords to all the locked Children at once, getting the list of Keywords that could not be added
+                    missingEntries = DBInterface.insert_clip_keywords(keywordList)
+                finally:
+                    # Release the locks we claimed, which also updates the Children's LastSaveTimes
+                    DBInterface.release_record_locks(childTable, childNumField, claimed)
                 # Iterate through the Child list 
-                for childRec in childList:
-                    # increment the child counter for the progress dialog
-                    objCount += 1.0
-                    if objType == _('Document'):
-                        # Load the Quote.
-                        tmpChildObj = Quote.Quote(childRec['QuoteNum'])
-                        childType = 'Quote'
-                    elif objType == _('Episode'):
-                        # Load the Clip.
-                        tmpChildObj = Clip.Clip(childRec['ClipNum'])
-                        childType = 'Clip'
-                    # Start Exception Handling
-                    try:
-                        # Lock the Child
-                        tmpChildObj.lock_record()
-                        # Add the new Keywords
-                        for kw in keywordsToAdd:
-                            tmpChildObj.add_keyword(kw.keywordGroup, kw.keyword)
-                        # Save the Child
-                        tmpChildObj.db_save()
-                        # Unlock the Child
-                        tmpChildObj.unlock_record()
-
-                        if not TransanaConstants.singleUserVersion:
-                            if TransanaGlobal.chatWindow != None:
-                                # We need to update the Keyword Visualization for the current ClipObject
-                                if objType == _('Document'):
-
-                                    if DEBUG:
-                                        print 'Message to send = "UKV %s %s %s"' % (childType, tmpChildObj.number, tmpChildObj.source_document_num)
-
-                                    TransanaGlobal.chatWindow.SendMessage("UKL %s %s" % (childType, tmpChildObj.number))
-                                    TransanaGlobal.chatWindow.SendMessage("UKV %s %s %s" % (childType, tmpChildObj.number, tmpChildObj.source_document_num))
-                                elif objType == _('Episode'):
-
-                                    if DEBUG:
-                                        print 'Message to send = "UKV %s %s %s"' % (childType, tmpChildObj.number, tmpChildObj.episode_num)
-                                
-                                    TransanaGlobal.chatWindow.SendMessage("UKL %s %s" % (childType, tmpChildObj.number))
-                                    TransanaGlobal.chatWindow.SendMessage("UKV %s %s %s" % (childType, tmpChildObj.number, tmpChildObj.episode_num))
-
-                        # Increment the Progress Dialog
-                        progress.Update(int((objCount / len(childList) * 100)))
-                    # Handle Exceptions
-                    except TransanaExceptions.RecordLockedError, e:
+                for childNum in childNums:
+                    # If the Child is locked by someone else ...
+                    if locks.has_key(childNum):
+                        # ... load the Child so we can tell the user which one it is
                         if objType == _('Document'):
+                            tmpChildObj = Quote.Quote(childNum)
                             prompt = unicode(_('New keywords were not added to Quote "%s"\nin Document "%s"\nbecause the Quote record was locked by %s.'), 'utf8')
                         elif objType == _('Episode'):
+                            tmpChildObj = Clip.Clip(childNum)
                             prompt = unicode(_('New keywords were not added to Clip "%s"\nin Collection "%s"\nbecause the Clip record was locked by %s.'), 'utf8')
-                        errDlg = Dialogs.ErrorDialog(self.MenuWindow, prompt % (tmpChildObj.id, tmpChildObj.GetNodeString(False), e.user))
+                        errDlg = Dialogs.ErrorDialog(self.MenuWindow, prompt % (tmpChildObj.id, tmpChildObj.GetNodeString(False), locks[childNum]))
                         errDlg.ShowModal()
                         errDlg.Destroy()
-                # Destroy the Progress Dialog
-                progress.Destroy()
+                missingKeywords = []
+                for (childType, childNum, kwg, kw, example) in missingEntries:
+                    if not (kwg, kw) in missingKeywords:
+                        missingKeywords.append((kwg, kw))
+                # If any Keywords could not be added ...
+                if len(missingKeywords) > 0:
+                    # ... another user must have changed them.  Build an error prompt.
+                    prompt = ''
+                    for (kwg, kw) in missingKeywords:
+                        # if the prompt isn't blank ...
+                        if prompt != '':
+                            # ... add a couple of line breaks to it
+                            prompt += u'\n\n'
+                        # Add the current keyword to the error prompt
+                        if objType == _('Document'):
+                            prompt += unicode(_('Keyword "%s : %s" cannot be added to Document "%s".\nAnother user must have edited the keyword while you were adding it.'), 'utf8') % (kwg, kw, tmpObj.id)
+                        elif objType == _('Episode'):
+                            prompt += unicode(_('Keyword "%s : %s" cannot be added to Episode "%s".\nAnother user must have edited the keyword while you were adding it.'), 'utf8') % (kwg, kw, tmpObj.id)
+                    errDlg = Dialogs.ErrorDialog(self.MenuWindow, prompt)
+                    errDlg.ShowModal()
+                    errDlg.Destroy()
+
+                if not TransanaConstants.singleUserVersion:
+                    if TransanaGlobal.chatWindow != None:
+                        # Iterate through the Children that got new Keywords
+                        for childNum in claimed:
+                            # We need to update the Keyword List and the Keyword Visualization for the Child.
+                            # (Quotes are from this Document, and Clips are from this Episode.)
+                            if DEBUG:
+                                print 'Message to send = "UKV %s %s %s"' % (childType, childNum, objNum)
+
+                            TransanaGlobal.chatWindow.SendMessage("UKL %s %s" % (childType, childNum))
+                            TransanaGlobal.chatWindow.SendMessage("UKV %s %s %s" % (childType, childNum, objNum))
 
                 # Need to Update the Keyword Visualization
                 self.UpdateKeywordVisualization()
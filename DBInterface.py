@@ -23,6 +23,13 @@ DEBUG = False
 if DEBUG:
     print "DBInterface DEBUG is ON!"
 
+# if running stand-alone (for benchmarking)
+if __name__ == '__main__':
+    # import wxPython
+    import wx
+    # This module expects i18n.  Enable it here.
+    __builtins__._ = wx.GetTranslation
+
 # import Transana's Constants
 import TransanaConstants
 
@@ -37,8 +44,6 @@ elif TransanaConstants.DBInstalled in ['PyMySQL']:
 elif TransanaConstants.DBInstalled in ['sqlite3']:
     # import sqlite
     import sqlite3
-    # import the python DateTime module
-    import datetime
 else:
     import TransanaExceptions
     raise TransanaExceptions.ProgrammingError('No Database Module loaded in DBInterface.py.')
@@ -66,6 +71,16 @@ import os
 import sys
 # import Python's string module
 import string
+# import Python's threading module
+import threading
+# import Python's time module
+import time
+# import Python's contextlib module
+import contextlib
+# import Python's collections module
+import collections
+# import the python DateTime module
+import datetime
 # import Transana's Clip object
 import Clip
 # import Transana's Collection Object
@@ -84,6 +99,14 @@ import Note
 import Library
 # import Transana's Snapshot Object
 import Snapshot
+# import Transana's Interval Tree
+import IntervalTree
+# import Transana's Query Profiler
+import QueryProfiler
+# import Transana's Keyword Index
+import KeywordIndex
+# import Transana's Text Index
+import TextIndex
 # import Transana's Global Variables
 import TransanaGlobal
 # import Transana's Exceptions
@@ -94,6 +117,14 @@ import Transcript
 # Declare Global Variables
 # Database Reference
 _dbref = None
+# The parameters get_db() used to connect to the database, so the Connection Pool can open more connections like it
+_connectionParameters = None
+# The Connection Pool used by background threads, created when first needed
+_connectionPool = None
+# The tables in the current database that have a MediaPathKey column, or None if we haven't checked yet
+_mediaPathKeyTables = None
+# Query Profiling statistics.  When Query Profiling is on, get_db() returns connections whose cursors record their queries here.
+_queryStatistics = QueryProfiler.QueryStatistics()
 
 def InitializeSingleUserDatabase():
     """ For single-user Transana only, this initializes (starts) the embedded MySQL Server. """
@@ -264,7 +295,8 @@ def CreateEpisodesTableQuery(num):
                  EpLength       INTEGER, 
                  EpComment      VARCHAR(255), 
                  RecordLock     VARCHAR(25), 
-                 LockTime       DATETIME"""
+                 LockTime       DATETIME,
+                 MediaPathKey   VARCHAR(255)"""
     # Add MySQL-specific SQL if appropriate
     if TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server', 'PyMySQL']:
         query += """,
@@ -399,7 +431,8 @@ def CreateClipsTableQuery(num):
                  ClipComment    VARCHAR(255), 
                  SortOrder      INTEGER, 
                  RecordLock     VARCHAR(25), 
-                 LockTime       DATETIME"""
+                 LockTime       DATETIME,
+                 MediaPathKey   VARCHAR(255)"""
     # Add MySQL-specific SQL if appropriate
     if TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server', 'PyMySQL']:
         query += """, 
@@ -449,7 +482,8 @@ def CreateSnapshotsTableQuery(num):
                  SortOrder          INTEGER, 
                  LastSaveTime       DATETIME, 
                  RecordLock         VARCHAR(25), 
-                 LockTime           DATETIME"""
+                 LockTime           DATETIME,
+                 MediaPathKey       VARCHAR(255)"""
     # Add MySQL-specific SQL if appropriate
     if TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server', 'PyMySQL']:
         query += """, 
@@ -873,7 +907,8 @@ def CreateAdditionalVidsTableQuery(num):
                  MediaFile      VARCHAR(255), 
                  VidLength      INTEGER,
                  Offset         INTEGER,
-                 Audio          INTEGER"""
+                 Audio          INTEGER,
+                 MediaPathKey   VARCHAR(255)"""
     # Add MySQL-specific SQL if appropriate
     if TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server', 'PyMySQL']:
         query += """,
@@ -888,6 +923,333 @@ def CreateAdditionalVidsTableQuery(num):
     # Return the query to the calling routine
     return query % (num, autoIncrementSyntax)
 
+def CreateTextIndexTableQuery(num):
+    """ Create Query for the Text Index Table """
+    # The Text Index holds one record for each word in each Transcript, Document, Quote, and Note, with the
+    # positions of the word in the object's text.  Each object also has one record with an empty Token, which
+    # shows that the object has been indexed even if it has no words.
+    query = """
+              CREATE TABLE IF NOT EXISTS TextIndex%d
+                (ObjectType     VARCHAR(20),
+                 ObjectNum      INTEGER,
+                 Token          VARCHAR(100),
+                 Positions      %s,
+                 PRIMARY KEY (ObjectType, ObjectNum, Token))"""
+    # Add MySQL-specific SQL if appropriate
+    if TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server', 'PyMySQL']:
+        query += """
+                 DEFAULT CHARACTER SET utf8
+                 COLLATE utf8_bin
+            """
+        # Add the appropriate Table Type to the CREATE Query
+        query = SetTableType(TransanaGlobal.hasInnoDB, query)
+        # The position list for a common word in a long Transcript can be too long for a TEXT column
+        positionsType = 'LONGTEXT'
+    elif TransanaConstants.DBInstalled in ['sqlite3']:
+        positionsType = 'TEXT'
+    # Return the query to the calling routine
+    return query % (num, positionsType)
+
+# The version number of the Secondary Index set defined in SecondaryIndexDefinitions() below.
+# If you add an index to that list, you MUST increment this number so that existing databases
+# will pick up the new index the next time they are opened.
+INDEX_VERSION = 3
+
+def SecondaryIndexDefinitions(num):
+    """ Return a list of (Table Name, Index Name, Column List) tuples that define the secondary indexes
+        Transana needs beyond the Primary Keys declared in the Create*TableQuery() methods above. """
+
+    # NOTE:  If you change this list, you need to increment INDEX_VERSION above!
+
+    # The Clip Keywords table is filtered by Keyword Group and Keyword by the Search, Keyword Map, and
+    # Keyword Management code, and by object number whenever keywords are loaded for an object.
+    indexes = [('ClipKeywords%d' % num, 'ClipKeywords_KWG_KW', 'KeywordGroup, Keyword'),
+               ('ClipKeywords%d' % num, 'ClipKeywords_Document', 'DocumentNum'),
+               ('ClipKeywords%d' % num, 'ClipKeywords_Clip', 'ClipNum'),
+               ('ClipKeywords%d' % num, 'ClipKeywords_Quote', 'QuoteNum'),
+               ('ClipKeywords%d' % num, 'ClipKeywords_Snapshot', 'SnapshotNum')]
+    # The MySQL version of the Clip Keywords table has a UNIQUE KEY that starts with EpisodeNum, so
+    # only sqlite needs a separate Episode Number index.
+    if TransanaConstants.DBInstalled in ['sqlite3']:
+        indexes.append(('ClipKeywords%d' % num, 'ClipKeywords_Episode', 'EpisodeNum'))
+    # Clips are looked up by Episode (and time position), and by Collection when the database tree is built
+    indexes += [('Clips%d' % num, 'Clips_Episode', 'EpisodeNum, ClipStart'),
+                ('Clips%d' % num, 'Clips_Collection', 'CollectNum')]
+    # Clip Transcripts are looked up by Clip, and by the Episode Transcript they were taken from
+    indexes += [('Transcripts%d' % num, 'Transcripts_Episode', 'EpisodeNum'),
+                ('Transcripts%d' % num, 'Transcripts_Clip', 'ClipNum'),
+                ('Transcripts%d' % num, 'Transcripts_SourceTranscript', 'SourceTranscriptNum')]
+    # Snapshots are looked up by Episode (and time position), by Transcript, and by Collection
+    indexes += [('Snapshots%d' % num, 'Snapshots_Episode', 'EpisodeNum, SnapshotTimeCode'),
+                ('Snapshots%d' % num, 'Snapshots_Transcript', 'TranscriptNum'),
+                ('Snapshots%d' % num, 'Snapshots_Collection', 'CollectNum')]
+    # Quotes are looked up by Collection and by their Source Document
+    indexes += [('Quotes%d' % num, 'Quotes_Collection', 'CollectNum'),
+                ('Quotes%d' % num, 'Quotes_SourceDocument', 'SourceDocumentNum')]
+    # Episodes, Clips, Snapshots, and Additional Media Files are looked up by media file path when the Video Root
+    # changes.  (Index Version 2.  UpdateSecondaryIndexes() adds and fills the MediaPathKey columns first.)
+    indexes += [('Episodes%d' % num, 'Episodes_MediaPathKey', 'MediaPathKey'),
+                ('Clips%d' % num, 'Clips_MediaPathKey', 'MediaPathKey'),
+                ('Snapshots%d' % num, 'Snapshots_MediaPathKey', 'MediaPathKey'),
+                ('AdditionalVids%d' % num, 'AdditionalVids_MediaPathKey', 'MediaPathKey')]
+    # The Text Index is searched by word.  (Index Version 3.  UpdateSecondaryIndexes() indexes the existing text first.)
+    indexes += [('TextIndex%d' % num, 'TextIndex_Token', 'Token')]
+    # Return the Index Definitions
+    return indexes
+
+def UpdateSecondaryIndexes(db, usePrompt=True, newDatabase=False):
+    """ Create any Secondary Indexes that are missing from the current database.  The IndexVersion value
+        in the ConfigInfo table records which version of the index set has already been applied, so this
+        only does real work for new databases and the first time an older database is opened.
+        usePrompt indicates whether the user may be shown a progress dialog, and newDatabase indicates
+        that the tables were just created, so the indexes will be built instantly and no dialog is needed. """
+    # Get a Database Cursor
+    dbCursor = db.cursor()
+    # Get the Index Version value from the Configuration Information table
+    indexVersion = GetSecondaryIndexVersion(dbCursor)
+
+    # If the database's indexes are current (or newer than we know about), there's nothing to do.
+    if indexVersion >= INDEX_VERSION:
+        # Close the Database Cursor
+        dbCursor.close()
+        return
+
+    # Get the list of Index Definitions
+    indexList = SecondaryIndexDefinitions(2)
+    # Creating indexes on large tables of an existing database can take a while.  If we're allowed to
+    # interact with the user, create a progress dialog.
+    if usePrompt and not newDatabase:
+        progDlg = wx.ProgressDialog(_("Transana"), _("Database upgrade in progress"), maximum = len(indexList),
+                                    style = wx.PD_APP_MODAL | wx.PD_ELAPSED_TIME | wx.PD_REMAINING_TIME)
+    else:
+        progDlg = None
+    # Initialize a counter for the Progress Dialog
+    counter = 0
+    # Note whether all the indexes were created successfully
+    allIndexesCreated = True
+    # Index Version 2 indexes the MediaPathKey columns, which databases created before then don't have yet.
+    if indexVersion < 2:
+        # If the columns can't be added and filled, the indexes on them will fail too, so we just report it here.
+        try:
+            # Add the MediaPathKey columns and fill them in for all existing records
+            AddMediaPathKeys(dbCursor)
+        except:
+            # Report the problem.  We'll try again next time the database is opened.
+            print "DBInterface.UpdateSecondaryIndexes():  Exception adding the MediaPathKey columns"
+            print sys.exc_info()[0], sys.exc_info()[1]
+    # Index Version 3 adds the Text Index, which must hold the text of all existing objects before it can be searched
+    if indexVersion < 3:
+        try:
+            # Add the text of every Transcript, Document, Quote, and Note to the Text Index
+            IndexMissingText(dbCursor)
+        except:
+            # If the Text Index is incomplete, Text Searches can't be done.  Don't record the new Index Version, so
+            # we'll try again the next time the database is opened.
+            allIndexesCreated = False
+            # Report the problem
+            print "DBInterface.UpdateSecondaryIndexes():  Exception building the Text Index"
+            print sys.exc_info()[0], sys.exc_info()[1]
+    # Iterate through the Index Definitions
+    for (table, indexName, columns) in indexList:
+        # Update the Progress Dialog
+        if progDlg != None:
+            progDlg.Update(counter)
+        # Creating an index can fail, for example if a Multi-user database account lacks the INDEX privilege,
+        # or if another copy of Transana creates the same index at the same time.  Neither should prevent
+        # the database from being opened, as the indexes only affect speed.
+        try:
+            # If we're using MySQL ...
+            if TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server', 'PyMySQL']:
+                # ... MySQL doesn't support CREATE INDEX IF NOT EXISTS, so we have to check for the index first.
+                query = "SHOW INDEX FROM %s WHERE Key_name = '%s'" % (table, indexName)
+                # Execute the Query
+                dbCursor.execute(query)
+                # If the index doesn't already exist ...
+                if len(dbCursor.fetchall()) == 0:
+                    # ... create it
+                    dbCursor.execute("CREATE INDEX %s ON %s (%s)" % (indexName, table, columns))
+            # If we're using sqlite ...
+            elif TransanaConstants.DBInstalled in ['sqlite3']:
+                # ... we can create the index only if it's missing directly
+                dbCursor.execute("CREATE INDEX IF NOT EXISTS %s ON %s (%s)" % (indexName, table, columns))
+        except:
+            # Note that the index set is incomplete, so we'll try again next time the database is opened
+            allIndexesCreated = False
+            # Report the problem and move on to the next index
+            print "DBInterface.UpdateSecondaryIndexes():  Exception creating index %s on %s" % (indexName, table)
+            print sys.exc_info()[0], sys.exc_info()[1]
+        # Increment the progress counter
+        counter += 1
+    # We can now close the Progress Dialog
+    if progDlg != None:
+        progDlg.Destroy()
+
+    # If any index could not be created, don't record the new Index Version
+    if not allIndexesCreated:
+        # Close the Database Cursor
+        dbCursor.close()
+        return
+
+    # Recording the Index Version can also collide with another copy of Transana doing the same thing
+    try:
+        # If there was no IndexVersion record ...
+        if indexVersion == 0:
+            # ... add one
+            query = "INSERT INTO ConfigInfo (KeyVal, Value) VALUES ('IndexVersion', %s)"
+        # If there was an IndexVersion record ...
+        else:
+            # ... update it
+            query = "UPDATE ConfigInfo SET Value = %s WHERE KeyVal = 'IndexVersion'"
+        # Adjust the query for sqlite if needed
+        query = FixQuery(query)
+        # Record the Index Version we just applied
+        dbCursor.execute(query, ('%d' % INDEX_VERSION, ))
+    except:
+        # If another copy of Transana has already recorded the current Index Version, that's fine.
+        # Otherwise, report the problem.  We'll try again next time the database is opened.
+        if GetSecondaryIndexVersion(dbCursor) < INDEX_VERSION:
+            print "DBInterface.UpdateSecondaryIndexes():  Exception recording the Index Version"
+            print sys.exc_info()[0], sys.exc_info()[1]
+    # Close the Database Cursor
+    dbCursor.close()
+
+def GetSecondaryIndexVersion(dbCursor):
+    """ Return the version of the Secondary Index set recorded in the ConfigInfo table, or 0 if none is recorded. """
+    # Get the Index Version value from the Configuration Information table
+    query = "SELECT Value FROM ConfigInfo WHERE KeyVal = 'IndexVersion'"
+    # Execute the Query
+    dbCursor.execute(query)
+    data = dbCursor.fetchall()
+    # If no value is returned ...
+    if len(data) <= 0:
+        # ... then no secondary indexes have been created yet
+        return 0
+    # Otherwise, return the Index Version from the Database
+    else:
+        return int(data[0][0])
+
+# The tables that have MediaPathKey columns, with each table's record number field and media file name field
+MEDIA_PATH_KEY_TABLES = (('Episodes2', 'EpisodeNum', 'MediaFile'),
+                         ('Clips2', 'ClipNum', 'MediaFile'),
+                         ('Snapshots2', 'SnapshotNum', 'ImageFile'),
+                         ('AdditionalVids2', 'AddVidNum', 'MediaFile'))
+
+def MediaPathKey(fileName):
+    """ Return the normalized form of a media file name that is stored in the MediaPathKey column.  File names
+        have been stored with both single and doubled backslashes as well as slashes, so the key collapses doubled
+        backslashes and then uses the slash as the only separator.  This MUST match MediaPathKeyExpression(). """
+    # (Python requires a double backslash in a string to represent a single backslash, so this replaces double
+    # backslashes ('\\') with single ones ('\') and then replaces single backslashes with slashes.)
+    return fileName.replace('\\\\', '\\').replace('\\', '/')
+
+def MediaPathKeyExpression(column):
+    """ Return the SQL expression and its parameters that calculate the MediaPathKey value for a file name column.
+        This does in the database exactly what MediaPathKey() does in Python. """
+    # REPLACE() works the same way in MySQL and sqlite.  Passing the separators as parameters saves us from
+    # having to deal with the different ways the two databases escape backslashes.
+    return ("REPLACE(REPLACE(%s, %%s, %%s), %%s, %%s)" % column, ('\\\\', '\\', '\\', '/'))
+
+def HasMediaPathKey(table):
+    """ Indicate whether the table has a MediaPathKey column.  Databases created before Index Version 2 don't
+        have these columns until UpdateSecondaryIndexes() adds them, which may not be possible for every user
+        of a multi-user database. """
+    global _mediaPathKeyTables
+    # If we haven't checked the current database yet ...
+    if _mediaPathKeyTables == None:
+        # Get a Database Cursor
+        dbCursor = get_db().cursor()
+        # Check all the tables now, and remember which ones have the column
+        _mediaPathKeyTables = [tableName for (tableName, numField, fileField) in MEDIA_PATH_KEY_TABLES
+                               if MediaPathKeyColumnExists(dbCursor, tableName)]
+        # Close the Database Cursor
+        dbCursor.close()
+    return table in _mediaPathKeyTables
+
+def MediaPathKeyColumnExists(dbCursor, table):
+    """ Check the database itself to see if the table has a MediaPathKey column """
+    # If we're using MySQL ...
+    if TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server', 'PyMySQL']:
+        # ... ask for the column by name
+        dbCursor.execute("SHOW COLUMNS FROM %s LIKE 'MediaPathKey'" % table)
+        return len(dbCursor.fetchall()) > 0
+    # If we're using sqlite ...
+    elif TransanaConstants.DBInstalled in ['sqlite3']:
+        # ... get the table's column list.  The column name is the second value of each row.
+        dbCursor.execute("PRAGMA table_info(%s)" % table)
+        return 'MediaPathKey' in [row[1] for row in dbCursor.fetchall()]
+
+def AddMediaPathKeys(dbCursor):
+    """ Add the MediaPathKey column to any table that doesn't have it yet, and fill it in for every record
+        that doesn't have a value.  Called by UpdateSecondaryIndexes() before the MediaPathKey indexes are created. """
+    global _mediaPathKeyTables
+    # Add the column to each table that needs it.  (MySQL commits the current transaction when a table is
+    # altered, so we add all the columns before we start the transaction below.)
+    for (table, numField, fileField) in MEDIA_PATH_KEY_TABLES:
+        # If the table doesn't have the column yet ...
+        if not MediaPathKeyColumnExists(dbCursor, table):
+            # ... add it.  New columns are empty (NULL) for existing records.
+            dbCursor.execute("ALTER TABLE %s ADD COLUMN MediaPathKey VARCHAR(255)" % table)
+    # The column list has changed, so HasMediaPathKey() needs to check it again
+    _mediaPathKeyTables = None
+    # Fill in all the missing keys in a single transaction, one query per table
+    dbCursor.execute("BEGIN")
+    try:
+        # For each table ...
+        for (table, numField, fileField) in MEDIA_PATH_KEY_TABLES:
+            # ... calculate the key for every record that doesn't have one
+            UpdateMediaPathKeys(dbCursor, table)
+        # Commit the transaction
+        dbCursor.execute("COMMIT")
+    except:
+        # If anything went wrong, don't leave part of the work done
+        dbCursor.execute("ROLLBACK")
+        # Let the calling routine report the problem
+        raise
+
+def UpdateMediaPathKeys(dbCursor, table, numField=None, num=None):
+    """ Calculate the MediaPathKey value for the records in table where numField equals num, or, if numField is
+        not specified, for all the records that don't have a MediaPathKey value.  The object db_save() methods call
+        this after they save a media file name, so the key always matches the saved file name.  If the table
+        doesn't have a MediaPathKey column, this does nothing. """
+    # If the table doesn't have a MediaPathKey column, there's nothing to do
+    if not HasMediaPathKey(table):
+        return
+    # Find the name of the table's file name field
+    fileField = [fileField for (tableName, tableNumField, fileField) in MEDIA_PATH_KEY_TABLES if tableName == table][0]
+    # Get the SQL that calculates the key from the file name
+    (expression, values) = MediaPathKeyExpression(fileField)
+    # Build the query to update a particular record or records ...
+    if numField != None:
+        query = "UPDATE %s SET MediaPathKey = %s WHERE %s = %%s" % (table, expression, numField)
+        values += (num, )
+    # ... or all records without a key
+    else:
+        query = "UPDATE %s SET MediaPathKey = %s WHERE MediaPathKey IS NULL" % (table, expression)
+    # Adjust the query for sqlite if needed
+    query = FixQuery(query)
+    # Execute the query
+    dbCursor.execute(query, values)
+
+def MediaPathPrefixCondition(table, filePath):
+    """ Return a WHERE clause and its parameters that select the records in table whose media file may start
+        with filePath, which must already use the slash as its separator.  The MediaPathKey index finds these
+        records without reading the whole table.  The calling routine must still compare each file name to
+        filePath, as records saved by older versions of Transana, which have no key, are also included.
+        If the table has no MediaPathKey column, an empty WHERE clause that selects all records is returned. """
+    # If the table has no MediaPathKey column, or there's no path to look for ...
+    if (filePath == '') or not HasMediaPathKey(table):
+        # ... we have to look at all the records
+        return ('', ())
+    # Every key that starts with filePath sorts at or after filePath and before the value we get by increasing
+    # filePath's last character by one.  The media file columns use binary collation, so this holds in the
+    # database too.
+    if isinstance(filePath, unicode):
+        upperBound = filePath[:-1] + unichr(ord(filePath[-1]) + 1)
+    # (A UTF-8 encoded string works too, as UTF-8 strings sort by their bytes in the same order as their characters.)
+    else:
+        upperBound = filePath[:-1] + chr(ord(filePath[-1]) + 1)
+    # Return the WHERE clause and its parameters
+    return ("WHERE ((MediaPathKey >= %s) AND (MediaPathKey < %s)) OR (MediaPathKey IS NULL)", (filePath, upperBound))
 
 def establish_db_exists(dbToOpen=None, usePrompt=True):
     """ Check for the existence of all database tables and create them
@@ -1511,6 +1873,11 @@ def establish_db_exists(dbToOpen=None, usePrompt=True):
         # Execute the Query
         dbCursor.execute(query)
 
+        # TextIndex2 (Text Index) Table: Test for existence and create if needed
+        query = CreateTextIndexTableQuery(2)
+        # Execute the Query
+        dbCursor.execute(query)
+
         if TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server', 'PyMySQL']:
             # Let's test for COLLATION.  ** NOTE:  THIS DOESN'T WORK for CHINESE!! **
             # Create a list of table to check
@@ -1598,6 +1965,9 @@ def establish_db_exists(dbToOpen=None, usePrompt=True):
                         # signal failure to connect to the database
                         return False
 
+        # Now that all the tables exist and have been upgraded, make sure the Secondary Indexes exist too.
+        UpdateSecondaryIndexes(db, usePrompt=usePrompt, newDatabase=(DBVersion == 0))
+
         # See if this (username, server, database) combination has defined paths.
         if TransanaGlobal.configData.pathsByDB.has_key((TransanaGlobal.userName.encode('utf8'), TransanaGlobal.configData.host.encode('utf8'), TransanaGlobal.configData.database.encode('utf8'))):
             # If so, load the video root and visualization paths.
@@ -1711,8 +2081,20 @@ def UpdateTranscriptRecsfor240(self):
 
 def get_db(dbToOpen=None, usePrompt=True):
     """ Get a connection object reference to the database.  If a connection has not yet been established, then create the connection.
-        dbToOpen is passed if we are automatically importing a database following 2.42 to 2.50 Data Conversion. """
+        dbToOpen is passed if we are automatically importing a database following 2.42 to 2.50 Data Conversion.
+        A thread that has checked out a connection from the Connection Pool gets that connection instead. """
     global _dbref
+    global _connectionParameters
+    # If a Connection Pool exists ...
+    if _connectionPool != None:
+        # ... see if this thread has checked out a pooled connection
+        pooledDB = _connectionPool.current()
+        # If so, use it rather than the main connection, which belongs to the user interface thread
+        if pooledDB != None:
+            # If Query Profiling is on, return a connection that records its queries
+            if _queryStatistics.enabled:
+                return QueryProfiler.InstrumentedConnection(pooledDB, _queryStatistics)
+            return pooledDB
     # If a database reference is not defined ...
     if (_dbref == None):
         # If we are NOT passed a database name, we need to get information from the user.
@@ -1803,12 +2185,8 @@ def get_db(dbToOpen=None, usePrompt=True):
 
                 # If we should connect to the database ...
                 if result == wx.ID_YES:
-                    # ... connect to it.
-                    _dbref = sqlite3.connect(dbName.encode('utf8'))
-                    # Enable AutoCommit
-                    _dbref.isolation_level = None
-                    # Have sqlite use Strings rather than Unicode, as all fields in Transana are manually encoded
-                    _dbref.text_factory = str
+                    # ... connect to it, using the user's sqlite Performance Profile.
+                    _dbref = ConnectSqlite(dbName.encode('utf8'))
                     # Set the Max Allowed Packet setting for use with sqlite (This number came from the sqlite documentation)
                     TransanaGlobal.max_allowed_packet = 2147483647
                     # ... and we'll make this the default database to make it even easier.
@@ -2284,42 +2662,453 @@ def get_db(dbToOpen=None, usePrompt=True):
                     _dbref = None
             else:
                 TransanaExceptions.ProgrammingError('Database Undefined in DBInterface.get_db()')
+
+            # If we have connected to the database ...
+            if _dbref != None:
+                # ... remember how we did it, so the Connection Pool can open more connections to the same database.
+                # If we're using sqlite, all we need is the database file.
+                if TransanaConstants.DBInstalled in ['sqlite3']:
+                    _connectionParameters = {'dbName' : dbName}
+                # If we're using MySQL ...
+                else:
+                    # ... we need the database name ...
+                    _connectionParameters = {'databaseName' : TransanaGlobal.configData.database}
+                    # ... and, for the multi-user version, the server, login and SSL information
+                    if not TransanaConstants.singleUserVersion:
+                        _connectionParameters['host'] = dbServer
+                        _connectionParameters['user'] = userName
+                        _connectionParameters['passwd'] = password
+                        _connectionParameters['port'] = int(port)
+                        # Only request SSL if the server turned out to support it
+                        if TransanaGlobal.configData.ssl:
+                            _connectionParameters['ssl'] = {'cert': sslClientCert, 'key': sslClientKey}
+                # Start Query Profiling if the user has turned it on
+                ConfigureQueryProfiling(TransanaGlobal.configData.queryProfiling, TransanaGlobal.configData.slowQueryThreshold)
+    # If Query Profiling is on, return a connection that records its queries
+    if _queryStatistics.enabled and (_dbref != None):
+        return QueryProfiler.InstrumentedConnection(_dbref, _queryStatistics)
     # Return the database reference
     return _dbref
 
 def close_db():
     """ This method flushes all database tables (saving data to disk) and closes the Database Connection. """
+    global _dbref
+    global _connectionParameters
+    global _connectionPool
+    global _mediaPathKeyTables
+    # If there is a Connection Pool ...
+    if _connectionPool != None:
+        # ... close all of its connections.  They belong to the database we're closing.
+        _connectionPool.close()
+        _connectionPool = None
+    # Forget how to connect to the database we're closing
+    _connectionParameters = None
+    # Forget which of the closed database's tables have MediaPathKey columns
+    _mediaPathKeyTables = None
+    # Discard all cached query results from the database we're closing
+    InvalidateQueryCache()
+    # Discard the closed database's Keyword Index
+    InvalidateKeywordIndex()
+
     # obtain the Database
-    db = get_db()
+    db = _dbref
 
     if db != None:
+        # If we're using sqlite ...
+        if TransanaConstants.DBInstalled in ['sqlite3']:
+            # ... copy everything in the Write-Ahead Log into the database file and empty the log, so the database file
+            # is complete on its own if it gets copied or backed up.  The Connection Pool has been closed, so no other
+            # connection of ours is using the log.  If another program is, sqlite will finish the job later.
+            try:
+                dbCursor = db.cursor()
+                dbCursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                dbCursor.fetchall()
+                dbCursor.close()
+            except:
+                print "DBInterface.close_db():  checkpoint failed"
+                print sys.exc_info()[0], sys.exc_info()[1]
         # Close the Database itself
         db.close()
 
-    global _dbref
     # Remove all reference to the database
     _dbref = None
 
+def ConnectSqlite(dbName, profile=None, checkSameThread=True):
+    """ Open a connection to the sqlite database file dbName, set up the way Transana expects, using the sqlite
+        Performance Profile named by profile, or the user's profile if profile is None. """
+    # If no profile was specified, use the one from the Configuration Data
+    if profile == None:
+        profile = TransanaGlobal.configData.sqliteProfile
+    # Get the number of prepared statements to keep for re-use from the profile
+    cachedStatements = dict(TransanaConstants.SQLITE_PROFILES[profile])['cached_statements']
+    # Connect to the database file
+    db = sqlite3.connect(dbName, check_same_thread=checkSameThread, cached_statements=cachedStatements)
+    # Enable AutoCommit
+    db.isolation_level = None
+    # Have sqlite use Strings rather than Unicode, as all fields in Transana are manually encoded
+    db.text_factory = str
+    # Apply the rest of the profile's settings
+    ApplySqliteProfile(db, profile)
+    return db
+
+def ApplySqliteProfile(db, profile):
+    """ Apply the settings of the sqlite Performance Profile named by profile to the sqlite connection db.
+        (The number of cached statements can only be set when a connection is opened.) """
+    # Get a Database Cursor
+    dbCursor = db.cursor()
+    # For each setting in the profile ...
+    for (setting, value) in TransanaConstants.SQLITE_PROFILES[profile]:
+        # ... cached_statements is a connection parameter, not a PRAGMA
+        if setting == 'cached_statements':
+            continue
+        # Older versions of sqlite ignore settings they don't know about, but a setting can still fail.  For example,
+        # the journal mode can't leave WAL while another program has the database open.  That's not a reason not to
+        # open the database, so just report it.
+        try:
+            dbCursor.execute('PRAGMA %s = %s' % (setting, value))
+            # Some PRAGMAs report their new value.  Read it so the statement is finished.
+            dbCursor.fetchall()
+        except:
+            print "DBInterface.ApplySqliteProfile():  Could not set %s to %s" % (setting, value)
+            print sys.exc_info()[0], sys.exc_info()[1]
+    # Close the Database Cursor
+    dbCursor.close()
+
+def ChangeSqliteProfile(profile):
+    """ Apply the sqlite Performance Profile named by profile to the open database, if there is one.  Pooled
+        connections get the new profile when they are next opened. """
+    # If we're using sqlite and have a database open ...
+    if (TransanaConstants.DBInstalled in ['sqlite3']) and (_dbref != None):
+        # ... apply the profile to the main connection
+        ApplySqliteProfile(_dbref, profile)
+
+def open_pooled_connection():
+    """ Open a new connection to the database get_db() is connected to, for use by the Connection Pool.
+        Returns None if get_db() has not connected to a database. """
+    # If get_db() hasn't connected to a database, we don't know what to connect to.
+    if _connectionParameters == None:
+        return None
+    # If we're using sqlite ...
+    if TransanaConstants.DBInstalled in ['sqlite3']:
+        # ... connect to the same database file.  Pooled connections are checked out by one thread at a time,
+        # but may be used by different threads over their lifetime.
+        db = ConnectSqlite(_connectionParameters['dbName'].encode('utf8'), checkSameThread=False)
+    # If we're using MySQL ...
+    elif TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server', 'PyMySQL']:
+        # Get the connection parameters, minus the database name, which must be selected separately
+        parameters = _connectionParameters.copy()
+        databaseName = parameters['databaseName']
+        del(parameters['databaseName'])
+        # Connect to the Database Server the same way get_db() did
+        if 'unicode' in wx.PlatformInfo:
+            db = MySQLdb.connect(use_unicode=True, **parameters)
+        else:
+            db = MySQLdb.connect(**parameters)
+        # Get a Database Cursor
+        dbCursor = db.cursor()
+        # If we have MySQL 4.1 or later, we have UTF-8 support and should use it.
+        if TransanaGlobal.DBVersion >= u'4.1':
+            # Set Character Encoding settings to match the main connection
+            dbCursor.execute('SET CHARACTER SET utf8')
+            dbCursor.execute('SET character_set_connection = utf8')
+            dbCursor.execute('SET character_set_client = utf8')
+            dbCursor.execute('SET character_set_results = utf8')
+            dbCursor.execute('SET collation_connection = utf8_general_ci')
+        # Select the database
+        dbCursor.execute('USE %s' % databaseName.encode(TransanaGlobal.encoding))
+        # Close the Database Cursor
+        dbCursor.close()
+    return db
+
+class ConnectionPool(object):
+    """ A bounded pool of database connections for background threads.  The single connection returned by
+        get_db() belongs to the user interface thread, and database connections can't safely be shared
+        between threads, so threads that need to query the database while the user keeps working should
+        check out a connection from the pool, using the pooled_db() context manager.
+
+        Each thread gets its own connection.  If a thread checks out a connection while it already holds
+        one, it gets the same connection back, so functions that use the pool can call each other. """
+
+    def __init__(self, maxConnections=4):
+        """ Create a Connection Pool that will open no more than maxConnections connections """
+        # Remember the maximum number of connections
+        self.maxConnections = maxConnections
+        # A Condition object protects the pool's data and lets threads wait for a connection to be checked in
+        self.condition = threading.Condition()
+        # Connections that are open but not checked out
+        self.idle = []
+        # Connections that are checked out, keyed by thread identifier.  Each entry holds the
+        # connection and the number of times the thread has checked it out.
+        self.checkedOut = {}
+        # The number of connections this pool has open
+        self.connectionCount = 0
+
+    def current(self):
+        """ Return the connection the current thread has checked out, or None """
+        # Look up this thread's connection.  (Dictionary lookups are atomic, so no lock is needed.)
+        entry = self.checkedOut.get(threading.current_thread().ident, None)
+        if entry == None:
+            return None
+        else:
+            return entry[0]
+
+    def checkout(self, timeout=None):
+        """ Check out a connection for the current thread, waiting up to timeout seconds (or forever, if
+            timeout is None) for one to become available.  Raises TransanaExceptions.GeneralError if no
+            connection can be obtained. """
+        # Identify the current thread
+        threadID = threading.current_thread().ident
+        self.condition.acquire()
+        try:
+            # If this thread already has a connection checked out ...
+            if self.checkedOut.has_key(threadID):
+                # ... note that it's been checked out again and return it
+                self.checkedOut[threadID][1] += 1
+                return self.checkedOut[threadID][0]
+            # If the pool has been closed, no connection will ever become available
+            if self.maxConnections == 0:
+                raise TransanaExceptions.GeneralError(_('The database connection has been closed.'))
+            # Wait until there's an idle connection or room to open a new one
+            while (len(self.idle) == 0) and (self.connectionCount >= self.maxConnections):
+                # Note when we started waiting
+                waitStart = time.time()
+                self.condition.wait(timeout)
+                # If the pool was closed while we waited, give up, as nothing will wake us again
+                if self.maxConnections == 0:
+                    raise TransanaExceptions.GeneralError(_('The database connection has been closed.'))
+                # If we've waited as long as we're allowed to ...
+                if timeout != None:
+                    timeout -= time.time() - waitStart
+                    if (timeout <= 0) and (len(self.idle) == 0) and (self.connectionCount >= self.maxConnections):
+                        # ... give up
+                        raise TransanaExceptions.GeneralError(_('No database connection became available.'))
+            # If there's an idle connection, use it
+            if len(self.idle) > 0:
+                db = self.idle.pop()
+            # Otherwise, open a new one
+            else:
+                db = open_pooled_connection()
+                if db == None:
+                    raise TransanaExceptions.GeneralError(_('There is no database connection.'))
+                self.connectionCount += 1
+            # Record that this thread has the connection checked out
+            self.checkedOut[threadID] = [db, 1]
+            return db
+        finally:
+            self.condition.release()
+
+    def checkin(self, db):
+        """ Return a connection checked out by the current thread to the pool """
+        # Identify the current thread
+        threadID = threading.current_thread().ident
+        self.condition.acquire()
+        try:
+            # Make sure this thread has this connection checked out
+            if (not self.checkedOut.has_key(threadID)) or (self.checkedOut[threadID][0] is not db):
+                raise TransanaExceptions.ProgrammingError('ConnectionPool.checkin():  Connection not checked out by this thread.')
+            # Count down the checkouts
+            self.checkedOut[threadID][1] -= 1
+            # If that was the thread's last checkout ...
+            if self.checkedOut[threadID][1] == 0:
+                # ... it no longer holds the connection
+                del(self.checkedOut[threadID])
+                # If the pool is still open ...
+                if self.maxConnections > 0:
+                    # ... keep the connection for the next thread that needs one
+                    self.idle.append(db)
+                    # Let a waiting thread know a connection is available
+                    self.condition.notify()
+                # If the pool has been closed ...
+                else:
+                    # ... close the connection
+                    db.close()
+                    self.connectionCount -= 1
+        finally:
+            self.condition.release()
+
+    def close(self):
+        """ Close all idle connections.  Connections still checked out are closed when they are checked in. """
+        self.condition.acquire()
+        try:
+            # Don't allow any more connections to be opened or kept
+            self.maxConnections = 0
+            # Close all the idle connections
+            for db in self.idle:
+                db.close()
+                self.connectionCount -= 1
+            self.idle = []
+            # Wake up any waiting threads so they can fail rather than wait forever
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+def get_connection_pool():
+    """ Return the Connection Pool for the current database, creating it if necessary """
+    global _connectionPool
+    # If we don't have a Connection Pool yet ...
+    if _connectionPool == None:
+        # ... create one
+        _connectionPool = ConnectionPool(TransanaConstants.dbConnectionPoolSize)
+    return _connectionPool
+
+@contextlib.contextmanager
+def pooled_db(timeout=None):
+    """ Context Manager that checks out a database connection from the Connection Pool for the current thread,
+        and returns it to the pool when done.  While the connection is checked out, get_db() and all the
+        functions in this module that use it use the pooled connection on this thread.  Use it like this:
+
+            with DBInterface.pooled_db() as db:
+                episodes = DBInterface.list_of_episodes()  """
+    # Get the Connection Pool
+    pool = get_connection_pool()
+    # Check out a connection
+    db = pool.checkout(timeout)
+    try:
+        yield db
+    finally:
+        # Return the connection to the pool, even if an exception was raised
+        pool.checkin(db)
+
 
 def get_username():
     """Get the name of the current database user."""
     return TransanaGlobal.userName
 
 
+class QueryCache(object):
+    """ A size-limited cache of list_of_* query results.  Tree refreshes, filter dialogs, the Keywords tab and
+        property forms call the same list functions over and over, which is slow with a remote MySQL server.
+
+        Each cached result records the database tables it was read from.  When a table is changed, all the
+        results read from it are discarded.  DataObject does this when records are saved or deleted, and
+        ChatWindow does it when another user reports a change through the Message Server.  Results are
+        discarded in least-recently-used order when the cache is full. """
+
+    def __init__(self, maxEntries=500):
+        """ Create a Query Cache that holds up to maxEntries results """
+        # Remember the maximum number of results
+        self.maxEntries = maxEntries
+        # Cached results, keyed by (function name, arguments).  Each value is (tables, result).
+        # An OrderedDict keeps the entries in least-recently-used order.
+        self.entries = collections.OrderedDict()
+        # Background threads may use the list functions too, so protect the cache with a Lock
+        self.lock = threading.Lock()
+        # Initialize the statistics counters
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key, copy=True):
+        """ Return the cached result for key, or None if there isn't one.  List results are copied unless copy is False. """
+        self.lock.acquire()
+        try:
+            # If the result is in the cache ...
+            if self.entries.has_key(key):
+                # ... move it to the most-recently-used end of the cache ...
+                (tables, result) = self.entries.pop(key)
+                self.entries[key] = (tables, result)
+                self.hits += 1
+                # ... and return a copy, so the caller can't change the cached result
+                if copy:
+                    return result[:]
+                else:
+                    return result
+            else:
+                self.misses += 1
+                return None
+        finally:
+            self.lock.release()
+
+    def put(self, key, tables, result, copy=True):
+        """ Cache the result for key, which was read from the listed tables.  List results are copied unless copy is False. """
+        self.lock.acquire()
+        try:
+            # Store a copy, so the caller can't change the cached result
+            if copy:
+                result = result[:]
+            self.entries[key] = (tables, result)
+            # If the cache is over its size limit, discard the least-recently-used results
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+        finally:
+            self.lock.release()
+
+    def invalidate(self, table=None):
+        """ Discard all cached results read from the named table, or all cached results if table is None """
+        self.lock.acquire()
+        try:
+            # If no table is named ...
+            if table == None:
+                # ... discard everything
+                self.invalidations += len(self.entries)
+                self.entries.clear()
+            else:
+                # Discard every result that depends on the table
+                for key in [key for (key, (tables, result)) in self.entries.items() if table in tables]:
+                    del(self.entries[key])
+                    self.invalidations += 1
+        finally:
+            self.lock.release()
+
+    def statistics(self):
+        """ Return a dictionary of cache statistics """
+        return {'entries' : len(self.entries), 'maxEntries' : self.maxEntries, 'hits' : self.hits,
+                'misses' : self.misses, 'invalidations' : self.invalidations}
+
+# The cache for list_of_* query results
+_queryCache = QueryCache()
+
+def CachedQuery(*tables):
+    """ Decorator for list functions whose results depend only on their arguments and the contents of
+        the named database tables.  Results are kept in the Query Cache until one of those tables changes. """
+    def decorator(function):
+        def cachedFunction(*args):
+            # The cache key is the function name plus its arguments
+            key = (function.__name__, ) + args
+            # See if the result is cached
+            result = _queryCache.get(key)
+            # If not ...
+            if result == None:
+                # ... run the query ...
+                result = function(*args)
+                # ... and cache the result
+                _queryCache.put(key, tables, result)
+            return result
+        # Preserve the function's name and documentation
+        cachedFunction.__name__ = function.__name__
+        cachedFunction.__doc__ = function.__doc__
+        return cachedFunction
+    return decorator
+
+def InvalidateQueryCache(table=None):
+    """ Discard cached list results read from the named database table, or all cached results if table is None.
+        Call this whenever a table is changed other than by saving or deleting a Data Object. """
+    _queryCache.invalidate(table)
+    # If the keyword tables may have changed in ways we weren't told about, the Keyword Index must be re-loaded
+    if table in [None, 'ClipKeywords2', 'SnapshotKeywords2']:
+        InvalidateKeywordIndex()
+
+def QueryCacheStatistics():
+    """ Return a dictionary of Query Cache statistics:  entries, maxEntries, hits, misses, and invalidations """
+    return _queryCache.statistics()
+
+
+@CachedQuery('Series2')
 def list_of_series():
     """Get a list of all Library record names."""
     l = []
     query = "SELECT SeriesNum, SeriesID FROM Series2 ORDER BY SeriesID"
     DBCursor = get_db().cursor()
     DBCursor.execute(query)
-    for row in fetchall_named(DBCursor):
-        id = row['SeriesID']
-        if 'unicode' in wx.PlatformInfo:
-            id = ProcessDBDataForUTF8Encoding(id)
+    rows = fetchall_named(DBCursor)
+    # Decode all the Library IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['SeriesID'] for row in rows])
+    for (row, id) in zip(rows, ids):
         l.append((row['SeriesNum'], id))
     DBCursor.close()
     return l
 
+@CachedQuery('Episodes2')
 def list_of_episodes():
     """ Get a list of all Episode records. """
     # Create an empty list to hold results
@@ -2330,14 +3119,12 @@ def list_of_episodes():
     DBCursor = get_db().cursor()
     # Execute the Query
     DBCursor.execute(query)
+    # Get the Results set
+    rows = fetchall_named(DBCursor)
+    # Decode all the Episode IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['EpisodeID'] for row in rows])
     # Iterate through the Results set
-    for row in fetchall_named(DBCursor):
-        # Get the Episode ID
-        id = row['EpisodeID']
-        # If we're using Unicode ...
-        if 'unicode' in wx.PlatformInfo:
-            # ... we need to handle the Unicode decoding
-            id = ProcessDBDataForUTF8Encoding(id)
+    for (row, id) in zip(rows, ids):
         # Add the results to the list
         l.append((row['EpisodeNum'], id, row['SeriesNum']))
     # Close the Database Cursor
@@ -2345,6 +3132,7 @@ def list_of_episodes():
     # Return the list as the function result
     return l
 
+@CachedQuery('Episodes2', 'Series2')
 def list_of_episodes_for_series(LibraryName):
     """Get a list of all Episodes contained within a named Library."""
     if 'unicode' in wx.PlatformInfo:
@@ -2361,10 +3149,10 @@ def list_of_episodes_for_series(LibraryName):
     DBCursor = get_db().cursor()
     DBCursor.execute(query, (LibraryName, ))
     # Records returned contain EpisodeNum, EpisodeID, and parent Library Num
-    for row in fetchall_named(DBCursor):
-        id = row['EpisodeID']
-        if 'unicode' in wx.PlatformInfo:
-            id = ProcessDBDataForUTF8Encoding(id)
+    rows = fetchall_named(DBCursor)
+    # Decode all the Episode IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['EpisodeID'] for row in rows])
+    for (row, id) in zip(rows, ids):
         l.append((row['EpisodeNum'], id, row['SeriesNum']))
     DBCursor.close()
     return l
@@ -2379,14 +3167,12 @@ def list_of_episode_transcripts():
     DBCursor = get_db().cursor()
     # Execute the Query
     DBCursor.execute(query)
+    # Get the Results Set
+    rows = fetchall_named(DBCursor)
+    # Decode all the Transcript IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['TranscriptID'] for row in rows])
     # Iterate through the Results Set
-    for row in fetchall_named(DBCursor):
-        # Get the Transcript ID
-        id = row['TranscriptID']
-        # If we're using Unicode ...
-        if 'unicode' in wx.PlatformInfo:
-            # ... then we need to decode the Transcript ID
-            id = ProcessDBDataForUTF8Encoding(id)
+    for (row, id) in zip(rows, ids):
         # Add the results to the list
         l.append((row['TranscriptNum'], id, row['EpisodeNum']))
     # Close the Database Cursor
@@ -2414,10 +3200,10 @@ def list_transcripts(LibraryName, EpisodeName):
     query = FixQuery(query)
     DBCursor = get_db().cursor()
     DBCursor.execute(query, (EpisodeName, LibraryName, 0))
-    for row in fetchall_named(DBCursor):
-        id = row['TranscriptID']
-        if 'unicode' in wx.PlatformInfo:
-            id = ProcessDBDataForUTF8Encoding(id)
+    rows = fetchall_named(DBCursor)
+    # Decode all the Transcript IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['TranscriptID'] for row in rows])
+    for (row, id) in zip(rows, ids):
         l.append((row['TranscriptNum'], id, row['EpisodeNum']))
     DBCursor.close()
     return l
@@ -2433,11 +3219,12 @@ def list_clip_transcripts(clipNum):
     query = FixQuery(query)
     DBCursor = get_db().cursor()
     DBCursor.execute(query, (clipNum, ))
-    for row in fetchall_named(DBCursor):
-        l.append((row['TranscriptNum'], row['SourceTranscriptNum'], row['SortOrder']))
+    # The rows are already (TranscriptNum, SourceTranscriptNum, SortOrder) tuples, so they don't need to be copied
+    l.extend(fetchall_named(DBCursor))
     DBCursor.close()
     return l
 
+@CachedQuery('Documents2')
 def list_of_documents(libraryNum = None):
     """ Get a list of all Document records, or only those for the specified Library. """
     # Create an empty list to hold results
@@ -2451,14 +3238,12 @@ def list_of_documents(libraryNum = None):
     DBCursor = get_db().cursor()
     # Execute the Query
     DBCursor.execute(query)
+    # Get the Results set
+    rows = fetchall_named(DBCursor)
+    # Decode all the Document IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['DocumentID'] for row in rows])
     # Iterate through the Results set
-    for row in fetchall_named(DBCursor):
-        # Get the Episode ID
-        id = row['DocumentID']
-        # If we're using Unicode ...
-        if 'unicode' in wx.PlatformInfo:
-            # ... we need to handle the Unicode decoding
-            id = ProcessDBDataForUTF8Encoding(id)
+    for (row, id) in zip(rows, ids):
         # Add the results to the list
         l.append((row['DocumentNum'], id, row['LibraryNum']))
     # Close the Database Cursor
@@ -2497,6 +3282,7 @@ def dictionary_of_documents_and_episodes(library=None):
     # Return the Dictionary.
     return d
 
+@CachedQuery('Collections2')
 def list_of_collections(ParentNum=0):
     """Get a list of all collections for under the given parent record.  By
     default, the root parent (0) record is used."""
@@ -2524,14 +3310,15 @@ def list_of_collections(ParentNum=0):
         DBCursor.execute(query, (0, ))
 
     # This method returns Collection Number, Collection ID, and Parent Colletion Number
-    for row in fetchall_named(DBCursor):
-        id = row['CollectID']
-        if 'unicode' in wx.PlatformInfo:
-            id = ProcessDBDataForUTF8Encoding(id)
+    rows = fetchall_named(DBCursor)
+    # Decode all the Collection IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['CollectID'] for row in rows])
+    for (row, id) in zip(rows, ids):
         l.append((row['CollectNum'], id, row['ParentCollectNum']))
     DBCursor.close()
     return l
 
+@CachedQuery('Collections2')
 def list_of_all_collections():
     """Get a list of all collections."""
     # Create an empty list
@@ -2544,14 +3331,11 @@ def list_of_all_collections():
     # Execute the Query
     DBCursor.execute(query)
     # The results set returns Collection Number, Collection ID, and Parent Collection Number.
+    rows = fetchall_named(DBCursor)
+    # Decode all the Collection IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['CollectID'] for row in rows])
     # Iterate through the Results Set
-    for row in fetchall_named(DBCursor):
-        # Get the Collection ID
-        id = row['CollectID']
-        # If we're using Unicode ...
-        if 'unicode' in wx.PlatformInfo:
-            # ... we need to decode the Collection ID
-            id = ProcessDBDataForUTF8Encoding(id)
+    for (row, id) in zip(rows, ids):
         # Add the results to the list
         l.append((row['CollectNum'], id, row['ParentCollectNum']))
     # Close the Database Cursor
@@ -2608,14 +3392,12 @@ def list_of_quotes():
     DBCursor = get_db().cursor()
     # Execute the Query
     DBCursor.execute(query)
+    # Get the Results
+    rows = fetchall_named(DBCursor)
+    # Decode all the Quote IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['QuoteID'] for row in rows])
     # Iterate through the Results
-    for row in fetchall_named(DBCursor):
-        # Get the Quote ID
-        id = row['QuoteID']
-        # If we're using Unicode ...
-        if 'unicode' in wx.PlatformInfo:
-            # ... we need to decode the ClipID
-            id = ProcessDBDataForUTF8Encoding(id)
+    for (row, id) in zip(rows, ids):
         # Add the results to the list
         l.append((row['QuoteNum'], id, row['CollectNum'], row['SourceDocumentNum'], row['SortOrder']))
     # Close the Database Cursor
@@ -2684,10 +3466,10 @@ def list_of_quotes_by_collectionnum(collectionNum, includeSortOrder=False):
     query = FixQuery(query)
     cursor = get_db().cursor()
     cursor.execute(query, (collectionNum, ))
-    for (quoteNum, quoteID, collectNum, sortOrder, sourceDocNum) in cursor.fetchall():
-        id = quoteID
-        if 'unicode' in wx.PlatformInfo:
-            id = ProcessDBDataForUTF8Encoding(id)
+    rows = cursor.fetchall()
+    # Decode all the Quote IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row[1] for row in rows])
+    for ((quoteNum, quoteID, collectNum, sortOrder, sourceDocNum), id) in zip(rows, ids):
         if includeSortOrder:
             quoteList.append((quoteNum, id, collectNum, sortOrder, sourceDocNum))
         else:
@@ -2706,14 +3488,12 @@ def list_of_clips():
     DBCursor = get_db().cursor()
     # Execute the Query
     DBCursor.execute(query)
+    # Get the Results
+    rows = fetchall_named(DBCursor)
+    # Decode all the Clip IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['ClipID'] for row in rows])
     # Iterate through the Results
-    for row in fetchall_named(DBCursor):
-        # Get the Clip ID
-        id = row['ClipID']
-        # If we're using Unicode ...
-        if 'unicode' in wx.PlatformInfo:
-            # ... we need to decode the ClipID
-            id = ProcessDBDataForUTF8Encoding(id)
+    for (row, id) in zip(rows, ids):
         # Add the results to the list
         l.append((row['ClipNum'], id, row['CollectNum'], row['EpisodeNum'], row['SortOrder']))
     # Close the Database Cursor
@@ -2746,10 +3526,10 @@ def list_of_clips_by_collection(CollectionID, ParentNum):
     DBCursor.execute(query, values)
     # This method will return the Clip's Record Number, its ID, and
     # the Record Number for the Parent Collection for each record
-    for row in fetchall_named(DBCursor):
-        id = row['ClipID']
-        if 'unicode' in wx.PlatformInfo:
-            id = ProcessDBDataForUTF8Encoding(id)
+    rows = fetchall_named(DBCursor)
+    # Decode all the Clip IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['ClipID'] for row in rows])
+    for (row, id) in zip(rows, ids):
         l.append((row['ClipNum'], id, row['CollectNum']))
     DBCursor.close()
     return l
@@ -2764,10 +3544,10 @@ def list_of_clips_by_collectionnum(collectionNum, includeSortOrder=False):
     query = FixQuery(query)
     cursor = get_db().cursor()
     cursor.execute(query, (collectionNum, ))
-    for (clipNum, clipID, collectNum, sortOrder) in cursor.fetchall():
-        id = clipID
-        if 'unicode' in wx.PlatformInfo:
-            id = ProcessDBDataForUTF8Encoding(id)
+    rows = cursor.fetchall()
+    # Decode all the Clip IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row[1] for row in rows])
+    for ((clipNum, clipID, collectNum, sortOrder), id) in zip(rows, ids):
         if includeSortOrder:
             clipList.append((clipNum, id, collectNum, sortOrder))
         else:
@@ -2775,9 +3555,25 @@ def list_of_clips_by_collectionnum(collectionNum, includeSortOrder=False):
     cursor.close()
     return clipList
 
-def list_of_clips_by_episode(EpisodeNum, TimeCode=None):
+def list_of_clips_by_episode(EpisodeNum, TimeCode=None, StopTimeCode=None):
     """Get a list of all Clips that have been created from a given Episode
-    Number.  Optionally restrict list to contain only a given timecode."""
+    Number.  Optionally restrict list to contain only a given timecode, or,
+    if StopTimeCode is also given, only clips that overlap the time range."""
+    # Get the Interval Tree for the Episode's Clips
+    tree = GetEpisodeIntervalTree('Clip', EpisodeNum)
+    # If no time code is given, we want all the Clips
+    if TimeCode == None:
+        clips = tree.items()
+    # Otherwise, we want the Clips that overlap the time code or time range
+    else:
+        clips = tree.overlapping(TimeCode, StopTimeCode)
+    # Return copies of the Clip dictionaries, so the caller can't change the ones in the tree
+    return [clip.copy() for clip in clips]
+
+def query_clips_by_episode(EpisodeNum, TimeCode=None):
+    """Query the database for all Clips that have been created from a given Episode
+    Number.  Optionally restrict list to contain only a given timecode.
+    list_of_clips_by_episode() is usually faster."""
     l = []
     if TimeCode == None:
         query = """
@@ -2933,14 +3729,12 @@ def list_of_snapshots():
     DBCursor = get_db().cursor()
     # Execute the Query
     DBCursor.execute(query)
+    # Get the Results
+    rows = fetchall_named(DBCursor)
+    # Decode all the Snapshot IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['SnapshotID'] for row in rows])
     # Iterate through the Results
-    for row in fetchall_named(DBCursor):
-        # Get the Snapshot ID
-        id = row['SnapshotID']
-        # If we're using Unicode ...
-        if 'unicode' in wx.PlatformInfo:
-            # ... we need to decode the ClipID
-            id = ProcessDBDataForUTF8Encoding(id)
+    for (row, id) in zip(rows, ids):
         # Add the results to the list
         l.append((row['SnapshotNum'], id, row['CollectNum'], row['SortOrder']))
     # Close the Database Cursor
@@ -2948,9 +3742,25 @@ def list_of_snapshots():
     # Return the list as the funtion results
     return l
 
-def list_of_snapshots_by_episode(EpisodeNum, TimeCode=None):
+def list_of_snapshots_by_episode(EpisodeNum, TimeCode=None, StopTimeCode=None):
     """Get a list of all Snapshots that have been attached to a given Episode
-    Number.  Optionally restrict list to contain only a given timecode."""
+    Number.  Optionally restrict list to contain only a given timecode, or,
+    if StopTimeCode is also given, only snapshots that overlap the time range."""
+    # Get the Interval Tree for the Episode's Snapshots
+    tree = GetEpisodeIntervalTree('Snapshot', EpisodeNum)
+    # If no time code is given, we want all the Snapshots
+    if TimeCode == None:
+        snapshots = tree.items()
+    # Otherwise, we want the Snapshots that overlap the time code or time range
+    else:
+        snapshots = tree.overlapping(TimeCode, StopTimeCode)
+    # Return copies of the Snapshot dictionaries, so the caller can't change the ones in the tree
+    return [snapshot.copy() for snapshot in snapshots]
+
+def query_snapshots_by_episode(EpisodeNum, TimeCode=None):
+    """Query the database for all Snapshots that have been attached to a given Episode
+    Number.  Optionally restrict list to contain only a given timecode.
+    list_of_snapshots_by_episode() is usually faster."""
     l = []
     if TimeCode == None:
         query = """
@@ -2996,6 +3806,35 @@ def list_of_snapshots_by_episode(EpisodeNum, TimeCode=None):
     DBCursor.close()
     return l
 
+def GetEpisodeIntervalTree(objType, EpisodeNum):
+    """ Return an Interval Tree of the Clips (objType 'Clip') or Snapshots (objType 'Snapshot') for an Episode.
+        The tree is built with a single query the first time it's needed, and kept in the Query Cache until a
+        Clip, Snapshot, or Collection is saved or deleted.  This lets the Data Items tab follow the media position
+        through a heavily coded Episode without querying the database each time the position changes. """
+    # The Interval Tree is cached like a query result
+    key = ('GetEpisodeIntervalTree', objType, EpisodeNum)
+    # See if we already have the tree.  (Interval Trees can't be changed, so there's no need to copy them.)
+    tree = _queryCache.get(key, copy=False)
+    # If not ...
+    if tree == None:
+        # If we want Clips ...
+        if objType == 'Clip':
+            # ... get all of the Episode's Clips and build the tree from their start and stop times
+            tree = IntervalTree.IntervalTree([(clip['ClipStart'], clip['ClipStop'], clip) for clip in query_clips_by_episode(EpisodeNum)])
+            # The tree depends on the Clips and Collections tables
+            tables = ('Clips2', 'Collections2')
+        # If we want Snapshots ...
+        elif objType == 'Snapshot':
+            # ... get all of the Episode's Snapshots and build the tree from their start and stop times
+            tree = IntervalTree.IntervalTree([(snapshot['SnapshotStart'], snapshot['SnapshotStop'], snapshot) for snapshot in query_snapshots_by_episode(EpisodeNum)])
+            # The tree depends on the Snapshots and Collections tables
+            tables = ('Snapshots2', 'Collections2')
+        else:
+            raise TransanaExceptions.ProgrammingError('DBInterface.GetEpisodeIntervalTree():  Unknown object type %s' % objType)
+        # Cache the tree
+        _queryCache.put(key, tables, tree, copy=False)
+    return tree
+
 def list_of_snapshots_by_transcriptnum(transcriptNum):
     snapshotList = []
     query = """ SELECT SnapshotNum, SnapshotID, CollectNum
@@ -3005,10 +3844,10 @@ def list_of_snapshots_by_transcriptnum(transcriptNum):
     query = FixQuery(query)
     cursor = get_db().cursor()
     cursor.execute(query, (transcriptNum, ))
-    for (snapshotNum, snapshotID, collectNum) in cursor.fetchall():
-        id = snapshotID
-        if 'unicode' in wx.PlatformInfo:
-            id = ProcessDBDataForUTF8Encoding(id)
+    rows = cursor.fetchall()
+    # Decode all the Snapshot IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row[1] for row in rows])
+    for ((snapshotNum, snapshotID, collectNum), id) in zip(rows, ids):
         snapshotList.append((snapshotNum, id, collectNum))
     cursor.close()
     return snapshotList
@@ -3023,10 +3862,10 @@ def list_of_snapshots_by_collectionnum(collectionNum, includeSortOrder=False):
     query = FixQuery(query)
     cursor = get_db().cursor()
     cursor.execute(query, (collectionNum, ))
-    for (snapshotNum, snapshotID, collectNum, sortOrder) in cursor.fetchall():
-        id = snapshotID
-        if 'unicode' in wx.PlatformInfo:
-            id = ProcessDBDataForUTF8Encoding(id)
+    rows = cursor.fetchall()
+    # Decode all the Snapshot IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row[1] for row in rows])
+    for ((snapshotNum, snapshotID, collectNum, sortOrder), id) in zip(rows, ids):
         if includeSortOrder:
             snapshotList.append((snapshotNum, id, collectNum, sortOrder))
         else:
@@ -3490,18 +4329,15 @@ def list_of_notes(** kwargs):
     # Execute our query
     DBCursor.execute(query, values)
     # Get the results set
-    r = DBCursor.fetchall()
+    rows = fetchall_named(DBCursor)
+    # Decode all the Note IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['NoteID'] for row in rows])
     # Iterate through the records in the query results
-    for tup in r:
-        # Identify the Note ID
-        id = tup[1]
-        # Convert for Unicode, if needed
-        if 'unicode' in wx.PlatformInfo:
-            id = ProcessDBDataForUTF8Encoding(id)
+    for (row, id) in zip(rows, ids):
         # If we want both the Note Number and Note ID ...
         if kwargs.has_key("includeNumber"):
             # ... add both elements to the Note List in a tuple
-            notelist.append((tup[0], id))
+            notelist.append((row['NoteNum'], id))
         # Otherwise ...
         else:
             # ... just add the Note ID to the Note List
@@ -3543,17 +4379,13 @@ def list_of_node_notes(** kwargs):
     # Execute the Query
     DBCursor.execute(query)
     # Get the results set
-    r = DBCursor.fetchall()
+    rows = fetchall_named(DBCursor)
+    # Decode all the Note IDs at once
+    ids = ProcessDBDataColumnForUTF8Encoding([row['NoteID'] for row in rows])
     # Iterate through the Results Set
-    for tup in r:
-        # Get the Note ID
-        id = tup[1]
-        # If we're working with Unicode ...
-        if 'unicode' in wx.PlatformInfo:
-            # ... we need to decode the Note ID
-            id = ProcessDBDataForUTF8Encoding(id)
-        # Add the results to the list
-        notelist.append((tup[0], id) + tup[2:])
+    for (row, id) in zip(rows, ids):
+        # Add the results to the list.  The object numbers follow the Note Number and Note ID.
+        notelist.append((row['NoteNum'], id) + tuple(row[2:]))
     # Close the Database Cursor
     DBCursor.close()
     # Return the list as the function results
@@ -3596,6 +4428,8 @@ def list_of_all_notes(reportType=None, searchText=None):
         query += " WHERE SnapshotNum <> 0"
     # If searchText is passed in, we want to limit the results to notes containing that text.
     # We need to add that to our Query
+    # NOTE:  This is a substring search, which finds text inside words and across word boundaries, so it can't
+    #        use the Text Index, which only matches whole words and word prefixes.
     if searchText != None:
         if (reportType != None):
             query += " AND "
@@ -3611,48 +4445,45 @@ def list_of_all_notes(reportType=None, searchText=None):
     DBCursor = db.cursor()
     # Execute the query
     DBCursor.execute(query)
-    # Get the Results Set
-    results = DBCursor.fetchall()
     # For each row in the results set ...
-    for row in results:
+    for row in fetchall_named(DBCursor):
         # Pull out the elements that need to be encoded
-        ID = row[1]
-        noteTaker = row[10]
+        ID = row['NoteID']
+        noteTaker = row['NoteTaker']
         # Encode the elements, if needed
         if 'unicode' in wx.PlatformInfo:
             ID = ProcessDBDataForUTF8Encoding(ID)
             noteTaker = ProcessDBDataForUTF8Encoding(noteTaker)
         # Create a Dictionary Object to be added to the Notes List
-        notelist.append({'NoteNum' : row[0],
+        notelist.append({'NoteNum' : row['NoteNum'],
                          'NoteID' : ID,
-                         'SeriesNum' : row[2],
-                         'EpisodeNum' : row[3],
-                         'TranscriptNum' : row[4],
-                         'CollectNum' : row[5],
-                         'ClipNum' : row[6],
-                         'SnapshotNum' : row[7],
-                         'DocumentNum' : row[8],
-                         'QuoteNum' : row[9],
+                         'SeriesNum' : row['SeriesNum'],
+                         'EpisodeNum' : row['EpisodeNum'],
+                         'TranscriptNum' : row['TranscriptNum'],
+                         'CollectNum' : row['CollectNum'],
+                         'ClipNum' : row['ClipNum'],
+                         'SnapshotNum' : row['SnapshotNum'],
+                         'DocumentNum' : row['DocumentNum'],
+                         'QuoteNum' : row['QuoteNum'],
                          'NoteTaker' : noteTaker})
     # Close the Database Cursor
     DBCursor.close()
     # Return the Note List as the Function Result
     return notelist
 
+@CachedQuery('Keywords2')
 def list_of_keyword_groups():
     """Get a list of all keyword groups."""
     l = []
     query = "SELECT KeywordGroup FROM Keywords2 GROUP BY KeywordGroup"
     DBCursor = get_db().cursor()
     DBCursor.execute(query)
-    for row in fetchall_named(DBCursor):
-        id = row['KeywordGroup']
-        if 'unicode' in wx.PlatformInfo:
-            id = ProcessDBDataForUTF8Encoding(id)
-        l.append(id)
+    # Decode all the Keyword Groups at once
+    l = ProcessDBDataColumnForUTF8Encoding([row['KeywordGroup'] for row in fetchall_named(DBCursor)])
     DBCursor.close()
     return l
 
+@CachedQuery('Keywords2')
 def list_of_keywords_by_group(KeywordGroup):
     """Get a list of all keywords for the named Keyword group."""
     if 'unicode' in wx.PlatformInfo:
@@ -3663,14 +4494,12 @@ def list_of_keywords_by_group(KeywordGroup):
     query = FixQuery(query)
     DBCursor = get_db().cursor()
     DBCursor.execute(query, (KeywordGroup, ))
-    for row in fetchall_named(DBCursor):
-        id = row['Keyword']
-        if 'unicode' in wx.PlatformInfo:
-            id = ProcessDBDataForUTF8Encoding(id)
-        l.append(id)
+    # Decode all the Keywords at once
+    l = ProcessDBDataColumnForUTF8Encoding([row['Keyword'] for row in fetchall_named(DBCursor)])
     DBCursor.close()
     return l
 
+@CachedQuery('Keywords2')
 def list_of_all_keywords():
     """Get a list of all keywords in the Transana database."""
     # Create an empty list
@@ -3681,19 +4510,13 @@ def list_of_all_keywords():
     DBCursor = get_db().cursor()
     # Execute the Query
     DBCursor.execute(query)
-    # Iterate through the results
-    for row in fetchall_named(DBCursor):
-        # Get the Keyword Group
-        kwg = row['KeywordGroup']
-        # Get the Keyword
-        kw = row['Keyword']
-        # If we're using Unicode ...
-        if 'unicode' in wx.PlatformInfo:
-            # ... we need to decode the Keyword Group and Keyword
-            kwg = ProcessDBDataForUTF8Encoding(kwg)
-            kw = ProcessDBDataForUTF8Encoding(kw)
-        # Add the results to the list
-        l.append((kwg, kw))
+    # Get the results
+    rows = fetchall_named(DBCursor)
+    # Decode all the Keyword Groups and Keywords, a column at a time
+    kwgs = ProcessDBDataColumnForUTF8Encoding([row['KeywordGroup'] for row in rows])
+    kws = ProcessDBDataColumnForUTF8Encoding([row['Keyword'] for row in rows])
+    # Add the results to the list
+    l = zip(kwgs, kws)
     # Close the database cursor
     DBCursor.close()
     # return the list as the function results
@@ -3727,17 +4550,16 @@ def list_of_keywords(** kwargs):
         DBCursor.execute(query, (kwargs.values()[0], ))
     else:
         DBCursor.execute(query)
-    r = DBCursor.fetchall()
     kwlist = []
     # Current ClipKeywords table row format used:
     # EpNum, DocNum, ClipNum, QuoteNum, SnapshotNum, KWGroup, Keyword, Example
-    for tup in r:
+    for row in fetchall_named(DBCursor):
         if 'unicode' in wx.PlatformInfo:
-            kwlist.append((ProcessDBDataForUTF8Encoding(tup[5]), \
-                           ProcessDBDataForUTF8Encoding(tup[6]), \
-                           ProcessDBDataForUTF8Encoding(tup[7])))
+            kwlist.append((ProcessDBDataForUTF8Encoding(row['KeywordGroup']), \
+                           ProcessDBDataForUTF8Encoding(row['Keyword']), \
+                           ProcessDBDataForUTF8Encoding(row['Example'])))
         else:
-            kwlist.append((tup[5], tup[6], tup[7]))
+            kwlist.append((row['KeywordGroup'], row['Keyword'], row['Example']))
     DBCursor.close()
     return kwlist
 
@@ -3770,16 +4592,10 @@ def list_of_snapshot_detail_keywords(** kwargs):
         DBCursor.execute(query, tuple(kwargs.values()))
     else:
         DBCursor.execute(query)
-    r = DBCursor.fetchall()
-    kwlist = []
-    # Current SnapshotKeywords table row format used:
-    # SnapshotNum, KWGroup, Keyword, etc
-    for tup in r:
-        if 'unicode' in wx.PlatformInfo:
-            kwlist.append((ProcessDBDataForUTF8Encoding(tup[1]), \
-                           ProcessDBDataForUTF8Encoding(tup[2])))
-        else:
-            kwlist.append((tup[1], tup[2]))
+    rows = fetchall_named(DBCursor)
+    # Decode all the Keyword Groups and Keywords at once
+    kwlist = zip(ProcessDBDataColumnForUTF8Encoding([row['KeywordGroup'] for row in rows]),
+                 ProcessDBDataColumnForUTF8Encoding([row['Keyword'] for row in rows]))
     DBCursor.close()
     return kwlist
 
@@ -3789,17 +4605,13 @@ def list_of_keyword_examples():
     query = "SELECT EpisodeNum, ClipNum, SnapshotNum, KeywordGroup, Keyword, Example FROM ClipKeywords2 WHERE Example = 1"
     dbCursor = get_db().cursor()
     dbCursor.execute(query)
-    results = dbCursor.fetchall()
+    rows = fetchall_named(dbCursor)
     keywordExampleList = []
-    # Current ClipKeywords table row format used:
-    # EpNum, ClipNum, KWGroup, Keyword, Example
-    for dbRowData in results:
-        kwg = dbRowData[3]
-        kw = dbRowData[4]
-        if 'unicode' in wx.PlatformInfo:
-            kwg = ProcessDBDataForUTF8Encoding(kwg)
-            kw = ProcessDBDataForUTF8Encoding(kw)
-        keywordExampleList.append((dbRowData[0], dbRowData[1], dbRowData[2], kwg, kw, dbRowData[5]))
+    # Decode all the Keyword Groups and Keywords at once
+    kwgs = ProcessDBDataColumnForUTF8Encoding([row['KeywordGroup'] for row in rows])
+    kws = ProcessDBDataColumnForUTF8Encoding([row['Keyword'] for row in rows])
+    for (row, kwg, kw) in zip(rows, kwgs, kws):
+        keywordExampleList.append((row['EpisodeNum'], row['ClipNum'], row['SnapshotNum'], kwg, kw, row['Example']))
     dbCursor.close()
     return keywordExampleList
 
@@ -3880,9 +4692,15 @@ def VideoFilePaths(filePath, update=False):
     #
     # David Woods
     # 1/27/2004
+    #
+    # The tables now have a MediaPathKey column holding the file name in the normalized form used below, with
+    # an index, so the queries only read the records whose key starts with the filePath (plus any records that
+    # don't have a key yet).  We still compare each file name here, as we always have.
     # If the filePath is empty, just return.  This happens when the user deletes the Video Path.
     if filePath == '':
         return (0, 0)
+    # Replace the backslash with the more universal slash character in the filePath
+    filePath = string.replace(filePath, '\\', '/')
 
     # Get a Database Cursor
     dbCursor = get_db().cursor()
@@ -3898,10 +4716,14 @@ def VideoFilePaths(filePath, update=False):
 
     # Initialize the Episode Counter        
     episodeCount = 0
+    # Get the condition that uses the MediaPathKey index to find the records that might start with the filePath
+    (whereClause, values) = MediaPathPrefixCondition('Episodes2', filePath)
     # Create the Query for the Episode Table
-    query = "SELECT EpisodeNum, MediaFile FROM Episodes2 "
+    query = "SELECT EpisodeNum, MediaFile FROM Episodes2 " + whereClause
+    # Adjust the query for sqlite if needed
+    query = FixQuery(query)
     # Execute the Query
-    dbCursor.execute(query)
+    dbCursor.execute(query, values)
     # Fetch all the Database Results, and process them row by row
     for (episodeNum, mediafile) in dbCursor.fetchall():
         # If we're using Unicode ...
@@ -3912,9 +4734,8 @@ def VideoFilePaths(filePath, update=False):
         # (Python requires a double backslash in a string to represent a single backslash, so this replaces double
         # backslashes ('\\') with single ones ('\') even though it looks like it replaces quadruples with doubles.)
         mediafile = string.replace(mediafile, '\\\\', '\\')
-        # Now replace the backslash with the more universal slash character in both the file name and the filePath
+        # Now replace the backslash with the more universal slash character in the file name
         mediafile = string.replace(mediafile, '\\', '/')
-        filePath = string.replace(filePath, '\\', '/')
         # Compare the Video Root filePath passed in with the front portion of the File Name from the Database.
         if filePath == mediafile[:len(filePath)]:
             # If they are the same, increment the Episode Counter
@@ -3947,10 +4768,14 @@ def VideoFilePaths(filePath, update=False):
     if transactionStatus:
         # Initialize the Clip Counter
         clipCount = 0
-        # Create the Query for the Episode Table
-        query = "SELECT ClipNum, MediaFile FROM Clips2 "
+        # Get the condition that uses the MediaPathKey index to find the records that might start with the filePath
+        (whereClause, values) = MediaPathPrefixCondition('Clips2', filePath)
+        # Create the Query for the Clip Table
+        query = "SELECT ClipNum, MediaFile FROM Clips2 " + whereClause
+        # Adjust the query for sqlite if needed
+        query = FixQuery(query)
         # Execute the Query
-        dbCursor.execute(query)
+        dbCursor.execute(query, values)
         # Fetch all the Database Results, and process them row by row
         for (clipNum, mediafile) in dbCursor.fetchall():
             # If we're using Unicode ...
@@ -3961,9 +4786,8 @@ def VideoFilePaths(filePath, update=False):
             # (Python requires a double backslash in a string to represent a single backslash, so this replaces double
             # backslashes ('\\') with single ones ('\') even though it looks like it replaces quadruples with doubles.)
             mediafile = string.replace(mediafile, '\\\\', '\\')
-            # Now replace the backslash with the more universal slash character in both the file name and the filePath
+            # Now replace the backslash with the more universal slash character in the file name
             mediafile = string.replace(mediafile, '\\', '/')
-            filePath = string.replace(filePath, '\\', '/')
             # Compare the Video Root filePath passed in with the front portion of the File Name from the Database.
             if filePath == mediafile[:len(filePath)]:
                 # If they are the same, increment the Clip Counter
@@ -3995,10 +4819,14 @@ def VideoFilePaths(filePath, update=False):
                         break
 
     if transactionStatus:
-        # Create the Query for the Episode Table
-        query = "SELECT EpisodeNum, ClipNum, MediaFile FROM AdditionalVids2 "
+        # Get the condition that uses the MediaPathKey index to find the records that might start with the filePath
+        (whereClause, values) = MediaPathPrefixCondition('AdditionalVids2', filePath)
+        # Create the Query for the Additional Media Files Table
+        query = "SELECT EpisodeNum, ClipNum, MediaFile FROM AdditionalVids2 " + whereClause
+        # Adjust the query for sqlite if needed
+        query = FixQuery(query)
         # Execute the Query
-        dbCursor.execute(query)
+        dbCursor.execute(query, values)
         # Fetch all the Database Results, and process them row by row
         for (episodeNum, clipNum, mediafile) in dbCursor.fetchall():
             # If we're using Unicode ...
@@ -4009,9 +4837,8 @@ def VideoFilePaths(filePath, update=False):
             # (Python requires a double backslash in a string to represent a single backslash, so this replaces double
             # backslashes ('\\') with single ones ('\') even though it looks like it replaces quadruples with doubles.)
             mediafile = string.replace(mediafile, '\\\\', '\\')
-            # Now replace the backslash with the more universal slash character in both the file name and the filePath
+            # Now replace the backslash with the more universal slash character in the file name
             mediafile = string.replace(mediafile, '\\', '/')
-            filePath = string.replace(filePath, '\\', '/')
             # Compare the Video Root filePath passed in with the front portion of the File Name from the Database.
             if filePath == mediafile[:len(filePath)]:
                 # If they are the same, increment the appropriate Counter
@@ -4140,20 +4967,80 @@ def fetch_named(cursor, row_result=None):
 
     return dict
 
+class DBRow(tuple):
+    """ A compact, read-only database result row.  Values can be read by position, like the tuples
+        returned by cursor.fetchall(), or by field name, like the dictionaries fetch_named() returns.
+        The field name map is shared by all rows with the same columns (see GetRowClass()), so each
+        row costs no more memory than the tuple the database module already created. """
+    # Don't give each row its own instance dictionary
+    __slots__ = ()
+    # Map of field names to column positions.  Each row class created by GetRowClass() defines its own.
+    _columns = {}
+
+    def __getitem__(self, key):
+        """ Get a value by column position (or slice) or by field name """
+        # If we're passed a field name ...
+        if isinstance(key, basestring):
+            # ... translate it to the column position
+            key = self._columns[key]
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        """ Get a value by field name, returning default if the field isn't in the row """
+        if key in self._columns:
+            return tuple.__getitem__(self, self._columns[key])
+        else:
+            return default
+
+    def has_key(self, key):
+        """ Does this row include the named field? """
+        return key in self._columns
+
+    def keys(self):
+        """ Return the field names, in column order """
+        # Sort the field names by column position
+        names = [(pos, name) for (name, pos) in self._columns.items()]
+        names.sort()
+        return [name for (pos, name) in names]
+
+    def __reduce__(self):
+        """ Pickle (and copy) a row as a plain tuple, as the row classes created by GetRowClass() can't be pickled """
+        return (tuple, (tuple(self), ))
+
+# Row classes for each set of column names we've seen, so repeated queries share them
+_rowClasses = {}
+
+def GetRowClass(description):
+    """ Return the DBRow class for a cursor description, creating it the first time a set of column
+        names is seen. """
+    # The field name is the first element of each column's description
+    names = tuple([column[0] for column in description])
+    # See if we already have a row class for these columns
+    rowClass = _rowClasses.get(names, None)
+    # If not ...
+    if rowClass == None:
+        # ... build the field name map.  If a name is repeated, the LAST column wins, just as it
+        # did when rows were built as dictionaries.
+        columns = {}
+        for pos in range(len(names)):
+            columns[names[pos]] = pos
+        # ... create a DBRow subclass that uses this field name map ...
+        rowClass = type('DBRow', (DBRow, ), {'__slots__' : (), '_columns' : columns})
+        # ... and remember it for next time.
+        _rowClasses[names] = rowClass
+    return rowClass
+
 def fetchall_named(cursor):
-    """Fetch all row results from the cursor object, and return it as a 
-    sequence of dictionaries including the database field names."""
+    """Fetch all row results from the cursor object, and return them as a
+    sequence of DBRow objects, which allow values to be read by database
+    field name as well as by position.  Works with both the MySQLdb and
+    sqlite3 database modules."""
     d = cursor.description
     rows = cursor.fetchall()
     if not d:
         return ()
-    l = []
-    for row in rows:
-        dict = {}
-        for c, r in map(None, d, row):
-            dict[c[0]] = r
-        l.append(dict)
-    return l
+    # Get the shared row class for this query's columns and wrap each row in it
+    return map(GetRowClass(d), rows)
 
 def list_all_keyword_examples_for_all_clips_in_a_collection(collectionNum):
     """ Lists all Keyword Examples for all Clips in the specified Collection and all
@@ -4203,6 +5090,465 @@ def list_all_keyword_examples_for_a_clip(clipnum):
     # Return the list of Keyword Examples as the function result
     return kwExamples
 
+# The Keyword Index answers keyword searches from memory.  It is loaded from the database the first time it is needed.
+_keywordIndex = KeywordIndex.KeywordIndex()
+# Background threads may search too, so protect the Keyword Index with a Lock
+_keywordIndexLock = threading.Lock()
+# The last results of each saved Search, so they can be brought up to date rather than re-evaluated from scratch.
+# Keyed by (search name, object type), each entry holds the search terms, the Keyword Index generation when the
+# results were found, and the set of object numbers found.
+_savedSearchResults = {}
+
+# The queries that get the Search Results data for the object numbers found in the Keyword Index, with the
+# object number field and the table alias used for the Collection selections (None for objects that aren't in
+# Collections).  The columns match the queries built by ProcessSearch.BuildQueries().
+KEYWORD_SEARCH_QUERIES = {'Document'       : ("""SELECT Doc.LibraryNum, SeriesID, Doc.DocumentNum, DocumentID
+                                                  FROM Series2 Se, Documents2 Doc
+                                                  WHERE (Doc.LibraryNum = Se.SeriesNum) %s
+                                                  ORDER BY SeriesID, DocumentID""", 'Doc.DocumentNum', None),
+                          'Episode'        : ("""SELECT Ep.SeriesNum, SeriesID, Ep.EpisodeNum, EpisodeID
+                                                  FROM Series2 Se, Episodes2 Ep
+                                                  WHERE (Ep.SeriesNum = Se.SeriesNum) %s
+                                                  ORDER BY SeriesID, EpisodeID""", 'Ep.EpisodeNum', None),
+                          'Quote'          : ("""SELECT Q.CollectNum, ParentCollectNum, Q.QuoteNum, CollectID, QuoteID, SortOrder
+                                                  FROM Collections2 Co, Quotes2 Q
+                                                  WHERE (Q.CollectNum = Co.CollectNum) %s
+                                                  ORDER BY CollectID, SortOrder""", 'Q.QuoteNum', 'Q'),
+                          'Clip'           : ("""SELECT Cl.CollectNum, ParentCollectNum, Cl.ClipNum, CollectID, ClipID, SortOrder
+                                                  FROM Collections2 Co, Clips2 Cl
+                                                  WHERE (Cl.CollectNum = Co.CollectNum) %s
+                                                  ORDER BY CollectID, SortOrder""", 'Cl.ClipNum', 'Cl'),
+                          'Snapshot'       : ("""SELECT Sn.CollectNum, ParentCollectNum, Sn.SnapshotNum, CollectID, SnapshotID, SortOrder
+                                                  FROM Collections2 Co, Snapshots2 Sn
+                                                  WHERE (Sn.CollectNum = Co.CollectNum) %s
+                                                  ORDER BY CollectID, SortOrder""", 'Sn.SnapshotNum', 'Sn')}
+# Snapshot Coding results look just like Whole Snapshot results
+KEYWORD_SEARCH_QUERIES['SnapshotCoding'] = KEYWORD_SEARCH_QUERIES['Snapshot']
+
+def InvalidateKeywordIndex(objType=None, objNum=None):
+    """ Note that keywords have been added or removed.  If objType ('Episode', 'Document', 'Clip', 'Quote', or
+        'Snapshot') and objNum are given, only that object's keywords are re-read before the next search.
+        Otherwise, the whole Keyword Index is re-loaded. """
+    _keywordIndexLock.acquire()
+    try:
+        # If no object (or an unknown type of object) is specified ...
+        if not objType in KEYWORD_OBJECT_FIELDS.keys():
+            # ... discard the whole index, and the saved Search results, which can no longer be brought up to date
+            _keywordIndex.clear()
+            _savedSearchResults.clear()
+        # If the index hasn't been loaded, there's nothing to update
+        elif _keywordIndex.loaded:
+            # Mark the object's keywords as out of date
+            _keywordIndex.markStale(objType, objNum)
+            # Snapshots have Coding keywords too, which are indexed separately
+            if objType == 'Snapshot':
+                _keywordIndex.markStale('SnapshotCoding', objNum)
+    finally:
+        _keywordIndexLock.release()
+
+def LoadKeywordIndex(dbCursor):
+    """ Load the Keyword Index from the Clip Keywords and Snapshot Keywords tables """
+    # Start with an empty list of (objectType, objectNumber, keywordGroup, keyword) rows
+    rows = []
+    # Get all the Clip Keywords records
+    dbCursor.execute("SELECT EpisodeNum, DocumentNum, ClipNum, QuoteNum, SnapshotNum, KeywordGroup, Keyword FROM ClipKeywords2")
+    data = dbCursor.fetchall()
+    # Decode all the Keyword Groups and Keywords at once
+    kwgs = ProcessDBDataColumnForUTF8Encoding([row[5] for row in data])
+    kws = ProcessDBDataColumnForUTF8Encoding([row[6] for row in data])
+    # For each record ...
+    for (row, kwg, kw) in zip(data, kwgs, kws):
+        # ... add it to the index for each object type it has a number for.  (The SQL search includes
+        # a record for an object type whenever its number field is greater than zero.)
+        for (objType, objNum) in zip(['Episode', 'Document', 'Clip', 'Quote', 'Snapshot'], row[:5]):
+            if objNum > 0:
+                rows.append((objType, objNum, kwg, kw))
+    # Get all the visible Snapshot Coding records
+    dbCursor.execute("SELECT SnapshotNum, KeywordGroup, Keyword FROM SnapshotKeywords2 WHERE Visible = 1")
+    data = dbCursor.fetchall()
+    # Decode all the Keyword Groups and Keywords at once
+    kwgs = ProcessDBDataColumnForUTF8Encoding([row[1] for row in data])
+    kws = ProcessDBDataColumnForUTF8Encoding([row[2] for row in data])
+    # Add each record to the index
+    for (row, kwg, kw) in zip(data, kwgs, kws):
+        if row[0] > 0:
+            rows.append(('SnapshotCoding', row[0], kwg, kw))
+    # Load the index
+    _keywordIndex.load(rows)
+
+def RefreshKeywordIndex(dbCursor):
+    """ Re-read the keywords of objects whose keywords have changed since the Keyword Index was loaded.  The
+        keywords are re-read rather than changed as they are saved so that changes that are rolled back
+        don't end up in the index. """
+    # For each object type that has objects with changed keywords ...
+    for (objType, objNums) in _keywordIndex.staleObjects().items():
+        # Get the list of object numbers
+        objNums = list(objNums)
+        # Start with an empty list of (objectNumber, keywordGroup, keyword) rows
+        data = []
+        # Ask for the objects' keywords a batch at a time
+        for start in range(0, len(objNums), IN_LIST_SIZE):
+            # Get the next batch of object numbers
+            batch = objNums[start:start + IN_LIST_SIZE]
+            # Snapshot Coding keywords come from the Snapshot Keywords table ...
+            if objType == 'SnapshotCoding':
+                query = "SELECT SnapshotNum, KeywordGroup, Keyword FROM SnapshotKeywords2 WHERE Visible = 1 AND SnapshotNum IN (%s)" % \
+                        ', '.join(['%s'] * len(batch))
+            # ... and all others from the Clip Keywords table
+            else:
+                field = KEYWORD_OBJECT_FIELDS[objType]
+                query = "SELECT %s, KeywordGroup, Keyword FROM ClipKeywords2 WHERE %s IN (%s)" % (field, field, ', '.join(['%s'] * len(batch)))
+            # Adjust the query for sqlite if needed
+            query = FixQuery(query)
+            # Execute the query
+            dbCursor.execute(query, tuple(batch))
+            data += dbCursor.fetchall()
+        # Decode all the Keyword Groups and Keywords at once
+        kwgs = ProcessDBDataColumnForUTF8Encoding([row[1] for row in data])
+        kws = ProcessDBDataColumnForUTF8Encoding([row[2] for row in data])
+        # Replace the objects' keywords in the index
+        _keywordIndex.refresh(objType, objNums, [(row[0], kwg, kw) for (row, kwg, kw) in zip(data, kwgs, kws)])
+
+def SearchResultRows(dbCursor, objType, objNums, collectionList=[]):
+    """ Get the Search Results data for objects of type objType ('Document', 'Episode', 'Quote', 'Clip', 'Snapshot', or
+        'SnapshotCoding') whose numbers are in objNums, limited to the Collections in collectionList, if any.  Returns
+        the same rows the SQL queries built by ProcessSearch.BuildQueries() return. """
+    # If there are no objects, there are no rows
+    if len(objNums) == 0:
+        return []
+    # We need a list of object numbers
+    objNums = list(objNums)
+    # Get the query for the object type
+    (query, numField, alias) = KEYWORD_SEARCH_QUERIES[objType]
+    # Add the Collections selected in the Search Dialog, for objects that are in Collections
+    conditions = ''
+    if (len(collectionList) > 0) and (alias != None):
+        conditions += 'AND (%s) ' % ' OR '.join(['(%s.CollectNum = %d)' % (alias, coll[0]) for coll in collectionList])
+    # If there aren't too many results, get just the records we need.  Otherwise, get them all and skip the
+    # ones we don't need, which is still much faster than grouping the Clip Keywords table.
+    if len(objNums) <= IN_LIST_SIZE:
+        conditions += 'AND (%s IN (%s)) ' % (numField, ', '.join(['%s'] * len(objNums)))
+        params = tuple(objNums)
+    else:
+        params = ()
+    # Adjust the query for sqlite if needed
+    query = FixQuery(query % conditions)
+    # Execute the query
+    dbCursor.execute(query, params)
+    rows = fetchall_named(dbCursor)
+    # If we got all the records, keep only the ones we need
+    if len(objNums) > IN_LIST_SIZE:
+        objNums = set(objNums)
+        rows = [row for row in rows if row[numField.split('.')[1]] in objNums]
+    return rows
+
+def KeywordIndexSearch(objType, searchTerms, collectionList=[], savedSearch=None):
+    """ Search for objects of type objType ('Document', 'Episode', 'Quote', 'Clip', 'Snapshot', or 'SnapshotCoding')
+        using the Keyword Index.  searchTerms are the lines of the search, as structured by the Search Dialog, and
+        collectionList is the list of Collections selected in the Search Dialog, if any.  Returns the same rows
+        the SQL queries built by ProcessSearch.BuildQueries() return, or None if the search should use SQL.
+
+        If savedSearch is the name of a saved Search, its results are kept, and the next time the same search is
+        run, only the objects whose keywords have changed since are re-evaluated. """
+    # Break the search terms into tokens for the Keyword Index
+    tokens = KeywordIndex.ParseSearchTerms(searchTerms)
+    # Get a Database Cursor
+    dbCursor = get_db().cursor()
+    try:
+        _keywordIndexLock.acquire()
+        try:
+            # If the Keyword Index hasn't been loaded, load it
+            if not _keywordIndex.loaded:
+                LoadKeywordIndex(dbCursor)
+            # Re-read the keywords of any objects that have changed
+            RefreshKeywordIndex(dbCursor)
+            # The index matches keywords exactly.  If a keyword in the search isn't in the index, either it
+            # isn't used, or MySQL would match it differently, perhaps ignoring case.  Let SQL decide.
+            for (kwg, kw) in KeywordIndex.SearchKeywords(tokens):
+                if not _keywordIndex.hasKeyword(kwg, kw):
+                    return None
+            # If this is a saved Search, see if we have its last results
+            if savedSearch != None:
+                savedResults = _savedSearchResults.get((savedSearch, objType), None)
+            else:
+                savedResults = None
+            # If we have the results of the same search, find the objects whose keywords have changed since
+            if (savedResults != None) and (savedResults[0] == tuple(searchTerms)):
+                changed = _keywordIndex.changedSince(objType, savedResults[1])
+            else:
+                changed = None
+            # If we know which objects have changed ...
+            if changed != None:
+                # ... the results are the earlier results, with just the changed objects re-evaluated
+                objNums = (savedResults[2] - changed) | _keywordIndex.search(objType, tokens, changed)
+            # Otherwise ...
+            else:
+                # ... find the numbers of the objects that match the search
+                objNums = _keywordIndex.search(objType, tokens)
+            # If this is a saved Search, keep its results.  (The Collection selections are applied below,
+            # so they don't affect these results.)
+            if savedSearch != None:
+                _savedSearchResults[(savedSearch, objType)] = (tuple(searchTerms), _keywordIndex.generation, objNums)
+            objNums = list(objNums)
+        finally:
+            _keywordIndexLock.release()
+        # Get the Search Results data for the objects found
+        return SearchResultRows(dbCursor, objType, objNums, collectionList)
+    except:
+        # If anything goes wrong, report it and let the search use SQL
+        print "DBInterface.KeywordIndexSearch():"
+        print sys.exc_info()[0], sys.exc_info()[1]
+        return None
+    finally:
+        # Close the Database Cursor
+        dbCursor.close()
+
+# The objects whose text is in the Text Index, with each object type's table, record number field, and text field
+TEXT_INDEX_SOURCES = (('Transcript', 'Transcripts2', 'TranscriptNum', 'RTFText'),
+                      ('Document', 'Documents2', 'DocumentNum', 'XMLText'),
+                      ('Quote', 'Quotes2', 'QuoteNum', 'XMLText'),
+                      ('Note', 'Notes2', 'NoteNum', 'NoteText'))
+# The number of Text Index records added by each INSERT query.  (Older versions of sqlite allow only 999 parameters.)
+TEXT_INDEX_INSERT_SIZE = 200
+# The number of objects whose text is read at once while the Text Index is built.  (Transcripts can be very large.)
+TEXT_INDEX_READ_SIZE = 20
+
+def UpdateTextIndex(objType, objNum, text, dbCursor=None):
+    """ Replace the Text Index entries for a Transcript, Document, Quote, or Note (objType) with the words in its
+        text.  The object db_save() methods call this after saving the text, using their own database cursor so the
+        Text Index is part of any save transaction.  The Text Index only affects Text Searches, so a problem here
+        is reported but does not prevent the save. """
+    # If no cursor is passed in ...
+    if dbCursor == None:
+        # ... get a Database Cursor
+        cursor = get_db().cursor()
+    else:
+        cursor = dbCursor
+    try:
+        # Remove the object's old entries
+        DeleteTextIndexEntries(objType, objNum, cursor)
+        # Add the new ones
+        InsertTextIndexEntries(objType, objNum, text, cursor)
+    except:
+        # Report the problem.  The Text Index may be missing for a database that hasn't been upgraded yet.
+        print "DBInterface.UpdateTextIndex():  Exception indexing %s %s" % (objType, objNum)
+        print sys.exc_info()[0], sys.exc_info()[1]
+    # If we created the Database Cursor ...
+    if dbCursor == None:
+        # ... close it
+        cursor.close()
+
+def RemoveFromTextIndex(table, objNum, dbCursor):
+    """ Remove the Text Index entries for a record that is being deleted from table.  DataObject._db_do_delete()
+        calls this for every object, so tables that aren't in the Text Index are ignored. """
+    # For each table in the Text Index ...
+    for (objType, sourceTable, numField, textField) in TEXT_INDEX_SOURCES:
+        # ... if it's the table the record is being deleted from ...
+        if sourceTable == table:
+            try:
+                # ... remove the record's entries
+                DeleteTextIndexEntries(objType, objNum, dbCursor)
+            except:
+                # Report the problem.  Text Search results are always checked against the object tables.
+                print "DBInterface.RemoveFromTextIndex():  Exception removing %s %s" % (objType, objNum)
+                print sys.exc_info()[0], sys.exc_info()[1]
+
+def DeleteTextIndexEntries(objType, objNum, dbCursor):
+    """ Delete all the Text Index entries for an object """
+    # Define the query
+    query = "DELETE FROM TextIndex2 WHERE ObjectType = %s AND ObjectNum = %s"
+    # Adjust the query for sqlite if needed
+    query = FixQuery(query)
+    # Execute the query
+    dbCursor.execute(query, (objType, objNum))
+
+def InsertTextIndexEntries(objType, objNum, text, dbCursor):
+    """ Add the Text Index entries for an object that has none.  The empty Token entry shows that the object has
+        been indexed, even if its text holds no words. """
+    # Start with the empty Token entry
+    rows = [(objType, objNum, '', '')]
+    # Add an entry for each word in the text, with the word's positions
+    for (token, positions) in TextIndex.TokenPositions(text, TransanaGlobal.encoding).items():
+        # MySQL's utf8 character set can't hold characters outside the Basic Multilingual Plane, so skip
+        # words that have them
+        if (TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server', 'PyMySQL']) and (max(token) > u'\uffff'):
+            continue
+        rows.append((objType, objNum, token.encode(TransanaGlobal.encoding), TextIndex.EncodePositions(positions)))
+    # Add the entries a batch at a time
+    for start in range(0, len(rows), TEXT_INDEX_INSERT_SIZE):
+        # Get the next batch of entries
+        batch = rows[start:start + TEXT_INDEX_INSERT_SIZE]
+        # Build a single query that inserts the whole batch
+        query = "INSERT INTO TextIndex2 (ObjectType, ObjectNum, Token, Positions) VALUES %s" % \
+                ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+        # Adjust the query for sqlite if needed
+        query = FixQuery(query)
+        # Execute the query
+        dbCursor.execute(query, tuple([value for row in batch for value in row]))
+
+def IndexMissingText(dbCursor=None):
+    """ Add every Transcript, Document, Quote, and Note that isn't in the Text Index yet to the Text Index.  This
+        builds the Text Index for existing databases, and adds the records brought in by a Transana XML Import. """
+    # If no cursor is passed in ...
+    if dbCursor == None:
+        # ... get a Database Cursor
+        cursor = get_db().cursor()
+    else:
+        cursor = dbCursor
+    try:
+        # For each table in the Text Index ...
+        for (objType, table, numField, textField) in TEXT_INDEX_SOURCES:
+            # ... find the records that have not been indexed
+            query = """SELECT %s FROM %s
+                         WHERE %s NOT IN (SELECT ObjectNum FROM TextIndex2 WHERE ObjectType = %%s AND Token = %%s)""" % \
+                    (numField, table, numField)
+            # Adjust the query for sqlite if needed
+            query = FixQuery(query)
+            # Execute the query
+            cursor.execute(query, (objType, ''))
+            objNums = [row[0] for row in cursor.fetchall()]
+            # Read and index the text a few records at a time
+            for start in range(0, len(objNums), TEXT_INDEX_READ_SIZE):
+                # Get the next batch of record numbers
+                batch = objNums[start:start + TEXT_INDEX_READ_SIZE]
+                # Get the text for the batch
+                query = "SELECT %s, %s FROM %s WHERE %s IN (%s)" % (numField, textField, table, numField, ', '.join(['%s'] * len(batch)))
+                # Adjust the query for sqlite if needed
+                query = FixQuery(query)
+                # Execute the query
+                cursor.execute(query, tuple(batch))
+                data = cursor.fetchall()
+                # Index the batch in a single transaction
+                cursor.execute("BEGIN")
+                try:
+                    for (objNum, text) in data:
+                        # Check for "array" data and convert if needed
+                        if type(text).__name__ == 'array':
+                            text = text.tostring()
+                        # Remove any partial entries left by an earlier problem, and index the text
+                        DeleteTextIndexEntries(objType, objNum, cursor)
+                        InsertTextIndexEntries(objType, objNum, text, cursor)
+                    # Commit the transaction
+                    cursor.execute("COMMIT")
+                except:
+                    # If anything went wrong, don't leave part of the batch done
+                    cursor.execute("ROLLBACK")
+                    # Let the calling routine report the problem
+                    raise
+    finally:
+        # If we created the Database Cursor ...
+        if dbCursor == None:
+            # ... close it
+            cursor.close()
+
+def TextIndexAvailable(dbCursor):
+    """ Indicate whether the Text Index has been built for the current database """
+    # The Text Index is complete once Index Version 3 has been applied
+    return GetSecondaryIndexVersion(dbCursor) >= 3
+
+def TextIndexPostings(dbCursor, token, prefix, includePositions, candidates=None):
+    """ Get the (objectType, objectNumber) pairs whose text includes token, or, if prefix is True, any word that starts
+        with token.  Returns a dictionary of word position sets (if includePositions is True) keyed by the pairs.  If
+        candidates is a set of pairs, pairs that aren't in it are skipped. """
+    # Get the fields we need
+    fields = 'ObjectType, ObjectNum'
+    if includePositions:
+        fields += ', Positions'
+    # A prefix matches every word from the prefix itself up to, but not including, the word we get by increasing
+    # the last character of the prefix.  Unlike LIKE, this uses the Token index in both MySQL and sqlite.
+    if prefix:
+        query = "SELECT %s FROM TextIndex2 WHERE Token >= %%s AND Token < %%s" % fields
+        params = (token.encode(TransanaGlobal.encoding), (token[:-1] + unichr(ord(token[-1]) + 1)).encode(TransanaGlobal.encoding))
+    # Otherwise, we need the word itself
+    else:
+        query = "SELECT %s FROM TextIndex2 WHERE Token = %%s" % fields
+        params = (token.encode(TransanaGlobal.encoding), )
+    # Adjust the query for sqlite if needed
+    query = FixQuery(query)
+    # Execute the query
+    dbCursor.execute(query, params)
+    # Build the dictionary of word positions
+    postings = {}
+    for row in dbCursor.fetchall():
+        key = (row[0], row[1])
+        # Skip objects that can't match
+        if (candidates != None) and not (key in candidates):
+            continue
+        # A prefix can match several words in the same object, so add to the positions we already have
+        if includePositions:
+            postings.setdefault(key, set()).update(TextIndex.DecodePositions(row[2]))
+        else:
+            postings[key] = set()
+    return postings
+
+def TextIndexSearch(queryText):
+    """ Find the Transcripts, Documents, Quotes, and Notes whose text matches a Text Search, made up of words,
+        "quoted phrases", and prefixes* (see TextIndex.ParseTextQuery()).  Returns a dictionary of sets of object
+        numbers, keyed by object type, which also includes the Episodes and Clips whose Transcripts match.  Returns
+        None if the Text Index can't be used. """
+    # Break the search into terms
+    terms = TextIndex.ParseTextQuery(queryText)
+    # Get a Database Cursor
+    dbCursor = get_db().cursor()
+    try:
+        # If the Text Index hasn't been built, we can't search it
+        if not TextIndexAvailable(dbCursor):
+            return None
+        # Start with no (objectType, objectNumber) matches
+        matches = set()
+        # For each term ...
+        for termNum in range(len(terms)):
+            # ... only objects that match all the earlier terms can match
+            if termNum == 0:
+                candidates = None
+            else:
+                candidates = matches
+            # If the term is a phrase ...
+            if len(terms[termNum]) > 1:
+                # ... find the objects that have all of its words before reading any word positions, so the
+                # positions of common words are only read for objects that might have the phrase.
+                for (token, prefix) in terms[termNum]:
+                    candidates = set(TextIndexPostings(dbCursor, token, prefix, False, candidates).keys())
+            # Get the word positions for the term's words.  (Positions are only needed for phrases.)
+            wordPositions = [TextIndexPostings(dbCursor, token, prefix, len(terms[termNum]) > 1, candidates)
+                             for (token, prefix) in terms[termNum]]
+            # Find the objects that include the term
+            matches = TextIndex.MatchTerm(wordPositions)
+            # If nothing matches, later terms won't change that
+            if len(matches) == 0:
+                break
+        # Sort the matches by object type
+        results = {'Transcript' : set(), 'Document' : set(), 'Quote' : set(), 'Note' : set(), 'Episode' : set(), 'Clip' : set()}
+        for (objType, objNum) in matches:
+            results[objType].add(objNum)
+        # Transcripts belong to Episodes, or, if they are Clip Transcripts, to Clips
+        transcriptNums = list(results['Transcript'])
+        # Look the Transcripts up a batch at a time
+        for start in range(0, len(transcriptNums), IN_LIST_SIZE):
+            # Get the next batch of Transcript numbers
+            batch = transcriptNums[start:start + IN_LIST_SIZE]
+            # Define the query
+            query = "SELECT EpisodeNum, ClipNum FROM Transcripts2 WHERE TranscriptNum IN (%s)" % ', '.join(['%s'] * len(batch))
+            # Adjust the query for sqlite if needed
+            query = FixQuery(query)
+            # Execute the query
+            dbCursor.execute(query, tuple(batch))
+            for (episodeNum, clipNum) in dbCursor.fetchall():
+                # Clip Transcripts have Clip numbers
+                if clipNum > 0:
+                    results['Clip'].add(clipNum)
+                else:
+                    results['Episode'].add(episodeNum)
+        return results
+    except:
+        # If anything goes wrong, report it
+        print "DBInterface.TextIndexSearch():"
+        print sys.exc_info()[0], sys.exc_info()[1]
+        return None
+    finally:
+        # Close the Database Cursor
+        dbCursor.close()
+
 def delete_all_keywords_for_a_group(epnum, docnum, clipnum, quotenum, snapshotnum):
     """ Given an Episode, Document, Clip, Quote, or Snapshot number, delete the appropriate keywordgroup/word pairs. """
     # If we have an Episode Number ...
@@ -4235,6 +5581,9 @@ def delete_all_keywords_for_a_group(epnum, docnum, clipnum, quotenum, snapshotnu
         # ... raise an exception
         raise Exception, _("All keywords would have been deleted!")
 
+    # The object's keywords are changing, so the Keyword Index must re-read them
+    InvalidateKeywordIndex(specifier[:-3], num)
+
     # Create the Delete query 
     query = "DELETE FROM ClipKeywords2 WHERE %s = %%s " % (specifier)
     # Get a database cursor
@@ -4267,6 +5616,10 @@ def insert_clip_keyword(ep_num, doc_num, clip_num, quote_num, snapshot_num, kw_g
         n = DBCursor.rowcount
     # If the keyword exists, which it almost always will ...    
     if n == 1:
+        # The object's keywords are changing, so the Keyword Index must re-read them
+        for (objType, objNum) in zip(['Episode', 'Document', 'Clip', 'Quote', 'Snapshot'], (ep_num, doc_num, clip_num, quote_num, snapshot_num)):
+            if objNum > 0:
+                InvalidateKeywordIndex(objType, objNum)
         # create a query to insert the Clip Keyword Record
         query = """
         INSERT INTO ClipKeywords2
@@ -4286,6 +5639,247 @@ def insert_clip_keyword(ep_num, doc_num, clip_num, quote_num, snapshot_num, kw_g
         # ... signal failure
         return False
 
+# The Clip Keywords table field that holds the object number for each type of object that can have keywords
+KEYWORD_OBJECT_FIELDS = {'Episode'  : 'EpisodeNum',
+                         'Document' : 'DocumentNum',
+                         'Clip'     : 'ClipNum',
+                         'Quote'    : 'QuoteNum',
+                         'Snapshot' : 'SnapshotNum'}
+
+# The number of values we put in a single SQL "IN" list
+IN_LIST_SIZE = 500
+
+def insert_clip_keywords(keywordList, mode='merge', use_transactions=True):
+    """ Add many Clip Keyword records at once, using a few batched queries instead of several queries per record.
+        keywordList is a list of (objectType, objectNum, keywordGroup, keyword, example) tuples, where objectType
+        is 'Episode', 'Document', 'Clip', 'Quote', or 'Snapshot'.  mode can be:
+            'merge'    Add the keywords the objects don't already have.  (Dropping a keyword on a Collection.)
+            'replace'  Delete all existing keywords for the objects in the list first.
+            'new'      The objects have no keywords yet, as when db_save() has just deleted them.
+        If use_transactions is True, all the changes are made in a single database transaction.  Otherwise, the
+        calling routine is responsible for the transaction.
+        Returns the list of entries that were NOT added because the keyword no longer exists, which can happen
+        when another user edits or deletes a keyword while it is being applied. """
+    # Build a list of unique entries, converting the keywords to unicode so they match what we get from the database
+    entries = []
+    # Keep track of the entries we've seen to remove duplicates
+    entriesSeen = set()
+    # Keep track of the keywords used
+    keywords = set()
+    # For each entry in the keyword list ...
+    for (objType, objNum, kwg, kw, example) in keywordList:
+        # ... make sure the keyword group and keyword are unicode ...
+        if isinstance(kwg, str):
+            kwg = unicode(kwg, TransanaGlobal.encoding)
+        if isinstance(kw, str):
+            kw = unicode(kw, TransanaGlobal.encoding)
+        # ... and if we haven't seen this entry before ...
+        if not (objType, objNum, kwg, kw) in entriesSeen:
+            # ... add it to the list of entries
+            entries.append((objType, objNum, kwg, kw, example))
+            entriesSeen.add((objType, objNum, kwg, kw))
+            # Note the keyword
+            keywords.add((kwg, kw))
+    # Get a Database Cursor
+    DBCursor = get_db().cursor()
+
+    # Check the continued existance of the keywords.  It's possible in the multi-user version for
+    # one user to edit a keyword while another user is applying it.  Get all the keywords in the
+    # Keyword Groups we're using.
+    existingKeywords = set()
+    # Get a list of the Keyword Groups being used
+    keywordGroups = list(set([kwg for (kwg, kw) in keywords]))
+    # Ask for the Keyword Groups a batch at a time
+    for start in range(0, len(keywordGroups), IN_LIST_SIZE):
+        # Get the next batch of Keyword Groups
+        batch = keywordGroups[start:start + IN_LIST_SIZE]
+        # Create a query to get the keywords in these Keyword Groups
+        query = "SELECT KeywordGroup, Keyword FROM Keywords2 WHERE KeywordGroup IN (%s)" % ', '.join(['%s'] * len(batch))
+        # Adjust the query for sqlite if needed
+        query = FixQuery(query)
+        # Execute the query, encoding the Keyword Groups for the database
+        DBCursor.execute(query, tuple([kwg.encode(TransanaGlobal.encoding) for kwg in batch]))
+        # Note each keyword that exists
+        for (kwg, kw) in DBCursor.fetchall():
+            existingKeywords.add((ProcessDBDataForUTF8Encoding(kwg), ProcessDBDataForUTF8Encoding(kw)))
+    # Separate the entries for missing keywords, which will be returned, from the ones we can add
+    missingEntries = [entry for entry in entries if not (entry[2], entry[3]) in existingKeywords]
+    entries = [entry for entry in entries if (entry[2], entry[3]) in existingKeywords]
+
+    # Make a list of the object numbers of each object type in the list
+    objects = {}
+    for (objType, objNum, kwg, kw, example) in entries:
+        objects.setdefault(objType, set()).add(objNum)
+        # The object's keywords are changing, so the Keyword Index must re-read them
+        InvalidateKeywordIndex(objType, objNum)
+
+    # If requested, begin a Database Transaction so that everything can be undone if we run into problems
+    if use_transactions:
+        DBCursor.execute('BEGIN')
+    try:
+        # If we're replacing keywords ...
+        if mode == 'replace':
+            # ... delete the existing keywords for all objects of each type
+            for objType in objects.keys():
+                # Create the Delete query
+                query = "DELETE FROM ClipKeywords2 WHERE %s = %%s" % KEYWORD_OBJECT_FIELDS[objType]
+                # Adjust the query for sqlite if needed
+                query = FixQuery(query)
+                # Execute the query for all the objects at once
+                DBCursor.executemany(query, [(objNum, ) for objNum in objects[objType]])
+        # If we're merging keywords ...
+        elif mode == 'merge':
+            # ... we need to know what keywords the objects already have.
+            existingEntries = set()
+            # For each type of object ...
+            for objType in objects.keys():
+                # ... get the Clip Keywords table field for the object type
+                field = KEYWORD_OBJECT_FIELDS[objType]
+                # Get the list of object numbers for this type of object
+                objNums = list(objects[objType])
+                # Ask for the objects' keywords a batch at a time
+                for start in range(0, len(objNums), IN_LIST_SIZE):
+                    # Get the next batch of object numbers
+                    batch = objNums[start:start + IN_LIST_SIZE]
+                    # Create a query to get the keywords for these objects
+                    query = "SELECT %s, KeywordGroup, Keyword FROM ClipKeywords2 WHERE %s IN (%s)" % (field, field, ', '.join(['%s'] * len(batch)))
+                    # Adjust the query for sqlite if needed
+                    query = FixQuery(query)
+                    # Execute the query
+                    DBCursor.execute(query, tuple(batch))
+                    # Note each keyword the objects already have
+                    for (objNum, kwg, kw) in DBCursor.fetchall():
+                        existingEntries.add((objType, objNum, ProcessDBDataForUTF8Encoding(kwg), ProcessDBDataForUTF8Encoding(kw)))
+            # Skip the entries the objects already have
+            entries = [entry for entry in entries if not entry[:4] in existingEntries]
+
+        # Build the data for the insert query
+        data = []
+        for (objType, objNum, kwg, kw, example) in entries:
+            # Start with all object numbers set to zero ...
+            values = {'EpisodeNum' : 0, 'DocumentNum' : 0, 'ClipNum' : 0, 'QuoteNum' : 0, 'SnapshotNum' : 0}
+            # ... and put the object number in the right field
+            values[KEYWORD_OBJECT_FIELDS[objType]] = objNum
+            # Add the values for this record, encoding the keyword for the database
+            data.append((values['EpisodeNum'], values['DocumentNum'], values['ClipNum'], values['QuoteNum'],
+                         values['SnapshotNum'], kwg.encode(TransanaGlobal.encoding), kw.encode(TransanaGlobal.encoding), example))
+        # If there are records to add ...
+        if len(data) > 0:
+            # ... create a query to insert the Clip Keyword Records
+            query = """
+            INSERT INTO ClipKeywords2
+                (EpisodeNum, DocumentNum, ClipNum, QuoteNum, SnapshotNum, KeywordGroup, Keyword, Example)
+                VALUES
+                (%s, %s, %s, %s, %s, %s, %s, %s)
+            """
+            # Adjust the query for sqlite if needed
+            query = FixQuery(query)
+            # Insert all the records at once
+            DBCursor.executemany(query, data)
+        # If we're handling the transaction ...
+        if use_transactions:
+            # ... commit the changes to the Database
+            DBCursor.execute('COMMIT')
+    except:
+        # If we're handling the transaction ...
+        if use_transactions:
+            # ... undo any changes we've made
+            DBCursor.execute('ROLLBACK')
+        # Close the Database Cursor
+        DBCursor.close()
+        # Let the calling routine handle the problem
+        raise
+    # Close the Database Cursor
+    DBCursor.close()
+    # Return the entries that could not be added
+    return missingEntries
+
+# Tables that have a LastSaveTime column, which other users check before saving to see if a record has changed
+LAST_SAVE_TIME_TABLES = ('Documents2', 'Quotes2', 'Snapshots2', 'Transcripts2')
+
+def claim_record_locks(table, numField, numList):
+    """ Lock all of the records from numList in the table that are not already locked, as DataObject.lock_record()
+        would.  Each batch of records is locked by a single UPDATE statement, so no other user can lock a record
+        between our check and our lock.  Returns a tuple of the list of record numbers we now hold locks on and a
+        dictionary of the records locked by other users, giving the name of the user holding each lock.
+        The claimed locks MUST be released with release_record_locks(). """
+    # Start with nothing claimed and nothing locked by others
+    claimed = []
+    locks = {}
+    # Get the Server's Date and Time for the lock times and for finding expired locks
+    serverDateTime = ServerDateTime()
+    # The Lock Time we use for our locks lets us tell our locks from any other lock this user holds
+    lockTime = serverDateTime.strftime('%Y-%m-%d %H:%M:%S')
+    # Locks more than a day old have expired, as in DataObject.lock_record()
+    expiredTime = (serverDateTime - datetime.timedelta(days=2)).strftime('%Y-%m-%d %H:%M:%S')
+    # Get the name of the current user for the locks
+    username = get_username()
+    # Get a Database Cursor
+    DBCursor = get_db().cursor()
+    # Lock the records a batch at a time
+    for start in range(0, len(numList), IN_LIST_SIZE):
+        # Get the next batch of record numbers
+        batch = numList[start:start + IN_LIST_SIZE]
+        # Create a query that locks all of the unlocked records in this batch in one statement
+        query = """UPDATE %s SET RecordLock = %%s, LockTime = %%s
+                     WHERE (%s IN (%s)) AND
+                           ((RecordLock IS NULL) OR (RecordLock = %%s) OR (LockTime IS NULL) OR (LockTime < %%s))""" % \
+                (table, numField, ', '.join(['%s'] * len(batch)))
+        # Adjust the query for sqlite if needed
+        query = FixQuery(query)
+        # Execute the query
+        DBCursor.execute(query, (username, lockTime) + tuple(batch) + ('', expiredTime))
+        # Now find out who holds the lock on each record in the batch
+        query = "SELECT %s, RecordLock, LockTime FROM %s WHERE %s IN (%s)" % \
+                (numField, table, numField, ', '.join(['%s'] * len(batch)))
+        # Adjust the query for sqlite if needed
+        query = FixQuery(query)
+        # Execute the query
+        DBCursor.execute(query, tuple(batch))
+        # For each record in the batch ...
+        for (num, recordLock, recordLockTime) in DBCursor.fetchall():
+            # sqlite returns the Lock Time as a string, which we need to convert to a datetime for the comparison
+            if isinstance(recordLockTime, (str, unicode)):
+                recordLockTime = datetime.datetime.strptime(recordLockTime[:19], '%Y-%m-%d %H:%M:%S')
+            # If the record holds the lock we just set ...
+            if (ProcessDBDataForUTF8Encoding(recordLock) == username) and (recordLockTime != None) and \
+               (recordLockTime.strftime('%Y-%m-%d %H:%M:%S') == lockTime):
+                # ... we have claimed it
+                claimed.append(num)
+            # Otherwise ...
+            else:
+                # ... someone else holds it
+                locks[num] = ProcessDBDataForUTF8Encoding(recordLock)
+    # Close the Database Cursor
+    DBCursor.close()
+    # Return the claimed records and the records locked by others
+    return (claimed, locks)
+
+def release_record_locks(table, numField, numList):
+    """ Release the record locks obtained by claim_record_locks() once the records have been changed, updating
+        the LastSaveTime (where the table has one) so other users know the records have changed. """
+    # Get a Database Cursor
+    DBCursor = get_db().cursor()
+    # Unlock the records a batch at a time
+    for start in range(0, len(numList), IN_LIST_SIZE):
+        # Get the next batch of record numbers
+        batch = numList[start:start + IN_LIST_SIZE]
+        # Create a query to unlock the records in this batch
+        query = "UPDATE %s SET RecordLock = %%s, LockTime = NULL" % table
+        # If the table has a LastSaveTime ...
+        if table in LAST_SAVE_TIME_TABLES:
+            # ... update it too
+            query += ", LastSaveTime = CURRENT_TIMESTAMP"
+        query += " WHERE %s IN (%s)" % (numField, ', '.join(['%s'] * len(batch)))
+        # Adjust the query for sqlite if needed
+        query = FixQuery(query)
+        # Execute the query
+        DBCursor.execute(query, ('', ) + tuple(batch))
+    # Close the Database Cursor
+    DBCursor.close()
+    # The records have changed, so cached list results from the table are out of date
+    InvalidateQueryCache(table)
+
 def add_keyword(group, kw_name):
     """Add a keyword to the database."""
     DBCursor = get_db().cursor()
@@ -4297,6 +5891,8 @@ def add_keyword(group, kw_name):
     query = FixQuery(query)
     DBCursor.execute(query, (group, kw_name))
     DBCursor.close()
+    # Cached keyword lists are now out of date
+    InvalidateQueryCache('Keywords2')
 
 def delete_keyword_group(name):
     """Delete a Keyword Group from the database, including all associated
@@ -4485,6 +6081,10 @@ def delete_keyword_group(name):
         # Adjust the query for sqlite if needed
         query = FixQuery(query)
         DBCursor.execute(query, (kwg, ))
+        # Cached keyword lists are now out of date
+        InvalidateQueryCache('Keywords2')
+        # The keyword is being removed from many objects, so the Keyword Index must be re-loaded
+        InvalidateKeywordIndex()
         # Now delete all instances of this keywordgroup/keyword combo in the
         # ClipKeywords file
         query = """DELETE FROM ClipKeywords2
@@ -4698,6 +6298,10 @@ def delete_keyword(group, kw_name):
         # Adjust the query for sqlite if needed
         query = FixQuery(query)
         DBCursor.execute(query, (kwg, kw))
+        # Cached keyword lists are now out of date
+        InvalidateQueryCache('Keywords2')
+        # The keyword is being removed from many objects, so the Keyword Index must be re-loaded
+        InvalidateKeywordIndex()
         # Now delete all instances of this keywordgroup/keyword combo in the
         # Clipkeywords file
         query = """DELETE FROM ClipKeywords2
@@ -4882,85 +6486,22 @@ def ProcessDBDataForUTF8Encoding(text):
     else:
         # If we're using MySQLdb (either server or embedded) ...
         if TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server']:
-            # Initialize a unicode object to build the function's result
-            result = unicode('', TransanaGlobal.encoding)
-            # Because some Unicode characters are more than one byte wide, but the STC doesn't recognize this,
-            # we will need to skip the processing of the later parts of multi-byte characters.  skipNext allows this.
-            skipNext = 0
-            # process each character in the StyledText.  The GetStyledText() call has returned a string
-            # with the data in two-character chunks, the text char and the styling char.  This for loop
-            # allows up to process these character pairs.
+            # Most values can be decoded in a single pass by the codec machinery.  Only if that fails do we
+            # need the character-by-character processing written for older, inconsistently-encoded data.
             try:
-                for x in range(len(text)):
-                    # If we are looking at the second character of a Unicode character pair, we can skip
-                    # this processing, as it has already been handled.
-                    if skipNext > 0:
-                        # We need to reset the skipNext flag so we won't skip too many characters.
-                        skipNext -= 1
-                    else:
-                        # Check for a Unicode character pair by looking to see if the first character is above 128
-                        if ord(text[x]) > 127:
-                                
-                            # UTF-8 characters are variable length.  We need to figure out the correct number of bytes.
-                            # Note the current position
-                            pos = x
-                            # Initialize the final character variable
-                            c = ''
-
-                            # Begin processing of unicode characters, continue until we have a legal character.
-                            while (pos < len(text)):
-                                # Add the current character to the character variable
-                                c += chr(ord(text[pos]))  # "Un-Unicode" the character ????
-                                # Try to encode the character.
-                                try:
-                                    # See if we have a legal UTF-8 character yet.
-                                    d = unicode(c, TransanaGlobal.encoding)
-                                    # If so, break out of the while loop
-                                    break
-                                # If we don't have a legal UTF-8 character, we'll get a UnicodeDecodeError exception
-                                except UnicodeDecodeError:
-                                    # We need to signal the need to skip a charater in overall processing
-                                    skipNext += 1
-                                    # We need to update the current position and keep processing until we have a legal UTF-8 character
-                                    pos += 1
-
-                            result += unicode(c, TransanaGlobal.encoding)
-                        else:
-                            c = text[x]
-                            result += c
-
-            except TypeError:
-                result = text
-            except UnicodeDecodeError:
-                # If we are reading Unicode text from Transana 2.05 or earlier, the line above that reads:
-                # result += unicode(c, TransanaGlobal.encoding)
-                # throws a UnicodeDecodeError when it can't interpret Latin-1 encoded characters using UTF-8.
-                # When that happens, we need to use Latin-1 encoding instead of UTF-8.
-
-                # The text doesn't need to be encoded in this circumstance.
-                result = text
-                # If we're in Russian, change the encoding to KOI8r
-                if TransanaGlobal.configData.language == 'ru':
-                    TransanaGlobal.encoding = 'koi8_r'
-                # If we're in Chinese, change the encoding to the appropriate Chinese encoding
-                elif TransanaGlobal.configData.language == 'zh':
-                    TransanaGlobal.encoding = TransanaConstants.chineseEncoding
-                # If we're in Eastern European Encoding, change the encoding to 'iso8859_2'
-                elif TransanaGlobal.configData.language == 'easteurope':
-                    TransanaGlobal.encoding = 'iso8859_2'
-                # If we're in Greek, change the encoding to 'iso8859_7'
-                elif TransanaGlobal.configData.language == 'el':
-                    TransanaGlobal.encoding = 'iso8859_7'
-                # If we're in Japanese, change the encoding to cp932
-                elif TransanaGlobal.configData.language == 'ja':
-                    TransanaGlobal.encoding = 'cp932'
-                # If we're in Korean, change the encoding to cp949
-                elif TransanaGlobal.configData.language == 'ko':
-                    TransanaGlobal.encoding = 'cp949'
-                # Otherwise, fall back to UTF8, not Latin-1 as of 2.50
-                else:
-                    TransanaGlobal.encoding = 'utf8'  # 'latin1'
-
+                # If we have a string object ...
+                if isinstance(text, str):
+                    # ... decode the whole thing at once
+                    return text.decode(TransanaGlobal.encoding)
+                # If we have a unicode object ...
+                elif isinstance(text, unicode):
+                    # ... its characters are really the database's encoded bytes.  Recover the bytes (Latin-1 maps
+                    # characters 0 - 255 straight to bytes) and decode the whole thing at once.
+                    return text.encode('latin1').decode(TransanaGlobal.encoding)
+            except (UnicodeEncodeError, UnicodeDecodeError):
+                pass
+            # Fall back to processing one character at a time
+            result = ProcessDBDataForUTF8EncodingByCharacter(text)
         # If we're NOT using MySQLdb ...
         else:
             # if we have a unicode object already ...
@@ -4983,6 +6524,132 @@ def ProcessDBDataForUTF8Encoding(text):
         return result
 
 
+def ProcessDBDataForUTF8EncodingByCharacter(text):
+    """ Process MySQLdb data one character at a time, building up multi-byte characters until they can be
+        decoded.  ProcessDBDataForUTF8Encoding() only uses this when the whole value can't be decoded at once,
+        which happens with mis-encoded data from older versions of Transana. """
+    # Initialize a unicode object to build the function's result
+    result = unicode('', TransanaGlobal.encoding)
+    # Because some Unicode characters are more than one byte wide, but the STC doesn't recognize this,
+    # we will need to skip the processing of the later parts of multi-byte characters.  skipNext allows this.
+    skipNext = 0
+    # process each character in the StyledText.  The GetStyledText() call has returned a string
+    # with the data in two-character chunks, the text char and the styling char.  This for loop
+    # allows up to process these character pairs.
+    try:
+        for x in range(len(text)):
+            # If we are looking at the second character of a Unicode character pair, we can skip
+            # this processing, as it has already been handled.
+            if skipNext > 0:
+                # We need to reset the skipNext flag so we won't skip too many characters.
+                skipNext -= 1
+            else:
+                # Check for a Unicode character pair by looking to see if the first character is above 128
+                if ord(text[x]) > 127:
+                        
+                    # UTF-8 characters are variable length.  We need to figure out the correct number of bytes.
+                    # Note the current position
+                    pos = x
+                    # Initialize the final character variable
+                    c = ''
+
+                    # Begin processing of unicode characters, continue until we have a legal character.
+                    while (pos < len(text)):
+                        # Add the current character to the character variable
+                        c += chr(ord(text[pos]))  # "Un-Unicode" the character ????
+                        # Try to encode the character.
+                        try:
+                            # See if we have a legal UTF-8 character yet.
+                            d = unicode(c, TransanaGlobal.encoding)
+                            # If so, break out of the while loop
+                            break
+                        # If we don't have a legal UTF-8 character, we'll get a UnicodeDecodeError exception
+                        except UnicodeDecodeError:
+                            # We need to signal the need to skip a charater in overall processing
+                            skipNext += 1
+                            # We need to update the current position and keep processing until we have a legal UTF-8 character
+                            pos += 1
+
+                    result += unicode(c, TransanaGlobal.encoding)
+                else:
+                    c = text[x]
+                    result += c
+
+    except TypeError:
+        result = text
+    except UnicodeDecodeError:
+        # If we are reading Unicode text from Transana 2.05 or earlier, the line above that reads:
+        # result += unicode(c, TransanaGlobal.encoding)
+        # throws a UnicodeDecodeError when it can't interpret Latin-1 encoded characters using UTF-8.
+        # When that happens, we need to use Latin-1 encoding instead of UTF-8.
+
+        # The text doesn't need to be encoded in this circumstance.
+        result = text
+        # If we're in Russian, change the encoding to KOI8r
+        if TransanaGlobal.configData.language == 'ru':
+            TransanaGlobal.encoding = 'koi8_r'
+        # If we're in Chinese, change the encoding to the appropriate Chinese encoding
+        elif TransanaGlobal.configData.language == 'zh':
+            TransanaGlobal.encoding = TransanaConstants.chineseEncoding
+        # If we're in Eastern European Encoding, change the encoding to 'iso8859_2'
+        elif TransanaGlobal.configData.language == 'easteurope':
+            TransanaGlobal.encoding = 'iso8859_2'
+        # If we're in Greek, change the encoding to 'iso8859_7'
+        elif TransanaGlobal.configData.language == 'el':
+            TransanaGlobal.encoding = 'iso8859_7'
+        # If we're in Japanese, change the encoding to cp932
+        elif TransanaGlobal.configData.language == 'ja':
+            TransanaGlobal.encoding = 'cp932'
+        # If we're in Korean, change the encoding to cp949
+        elif TransanaGlobal.configData.language == 'ko':
+            TransanaGlobal.encoding = 'cp949'
+        # Otherwise, fall back to UTF8, not Latin-1 as of 2.50
+        else:
+            TransanaGlobal.encoding = 'utf8'  # 'latin1'
+    # Return the results
+    return result
+
+def ProcessDBDataColumnForUTF8Encoding(values):
+    """ Process a whole column of database values (a list of IDs, for example) at once.  Returns a list
+        with the same results ProcessDBDataForUTF8Encoding() would give for each value, but decodes
+        all the values with a single call to the codec when it can. """
+    # Make sure we have a list we can measure and index
+    values = list(values)
+    # If we're not using a unicode version of wxPython ...
+    if not 'unicode' in wx.PlatformInfo:
+        # ... do nothing
+        return values
+    # If there are no values, there's nothing to do.  (Joining and splitting an empty list would create a value!)
+    if len(values) == 0:
+        return values
+    # If we're using MySQLdb (either server or embedded), values are in the database encoding.  Otherwise they're UTF-8.
+    if TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server']:
+        encoding = TransanaGlobal.encoding
+    else:
+        encoding = 'utf8'
+    try:
+        # If all the values are strings ...
+        if all([isinstance(value, str) for value in values]):
+            # ... join them with a character that can't appear in a Transana ID
+            joined = '\x00'.join(values)
+        # If all the values are unicode objects from MySQLdb ...
+        elif all([isinstance(value, unicode) for value in values]) and \
+             TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server']:
+            # ... join them and recover the encoded bytes, as ProcessDBDataForUTF8Encoding() does
+            joined = u'\x00'.join(values).encode('latin1')
+        # If the values are a mixture, or unicode objects that need no processing ...
+        else:
+            # ... we can't take the short cut
+            joined = None
+        # If we joined the values, and none of them contained the separator character ...
+        if (joined != None) and (joined.count('\x00') == len(values) - 1):
+            # ... decode them all at once and split them apart again
+            return joined.decode(encoding).split(u'\x00')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        pass
+    # If decoding the whole column fails, process the values one at a time
+    return [ProcessDBDataForUTF8Encoding(value) for value in values]
+
 def UpdateDBFilenames(parent, filePath, fileList, newName=''):
     """ Update the Database Filenames """
     # To start with, let's make sure the filePath ends with the appropriate Seperator
@@ -5358,6 +7025,10 @@ def DeleteDatabase(username, password, server, database, port):
                 if result == wx.ID_YES:
                     # Delete the database file!
                     os.remove(dbName)
+                    # If sqlite left a Write-Ahead Log or its shared memory file behind, delete them too
+                    for extension in ['-wal', '-shm']:
+                        if os.path.exists(dbName + extension):
+                            os.remove(dbName + extension)
                     # If we get this far, return True rather than False
                     res = 1
                 # If user cancels ...
@@ -5373,6 +7044,39 @@ def DeleteDatabase(username, password, server, database, port):
     except:
         return res
 
+def ConfigureQueryProfiling(enabled, slowQueryThreshold):
+    """ Turn Query Profiling on or off.  While it is on, every query's time, row count, and calling function is
+        recorded for the Query Statistics report, and queries taking slowQueryThreshold milliseconds or more are
+        written to the Slow Query Log in the user's Transana profile folder. """
+    _queryStatistics.configure(enabled, slowQueryThreshold,
+                               os.path.join(TransanaGlobal.configData.GetDefaultProfilePath(), 'Transana_SlowQueries.log'))
+
+def ResetQueryStatistics():
+    """ Discard the Query Profiling statistics collected so far """
+    _queryStatistics.reset()
+
+def ReportQueryStatistics(maxQueries=50):
+    """ Build a string that reports the queries that have taken the most time since Query Profiling statistics
+        were last reset. """
+    # Get the statistics for the slowest queries
+    (results, seconds) = _queryStatistics.summary(maxQueries)
+    # Build the report heading
+    # Encode with UTF-8 rather than TransanaGlobal.encoding because this is a prompt, not DB Data.
+    prompt = unicode(_('Queries with the most total time over the last %d seconds:'), 'utf8')
+    resMessage = prompt % seconds + u'\n\n'
+    # If Query Profiling is off, say so
+    if not _queryStatistics.enabled:
+        resMessage += unicode(_('Query Profiling is off.'), 'utf8') + u'\n\n'
+    # Add each query to the report
+    for (query, caller, count, totalTime, maxTime, rows, shape) in results:
+        prompt = unicode(_('%d queries, %0.1f ms total, %0.1f ms maximum, %d rows\nCalled from %s\n%s\n'), 'utf8')
+        resMessage += prompt % (count, totalTime * 1000.0, maxTime * 1000.0, rows, caller, query)
+        # If there were parameters, describe them
+        if shape != '':
+            resMessage += unicode(_('Parameters: %s'), 'utf8') % shape + u'\n'
+        resMessage += u'\n'
+    return resMessage
+
 def ReportRecordLocks(parent):
     """ Query the database for Record Locks and build a string that holds the report data. """
     # Initialize the Report Results string
@@ -6145,3 +7849,91 @@ def CheckSUWin250Database(dbName):
     else:
         # ... we pass this test.
         return True
+
+
+# For testing purposes, this module can run stand-alone to benchmark decoding of database data.
+if __name__ == '__main__':
+    # Create a simple app for testing.
+    app = wx.PySimpleApp()
+    # Decode using UTF-8, as Transana databases do
+    TransanaGlobal.encoding = 'utf8'
+
+    def Benchmark(label, function, data):
+        """ Time a decoding function, returning its result """
+        startTime = time.time()
+        result = function(data)
+        print "  %-40s %8.3f seconds" % (label, time.time() - startTime)
+        return result
+
+    # Build 100,000 IDs, a third of which include multi-byte characters
+    ids = []
+    for x in range(100000):
+        if x % 3 == 0:
+            ids.append('Clip %d \xc3\xa9t\xc3\xa9 \xe4\xba\xb0' % x)
+        else:
+            ids.append('Clip %d' % x)
+    # If we're using MySQLdb, IDs arrive as unicode objects holding the UTF-8 bytes
+    if TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server']:
+        ids = [id.decode('latin1') for id in ids]
+    print "Decoding %d IDs:" % len(ids)
+    r1 = Benchmark('one character at a time', lambda data: [ProcessDBDataForUTF8EncodingByCharacter(id) for id in data], ids)
+    r2 = Benchmark('one value at a time', lambda data: [ProcessDBDataForUTF8Encoding(id) for id in data], ids)
+    r3 = Benchmark('one column at a time', ProcessDBDataColumnForUTF8Encoding, ids)
+    print "  Results match:", r1 == r2 == r3
+
+    # The character-by-character loop builds its result one character at a time, so its run time grows with
+    # the square of the transcript size.  Compare the two approaches on a transcript of about 250 KB ...
+    text = '{\\rtf1\\ansi ' + ('Transcript text with an \xc3\xa9 and a \xe4\xba\xb0 in it.  ' * 5500) + '}'
+    if TransanaConstants.DBInstalled in ['MySQLdb-embedded', 'MySQLdb-server']:
+        text = text.decode('latin1')
+    print "Decoding a %d byte transcript:" % len(text)
+    r1 = Benchmark('one character at a time', ProcessDBDataForUTF8EncodingByCharacter, text)
+    r2 = Benchmark('all at once', ProcessDBDataForUTF8Encoding, text)
+    print "  Results match:", r1 == r2
+    # ... then time the bulk approach alone on a transcript of about 4 MB, which would take hours the old way.
+    text = text[:-1] * 16 + '}'
+    print "Decoding a %d byte transcript:" % len(text)
+    Benchmark('all at once', ProcessDBDataForUTF8Encoding, text)
+
+    # If we're using sqlite, compare save and search times for each sqlite Performance Profile
+    if TransanaConstants.DBInstalled in ['sqlite3']:
+        import shutil
+        import tempfile
+        print
+        print "sqlite Performance Profiles:"
+        for profile in TransanaConstants.SQLITE_PROFILE_NAMES:
+            # Create an empty database in a temporary folder, so the timing includes writing to a real disk
+            tempDir = tempfile.mkdtemp()
+            db = ConnectSqlite(os.path.join(tempDir, 'Benchmark.db'), profile)
+            dbCursor = db.cursor()
+            dbCursor.execute("""CREATE TABLE Clips2 (ClipNum INTEGER PRIMARY KEY, ClipID VARCHAR(100), EpisodeNum INTEGER,
+                                                     ClipStart INTEGER, ClipStop INTEGER, ClipComment VARCHAR(255))""")
+            dbCursor.execute("""CREATE TABLE ClipKeywords2 (ClipNum INTEGER, KeywordGroup VARCHAR(50), Keyword VARCHAR(85))""")
+            dbCursor.execute("CREATE INDEX ClipKeywords_Keyword ON ClipKeywords2 (KeywordGroup, Keyword)")
+            # Save 500 Clips one at a time, the way db_save() does, each with three keywords in its own transaction
+            startTime = time.time()
+            for clipNum in range(1, 501):
+                dbCursor.execute('BEGIN')
+                dbCursor.execute("INSERT INTO Clips2 VALUES (?, ?, ?, ?, ?, ?)", (clipNum, 'Clip %d' % clipNum, clipNum % 20, clipNum * 1000, clipNum * 1000 + 5000, 'Comment'))
+                dbCursor.executemany("INSERT INTO ClipKeywords2 VALUES (?, ?, ?)", [(clipNum, 'Group %d' % (clipNum % 5), 'Keyword %d' % ((clipNum + k) % 50)) for k in range(3)])
+                dbCursor.execute('COMMIT')
+            saveTime = time.time() - startTime
+            # Import 50,000 more Clips in a single transaction, the way XMLImport does
+            startTime = time.time()
+            dbCursor.execute('BEGIN')
+            dbCursor.executemany("INSERT INTO Clips2 VALUES (?, ?, ?, ?, ?, ?)", [(clipNum, 'Clip %d' % clipNum, clipNum % 20, clipNum * 1000, clipNum * 1000 + 5000, 'Comment') for clipNum in range(501, 50501)])
+            dbCursor.executemany("INSERT INTO ClipKeywords2 VALUES (?, ?, ?)", [(clipNum, 'Group %d' % (clipNum % 5), 'Keyword %d' % ((clipNum + k) % 50)) for clipNum in range(501, 50501) for k in range(3)])
+            dbCursor.execute('COMMIT')
+            importTime = time.time() - startTime
+            # Run 200 keyword searches
+            startTime = time.time()
+            for searchNum in range(200):
+                dbCursor.execute("""SELECT Clips2.ClipNum, ClipID FROM Clips2, ClipKeywords2
+                                    WHERE Clips2.ClipNum = ClipKeywords2.ClipNum AND KeywordGroup = ? AND Keyword = ?
+                                    ORDER BY ClipID""", ('Group %d' % (searchNum % 5), 'Keyword %d' % (searchNum % 50)))
+                dbCursor.fetchall()
+            searchTime = time.time() - startTime
+            dbCursor.close()
+            db.close()
+            shutil.rmtree(tempDir)
+            print "  %-12s save %7.2f ms    import 50,000 %6.2f seconds    search %7.2f ms" % (profile, saveTime * 2.0, importTime, searchTime * 5.0)
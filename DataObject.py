@@ -335,6 +335,8 @@ class DataObject(object):
                 ((self.record_lock == DBInterface.get_username()) and
                 ((self.lock_time == None) or
                  ((DBInterface.ServerDateTime() - self.lock_time).days <= 1))):
+                # The record is about to change, so cached list results from its table are out of date
+                DBInterface.InvalidateQueryCache(self._table())
                 # If record num is 0, this is a NEW record and needs to be
                 # INSERTed.  Otherwise, it is an existing record to be UPDATEd.
                 if (self.number == 0):
@@ -380,6 +382,10 @@ class DataObject(object):
         query = DBInterface.FixQuery(query)
         # Execute the query
         c.execute(query, (self.number, ))
+        # Cached list results from this table are now out of date
+        DBInterface.InvalidateQueryCache(tablename)
+        # If the record has text in the Text Index, remove it
+        DBInterface.RemoveFromTextIndex(tablename, self.number, c)
         # If we're using Transactions ...
         if (use_transactions):
             # ... and the result exists ...
@@ -3762,6 +3762,81 @@ class _DBTreeCtrl(wx.TreeCtrl):
             except:
                 pass
 
+    def add_SearchResults(self, nodeData, searchNodes):
+        """ Add a complete set of Search Results to the Search Results Node described by nodeData in one pass.
+            searchNodes is a dictionary of the nodes to add below the Search Results Node, keyed by (nodeType, recNum).
+            Each entry is a [nodeText, parent, sortOrder, children] list, where children is a dictionary of the
+            same kind holding the nodes to add below that node.  add_Node() climbs the tree from the root for each
+            node it adds, which is too slow for searches with thousands of results. """
+        # Find the Search Results Node
+        searchResultsNode = self.select_Node(nodeData, 'SearchResultsNode', ensureVisible=False)
+        # If the Search Results Node can't be found, there's nowhere to put the results
+        if searchResultsNode == None:
+            return
+        # Don't repaint the tree until all the nodes have been added
+        self.Freeze()
+        try:
+            # Add the nodes
+            self.add_SearchBranch(searchResultsNode, searchNodes)
+            # Expand the Search Results Node
+            self.Expand(searchResultsNode)
+        finally:
+            # Now the tree can be repainted
+            self.Thaw()
+        # Refresh the Tree
+        self.Refresh()
+
+    def add_SearchBranch(self, parentNode, searchNodes):
+        """ Add the nodes in searchNodes (structured as described in add_SearchResults()), and all their children,
+            below parentNode """
+        # The Search Node Types that are sorted by Sort Order rather than alphabetically
+        sortOrderNodeTypes = ['SearchQuoteNode', 'SearchClipNode', 'SearchSnapshotNode']
+
+        def sortKey(key):
+            """ Put Library Nodes before Collection Nodes, and Collection Nodes before Quotes, Clips and Snapshots.
+                Quotes, Clips and Snapshots are in Sort Order, and everything else is in alphabetical order. """
+            # Get the Node Type and the node data
+            nodeType = key[0]
+            (nodeText, parent, sortOrder, children) = searchNodes[key]
+            # Quotes, Clips, and Snapshots come last, in Sort Order
+            if nodeType in sortOrderNodeTypes:
+                return (2, sortOrder, nodeText.upper())
+            # Collections come after Libraries
+            elif nodeType == 'SearchCollectionNode':
+                return (1, 0, nodeText.upper())
+            # Libraries, Documents, Episodes, and Transcripts are alphabetical
+            else:
+                return (0, 0, nodeText.upper())
+
+        # The images used for each type of Search Node
+        images = {'SearchLibraryNode'    : 'Library16',
+                  'SearchDocumentNode'   : 'Document16',
+                  'SearchEpisodeNode'    : 'Episode16',
+                  'SearchTranscriptNode' : 'Transcript16',
+                  'SearchCollectionNode' : 'Collection16',
+                  'SearchQuoteNode'      : 'Quote16',
+                  'SearchClipNode'       : 'Clip16',
+                  'SearchSnapshotNode'   : 'Snapshot16'}
+        # Get the nodes in the order they belong in the tree
+        keys = searchNodes.keys()
+        keys.sort(key=sortKey)
+        # Add each node
+        for key in keys:
+            (nodeType, recNum) = key
+            (nodeText, parent, sortOrder, children) = searchNodes[key]
+            # Add the new Node to the Tree at the end of its parent's children
+            newNode = self.AppendItem(parentNode, nodeText)
+            # Give the new Node the appropriate Graphic
+            self.set_image(newNode, images[nodeType])
+            # Create the Node Data and attach it to the Node
+            nodedata = _NodeData(nodetype=nodeType, recNum=recNum, parent=parent, sortOrder=sortOrder)
+            self.SetPyData(newNode, nodedata)
+            # If the node has children ...
+            if len(children) > 0:
+                # ... add them, and expand the node
+                self.add_SearchBranch(newNode, children)
+                self.Expand(newNode)
+
     def select_Node(self, nodeData, nodeType, ensureVisible=True):
         """ This method is used to select nodes in the tree.
             nodeData is a list that gives the tree structure that describes where the node should be selected. """
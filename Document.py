@@ -567,19 +567,22 @@ class Document(DataObject.DataObject):
                 # in anticipation of putting them all back later
                 DBInterface.delete_all_keywords_for_a_group(0, self.number, 0, 0, 0)
 
+            # Update the Text Index for the saved text
+            DBInterface.UpdateTextIndex('Document', self.number, self.text, c)
+
             # Initialize a blank error prompt
             prompt = ''
-            # Add the Document keywords back.  Iterate through the Keyword List
-            for kws in self._kwlist:
-                # Try to add the Clip Keyword record.  If it is NOT added, the keyword has been changed by another user!
-                if not DBInterface.insert_clip_keyword(0, self.number, 0, 0, 0, kws.keywordGroup, kws.keyword, kws.example):
-                    # if the prompt isn't blank ...
-                    if prompt != '':
-                        # ... add a couple of line breaks to it
-                        prompt += u'\n\n'
-                    # Add the current keyword to the error prompt
-                    # Encode with UTF-8 rather than TransanaGlobal.encoding because this is a prompt, not DB Data.
-                    prompt += unicode(_('Keyword "%s : %s" cannot be added to Document "%s".\nAnother user must have edited the keyword while you were adding it.'), 'utf8') % (kws.keywordGroup, kws.keyword, self.id)
+            # Add the Document keywords back, all at once.  If a keyword is NOT added, the keyword has been changed by another user!
+            keywordList = [('Document', self.number, kws.keywordGroup, kws.keyword, kws.example) for kws in self._kwlist]
+            # Iterate through the keywords that could not be added
+            for (objType, objNum, kwg, kw, example) in DBInterface.insert_clip_keywords(keywordList, mode='new', use_transactions=False):
+                # if the prompt isn't blank ...
+                if prompt != '':
+                    # ... add a couple of line breaks to it
+                    prompt += u'\n\n'
+                # Add the current keyword to the error prompt
+                # Encode with UTF-8 rather than TransanaGlobal.encoding because this is a prompt, not DB Data.
+                prompt += unicode(_('Keyword "%s : %s" cannot be added to Document "%s".\nAnother user must have edited the keyword while you were adding it.'), 'utf8') % (kwg, kw, self.id)
 
 
             # If there is an error prompt ...
@@ -1674,101 +1674,80 @@ def DropKeyword(parent, sourceData, targetType, targetName, targetRecNum, target
             # Lock the Collection Record, just to be on the safe side (Is this necessary??  I don't think so, but maybe that can confirm that all Clips are available.)
             tempCollection.lock_record()
 
+            # Rather than loading, locking, saving, and unlocking every Quote, Clip, and Snapshot in the Collection,
+            # we lock all the ones we can at once, skip the ones that are locked by others, and add the Keyword to
+            # all the others at once.
+            # Build a list of (object type, object type name, table, number field, list of (number, ID)) for the
+            # types of objects in the Collection.
+            objectLists = []
+            # If we're not in the Standard version ...
             if TransanaConstants.proVersion:
-                # Now load a list of all the Quotes in the Collection and iterate through them
-                for tempQuoteNum, tempQuoteID, tempCollectNum, tempParentDocNum in DBInterface.list_of_quotes_by_collectionnum(tempCollection.number):
-                    # Load the Quote.
-                    tempQuote = Quote.Quote(num=tempQuoteNum)
-                    try:
-                        # Lock the Quote
-                        tempQuote.lock_record()
-                        # Add the Keyword to the Quote
-                        tempQuote.add_keyword(sourceData.parent, sourceData.text)
-                        # Save the Quote
-                        tempQuote.db_save()
-                        # If the affected Quote is for the current Document, we need to update the
-                        # Keyword Visualization
-                        if (isinstance(parent.parent.ControlObject.currentObj, Document.Document)) and \
-                           (tempQuote.source_document_num == parent.parent.ControlObject.currentObj.number):
-                            # Signal that the Keyword Visualization needs to be updated
-                            updateKeywordVisualization = True
-                        # If the affected Quote is the current Quote, we need to update the
-                        # Keyword Visualization
-                        elif (isinstance(parent.parent.ControlObject.currentObj, Quote.Quote)) and \
-                           (tempQuote.number == parent.parent.ControlObject.currentObj.number):
-                            # Signal that the Keyword Visualization needs to be updated
-                            updateKeywordVisualization = True
-                        # Now let's communicate with other Transana instances if we're in Multi-user mode
-                        if not TransanaConstants.singleUserVersion:
-                            msg = 'Quote %d' % tempQuote.number
-                            if TransanaGlobal.chatWindow != None:
-                                # Send the "Update Keyword List" message
-                                TransanaGlobal.chatWindow.SendMessage("UKL %s" % msg)
-                        # Unlock the Quote
-                        tempQuote.unlock_record()
-                    # Handle "RecordLockedError" exception
-                    except TransanaExceptions.RecordLockedError, e:
-                        TransanaExceptions.ReportRecordLockedException(_("Quote"), tempQuote.id, e)
-
-            # Now load a list of all the Clips in the Collection and iterate through them
-            for tempClipNum, tempClipID, tempCollectNum in DBInterface.list_of_clips_by_collection(tempCollection.id, tempCollection.parent):
-                # Load the Clip.
-                tempClip = Clip.Clip(id_or_num=tempClipNum)
-                try:
-                    # Lock the Clip
-                    tempClip.lock_record()
-                    # Add the Keyword to the Clip
-                    tempClip.add_keyword(sourceData.parent, sourceData.text)
-                    # Save the Clip
-                    tempClip.db_save()
-                    # If the affected clip is for the current Episode, we need to update the
-                    # Keyword Visualization
-                    if (isinstance(parent.parent.ControlObject.currentObj, Episode.Episode)) and \
-                       (tempClip.episode_num == parent.parent.ControlObject.currentObj.number):
-                        # Signal that the Keyword Visualization needs to be updated
-                        updateKeywordVisualization = True
-                    # If the affected clip is the current Clip, we need to update the
-                    # Keyword Visualization
-                    elif (isinstance(parent.parent.ControlObject.currentObj, Clip.Clip)) and \
-                       (tempClip.number == parent.parent.ControlObject.currentObj.number):
+                # ... get the list of Quotes in the Collection
+                objectLists.append(('Quote', _('Quote'), 'Quotes2', 'QuoteNum',
+                                    [(rec[0], rec[1]) for rec in DBInterface.list_of_quotes_by_collectionnum(tempCollection.number)]))
+            # Get the list of Clips in the Collection
+            objectLists.append(('Clip', _('Clip'), 'Clips2', 'ClipNum',
+                                [(rec[0], rec[1]) for rec in DBInterface.list_of_clips_by_collection(tempCollection.id, tempCollection.parent)]))
+            # If we're not in the Standard version ...
+            if TransanaConstants.proVersion:
+                # ... get the list of Snapshots in the Collection
+                objectLists.append(('Snapshot', _('Snapshot'), 'Snapshots2', 'SnapshotNum',
+                                    [(rec[0], rec[1]) for rec in DBInterface.list_of_snapshots_by_collectionnum(tempCollection.number)]))
+            # Initialize the list of Keywords to add
+            keywordList = []
+            # Initialize the list of (table, number field, list of numbers) of the record locks we claim
+            claimedLocks = []
+            # Initialize the list of (object type name, object ID, lock holder) of the objects locked by others
+            lockedObjects = []
+            try:
+                # Iterate through the object types
+                for (objType, objTypeName, table, numField, objList) in objectLists:
+                    # Lock all of these objects that aren't locked by someone else
+                    (claimed, locks) = DBInterface.claim_record_locks(table, numField, [objNum for (objNum, objID) in objList])
+                    # Remember the locks we claimed so we can release them
+                    claimedLocks.append((table, numField, claimed))
+                    # Iterate through the objects
+                    for (objNum, objID) in objList:
+                        # If the object is locked by someone else ...
+                        if locks.has_key(objNum):
+                            # ... note it so we can report it and skip it
+                            lockedObjects.append((objTypeName, objID, locks[objNum]))
+                        # If we locked the object ...
+                        elif objNum in claimed:
+                            # ... add the Keyword to it
+                            keywordList.append((objType, objNum, sourceData.parent, sourceData.text, 0))
+                # Add the Keyword to all the locked objects at once
+                missingKeywords = DBInterface.insert_clip_keywords(keywordList)
+            finally:
+                # Release the locks we claimed, which also updates the objects' LastSaveTimes
+                for (table, numField, claimed) in claimedLocks:
+                    DBInterface.release_record_locks(table, numField, claimed)
+            # Report the objects that were skipped because other users have them locked
+            for (objTypeName, objID, lockHolder) in lockedObjects:
+                TransanaExceptions.ReportRecordLockedException(objTypeName, objID, TransanaExceptions.RecordLockedError(lockHolder))
+            # If the Keyword can't be added ...
+            if len(missingKeywords) > 0:
+                # ... another user must have changed it.  Let the user know.
+                prompt = unicode(_('Keyword "%s : %s" cannot be added to Collection "%s".\nAnother user must have edited the keyword while you were adding it.'), 'utf8')
+                errordlg = Dialogs.ErrorDialog(None, prompt % (sourceData.parent, sourceData.text, tempCollection.id))
+                errordlg.ShowModal()
+                errordlg.Destroy()
+            # If the Keyword was added ...
+            else:
+                # Iterate through the objects that got the Keyword
+                for (objType, objNum, kwg, kw, example) in keywordList:
+                    # If the current Episode or Clip has a changed Clip, or the current Document or Quote has a changed
+                    # Quote, we need to update the Keyword Visualization
+                    if ((objType == 'Clip') and isinstance(parent.parent.ControlObject.currentObj, (Episode.Episode, Clip.Clip))) or \
+                       ((objType == 'Quote') and isinstance(parent.parent.ControlObject.currentObj, (Document.Document, Quote.Quote))):
                         # Signal that the Keyword Visualization needs to be updated
                         updateKeywordVisualization = True
                     # Now let's communicate with other Transana instances if we're in Multi-user mode
                     if not TransanaConstants.singleUserVersion:
-                        msg = 'Clip %d' % tempClip.number
+                        msg = '%s %d' % (objType, objNum)
                         if TransanaGlobal.chatWindow != None:
                             # Send the "Update Keyword List" message
                             TransanaGlobal.chatWindow.SendMessage("UKL %s" % msg)
-                    # Unlock the Clip
-                    tempClip.unlock_record()
-                # Handle "RecordLockedError" exception
-                except TransanaExceptions.RecordLockedError, e:
-                    TransanaExceptions.ReportRecordLockedException(_("Clip"), tempClip.id, e)
-
-            if TransanaConstants.proVersion:
-                # Now load a list of all the Snapshots in the Collection and iterate through them
-                for tempSnapshotNum, tempSnapshotID, tempCollectNum in DBInterface.list_of_snapshots_by_collectionnum(tempCollection.number):
-                    # Load the Snapshot
-                    tempSnapshot = Snapshot.Snapshot(tempSnapshotNum)
-                    try:
-                        # Lock the Snapshot
-                        tempSnapshot.lock_record()
-                        # Add the Keyword to the Snapshot
-                        tempSnapshot.add_keyword(sourceData.parent, sourceData.text)
-                        # Save the Snapshot
-                        tempSnapshot.db_save()
-
-                        # Now let's communicate with other Transana instances if we're in Multi-user mode
-                        if not TransanaConstants.singleUserVersion:
-                            msg = 'Snapshot %d' % tempSnapshot.number
-                            if TransanaGlobal.chatWindow != None:
-                                # Send the "Update Keyword List" message
-                                TransanaGlobal.chatWindow.SendMessage("UKL %s" % msg)
-                        # Unlock the Snapshot
-                        tempSnapshot.unlock_record()
-                    # Handle "RecordLockedError" exception
-                    except TransanaExceptions.RecordLockedError, e:
-                        TransanaExceptions.ReportRecordLockedException(_("Snapshot"), tempSnapshot.id, e)
 
             # Unlock the Collection Record
             tempCollection.unlock_record()
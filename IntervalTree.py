@@ -0,0 +1,130 @@
+# Copyright (C) 2002 - 2015 The Board of Regents of the University of Wisconsin System
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of version 2 of the GNU General Public License as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""This module implements an Interval Tree, which quickly finds the time-positioned items
+(such as Clips and Snapshots) that overlap a given time or range of times."""
+
+__author__ = 'David Woods <dwoods@wcer.wisc.edu>'
+
+
+class IntervalTree(object):
+    """ An Interval Tree holds a fixed set of items, each covering the time from its start up to (but not including)
+        its stop.  It answers "which items overlap time T" and "which items overlap times T1 to T2" in time proportional
+        to log(n) plus the number of items found, where the database would have to scan every Clip in the Episode.
+
+        The items are kept in a list sorted by start time.  That list is treated as a balanced binary tree, with
+        the middle item as the root, and each node also records the latest stop time in its subtree, so whole
+        subtrees that end before the requested time can be skipped.  Items are returned in start time order.
+        Items with the same start time are returned in the order they were passed in. """
+
+    def __init__(self, items):
+        """ Build the tree from a list of (start, stop, data) tuples """
+        # Sort the items by start time.  Python's sort is stable, so items with the same start time stay in order.
+        items = list(items)
+        items.sort(key=lambda item: item[0])
+        # Keep the start times, stop times, and data in separate lists
+        self.starts = [item[0] for item in items]
+        self.stops = [item[1] for item in items]
+        self.data = [item[2] for item in items]
+        # Calculate the latest stop time in each node's subtree
+        self.maxStops = [None] * len(items)
+        self._build(0, len(items))
+
+    def __len__(self):
+        """ The number of items in the tree """
+        return len(self.data)
+
+    def _build(self, lo, hi):
+        """ Calculate the latest stop time for the subtree holding items lo to hi - 1, returning it """
+        # An empty subtree has no stop time
+        if lo >= hi:
+            return None
+        # The subtree's root is its middle item
+        mid = (lo + hi) / 2
+        # The latest stop time is the latest of the root's stop time and its children's latest stop times.
+        # (None is less than any number in Python 2.)
+        self.maxStops[mid] = max(self.stops[mid], self._build(lo, mid), self._build(mid + 1, hi))
+        return self.maxStops[mid]
+
+    def items(self):
+        """ Return the data for all items, in start time order """
+        return self.data[:]
+
+    def overlapping(self, start, stop=None):
+        """ Return the data for all items that overlap the time start, or, if stop is specified, that overlap
+            any time from start to stop, in start time order """
+        # A single time is a range that starts and stops at that time
+        if stop == None:
+            stop = start
+        # Start with an empty list
+        results = []
+        # Search the whole tree
+        self._search(0, len(self.data), start, stop, results)
+        return results
+
+    def _search(self, lo, hi, start, stop, results):
+        """ Add the data for items lo to hi - 1 that overlap start to stop to the results list """
+        # If the subtree is empty, or everything in it ends at or before the start time, there's nothing to find
+        if (lo >= hi) or (self.maxStops[(lo + hi) / 2] <= start):
+            return
+        # Find the subtree's root
+        mid = (lo + hi) / 2
+        # Search the items that start before the root item
+        self._search(lo, mid, start, stop, results)
+        # If the root item starts after the stop time, so does everything after it, so we're done
+        if self.starts[mid] > stop:
+            return
+        # If the root item ends after the start time, it overlaps
+        if self.stops[mid] > start:
+            results.append(self.data[mid])
+        # Search the items that start after the root item
+        self._search(mid + 1, hi, start, stop, results)
+
+
+# For testing purposes, this module can run stand-alone.
+if __name__ == '__main__':
+    import random
+    import time
+
+    # Build a heavily coded Episode of about one hour, with 20,000 overlapping Clips
+    random.seed(1)
+    clips = []
+    for clipNum in range(20000):
+        clipStart = random.randint(0, 3600000)
+        clipStop = clipStart + random.randint(1000, 120000)
+        clips.append((clipStart, clipStop, clipNum))
+    tree = IntervalTree(clips)
+
+    # Compare the tree's answers to a full scan, the way the database does it
+    for x in range(1000):
+        t1 = random.randint(0, 3700000)
+        t2 = t1 + random.choice([0, random.randint(0, 60000)])
+        expected = [clip for (clipStart, clipStop, clip) in sorted(clips, key=lambda c: c[0]) if (clipStart <= t2) and (clipStop > t1)]
+        if tree.overlapping(t1, t2) != expected:
+            print "Mismatch at", t1, t2
+            break
+    else:
+        print "1000 queries match a full scan"
+
+    # Time moving the playhead through the Episode one second at a time
+    startTime = time.time()
+    for t in range(0, 3600000, 1000):
+        tree.overlapping(t)
+    print "3600 point queries:  %0.3f seconds with the tree" % (time.time() - startTime)
+    startTime = time.time()
+    for t in range(0, 3600000, 1000):
+        [clip for (clipStart, clipStop, clip) in clips if (clipStart <= t) and (clipStop > t)]
+    print "3600 point queries:  %0.3f seconds scanning" % (time.time() - startTime)
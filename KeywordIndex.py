@@ -0,0 +1,298 @@
+# Copyright (C) 2002 - 2015 The Board of Regents of the University of Wisconsin System
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of version 2 of the GNU General Public License as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""This module implements a Keyword Index, which answers Boolean keyword searches (as structured by the
+Transana Search Dialog) from memory rather than by grouping every row of the ClipKeywords table."""
+
+__author__ = 'David Woods <dwoods@wcer.wisc.edu>'
+
+# import Python's string module
+import string
+
+
+def ParseSearchTerms(queryText):
+    """ Convert the lines of a search (as structured by the Transana Search Dialog) into a list of tokens:
+        '(', ')', 'AND', 'OR', and (notFlag, keywordGroup, keyword) tuples.  This follows the same rules as
+        ProcessSearch.BuildQueries(), so both produce the same results. """
+    # Start with an empty token list
+    tokens = []
+    # Go through the Search Terms line by line
+    for line in queryText:
+        # Capture the Line being processed, and remove whitespace from either end
+        tempStr = string.strip(line)
+        # Skip blank lines
+        if len(tempStr) == 0:
+            continue
+        # Initialize the "Continuation" string, which holds a BOOLEAN Operator ("AND" or "OR")
+        continStr = ''
+        # Initialize the flag that signals the BOOLEAN "NOT" Operator
+        notFlag = False
+        # If a line ends with " AND" or " OR", remember the operator and remove it from the line
+        if tempStr[-4:] == ' AND':
+            continStr = 'AND'
+            tempStr = tempStr[:-4]
+        if tempStr[-3:] == ' OR':
+            continStr = 'OR'
+            tempStr = tempStr[:-3]
+        # Process open parens and the "NOT" operator at the beginning of the line.
+        # NOTE:  The Search Dialog allows "(NOT", but not "NOT(".
+        while (tempStr[:1] == '(') or (tempStr[:4] == 'NOT '):
+            if tempStr[0] == '(':
+                tokens.append('(')
+                tempStr = tempStr[1:]
+            if tempStr[:4] == 'NOT ':
+                notFlag = True
+                tempStr = tempStr[4:]
+        # Count and remove the close parens in the line
+        closeParen = tempStr.count(')')
+        tempStr = tempStr.replace(')', '')
+        # All that should be left in the line now is the Keyword Group : Keyword pair
+        if len(tempStr) > 0:
+            tokens.append((notFlag, tempStr[:tempStr.find(':')], tempStr[tempStr.find(':') + 1:]))
+        # Add the close parens and the Boolean Operator
+        tokens += [')'] * closeParen
+        if continStr != '':
+            tokens.append(continStr)
+    return tokens
+
+def SearchKeywords(tokens):
+    """ Return the list of (keywordGroup, keyword) pairs used in a list of search tokens """
+    return [(token[1], token[2]) for token in tokens if isinstance(token, tuple)]
+
+
+class KeywordIndex(object):
+    """ A Keyword Index holds, for each type of object (Episode, Clip, Snapshot, etc.), the set of object
+        numbers that have each keyword, plus the keywords each object has.  A search becomes set algebra:
+        AND is intersection, OR is union, and NOT is difference from the set of objects of that type that
+        have any keywords at all, which matches the SQL search, since it only considers objects with at
+        least one row in the ClipKeywords table.
+
+        The index doesn't read the database itself.  DBInterface loads it, and tells it which objects'
+        keywords need to be re-read when keywords are added or removed.
+
+        The index also keeps a change log, so the results of an earlier search can be brought up to date by
+        re-evaluating only the objects whose keywords have changed since.  Each load and refresh starts a new
+        generation, and the index records the generation in which each object's keywords last changed. """
+
+    def __init__(self):
+        """ Create an empty Keyword Index """
+        # The current generation.  This keeps counting up when the index is cleared and re-loaded, so a generation
+        # from before a re-load is never mistaken for one after it.
+        self.generation = 0
+        self.clear()
+
+    def clear(self):
+        """ Empty the index.  It must be loaded again before it can be used. """
+        # The index has not been loaded
+        self.loaded = False
+        # For each object type, a dictionary of keyword sets, keyed by (keywordGroup, keyword)
+        self.keywords = {}
+        # For each object type, a dictionary of (keywordGroup, keyword) sets, keyed by object number
+        self.objects = {}
+        # For each object type, the set of object numbers whose keywords have changed since they were loaded
+        self.stale = {}
+        # The generation in which the index was loaded
+        self.loadGeneration = self.generation
+        # For each object type, the generation in which each object's keywords last changed, keyed by object number
+        self.changes = {}
+
+    def load(self, rows):
+        """ Load the index from a list of (objectType, objectNumber, keywordGroup, keyword) rows """
+        # Start with an empty index
+        self.clear()
+        # Add each row
+        for (objType, objNum, keywordGroup, keyword) in rows:
+            self._add(objType, objNum, (keywordGroup, keyword))
+        # Start a new generation.  Nothing is known about changes made before this.
+        self.generation += 1
+        self.loadGeneration = self.generation
+        # The index is ready to use
+        self.loaded = True
+
+    def _add(self, objType, objNum, keyword):
+        """ Record that the object has the keyword """
+        self.keywords.setdefault(objType, {}).setdefault(keyword, set()).add(objNum)
+        self.objects.setdefault(objType, {}).setdefault(objNum, set()).add(keyword)
+
+    def markStale(self, objType, objNum):
+        """ Note that an object's keywords have changed, so they must be re-read before the next search """
+        self.stale.setdefault(objType, set()).add(objNum)
+
+    def staleObjects(self):
+        """ Return a dictionary of the object numbers whose keywords must be re-read, keyed by object type """
+        return self.stale
+
+    def refresh(self, objType, objNums, rows):
+        """ Replace the keywords for objects objNums of type objType with the (objectNumber, keywordGroup, keyword)
+            rows read from the database """
+        # Remove each object's old keywords
+        for objNum in objNums:
+            for keyword in self.objects.get(objType, {}).pop(objNum, set()):
+                objSet = self.keywords[objType][keyword]
+                objSet.discard(objNum)
+                # Don't keep empty sets around
+                if len(objSet) == 0:
+                    del(self.keywords[objType][keyword])
+        # Add the new keywords
+        for (objNum, keywordGroup, keyword) in rows:
+            self._add(objType, objNum, (keywordGroup, keyword))
+        # These objects are now up to date
+        self.stale.get(objType, set()).difference_update(objNums)
+        # Start a new generation, and record that these objects changed in it
+        self.generation += 1
+        changes = self.changes.setdefault(objType, {})
+        for objNum in objNums:
+            changes[objNum] = self.generation
+
+    def changedSince(self, objType, generation):
+        """ Return the set of numbers of objects of type objType whose keywords have changed since the given
+            generation, or None if the index has been re-loaded since then, so the changes aren't known """
+        # If the index has been re-loaded since then, we don't know what changed
+        if (not self.loaded) or (generation < self.loadGeneration):
+            return None
+        return set([objNum for (objNum, changeGeneration) in self.changes.get(objType, {}).items()
+                    if changeGeneration > generation])
+
+    def hasKeyword(self, keywordGroup, keyword):
+        """ Is the keyword applied to any object of any type? """
+        for objType in self.keywords.keys():
+            if self.keywords[objType].has_key((keywordGroup, keyword)):
+                return True
+        return False
+
+    def search(self, objType, tokens, candidates=None):
+        """ Return the set of numbers of objects of type objType that match the search tokens
+            produced by ParseSearchTerms().  If candidates (a set of object numbers) is given,
+            only those objects are considered. """
+        # If there's nothing to search for, nothing matches
+        if len(tokens) == 0:
+            return set()
+        # Keep track of our position in the token list as we work through it
+        self._tokens = tokens
+        self._position = 0
+        self._objType = objType
+        self._candidates = candidates
+        return self._expression()
+
+    def _expression(self):
+        """ expression := term (OR term)* """
+        result = self._term()
+        while (self._position < len(self._tokens)) and (self._tokens[self._position] == 'OR'):
+            self._position += 1
+            result = result | self._term()
+        return result
+
+    def _term(self):
+        """ term := factor (AND factor)*   (AND is done before OR, as in SQL) """
+        result = self._factor()
+        while (self._position < len(self._tokens)) and (self._tokens[self._position] == 'AND'):
+            self._position += 1
+            result = result & self._factor()
+        return result
+
+    def _factor(self):
+        """ factor := '(' expression ')' | [NOT] keywordGroup:keyword """
+        token = self._tokens[self._position]
+        self._position += 1
+        # A parenthesized expression
+        if token == '(':
+            result = self._expression()
+            # Skip the close paren.  (The Search Dialog always balances parens, but don't fail if one is missing.)
+            if (self._position < len(self._tokens)) and (self._tokens[self._position] == ')'):
+                self._position += 1
+            return result
+        # A keyword, possibly negated
+        (notFlag, keywordGroup, keyword) = token
+        objects = self.keywords.get(self._objType, {}).get((keywordGroup, keyword), set())
+        # If only some objects are being considered, we need only check those
+        if self._candidates != None:
+            if notFlag:
+                return set([objNum for objNum in self._candidates
+                            if self.objects.get(self._objType, {}).has_key(objNum)]) - objects
+            else:
+                return self._candidates & objects
+        if notFlag:
+            return set(self.objects.get(self._objType, {}).keys()) - objects
+        else:
+            return set(objects)
+
+
+# For testing purposes, this module can run stand-alone.
+if __name__ == '__main__':
+    import random
+    import time
+
+    # Build a heavily coded database with 50,000 Clips, each with a few of 200 keywords
+    random.seed(1)
+    keywordList = [('Group %d' % (x / 20), 'Keyword %d' % x) for x in range(200)]
+    rows = []
+    for clipNum in range(1, 50001):
+        for keyword in random.sample(keywordList, random.randint(1, 8)):
+            rows.append(('Clip', clipNum, keyword[0], keyword[1]))
+    index = KeywordIndex()
+    startTime = time.time()
+    index.load(rows)
+    print "Loaded %d keyword rows:  %0.3f seconds" % (len(rows), time.time() - startTime)
+
+    # Evaluate a search the slow way, the way the SQL HAVING clause does, one Clip at a time
+    def slowSearch(tokens):
+        clipKeywords = {}
+        for (objType, clipNum, kwg, kw) in rows:
+            clipKeywords.setdefault(clipNum, set()).add((kwg, kw))
+        expression = ''
+        for token in tokens:
+            if isinstance(token, tuple):
+                expression += '(%s(%r in kws))' % (('', 'not ')[token[0]], (token[1], token[2]))
+            else:
+                expression += ' %s ' % token.lower()
+        return set([clipNum for (clipNum, kws) in clipKeywords.items() if eval(expression)])
+
+    searches = [['Group 0:Keyword 1 AND', 'Group 0:Keyword 2'],
+                ['Group 0:Keyword 1 OR', 'NOT Group 1:Keyword 25'],
+                ['(Group 0:Keyword 1 OR', 'Group 2:Keyword 45) AND', '(NOT Group 3:Keyword 61 OR', 'Group 9:Keyword 199)'],
+                ['Group 0:Keyword 3 AND', 'NOT Group 0:Keyword 4 OR', 'Group 5:Keyword 100 AND', 'Group 5:Keyword 101']]
+    for searchTerms in searches:
+        tokens = ParseSearchTerms(searchTerms)
+        startTime = time.time()
+        result = index.search('Clip', tokens)
+        elapsed = time.time() - startTime
+        print "%6d Clips in %6.2f ms, matches a row-by-row evaluation: %s   %s" % \
+              (len(result), elapsed * 1000.0, result == slowSearch(tokens), ' '.join(searchTerms))
+
+    # Change one Clip's keywords and refresh it
+    index.markStale('Clip', 7)
+    index.refresh('Clip', index.staleObjects()['Clip'].copy(), [(7, 'Group 0', 'Keyword 1'), (7, 'Group 0', 'Keyword 2')])
+    rows = [row for row in rows if row[1] != 7] + [('Clip', 7, 'Group 0', 'Keyword 1'), ('Clip', 7, 'Group 0', 'Keyword 2')]
+    tokens = ParseSearchTerms(searches[0])
+    print "After refreshing Clip 7, matches:", index.search('Clip', tokens) == slowSearch(tokens), 7 in index.search('Clip', tokens)
+
+    # Bring earlier search results up to date by re-evaluating only the Clips that have changed since
+    watermark = index.generation
+    results = [index.search('Clip', ParseSearchTerms(searchTerms)) for searchTerms in searches]
+    changedClips = random.sample(range(1, 50001), 500)
+    for clipNum in changedClips:
+        index.markStale('Clip', clipNum)
+    newRows = [(clipNum, kw[0], kw[1]) for clipNum in changedClips for kw in random.sample(keywordList, random.randint(0, 8))]
+    index.refresh('Clip', index.staleObjects()['Clip'].copy(), newRows)
+    rows = [row for row in rows if not row[1] in changedClips] + [('Clip',) + row for row in newRows]
+    for (searchTerms, result) in zip(searches, results):
+        tokens = ParseSearchTerms(searchTerms)
+        startTime = time.time()
+        changed = index.changedSince('Clip', watermark)
+        result = (result - changed) | index.search('Clip', tokens, changed)
+        elapsed = time.time() - startTime
+        print "%6d Clips, %d changed, in %6.2f ms, matches a row-by-row evaluation: %s" % \
+              (len(result), len(changed), elapsed * 1000.0, result == slowSearch(tokens))
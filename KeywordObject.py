@@ -597,6 +597,8 @@ that would corrupt the record that is currently locked by %s.  Please try again
                     values = (keywordGroup, keyword, originalKeywordGroup, originalKeyword)
                     query = DBInterface.FixQuery(query)
                     c.execute(query, values)
+                    # The keyword has changed for many objects, so the Keyword Index must be re-loaded
+                    DBInterface.InvalidateKeywordIndex()
 
                 # If the Keyword Group or Keyword has changed, we need to update all Snapshot Keyword records too.
                 if ((originalKeywordGroup != keywordGroup) or \
@@ -774,6 +776,8 @@ that would corrupt the record that is currently locked by %s.  Please try again
                ((self.record_lock == DBInterface.get_username()) and
                ((DBInterface.ServerDateTime() - self.lock_time).days <= 1)):
                 c = db.cursor()
+                # The record is about to change, so cached keyword lists are out of date
+                DBInterface.InvalidateQueryCache(self._table())
                 # If record num is 0, this is a NEW record and needs to be
                 # INSERTed.  Otherwise, it is an existing record to be UPDATEd.
                 if (self.originalKeywordGroup == None) or \
@@ -0,0 +1,307 @@
+# Copyright (C) 2002 - 2015 The Board of Regents of the University of Wisconsin System
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of version 2 of the GNU General Public License as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""This module implements a Media Cache, which keeps track of the wave files extracted from media files by the
+content of the media files rather than by their names."""
+
+__author__ = 'David Woods <dwoods@wcer.wisc.edu>'
+
+# Import Python's hashlib module
+import hashlib
+# Import Python's os module
+import os
+# Import Python's pickle module, for reading and writing the index file
+import pickle
+# Import Python's sys module
+import sys
+# Import Python's time module
+import time
+
+# The name of the Media Cache's index file, which is kept in the cache directory
+CACHE_INDEX_FILENAME = 'MediaCache.idx'
+# The version of the index file format
+CACHE_INDEX_VERSION = 1
+# A media file's fingerprint is calculated from its size and this many evenly spaced blocks of this many bytes,
+# so it takes the same time to calculate no matter how big the file is
+FINGERPRINT_BLOCKS = 16
+FINGERPRINT_BLOCK_SIZE = 65536
+
+
+def Fingerprint(filename):
+    """ Return a fingerprint of a file's contents, a string of hex digits that will be different if the file is
+        replaced by a different one, such as a re-encoded version, even if it has the same name.  Only part of the
+        file is read. """
+    # Start the fingerprint with the file's size
+    size = os.path.getsize(filename)
+    fingerprint = hashlib.sha1('%d:' % size)
+    mediaFile = open(filename, 'rb')
+    try:
+        # A small file is fingerprinted in full
+        if size <= FINGERPRINT_BLOCKS * FINGERPRINT_BLOCK_SIZE:
+            fingerprint.update(mediaFile.read())
+        # Otherwise, add blocks from the start of the file, the end of the file, and evenly spaced points in between
+        else:
+            for block in range(FINGERPRINT_BLOCKS):
+                mediaFile.seek((size - FINGERPRINT_BLOCK_SIZE) * block / (FINGERPRINT_BLOCKS - 1))
+                fingerprint.update(mediaFile.read(FINGERPRINT_BLOCK_SIZE))
+    finally:
+        mediaFile.close()
+    return fingerprint.hexdigest()
+
+
+class MediaCache(object):
+    """ A Media Cache names the wave files extracted from media files after a fingerprint of each media file's
+        contents, so that media files with the same name in different folders get different wave files, a media
+        file that is replaced by a different one is extracted again, and the same media file under different names
+        is only extracted once.
+
+        The cache's index file records the wave file for each fingerprint and when it was last used, so the least
+        recently used wave files (and their Peak Files) can be removed when the cache grows beyond its size limit.
+        It also remembers the size, modification time, and fingerprint of each media file it has seen, so a media
+        file is only read again when it has changed.  The index is read again before each change, so several
+        copies of Transana can share a cache directory. """
+
+    def __init__(self, cachePath, sizeLimit=0):
+        """ Create a Media Cache for the wave files in the cachePath directory.  If sizeLimit is more than 0, the
+            least recently used wave files are removed when the cache holds more than sizeLimit bytes. """
+        # Remember the cache directory and size limit
+        self.cachePath = cachePath
+        self.sizeLimit = sizeLimit
+        # The index file's name
+        self.indexFilename = os.path.join(cachePath, CACHE_INDEX_FILENAME)
+        # entries holds {'wave' : wave file name, 'lastUsed' : time} dictionaries by fingerprint
+        self.entries = {}
+        # sources holds (size, modification time, fingerprint) tuples by media file name
+        self.sources = {}
+
+    def Load(self):
+        """ Read the index file, if there is one """
+        try:
+            indexFile = open(self.indexFilename, 'rb')
+            try:
+                index = pickle.load(indexFile)
+            finally:
+                indexFile.close()
+            # Ignore an index file from a different version of the Media Cache
+            if index['version'] == CACHE_INDEX_VERSION:
+                self.entries = index['entries']
+                self.sources = index['sources']
+        except:
+            # If there's no index file (or it can't be read), start an empty cache
+            self.entries = {}
+            self.sources = {}
+
+    def Save(self):
+        """ Write the index file """
+        try:
+            # If the cache directory does not exist, create it.
+            if not os.path.exists(self.cachePath):
+                # (os.makedirs is a recursive call to create ALL needed folders!)
+                os.makedirs(self.cachePath)
+            # Write the index under a temporary name, so an incomplete index is never read
+            tempFilename = self.indexFilename + '.tmp'
+            indexFile = open(tempFilename, 'wb')
+            try:
+                pickle.dump({'version' : CACHE_INDEX_VERSION, 'entries' : self.entries, 'sources' : self.sources}, indexFile, pickle.HIGHEST_PROTOCOL)
+            finally:
+                indexFile.close()
+            # Replace the old index with the new one
+            if os.path.exists(self.indexFilename):
+                os.remove(self.indexFilename)
+            os.rename(tempFilename, self.indexFilename)
+        except:
+            # The index only saves time, so report the problem and carry on without it
+            print "MediaCache.Save():"
+            print sys.exc_info()[0], sys.exc_info()[1]
+
+    def GetFingerprint(self, mediaFilename):
+        """ Return the fingerprint of a media file, calculating it only if the file has changed since it was last seen """
+        # Identify the media file by its full path
+        key = os.path.normcase(os.path.abspath(mediaFilename))
+        size = os.path.getsize(mediaFilename)
+        modified = os.path.getmtime(mediaFilename)
+        # If we've seen this media file before, and its size and modification time are the same, use the fingerprint we have
+        if self.sources.has_key(key) and (self.sources[key][:2] == (size, modified)):
+            return self.sources[key][2]
+        # Otherwise, calculate the fingerprint and remember it
+        fingerprint = Fingerprint(mediaFilename)
+        self.sources[key] = (size, modified, fingerprint)
+        return fingerprint
+
+    def WaveFilename(self, mediaFilename):
+        """ Return (wave file name, exists) for a media file.  If the wave file already exists, it is marked as used.
+            If not, the wave file name is where the media file's audio should be extracted to, after which Add()
+            should be called. """
+        # Separate path and filename, and break the filename into root filename and extension
+        (filenameroot, extension) = os.path.splitext(os.path.basename(mediaFilename))
+        # The name used before the Media Cache, which is used when the media file can't be fingerprinted
+        legacyFilename = os.path.join(self.cachePath, filenameroot + '.wav')
+        try:
+            # Get the latest index
+            self.Load()
+            fingerprint = self.GetFingerprint(mediaFilename)
+            # If this media file's contents have been extracted before, use that wave file
+            if self.entries.has_key(fingerprint) and os.path.exists(os.path.join(self.cachePath, self.entries[fingerprint]['wave'])):
+                self.entries[fingerprint]['lastUsed'] = time.time()
+                self.Save()
+                return (os.path.join(self.cachePath, self.entries[fingerprint]['wave']), True)
+            # Otherwise, name the new wave file after the media file and its fingerprint.
+            # NOTE:  A wave file extracted before the Media Cache existed is NOT used, even if it has the right name.
+            #        It may have come from a different media file with the same name in another folder, and nothing
+            #        in the wave file tells us which media file it came from.
+            self.Save()
+            return (os.path.join(self.cachePath, '%s_%s.wav' % (filenameroot, fingerprint[:8])), False)
+        except:
+            # If the media file can't be read, fall back to naming the wave file after the media file
+            print "MediaCache.WaveFilename():"
+            print sys.exc_info()[0], sys.exc_info()[1]
+            return (legacyFilename, os.path.exists(legacyFilename))
+
+    def Add(self, mediaFilename, waveFilename):
+        """ Record the wave file extracted from a media file, then remove the least recently used wave files if the
+            cache is over its size limit """
+        try:
+            # Get the latest index
+            self.Load()
+            self.entries[self.GetFingerprint(mediaFilename)] = {'wave' : os.path.basename(waveFilename), 'lastUsed' : time.time()}
+            # Make room for the new wave file, if necessary, without removing it
+            self.Evict(keep=os.path.basename(waveFilename))
+            self.Save()
+        except:
+            print "MediaCache.Add():"
+            print sys.exc_info()[0], sys.exc_info()[1]
+
+    def CacheFiles(self, waveFilename):
+        """ Return the files in the cache directory that belong to a wave file:  the wave file and its Peak File """
+        return [os.path.join(self.cachePath, waveFilename), os.path.join(self.cachePath, os.path.splitext(waveFilename)[0] + '.pks')]
+
+    def Evict(self, keep=None):
+        """ Remove the least recently used wave files (other than keep) until the cache is within its size limit.
+            Returns (files removed, bytes freed). """
+        removed = 0
+        freed = 0
+        # If there's no size limit, there's nothing to do
+        if self.sizeLimit <= 0:
+            return (removed, freed)
+        # Determine the size of each wave file and its Peak File
+        sizes = {}
+        for entry in self.entries.values():
+            sizes[entry['wave']] = sum([os.path.getsize(filename) for filename in self.CacheFiles(entry['wave']) if os.path.exists(filename)])
+        total = sum(sizes.values())
+        # Go through the entries from least to most recently used, until the cache is small enough
+        for (fingerprint, entry) in sorted(self.entries.items(), key=lambda item: item[1]['lastUsed']):
+            if total <= self.sizeLimit:
+                break
+            if entry['wave'] == keep:
+                continue
+            try:
+                for filename in self.CacheFiles(entry['wave']):
+                    if os.path.exists(filename):
+                        os.remove(filename)
+                        removed += 1
+            except:
+                # A wave file that's in use can't be removed on Windows.  Leave it for later.
+                continue
+            del self.entries[fingerprint]
+            total -= sizes[entry['wave']]
+            freed += sizes[entry['wave']]
+        return (removed, freed)
+
+    def Cleanup(self):
+        """ Tidy the cache directory:  forget wave files that no longer exist and media files that no longer exist,
+            remove Peak Files and temporary files left behind, and remove the least recently used wave files if the
+            cache is over its size limit.  Wave files the cache doesn't know about are left alone.  Returns
+            (files removed, bytes freed). """
+        removed = 0
+        freed = 0
+        # Get the latest index
+        self.Load()
+        # Forget wave files that have been deleted
+        for fingerprint in self.entries.keys():
+            if not os.path.exists(os.path.join(self.cachePath, self.entries[fingerprint]['wave'])):
+                del self.entries[fingerprint]
+        # Forget media files that have been deleted
+        for key in self.sources.keys():
+            if not os.path.exists(key):
+                del self.sources[key]
+        # Remove Peak Files without wave files, and temporary files
+        if os.path.exists(self.cachePath):
+            for filename in os.listdir(self.cachePath):
+                (filenameroot, extension) = os.path.splitext(filename)
+                if ((extension.lower() == '.pks') and not os.path.exists(os.path.join(self.cachePath, filenameroot + '.wav'))) or \
+                   (extension.lower() == '.tmp'):
+                    try:
+                        size = os.path.getsize(os.path.join(self.cachePath, filename))
+                        os.remove(os.path.join(self.cachePath, filename))
+                        removed += 1
+                        freed += size
+                    except:
+                        print "MediaCache.Cleanup():"
+                        print sys.exc_info()[0], sys.exc_info()[1]
+        # Enforce the size limit
+        (evictRemoved, evictFreed) = self.Evict()
+        self.Save()
+        return (removed + evictRemoved, freed + evictFreed)
+
+
+# For testing purposes, this module can run stand-alone.
+if __name__ == '__main__':
+    import shutil
+    import tempfile
+
+    cachePath = tempfile.mkdtemp()
+    mediaPath = tempfile.mkdtemp()
+    try:
+        # Two different lectures with the same name in different folders, and a copy of the first under another name
+        os.mkdir(os.path.join(mediaPath, 'Fall'))
+        os.mkdir(os.path.join(mediaPath, 'Spring'))
+        open(os.path.join(mediaPath, 'Fall', 'Lecture1.mp4'), 'wb').write(os.urandom(3000000))
+        open(os.path.join(mediaPath, 'Spring', 'Lecture1.mp4'), 'wb').write(os.urandom(3000000))
+        shutil.copy(os.path.join(mediaPath, 'Fall', 'Lecture1.mp4'), os.path.join(mediaPath, 'Copy.mp4'))
+
+        cache = MediaCache(cachePath, sizeLimit=2500000)
+        # "Extract" the first lecture
+        (waveFilename, exists) = cache.WaveFilename(os.path.join(mediaPath, 'Fall', 'Lecture1.mp4'))
+        print "Fall lecture:    ", os.path.basename(waveFilename), exists
+        open(waveFilename, 'wb').write('x' * 1000000)
+        cache.Add(os.path.join(mediaPath, 'Fall', 'Lecture1.mp4'), waveFilename)
+        # The other lecture with the same name gets a different wave file
+        (waveFilename, exists) = cache.WaveFilename(os.path.join(mediaPath, 'Spring', 'Lecture1.mp4'))
+        print "Spring lecture:  ", os.path.basename(waveFilename), exists
+        open(waveFilename, 'wb').write('x' * 1000000)
+        cache.Add(os.path.join(mediaPath, 'Spring', 'Lecture1.mp4'), waveFilename)
+        # The copy uses the first lecture's wave file
+        (waveFilename, exists) = cache.WaveFilename(os.path.join(mediaPath, 'Copy.mp4'))
+        print "Copy:            ", os.path.basename(waveFilename), exists
+        # A re-encoded first lecture needs a new wave file
+        open(os.path.join(mediaPath, 'Fall', 'Lecture1.mp4'), 'wb').write(os.urandom(2000000))
+        (waveFilename, exists) = cache.WaveFilename(os.path.join(mediaPath, 'Fall', 'Lecture1.mp4'))
+        print "Re-encoded:      ", os.path.basename(waveFilename), exists
+        open(waveFilename, 'wb').write('x' * 1000000)
+        # Adding it takes the cache over its limit, so the least recently used wave file (the Spring lecture) is removed
+        cache.Add(os.path.join(mediaPath, 'Fall', 'Lecture1.mp4'), waveFilename)
+        print "Cache directory: ", sorted(os.listdir(cachePath))
+        # A wave file from before the Media Cache, which may be from either lecture, isn't used
+        open(os.path.join(cachePath, 'Lecture1.wav'), 'wb').write('x' * 1000)
+        (waveFilename, exists) = cache.WaveFilename(os.path.join(mediaPath, 'Spring', 'Lecture1.mp4'))
+        print "Old wave file:   ", os.path.basename(waveFilename), exists
+        os.remove(os.path.join(cachePath, 'Lecture1.wav'))
+        # Clean up a Peak File whose wave file is gone
+        open(os.path.join(cachePath, 'Old.pks'), 'wb').write('x' * 100)
+        print "Cleanup:          %d files removed, %d bytes freed" % cache.Cleanup()
+    finally:
+        shutil.rmtree(cachePath)
+        shutil.rmtree(mediaPath)
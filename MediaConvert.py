@@ -54,6 +54,8 @@ import multiprocessing
 import os, sys
 # import Python's shutil for fast file copies
 import shutil
+# import Python's subprocess module, for finding out about media files in a batch
+import subprocess
 
 # We MUST disable MPEG-1, MPEG-2, and MP3 formats for legal reasons.
 ENABLE_MPG = False  # DO NOT CHANGE THIS VALUE
@@ -64,14 +66,216 @@ ENABLE_MOV = False
 if ENABLE_MPG or ENABLE_MOV:
     print "MediaConvert:  MPG or MOV format enabled!!"
 
+# The video widths offered for video files.  Only widths no larger than the source video are offered.
+VIDEO_WIDTHS = [320, 400, 480, 560, 640, 720, 800, 1024, 1280, 1366, 1440, 1680, 1920]
+# The video bit rates (kb/s) offered for video files
+VIDEO_BITRATES = [100, 150, 200, 250, 300, 350, 500, 750, 1000, 1500, 2000, 2500, 3000, 5000]
+# The video bit rate (kb/s) selected by default, if the source video's bit rate is higher
+DEFAULT_VIDEO_BITRATE = 1500
+# The audio bit rates (kb/s) offered
+AUDIO_BITRATES = [32, 48, 56, 64, 80, 96, 128, 144, 192, 224, 256, 320, 384]
+# The audio bit rate (kb/s) selected by default, if the source audio's bit rate is higher.  It's "good enough" for analysis.
+DEFAULT_AUDIO_BITRATE = 192
+# The audio bit rates (kb/s) allowed by the MP2 specification, used in MPEG-1 files
+MP2_AUDIO_BITRATES = [32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384]
+# The audio sample rates (Hz) offered
+AUDIO_SAMPLERATES = [11025, 22050, 24000, 32000, 44100, 48000]
+# The name of the file, in the user's Transana directory, that holds the queue of a batch of conversions
+CONVERSION_QUEUE_FILENAME = 'ConversionQueue.pkl'
+
+
+def ParseMediaInfo(text):
+    """ Interpret the media file information FFmpeg reports with the second level of embedded feedback.  Returns a
+        dictionary whose keys are the names of the MediaConvert attributes that hold the information. """
+    # Start with the values for a file with no media streams
+    info = {'duration' : 0,
+            'bitrate' : 0,
+            'streams' : 0,
+            'vidStream' : False,
+            'vidCodec' : '',
+            'vidPixFmt' : '',
+            'vidBitrate' : 0,
+            'vidSizeW' : 0,
+            'vidSizeH' : 0,
+            'vidFrameRate' : 0,
+            'audStream' : False,
+            'audCodec' : '',
+            'audBitrate' : 0,
+            'audSampleRate' : 0,
+            'audChannels' : 0}
+    # Divide the text up into separate lines
+    text = text.replace('\r\n', '\n')
+    text = text.split('\n')
+    # Process the text one line at a time
+    for line in text:
+        # Divide the line up into its separate parameters
+        param = line.split(' ')
+        # If the line isn't blank and starts with an "x", indicating embedded feedback information ...
+        if (len(line) > 0) and (line[0] == 'x'):
+            # If the first parameter is just plain "x", we have a General Parameter
+            if param[0] == 'x':
+                # If Duration:
+                if param[1] == 'Duration:':
+                    # Get the Media File Duration
+                    info['duration'] = float(param[2])
+                # If Bitrate:
+                elif param[1] == 'Bitrate:':
+                    # Get the General Bitrate
+                    info['bitrate'] = int(param[2])
+                # If Streams:
+                elif param[1] == 'Streams:':
+                    # Get the Number of Streams
+                    info['streams'] = int(param[2])
+            # If the first paramer is "xv", we have a Video Parameter
+            elif param[0] == 'xv':
+                # If Stream
+                if param[1] == 'Stream':
+                    # We have a Video Stream
+                    info['vidStream'] = True
+                # If Codec:
+                elif param[1] == 'Codec:':
+                    # Get the Video Codec
+                    info['vidCodec'] = param[2]
+                # If Pix_Fmt:
+                elif param[1] == 'Pix_Fmt:':
+                    # Get the Picture Format
+                    info['vidPixFmt'] = param[2]
+                # If Bitrate:
+                elif param[1] == 'Bitrate:':
+                    # Get the Video Bit Rate
+                    info['vidBitrate'] = int(param[2])
+                # If FrameRate:
+                elif param[1] == 'FrameRate:':
+                    # Get Video Frame Rate
+                    info['vidFrameRate'] = float(param[2])
+                    # If the Frame Rate is negative ...
+                    if info['vidFrameRate'] < 0.0:
+                        # ... reset it to 0
+                        info['vidFrameRate'] = 0.0
+                # If Size:
+                elif param[1] == 'Size:':
+                    # Get video Width ...
+                    info['vidSizeW'] = int(param[2])
+                    # ... and Height
+                    info['vidSizeH'] = int(param[4])
+            # If the first paramer is "xa", we have an Audio Parameter
+            elif param[0] == 'xa':
+                # If Stream
+                if param[1] == 'Stream':
+                    # We have an Audio Stream
+                    info['audStream'] = True
+                # If Codec:
+                elif param[1] == 'Codec:':
+                    # Get the Audio Codec
+                    info['audCodec'] = param[2]
+                # If Bitrate:
+                elif param[1] == 'Bitrate:':
+                    # Get the Audio Bit Rate
+                    info['audBitrate'] = int(param[2])
+                # If SampleRate:
+                elif param[1] == 'SampleRate:':
+                    # Get Audio Sample Rate
+                    info['audSampleRate'] = int(param[2])
+                # If Channels:
+                elif param[1] == 'Channels:':
+                    # Get the Number of Audio Channels
+                    info['audChannels'] = int(param[2])
+            # Otherwise ...
+            else:
+                # ... we have an unknown parameter.  (This shouldn't occur.)
+                print "Unknown Parameter", param
+    return info
+
+def GetMediaInfo(filename):
+    """ Find out what a media file is made of, waiting for FFmpeg to report it.  Returns the dictionary described in
+        ParseMediaInfo(), which shows no media streams if the file can't be read. """
+    programStr = os.path.join(TransanaGlobal.programDir, 'ffmpeg_Transana')
+    if 'wxMSW' in wx.PlatformInfo:
+        programStr += '.exe'
+    # Ask for the second level of embedded feedback (file information) about the input file
+    command = [programStr, '-embedded', '2', '-i', filename]
+    # Encode the command for the file system, so that unicode file names are handled properly
+    command = [arg.encode(sys.getfilesystemencoding()) if isinstance(arg, unicode) else arg for arg in command]
+    # On Windows, FFmpeg is a console program.  Don't let it open a console window.
+    if 'wxMSW' in wx.PlatformInfo:
+        startupInfo = subprocess.STARTUPINFO()
+        startupInfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupInfo.wShowWindow = subprocess.SW_HIDE
+    else:
+        startupInfo = None
+    try:
+        # Run FFmpeg and collect the information it writes to its standard output.  (Standard input is a pipe so FFmpeg
+        # doesn't wait for keyboard commands.)
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   startupinfo=startupInfo)
+        (text, errors) = process.communicate()
+    except:
+        # If FFmpeg can't be run, report the problem and treat the file as unreadable
+        print "MediaConvert.GetMediaInfo():"
+        print sys.exc_info()[0], sys.exc_info()[1]
+        text = ''
+    return ParseMediaInfo(text)
+
+def DefaultSettings(info):
+    """ Determine the conversion settings the form selects by default for a media file, given the information from
+        ParseMediaInfo().  Returns (videoSize, videoBitrate, audioBitrate, audioSampleRate) as they appear in the form's
+        choice boxes.  Settings for a kind of stream the file doesn't have are blank. """
+    # Initialize all settings to blank
+    videoSize = videoBitrate = audioBitrate = audioSampleRate = ''
+    # If we have a Video stream ...
+    if info['vidStream']:
+        # The largest size offered is the source video size, unless that's larger than the largest width we allow
+        if (info['vidSizeW'] > VIDEO_WIDTHS[-1]) and (info['vidSizeW'] > 0):
+            videoSize = '%d x %d' % (VIDEO_WIDTHS[-1], int(info['vidSizeH'] * float(VIDEO_WIDTHS[-1]) / info['vidSizeW']))
+        else:
+            videoSize = '%d x %d' % (info['vidSizeW'], info['vidSizeH'])
+        # If the Video Bitrate is 0 (as seems to be true for AVI files), use the Overall Bit Rate
+        vidBitrate = info['vidBitrate']
+        if vidBitrate == 0:
+            vidBitrate = info['bitrate']
+        # Use the default video bit rate unless the source video's is lower
+        videoBitrate = str(min(vidBitrate, DEFAULT_VIDEO_BITRATE))
+    # If we have an Audio stream ...
+    if info['audStream']:
+        # Use the default audio bit rate unless the source audio's is lower
+        audioBitrate = str(min(info['audBitrate'], DEFAULT_AUDIO_BITRATE))
+        # Keep the source audio's sample rate
+        audioSampleRate = str(info['audSampleRate'])
+    return (videoSize, videoBitrate, audioBitrate, audioSampleRate)
+
+def FormatExtension(formatString):
+    """ Return the file extension for a Format choice, or '' if the choice isn't recognized """
+    # Based on the Format Selection (start of the text), determine the appropriate file extension.
+    if 'MPEG-1' in formatString:
+        return '.mpg'
+    elif 'MOV' in formatString:
+        return '.mov'
+    elif 'MPEG-4' in formatString:
+        return '.mp4'
+    elif 'MP3' in formatString:
+        return '.mp3'
+    elif 'WAV' in formatString:
+        return '.wav'
+    elif 'JPEG' in formatString:
+        return '.jpg'
+    else:
+        return ''
+
 # This simple derived class let's the user drop files onto an edit box
 class EditBoxFileDropTarget(wx.FileDropTarget):
-    def __init__(self, editbox):
+    def __init__(self, editbox, onDropMany=None):
         wx.FileDropTarget.__init__(self)
         self.editbox = editbox
+        # Remember the function to call when several files or a directory are dropped
+        self.onDropMany = onDropMany
     def OnDropFiles(self, x, y, files):
         """Called when a file is dragged onto the edit box."""
-        self.editbox.SetValue(files[0])
+        # If several files or a directory are dropped, and they can be handled, pass them on
+        if (self.onDropMany != None) and ((len(files) > 1) or os.path.isdir(files[0])):
+            # (Wait until the drop is done, as handling them may show dialogs.)
+            wx.CallAfter(self.onDropMany, files)
+        else:
+            self.editbox.SetValue(files[0])
 
 class MediaConvert(wx.Dialog):
     """ Transana's Media Conversion Tool Dialog Box. """
@@ -122,6 +326,8 @@ class MediaConvert(wx.Dialog):
         self.process = None
         # Create a dictionary for remembering the number of conversion processes currently running
         self.runningConversions = {}
+        # Initialize the Batch Progress Dialog, which runs a batch of conversions, to None, as there is no batch yet
+        self.batchDlg = None
 
         # Initialize all media file variables
         self.Reset()
@@ -156,8 +362,8 @@ class MediaConvert(wx.Dialog):
             self.txtSrcFileName.Enable(False)
         # If we're NOT exporting a Clip ...
         else:
-            # Make the Source File a File Drop Target
-            self.txtSrcFileName.SetDropTarget(EditBoxFileDropTarget(self.txtSrcFileName))
+            # Make the Source File a File Drop Target.  Several files or a directory dropped there are converted as a batch.
+            self.txtSrcFileName.SetDropTarget(EditBoxFileDropTarget(self.txtSrcFileName, self.ConvertBatch))
 
         # Handle ALL changes to the source filename
         self.txtSrcFileName.Bind(wx.EVT_TEXT, self.OnSrcFileNameChange)
@@ -351,6 +557,22 @@ class MediaConvert(wx.Dialog):
         # Create the boxButtons sizer, which will hold the dialog box's buttons
         boxButtons = wx.BoxSizer(wx.HORIZONTAL)
 
+        # Create a Convert Files button, for converting many files at once
+        self.btnBatchFiles = wx.Button(self, -1, _("Convert Files..."))
+        self.btnBatchFiles.Bind(wx.EVT_BUTTON, self.OnBatchBrowse)
+        boxButtons.Add(self.btnBatchFiles, 0, wx.ALIGN_LEFT | wx.ALIGN_BOTTOM | wx.RIGHT, 10)
+
+        # Create a Convert Folder button, for converting all the media files in a directory
+        self.btnBatchFolder = wx.Button(self, -1, _("Convert Folder..."))
+        self.btnBatchFolder.Bind(wx.EVT_BUTTON, self.OnBatchBrowse)
+        boxButtons.Add(self.btnBatchFolder, 0, wx.ALIGN_LEFT | wx.ALIGN_BOTTOM | wx.RIGHT, 10)
+
+        # Batches can't be used for Clips or snapshots, or in the DEMO version
+        if (self.clipDuration > 0) or snapshot or TransanaConstants.demoVersion:
+            # ... so disable the batch buttons
+            self.btnBatchFiles.Enable(False)
+            self.btnBatchFolder.Enable(False)
+
         # Create a Convert button
         self.btnConvert = wx.Button(self, -1, _("Convert"))
         # Set this as the default button
@@ -400,11 +622,17 @@ class MediaConvert(wx.Dialog):
         if (self.fileName != '') and (not (TransanaConstants.demoVersion) or snapshot):
             # ... process that file to prepare for conversion
             self.ProcessMediaFile(self.fileName)
+        # Otherwise, if batches are allowed ...
+        elif self.btnBatchFiles.IsEnabled():
+            # ... see if an interrupted batch should be resumed, once the dialog is showing
+            wx.CallAfter(self.ResumeBatch)
 
     def Reset(self):
         """ Initialize or Reset all variables associated with the Media File to be converted """
         # initialize the process variable
         self.process = None
+        # Media File Information, as reported by ParseMediaInfo()
+        self.mediaInfo = ParseMediaInfo('')
         # Media File Duration
         self.duration = 0
         # Overall Bit Rate
@@ -596,15 +824,10 @@ class MediaConvert(wx.Dialog):
                     
                 # ... read it!
                 text = stream.read()
-                # Divide the text up into separate lines
-                text = text.replace('\r\n', '\n')
-                text = text.split('\n')
-                # Process the input stream text one line at a time
-                for line in text:
-                    # Divide the line up into its separate parameters
-                    param = line.split(' ')
-
-                    if DEBUG:
+
+                if DEBUG:
+                    for line in text.replace('\r\n', '\n').split('\n'):
+                        param = line.split(' ')
                         tmpParamCount += 1
                         self.memo.AppendText("%8d '%s' " % (tmpParamCount, param[0]))
                         if len(param) > 1:
@@ -614,82 +837,12 @@ class MediaConvert(wx.Dialog):
                                 self.memo.AppendText("%s " % par)
                         self.memo.AppendText("(%s)" % len(line))
                         self.memo.AppendText("\n")
-                        
-                        
-                    # If the line isn't blank and starts with an "x", indicating embedded feedback information ...
-                    if (len(line) > 0) and (line[0] == 'x'):
-                        # If the first parameter is just plain "x", we have a General Parameter
-                        if param[0] == 'x':
-                            # If Duration:
-                            if param[1] == 'Duration:':
-                                # Get the Media File Duration
-                                self.duration = float(param[2])
-                            # If Bitrate:
-                            elif param[1] == 'Bitrate:':
-                                # Get the General Bitrate
-                                self.bitrate = int(param[2])
-                            # If Streams:
-                            elif param[1] == 'Streams:':
-                                # Get the Number of Streams
-                                self.streams = int(param[2])
-                        # If the first paramer is "xv", we have a Video Parameter
-                        elif param[0] == 'xv':
-                            # If Stream
-                            if param[1] == 'Stream':
-                                # We have a Video Stream
-                                self.vidStream = True
-                            # If Codec:
-                            elif param[1] == 'Codec:':
-                                # Get the Video Codec
-                                self.vidCodec = param[2]
-                            # If Pix_Fmt:
-                            elif param[1] == 'Pix_Fmt:':
-                                # Get the Picture Format
-                                self.vidPixFmt = param[2]
-                            # If Bitrate:
-                            elif param[1] == 'Bitrate:':
-                                # Get the Video Bit Rate
-                                self.vidBitrate = int(param[2])
-                            # If FrameRate:
-                            elif param[1] == 'FrameRate:':
-                                # Get Video Frame Rate
-                                self.vidFrameRate = float(param[2])
-                                # If the Frame Rate is negative ...
-                                if self.vidFrameRate < 0.0:
-                                    # ... reset it to 0
-                                    self.vidFrameRate == 0.0
-                            # If Size:
-                            elif param[1] == 'Size:':
-                                # Get video Width ...
-                                self.vidSizeW = int(param[2])
-                                # ... and Height
-                                self.vidSizeH = int(param[4])
-                        # If the first paramer is "xa", we have an Audio Parameter
-                        elif param[0] == 'xa':
-                            # If Stream
-                            if param[1] == 'Stream':
-                                self.audStream = True
-                                # We have an Audio Stream
-                            # If Codec:
-                            elif param[1] == 'Codec:':
-                                # Get the Audio Codec
-                                self.audCodec = param[2]
-                            # If Bitrate:
-                            elif param[1] == 'Bitrate:':
-                                # Get the Audio Bit Rate
-                                self.audBitrate = int(param[2])
-                            # If SampleRate:
-                            elif param[1] == 'SampleRate:':
-                                # Get Audio Sample Rate
-                                self.audSampleRate = int(param[2])
-                            # If Channels:
-                            elif param[1] == 'Channels:':
-                                # Get the Number of Audio Channels
-                                self.audChannels = int(param[2])
-                        # Otherwise ...
-                        else:
-                            # ... we have an unknown parameter.  (This shouldn't occur.)
-                            print "Unknown Parameter", param
+
+                # Interpret the file information FFmpeg reported
+                self.mediaInfo = ParseMediaInfo(text)
+                # Remember each item of it (self.duration, self.vidStream, etc.)
+                for key in self.mediaInfo.keys():
+                    setattr(self, key, self.mediaInfo[key])
 
             # Since the process has ended, destroy it.
             self.process.Destroy()
@@ -763,49 +916,14 @@ class MediaConvert(wx.Dialog):
                     self.videoSize.Clear()
                     # Add sizes as long as they are SMALLER than source video size.  (Calculate Heights for
                     # "standard" Width options)
-                    if self.vidSizeW >= 320:
-                        st = _('%d x %d') % (320, int(self.vidSizeH * 320.0 / self.vidSizeW))
-                        self.videoSize.Append(st)
-                    if self.vidSizeW >= 400:
-                        st = _('%d x %d') % (400, int(self.vidSizeH * 400.0 / self.vidSizeW))
-                        self.videoSize.Append(st)
-                    if self.vidSizeW >= 480:
-                        st = _('%d x %d') % (480, int(self.vidSizeH * 480.0 / self.vidSizeW))
-                        self.videoSize.Append(st)
-                    if self.vidSizeW >= 560:
-                        st = _('%d x %d') % (560, int(self.vidSizeH * 560.0 / self.vidSizeW))
-                        self.videoSize.Append(st)
-                    if self.vidSizeW >= 640:
-                        st = _('%d x %d') % (640, int(self.vidSizeH * 640.0 / self.vidSizeW))
-                        self.videoSize.Append(st)
-                    if self.vidSizeW >= 720:
-                        st = _('%d x %d') % (720, int(self.vidSizeH * 720.0 / self.vidSizeW))
-                        self.videoSize.Append(st)
-                    if self.vidSizeW >= 800:
-                        st = _('%d x %d') % (800, int(self.vidSizeH * 800.0 / self.vidSizeW))
-                        self.videoSize.Append(st)
-                    if self.vidSizeW >= 1024:
-                        st = _('%d x %d') % (1024, int(self.vidSizeH * 1024.0 / self.vidSizeW))
-                        self.videoSize.Append(st)
-                    if self.vidSizeW >= 1280:
-                        st = _('%d x %d') % (1280, int(self.vidSizeH * 1280.0 / self.vidSizeW))
-                        self.videoSize.Append(st)
-                    if self.vidSizeW >= 1366:
-                        st = _('%d x %d') % (1366, int(self.vidSizeH * 1366.0 / self.vidSizeW))
-                        self.videoSize.Append(st)
-                    if self.vidSizeW >= 1440:
-                        st = _('%d x %d') % (1440, int(self.vidSizeH * 1440.0 / self.vidSizeW))
-                        self.videoSize.Append(st)
-                    if self.vidSizeW >= 1680:
-                        st = _('%d x %d') % (1680, int(self.vidSizeH * 1680.0 / self.vidSizeW))
-                        self.videoSize.Append(st)
-                    if self.vidSizeW >= 1920:
-                        st = _('%d x %d') % (1920, int(self.vidSizeH * 1920.0 / self.vidSizeW))
-                        self.videoSize.Append(st)
+                    for width in VIDEO_WIDTHS:
+                        if self.vidSizeW >= width:
+                            st = _('%d x %d') % (width, int(self.vidSizeH * float(width) / self.vidSizeW))
+                            self.videoSize.Append(st)
 
                     # If the actual video size hasn't already been inserted, add it, UNLESS
                     # it is larger than 1920 pixels wide, which is our maximum
-                    if (not self.vidSizeW in [1920, 1680, 1440, 1366, 1280, 1024, 800, 720, 640, 560, 480, 400, 320]) and (self.vidSizeW <= 1920):
+                    if (not self.vidSizeW in VIDEO_WIDTHS) and (self.vidSizeW <= VIDEO_WIDTHS[-1]):
                         st = str(self.vidSizeW) + ' x ' + str(self.vidSizeH)
                         self.videoSize.Append(st)
                     # If more than one Video Size option exists ...
@@ -840,7 +958,7 @@ class MediaConvert(wx.Dialog):
                     # Clear the Video Bit Rate choice box
                     self.videoBitrate.Clear()
                     # Start with a list of "default" video bit rates
-                    bitrates = [100, 150, 200, 250, 300, 350, 500, 750, 1000, 1500, 2000, 2500, 3000, 5000]
+                    bitrates = VIDEO_BITRATES
                     # For each bit rate in the list ...
                     for bitrate in bitrates:
                         # ... if the File's Video Bit Rate is greater than the proposed bit rate setting ...
@@ -856,9 +974,9 @@ class MediaConvert(wx.Dialog):
                         # ... then add it to the choice box too
                         self.videoBitrate.Append(str(self.vidBitrate))
                     # if the Video Bitrate exceeds 1500 ...
-                    if self.vidBitrate >= 1500:
+                    if self.vidBitrate >= DEFAULT_VIDEO_BITRATE:
                         # ... then select 1500 as a reasonable bitrate
-                        self.videoBitrate.SetSelection(9)
+                        self.videoBitrate.SetSelection(VIDEO_BITRATES.index(DEFAULT_VIDEO_BITRATE))
                     # if the video bitrate is less than 1500
                     else:
                         # ... select the highest video bit rate in the list, which should match the source file's
@@ -882,7 +1000,7 @@ class MediaConvert(wx.Dialog):
                     # Clear the Audio Bit Rate choice box
                     self.audioBitrate.Clear()
                     # Start with a list of "default" audio bit rates
-                    bitrates = [32, 48, 56, 64, 80, 96, 128, 144, 192, 224, 256, 320, 384]
+                    bitrates = AUDIO_BITRATES
                     # For each bit rate in the list ...
                     for bitrate in bitrates:
                         # ... if the File's Audio Bit Rate is greater than the proposed bit rate setting ...
@@ -898,13 +1016,13 @@ class MediaConvert(wx.Dialog):
                         # ... then add it to the choice box too
                         self.audioBitrate.Append(str(self.audBitrate))
                     # If 192 kb/s is NOT among the audio bit rate options ...
-                    if self.audioBitrate.FindString('192') == wx.NOT_FOUND:
+                    if self.audioBitrate.FindString(str(DEFAULT_AUDIO_BITRATE)) == wx.NOT_FOUND:
                         # ... then select the highest audio bit rate in the list, which should match the source file's
                         self.audioBitrate.SetSelection(self.audioBitrate.GetCount() - 1)
                     # If 192 kb/s IS among the options ...
                     else:
                         # ... pick that.  It's "good enough" for analysis.
-                        self.audioBitrate.SetSelection(self.audioBitrate.FindString('192'))
+                        self.audioBitrate.SetSelection(self.audioBitrate.FindString(str(DEFAULT_AUDIO_BITRATE)))
                     # If there are multiple audio bit rate options and we're not doing a video snapshot ...
                     if (self.audioBitrate.GetCount() > 1) and not self.snapshot:
                         # Enable the audio bit rate choice box
@@ -913,7 +1031,7 @@ class MediaConvert(wx.Dialog):
                     # Clear the Audio Sampling Rate choice box
                     self.audioSampleRate.Clear()
                     # Start with a list of "default" audio sampling rates
-                    samplerates = [11025, 22050, 24000, 32000, 44100, 48000]
+                    samplerates = AUDIO_SAMPLERATES
                     # For each sample rate in the list ...
                     for samplerate in samplerates:
                         # ... if the File's Audio Sample Rate is greater than the proposed sample rate setting ...
@@ -1025,243 +1143,10 @@ class MediaConvert(wx.Dialog):
             if 'wxMSW' in wx.PlatformInfo:
                 # Set the Python Encoding to match the File System Encoding
                 wx.SetDefaultPyEncoding(sys.getfilesystemencoding())
-            # We need to build the Extraction command line in stages.  Start with the executable path and name,
-            # and add that we are using it embedded and want the first level of feedback (progress information),
-            # and specify the Input File name placeholder.
-            
-            ## THEORY:  Moving -ss parameter before -i parameter will speed up Clip Export and prevent Harrie's "Buffering
-            ##          several frames" problem.  "-async 1" will prevent audio-video synch problems.
-            ##          See http://ffmpeg.org/pipermail/ffmpeg-user/2011-April/000234.html
-            ## Implemented for Transana 2.61.  It appears to work exactly that way.
-            ##
-            ## Except, for Transana 3.0, I notice that I can't take Snapshots from MPEG-1 video!!
-
-##            FFmpegCommand = '"' + TransanaGlobal.programDir + os.sep + 'ffmpeg_Transana" "-embedded" "1" "-i" "%s"'
-            FFmpegCommand = '"' + TransanaGlobal.programDir + os.sep + 'ffmpeg_Transana" "-embedded" "1"'
-
-            # For CLIPS, add "-ss StartTime" and "-t Duration (seconds)"!!
-            if (not self.ext in ['.jpg']) and (self.clipDuration > 0):
-                FFmpegCommand += ' "-ss" "%0.5f" "-t" "%0.5f"' % (float(self.clipStart) / 1000.0, float(self.clipDuration) / 1000.0)
-
-            # If we're producing still images ...
-            if self.ext in ['.jpg']:
-                # Extract the extension of the source file name
-                (srcName, srcExt) = os.path.splitext(self.txtSrcFileName.GetValue())
-                # Some video formats have proven to be less reliable than others.  They seem to
-                # work well enough if we request 4 frames.
-                # Specifically, MPEG formats only seem to work with every third frame.  Weird.
-                # The value 4 was determined through trial-and-error.
-                numFramesForStill = 4
-
-                # AVI and WMV formats appear to have a frame rate of float(-1.#IND00), which also shows up as
-                # string('nan').  To check for this, we have to typecast the Frame Rate as a string.
-                # If the Video Frame Rate is "not a number" ...
-                if str(self.vidFrameRate) == 'nan':
-                    # ... then a frame rate of 30 fps can be used.
-                    tmpVidFrameRate = 30.0
-                # Otherwise ...
-                else:
-                    # ... just use the frame rate extracted from the video
-                    tmpVidFrameRate = self.vidFrameRate
-
-                # This syntax is SLOWER, but the other syntax doesn't work for MPEG video
-                if srcExt in ['.mpg', '.mpeg']:
-                    FFmpegCommand += ' "-i" "%s"'
-
-                # If we're doing a video snapshot ...
-                if self.snapshot:
-                    # Set the Clip Duration to the frame rate times the number of frames divided by 1000.
-                    # Hopefully, this will stop the DIVx Snapshot not stopping problem.  (It didn't.)
-                    self.clipDuration = round(tmpVidFrameRate * numFramesForStill) / 1000.0
-                    # ... then a frame rate of whatever the frame rate is and specifying the position of the desired frame is needed.
-                    # We need to adjust the start time one FRAME earlier!  We need to adjust the end time  4 FRAMES later.  Otherwise,
-                    # MPEG-1 video doesn't work every time!  I'm not sure why.  (This was determined experimentally.)
-                    FFmpegCommand += ' "-r" "%0.2f" "-ss" "%0.5f" "-t" "%0.5f"' % (tmpVidFrameRate, (float(self.clipStart) - (1.5 * tmpVidFrameRate))/ 1000.0, self.clipDuration)
-
-                # If we're NOT doing a snapshop, we need to get the proper frame rate to produce the correct pictures.
-                elif self.stillFrameRate.GetStringSelection() == _("20 seconds"):
-                    FFmpegCommand += ' "-r" "0.05"'
-                elif self.stillFrameRate.GetStringSelection() == _("15 seconds"):
-                    FFmpegCommand += ' "-r" "0.0666667"'
-                elif self.stillFrameRate.GetStringSelection() == _("10 seconds"):
-                    FFmpegCommand += ' "-r" "0.1"'
-                elif self.stillFrameRate.GetStringSelection() == _("5 seconds"):
-                    FFmpegCommand += ' "-r" "0.2"'
-                elif self.stillFrameRate.GetStringSelection() == _("1 second"):
-                    FFmpegCommand += ' "-r" "1"'
-
-                # This syntax is FASTER, but the doesn't work for MPEG video
-                if not srcExt in ['.mpg', '.mpeg']:
-                    FFmpegCommand += ' "-i" "%s"'
-
-            else:
-                FFmpegCommand += ' "-i" "%s"'
-
-            # Specify image size.  If we are creating a Video file ...
-            if self.vidStream and (self.ext in ['.mpg', '.mp4', '.mov', '.jpg']):
-                # ... Determine the current Video Size selection, and divide it up into its component parts
-                size = self.videoSize.GetStringSelection().split(' ')
-                # Supply the FFmpeg "-s" parameter and open the data quotes
-                FFmpegCommand += ' "-s" "'
-                # Build the size value.  (This essentially removes the internal spaces from the string)
-                for x in size:
-                    FFmpegCommand += x
-                # Close the data quotes.
-                FFmpegCommand += '"'
-
-            # Specify video bitrate and some additional parameters.  If we are creating a Video file ...
-            if self.vidStream and (self.ext in ['.mpg', '.mp4', '.mov']):
-                # If we are creating an MPEG-1 file ...
-                if self.ext == '.mpg':
-                    # ... specify the video codec as mpeg1video
-                    FFmpegCommand += ' "-vcodec" "mpeg1video"'
-                # If we are creating an MPEG-4 file ...
-                elif self.ext == '.mp4':
-                    # ... specify Four Motion Vector (mpeg4) and h.263 advanced introacoding / mpeg2 ac prediction
-                    FFmpegCommand += ' "-flags" "+mv4+aic"'
-
-                # Add the Video Bit Rate specification
-                FFmpegCommand += ' "-vb" "%dk"' % int(self.videoBitrate.GetStringSelection())
-
-                # if the Frame Rate is not UNKNOWN ...
-                if self.vidFrameRate > 0.0:
-                    # HD video with high frame rates (eg. 59.96 fps) don't play smoothly.
-                    # Frame Rate reduction causes problems if set to "29.97" or "30", but is okay at "29"
-                    if self.vidFrameRate > 30:
-                        # Let's max the Frame Rate out at 29 fps.
-                        FFmpegCommand += ' "-r" "29"'
-                        # Let's inform the user we changed their frame rate!
-                        self.memo.AppendText("\n" + _("Frame Rate reduced from %0.2f fps to 29 fps.") % self.vidFrameRate)
-                    # Otherwise ...
-                    else:
-                        # ... use the existing frame rate
-                        FFmpegCommand += ' "-r" "%0.2f"' % self.vidFrameRate
-
-            # If we have an Audio Stream to process ...
-            if self.audStream and not self.ext in ['.jpg']:
-                # If we are creating an MPEG-1 file ...
-                if self.ext == '.mpg':
-                    # ... specify the audio codes as mp2
-                    FFmpegCommand += ' "-acodec" "mp2"'
-
-                # Get the desired Audio Bitrate from the form
-                tmpAudioBitrate = int(self.audioBitrate.GetStringSelection())
-                # If we are creating an MPEG-1 file ...
-                if self.ext == '.mpg':
-                    # Check to see if the desired Audio Bit Rate is in the options allowed by the MP2 specification.  If not ...
-                    if not int(self.audioBitrate.GetStringSelection()) in [32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384]:
-                        # ... display a message to the user ...
-                        self.memo.AppendText("\n" + _("MPEG-1 supports only limited audio bit rate options.  Over-riding Audio Bit Rate setting."))
-                        # ... if the user has multiple options ...
-                        if self.audioBitrate.GetSelection() > 0:
-                            # ... pick the option just smaller than the user selected.  All the values in the list except the source file's
-                            #     original setting are legal values, so this MUST be legal!
-                            tmpAudioBitrate = int(self.audioBitrate.GetString(self.audioBitrate.GetSelection() - 1))
-                        # If there's only one value in the options list ...
-                        else:
-                            # ... just use 64.  (This was somewhat arbitrary, but is unlikely to be used.)
-                            tmpAudioBitrate = 64
-                # Add the Audio Bit Rate to the Conversion Command
-                FFmpegCommand += ' "-ab" "%dk"' % tmpAudioBitrate
-
-                # If we are creating an MPEG-1 file and we are supposed to use a Sample Rate less than 44,100 Hz ...
-                if (self.ext == '.mpg') and (int(self.audioSampleRate.GetStringSelection()) < 32000):
-                    # ... inform the user of the smallest legal Sample Rate value for MP2 audio
-                    self.memo.AppendText("\n" + _("MPEG-1 requires an Audio Sample Rate of at least 32,000.  Over-riding Audio Sample Rate.") + "\n")
-                    # ... and set the value to 32000
-                    FFmpegCommand += ' "-ar" "%d"' % 32000
-                # Otherwise ...
-                else:
-                    # ... use the Sample Rate from the form
-                    FFmpegCommand += ' "-ar" "%d"' % int(self.audioSampleRate.GetStringSelection())
-
-                # If there are more than 2 audio channels ...
-                if self.audChannels > 2:
-                    # ... then let's reduce the number down to just 2.
-                    FFmpegCommand += ' "-ac" "2"'
-                    
-            if not self.ext in ['.jpg']:
-                # For best quality media files, the FFmpeg site suggests the following:
-                #   -mbd rd                Macroblock Decision Algorithm "use best rate distortion"
-                #   -trellis 2             rate-distortion optimal quantization (whatever that means)
-                #   -cmp 2                 full pel me compare function (whatever that means)
-                #   -subcmp 2              sub pel me compare function (whatever that means)
-                FFmpegCommand += ' "-mbd" "rd" "-trellis" "2" "-cmp" "2" "-subcmp" "2"'
-
-            # If we are creating an MPEG-1 file ...
-            if self.ext == '.mpg':
-                # ... the FFmpeg web site recommends a "group picture size" of 100 and a pass value of 1/2
-                FFmpegCommand += ' "-g" "100" "-pass" "1/2"'
-            # if we are creating an MPEG-4 file ...
-            elif self.ext == '.mp4':
-                # ... the FFmpeg web site recommends a "group picture size" of 300 and a pass value of 1/2
-                FFmpegCommand += ' "-g" "300"'
-                # When bundled on OS X, this argument causes problems.
-                # Or perhaps it's due to network and permissions, as it returns a "permission denied" error.
-                # Let's leave it off everywhere!
-                if False or (not 'wxMac' in wx.PlatformInfo):
-                    FFmpegCommand += ' "-pass" "1/2"'
-            
-            # The Transana Demo restricts the length of file conversion to 10 minutes
-            if TransanaConstants.demoVersion and (self.duration > 600):
-                FFmpegCommand += ' "-t" "600"'
-
-##            # If we're producing still images ...
-##            if self.ext in ['.jpg']:
-##                # Extract the extension of the source file name
-##                (srcName, srcExt) = os.path.splitext(self.txtSrcFileName.GetValue())
-##                # Some video formats have proven to be less reliable than others.  They seem to
-##                # work well enough if we request 4 frames.
-##                # Specifically, MPEG formats only seem to work with every third frame.  Weird.
-##                # The value 4 was determined through trial-and-error.
-##                numFramesForStill = 4
-##
-##                # AVI and WMV formats appear to have a frame rate of float(-1.#IND00), which also shows up as
-##                # string('nan').  To check for this, we have to typecast the Frame Rate as a string.
-##                # If the Video Frame Rate is "not a number" ...
-##                if str(self.vidFrameRate) == 'nan':
-##                    # ... then a frame rate of 30 fps can be used.
-##                    tmpVidFrameRate = 30.0
-##                # Otherwise ...
-##                else:
-##                    # ... just use the frame rate extracted from the video
-##                    tmpVidFrameRate = self.vidFrameRate
-##
-##                # If we're doing a video snapshot ...
-##                if self.snapshot:
-##                    # Set the Clip Duration to the frame rate times the number of frames divided by 1000.
-##                    # Hopefully, this will stop the DIVx Snapshot not stopping problem.  (It didn't.)
-##                    self.clipDuration = round(tmpVidFrameRate * numFramesForStill) / 1000.0
-##                    # ... then a frame rate of whatever the frame rate is and specifying the position of the desired frame is needed.
-##                    # We need to adjust the start time one FRAME earlier!  We need to adjust the end time  4 FRAMES later.  Otherwise,
-##                    # MPEG-1 video doesn't work every time!  I'm not sure why.  (This was determined experimentally.)
-##                    FFmpegCommand += ' "-r" "%0.2f" "-ss" "%0.5f" "-t" "%0.5f"' % (tmpVidFrameRate, (float(self.clipStart) - (1.5 * tmpVidFrameRate))/ 1000.0, self.clipDuration)
-##
-##                # If we're NOT doing a snapshop, we need to get the proper frame rate to produce the correct pictures.
-##                elif self.stillFrameRate.GetStringSelection() == _("20 seconds"):
-##                    FFmpegCommand += ' "-r" "0.05"'
-##                elif self.stillFrameRate.GetStringSelection() == _("15 seconds"):
-##                    FFmpegCommand += ' "-r" "0.0666667"'
-##                elif self.stillFrameRate.GetStringSelection() == _("10 seconds"):
-##                    FFmpegCommand += ' "-r" "0.1"'
-##                elif self.stillFrameRate.GetStringSelection() == _("5 seconds"):
-##                    FFmpegCommand += ' "-r" "0.2"'
-##                elif self.stillFrameRate.GetStringSelection() == _("1 second"):
-##                    FFmpegCommand += ' "-r" "1"'
-
-## THEORY:  Moving -ss parameter before -i parameter will speed up Clip Export and prevent Harrie's "Buffering
-##          several frames" problem.  "-async 1" will prevent audio-video synch problems.
-##          See http://ffmpeg.org/pipermail/ffmpeg-user/2011-April/000234.html
-
-##            # For CLIPS, add "-ss StartTime" and "-t Duration (seconds)"!!
-##            if (not self.ext in ['.jpg']) and (self.clipDuration > 0):
-##                FFmpegCommand += ' "-ss" "%0.5f" "-t" "%0.5f"' % (float(self.clipStart) / 1000.0, float(self.clipDuration) / 1000.0)
-
-            if (not self.ext in ['.jpg']) and (self.clipDuration > 0):
-                FFmpegCommand += ' "-async" "1"'
-
-            # Add the "-y" parameter to over-write files, and append the destination file name placeholder
-            FFmpegCommand += ' "-y" "%s"'
+            # Build the conversion command from the format and settings on the form
+            FFmpegCommand = self.BuildCommand(self.txtSrcFileName.GetValue(), self.ext, self.mediaInfo, self.videoSize.GetStringSelection(),
+                                              self.videoBitrate.GetStringSelection(), self.audioBitrate.GetStringSelection(),
+                                              self.audioSampleRate.GetStringSelection())
 
             # Create the prompt for the progress dialog
             prompt = unicode(_("Converting %s\n to %s"), 'utf8') % (self.txtSrcFileName.GetValue(), self.txtDestFileName.GetValue())
@@ -1347,6 +1232,249 @@ class MediaConvert(wx.Dialog):
 #            progressDlg.Destroy()
 
 
+    def BuildCommand(self, srcFilename, ext, info, videoSize, videoBitrate, audioBitrate, audioSampleRate):
+        """ Build the FFmpeg command that converts srcFilename to the format with extension ext.  info is the media file
+            information from ParseMediaInfo().  videoSize, videoBitrate, audioBitrate, and audioSampleRate are settings
+            as they appear in the form's choice boxes.  The command has placeholders for the input and output file names. """
+        # We need to build the Extraction command line in stages.  Start with the executable path and name,
+        # and add that we are using it embedded and want the first level of feedback (progress information),
+        # and specify the Input File name placeholder.
+        
+        ## THEORY:  Moving -ss parameter before -i parameter will speed up Clip Export and prevent Harrie's "Buffering
+        ##          several frames" problem.  "-async 1" will prevent audio-video synch problems.
+        ##          See http://ffmpeg.org/pipermail/ffmpeg-user/2011-April/000234.html
+        ## Implemented for Transana 2.61.  It appears to work exactly that way.
+        ##
+        ## Except, for Transana 3.0, I notice that I can't take Snapshots from MPEG-1 video!!
+
+##            FFmpegCommand = '"' + TransanaGlobal.programDir + os.sep + 'ffmpeg_Transana" "-embedded" "1" "-i" "%s"'
+        FFmpegCommand = '"' + TransanaGlobal.programDir + os.sep + 'ffmpeg_Transana" "-embedded" "1"'
+
+        # For CLIPS, add "-ss StartTime" and "-t Duration (seconds)"!!
+        if (not ext in ['.jpg']) and (self.clipDuration > 0):
+            FFmpegCommand += ' "-ss" "%0.5f" "-t" "%0.5f"' % (float(self.clipStart) / 1000.0, float(self.clipDuration) / 1000.0)
+
+        # If we're producing still images ...
+        if ext in ['.jpg']:
+            # Extract the extension of the source file name
+            (srcName, srcExt) = os.path.splitext(srcFilename)
+            # Some video formats have proven to be less reliable than others.  They seem to
+            # work well enough if we request 4 frames.
+            # Specifically, MPEG formats only seem to work with every third frame.  Weird.
+            # The value 4 was determined through trial-and-error.
+            numFramesForStill = 4
+
+            # AVI and WMV formats appear to have a frame rate of float(-1.#IND00), which also shows up as
+            # string('nan').  To check for this, we have to typecast the Frame Rate as a string.
+            # If the Video Frame Rate is "not a number" ...
+            if str(info['vidFrameRate']) == 'nan':
+                # ... then a frame rate of 30 fps can be used.
+                tmpVidFrameRate = 30.0
+            # Otherwise ...
+            else:
+                # ... just use the frame rate extracted from the video
+                tmpVidFrameRate = info['vidFrameRate']
+
+            # This syntax is SLOWER, but the other syntax doesn't work for MPEG video
+            if srcExt in ['.mpg', '.mpeg']:
+                FFmpegCommand += ' "-i" "%s"'
+
+            # If we're doing a video snapshot ...
+            if self.snapshot:
+                # Set the Clip Duration to the frame rate times the number of frames divided by 1000.
+                # Hopefully, this will stop the DIVx Snapshot not stopping problem.  (It didn't.)
+                self.clipDuration = round(tmpVidFrameRate * numFramesForStill) / 1000.0
+                # ... then a frame rate of whatever the frame rate is and specifying the position of the desired frame is needed.
+                # We need to adjust the start time one FRAME earlier!  We need to adjust the end time  4 FRAMES later.  Otherwise,
+                # MPEG-1 video doesn't work every time!  I'm not sure why.  (This was determined experimentally.)
+                FFmpegCommand += ' "-r" "%0.2f" "-ss" "%0.5f" "-t" "%0.5f"' % (tmpVidFrameRate, (float(self.clipStart) - (1.5 * tmpVidFrameRate))/ 1000.0, self.clipDuration)
+
+            # If we're NOT doing a snapshop, we need to get the proper frame rate to produce the correct pictures.
+            elif self.stillFrameRate.GetStringSelection() == _("20 seconds"):
+                FFmpegCommand += ' "-r" "0.05"'
+            elif self.stillFrameRate.GetStringSelection() == _("15 seconds"):
+                FFmpegCommand += ' "-r" "0.0666667"'
+            elif self.stillFrameRate.GetStringSelection() == _("10 seconds"):
+                FFmpegCommand += ' "-r" "0.1"'
+            elif self.stillFrameRate.GetStringSelection() == _("5 seconds"):
+                FFmpegCommand += ' "-r" "0.2"'
+            elif self.stillFrameRate.GetStringSelection() == _("1 second"):
+                FFmpegCommand += ' "-r" "1"'
+
+            # This syntax is FASTER, but the doesn't work for MPEG video
+            if not srcExt in ['.mpg', '.mpeg']:
+                FFmpegCommand += ' "-i" "%s"'
+
+        else:
+            FFmpegCommand += ' "-i" "%s"'
+
+        # Specify image size.  If we are creating a Video file ...
+        if info['vidStream'] and (ext in ['.mpg', '.mp4', '.mov', '.jpg']):
+            # ... Determine the current Video Size selection, and divide it up into its component parts
+            size = videoSize.split(' ')
+            # Supply the FFmpeg "-s" parameter and open the data quotes
+            FFmpegCommand += ' "-s" "'
+            # Build the size value.  (This essentially removes the internal spaces from the string)
+            for x in size:
+                FFmpegCommand += x
+            # Close the data quotes.
+            FFmpegCommand += '"'
+
+        # Specify video bitrate and some additional parameters.  If we are creating a Video file ...
+        if info['vidStream'] and (ext in ['.mpg', '.mp4', '.mov']):
+            # If we are creating an MPEG-1 file ...
+            if ext == '.mpg':
+                # ... specify the video codec as mpeg1video
+                FFmpegCommand += ' "-vcodec" "mpeg1video"'
+            # If we are creating an MPEG-4 file ...
+            elif ext == '.mp4':
+                # ... specify Four Motion Vector (mpeg4) and h.263 advanced introacoding / mpeg2 ac prediction
+                FFmpegCommand += ' "-flags" "+mv4+aic"'
+
+            # Add the Video Bit Rate specification
+            FFmpegCommand += ' "-vb" "%dk"' % int(videoBitrate)
+
+            # if the Frame Rate is not UNKNOWN ...
+            if info['vidFrameRate'] > 0.0:
+                # HD video with high frame rates (eg. 59.96 fps) don't play smoothly.
+                # Frame Rate reduction causes problems if set to "29.97" or "30", but is okay at "29"
+                if info['vidFrameRate'] > 30:
+                    # Let's max the Frame Rate out at 29 fps.
+                    FFmpegCommand += ' "-r" "29"'
+                    # Let's inform the user we changed their frame rate!
+                    self.memo.AppendText("\n" + _("Frame Rate reduced from %0.2f fps to 29 fps.") % info['vidFrameRate'])
+                # Otherwise ...
+                else:
+                    # ... use the existing frame rate
+                    FFmpegCommand += ' "-r" "%0.2f"' % info['vidFrameRate']
+
+        # If we have an Audio Stream to process ...
+        if info['audStream'] and not ext in ['.jpg']:
+            # If we are creating an MPEG-1 file ...
+            if ext == '.mpg':
+                # ... specify the audio codes as mp2
+                FFmpegCommand += ' "-acodec" "mp2"'
+
+            # Get the desired Audio Bitrate
+            tmpAudioBitrate = int(audioBitrate)
+            # If we are creating an MPEG-1 file ...
+            if ext == '.mpg':
+                # Check to see if the desired Audio Bit Rate is in the options allowed by the MP2 specification.  If not ...
+                if not tmpAudioBitrate in MP2_AUDIO_BITRATES:
+                    # ... display a message to the user ...
+                    self.memo.AppendText("\n" + _("MPEG-1 supports only limited audio bit rate options.  Over-riding Audio Bit Rate setting."))
+                    # ... if there are legal options smaller than the bit rate requested ...
+                    if tmpAudioBitrate > MP2_AUDIO_BITRATES[0]:
+                        # ... pick the largest of them
+                        tmpAudioBitrate = max([bitrate for bitrate in MP2_AUDIO_BITRATES if bitrate < tmpAudioBitrate])
+                    # If there are none ...
+                    else:
+                        # ... just use 64.  (This was somewhat arbitrary, but is unlikely to be used.)
+                        tmpAudioBitrate = 64
+            # Add the Audio Bit Rate to the Conversion Command
+            FFmpegCommand += ' "-ab" "%dk"' % tmpAudioBitrate
+
+            # If we are creating an MPEG-1 file and we are supposed to use a Sample Rate less than 44,100 Hz ...
+            if (ext == '.mpg') and (int(audioSampleRate) < 32000):
+                # ... inform the user of the smallest legal Sample Rate value for MP2 audio
+                self.memo.AppendText("\n" + _("MPEG-1 requires an Audio Sample Rate of at least 32,000.  Over-riding Audio Sample Rate.") + "\n")
+                # ... and set the value to 32000
+                FFmpegCommand += ' "-ar" "%d"' % 32000
+            # Otherwise ...
+            else:
+                # ... use the Sample Rate from the form
+                FFmpegCommand += ' "-ar" "%d"' % int(audioSampleRate)
+
+            # If there are more than 2 audio channels ...
+            if info['audChannels'] > 2:
+                # ... then let's reduce the number down to just 2.
+                FFmpegCommand += ' "-ac" "2"'
+                
+        if not ext in ['.jpg']:
+            # For best quality media files, the FFmpeg site suggests the following:
+            #   -mbd rd                Macroblock Decision Algorithm "use best rate distortion"
+            #   -trellis 2             rate-distortion optimal quantization (whatever that means)
+            #   -cmp 2                 full pel me compare function (whatever that means)
+            #   -subcmp 2              sub pel me compare function (whatever that means)
+            FFmpegCommand += ' "-mbd" "rd" "-trellis" "2" "-cmp" "2" "-subcmp" "2"'
+
+        # If we are creating an MPEG-1 file ...
+        if ext == '.mpg':
+            # ... the FFmpeg web site recommends a "group picture size" of 100 and a pass value of 1/2
+            FFmpegCommand += ' "-g" "100" "-pass" "1/2"'
+        # if we are creating an MPEG-4 file ...
+        elif ext == '.mp4':
+            # ... the FFmpeg web site recommends a "group picture size" of 300 and a pass value of 1/2
+            FFmpegCommand += ' "-g" "300"'
+            # When bundled on OS X, this argument causes problems.
+            # Or perhaps it's due to network and permissions, as it returns a "permission denied" error.
+            # Let's leave it off everywhere!
+            if False or (not 'wxMac' in wx.PlatformInfo):
+                FFmpegCommand += ' "-pass" "1/2"'
+        
+        # The Transana Demo restricts the length of file conversion to 10 minutes
+        if TransanaConstants.demoVersion and (info['duration'] > 600):
+            FFmpegCommand += ' "-t" "600"'
+
+##            # If we're producing still images ...
+##            if self.ext in ['.jpg']:
+##                # Extract the extension of the source file name
+##                (srcName, srcExt) = os.path.splitext(self.txtSrcFileName.GetValue())
+##                # Some video formats have proven to be less reliable than others.  They seem to
+##                # work well enough if we request 4 frames.
+##                # Specifically, MPEG formats only seem to work with every third frame.  Weird.
+##                # The value 4 was determined through trial-and-error.
+##                numFramesForStill = 4
+##
+##                # AVI and WMV formats appear to have a frame rate of float(-1.#IND00), which also shows up as
+##                # string('nan').  To check for this, we have to typecast the Frame Rate as a string.
+##                # If the Video Frame Rate is "not a number" ...
+##                if str(self.vidFrameRate) == 'nan':
+##                    # ... then a frame rate of 30 fps can be used.
+##                    tmpVidFrameRate = 30.0
+##                # Otherwise ...
+##                else:
+##                    # ... just use the frame rate extracted from the video
+##                    tmpVidFrameRate = self.vidFrameRate
+##
+##                # If we're doing a video snapshot ...
+##                if self.snapshot:
+##                    # Set the Clip Duration to the frame rate times the number of frames divided by 1000.
+##                    # Hopefully, this will stop the DIVx Snapshot not stopping problem.  (It didn't.)
+##                    self.clipDuration = round(tmpVidFrameRate * numFramesForStill) / 1000.0
+##                    # ... then a frame rate of whatever the frame rate is and specifying the position of the desired frame is needed.
+##                    # We need to adjust the start time one FRAME earlier!  We need to adjust the end time  4 FRAMES later.  Otherwise,
+##                    # MPEG-1 video doesn't work every time!  I'm not sure why.  (This was determined experimentally.)
+##                    FFmpegCommand += ' "-r" "%0.2f" "-ss" "%0.5f" "-t" "%0.5f"' % (tmpVidFrameRate, (float(self.clipStart) - (1.5 * tmpVidFrameRate))/ 1000.0, self.clipDuration)
+##
+##                # If we're NOT doing a snapshop, we need to get the proper frame rate to produce the correct pictures.
+##                elif self.stillFrameRate.GetStringSelection() == _("20 seconds"):
+##                    FFmpegCommand += ' "-r" "0.05"'
+##                elif self.stillFrameRate.GetStringSelection() == _("15 seconds"):
+##                    FFmpegCommand += ' "-r" "0.0666667"'
+##                elif self.stillFrameRate.GetStringSelection() == _("10 seconds"):
+##                    FFmpegCommand += ' "-r" "0.1"'
+##                elif self.stillFrameRate.GetStringSelection() == _("5 seconds"):
+##                    FFmpegCommand += ' "-r" "0.2"'
+##                elif self.stillFrameRate.GetStringSelection() == _("1 second"):
+##                    FFmpegCommand += ' "-r" "1"'
+
+## THEORY:  Moving -ss parameter before -i parameter will speed up Clip Export and prevent Harrie's "Buffering
+##          several frames" problem.  "-async 1" will prevent audio-video synch problems.
+##          See http://ffmpeg.org/pipermail/ffmpeg-user/2011-April/000234.html
+
+##            # For CLIPS, add "-ss StartTime" and "-t Duration (seconds)"!!
+##            if (not self.ext in ['.jpg']) and (self.clipDuration > 0):
+##                FFmpegCommand += ' "-ss" "%0.5f" "-t" "%0.5f"' % (float(self.clipStart) / 1000.0, float(self.clipDuration) / 1000.0)
+
+        if (not ext in ['.jpg']) and (self.clipDuration > 0):
+            FFmpegCommand += ' "-async" "1"'
+
+        # Add the "-y" parameter to over-write files, and append the destination file name placeholder
+        FFmpegCommand += ' "-y" "%s"'
+
+        return FFmpegCommand
+
     def OnConvertComplete(self, progressDlg):
 
         if DEBUG:
@@ -1439,8 +1567,8 @@ class MediaConvert(wx.Dialog):
             if len(self.runningConversions) == 0:
                 # ... reset the label of the button to Close ...
                 self.btnClose.SetLabel(_('Close'))
-                # ... enable the Close button ...
-                self.btnClose.Enable(True)
+                # ... enable the Close button, unless a batch is still running ...
+                self.btnClose.Enable(self.batchDlg == None)
                 # ... and redo the layout to resize the button
                 self.Layout()
             # If we have exactly ONE conversion remaining ...
@@ -1461,10 +1589,285 @@ class MediaConvert(wx.Dialog):
                 # ... let's close the dialog automatically!
                 self.Close()
 
+    def OnBatchBrowse(self, event):
+        """ Convert Files and Convert Folder Button event handler """
+        # If triggered by the Convert Files button ...
+        if event.GetId() == self.btnBatchFiles.GetId():
+            # Get Transana's File Filter definitions
+            fileTypesString = TransanaConstants.fileTypesString
+            # Create a File Open dialog that allows multiple file selections
+            fs = wx.FileDialog(self, _('Select the media files to convert:'),
+                            self.lastPath,
+                            "",
+                            fileTypesString, 
+                            wx.FD_OPEN | wx.FD_FILE_MUST_EXIST | wx.FD_MULTIPLE)
+            # Select "All Media Files" as the initial Filter
+            fs.SetFilterIndex(1)
+            # Show the dialog and get user response.  If OK ...
+            if fs.ShowModal() == wx.ID_OK:
+                # ... get the selected files
+                paths = fs.GetPaths()
+                # Remember the path of the first file selected for use next time
+                (self.lastPath, filename) = os.path.split(fs.GetPath())
+            else:
+                paths = []
+            # Destroy the File Dialog
+            fs.Destroy()
+        # If triggered by the Convert Folder button ...
+        else:
+            # Build a dialog that requests that the user select a directory
+            dlg = wx.DirDialog(self, _('Select a directory that contains the media files to convert:'), self.lastPath, style=wx.DD_DEFAULT_STYLE)
+            # Show the dialog and see if the user pressed OK
+            if dlg.ShowModal() == wx.ID_OK:
+                # ... get the selected directory
+                paths = [dlg.GetPath()]
+                # Remember the path for reuse
+                self.lastPath = dlg.GetPath()
+            else:
+                paths = []
+            # Destroy the Dialog
+            dlg.Destroy()
+        # If files or a directory were selected ...
+        if len(paths) > 0:
+            # ... convert them
+            self.ConvertBatch(paths)
+
+    def ConvertBatch(self, paths):
+        """ Convert a batch of media files.  paths is a list of media files and directories.  All the media files in the
+            directories and their subdirectories are included.  Each file is converted to the format the user selects,
+            with the settings the form selects for that file by default, in the file's own directory.  Several
+            conversions run at once, up to the number set in Options > Settings. """
+        # Only one batch can run at a time
+        if self.batchDlg != None:
+            return
+        # Make a list of the media files to be converted
+        filenames = []
+        for path in paths:
+            # If we have a directory ...
+            if os.path.isdir(path):
+                # ... traverse through all files and subdirectories, in order
+                for (root, dirs, files) in os.walk(path):
+                    dirs.sort()
+                    for name in sorted(files):
+                        # If the extension is in the list of supported media types ...
+                        if os.path.splitext(name)[1][1:].lower() in TransanaConstants.mediaFileTypes:
+                            # ... add the file to the list
+                            filenames.append(os.path.join(root, name))
+            # If we have a file ...
+            elif os.path.exists(path):
+                # ... add it to the list
+                filenames.append(path)
+        # If there are no media files ...
+        if len(filenames) == 0:
+            # ... tell the user, and stop
+            errDlg = Dialogs.ErrorDialog(self, unicode(_('No media files were found.'), 'utf8'))
+            errDlg.ShowModal()
+            errDlg.Destroy()
+            return
+
+        # Build the list of formats.  Each file can only be converted to the formats its streams allow.
+        choices = []
+        if ENABLE_MPG:
+            choices.append(_("MPEG-1 - An excellent choice for video files"))
+        choices.append(_("MPEG-4 - Efficient video compression, with moderate responsiveness"))
+        if ENABLE_MOV:
+            choices.append(_("MOV - An excellent choice for multiple simultaneous video files"))
+        if ENABLE_MPG:
+            choices.append(_("MP3 - Compressed audio files"))
+        choices.append(_("WAV - Uncompressed audio files"))
+        choices.append(_("JPEG - Create still images from video files"))
+        # Ask the user for the format
+        prompt = unicode(_('Select a format for the %d media files:'), 'utf8') % len(filenames)
+        dlg = wx.SingleChoiceDialog(self, prompt, _('Media File Conversion'), choices)
+        # Start with the format selected on the form, if there is one
+        if self.format.GetStringSelection() in choices:
+            dlg.SetSelection(choices.index(self.format.GetStringSelection()))
+        # If the user presses OK ...
+        if dlg.ShowModal() == wx.ID_OK:
+            # ... get the selected format's file extension
+            ext = FormatExtension(dlg.GetStringSelection())
+        else:
+            ext = ''
+        dlg.Destroy()
+        # If the user cancelled, stop
+        if ext == '':
+            return
+
+        # Determine the tag added to converted file names, just as SetOutputFilename() does
+        if TransanaGlobal.configData.LayoutDirection == wx.Layout_LeftToRight:
+            analysisTag = unicode(_('-Analysis'), 'utf8')
+        else:
+            analysisTag = unicode('-Analysis', 'utf8')
+
+        # Clear the Information box
+        self.memo.Clear()
+        # Create a Progress Dialog, as finding out about many media files takes a while
+        progress = wx.ProgressDialog(_("Media File Conversion"), _("Examining media files"), len(filenames), self)
+        # Initialize the list of conversions and the list of the output files they will create
+        jobs = []
+        outputFiles = []
+        for fileCount in range(len(filenames)):
+            # Update the progress dialog
+            progress.Update(fileCount)
+            filename = filenames[fileCount]
+            # Separate path, file name, and extension
+            (path, name) = os.path.split(filename)
+            (root, srcExt) = os.path.splitext(name)
+            # Skip files that have already been converted for analysis
+            if root.endswith(analysisTag):
+                continue
+            # Build the output file name in the source file's directory
+            if ext == '.jpg':
+                outputFile = os.path.join(path, root + _('_%06d') + ext)
+            else:
+                outputFile = os.path.join(path, root + analysisTag + ext)
+            # If the output file already exists, or another file in the batch would create it ...
+            if os.path.exists(outputFile.replace('%06d', '%06d' % 1)) or (outputFile in outputFiles):
+                # ... skip the file
+                prompt = unicode(_('File "%s" already exists.  "%s" was skipped.'), 'utf8')
+                self.memo.AppendText(prompt % (outputFile, filename) + '\n')
+                continue
+            # If we're on Windows ...
+            if 'wxMSW' in wx.PlatformInfo:
+                try:
+                    # Find out if the file names can be converted to cp1252 encoding.
+                    # FFmpeg cannot handle files that are not cp1252 encodable on Windows!
+                    filename.encode('cp1252')
+                    outputFile.encode('cp1252')
+                # Files that need to be temporarily copied can't be converted in a batch
+                except exceptions.UnicodeEncodeError:
+                    prompt = unicode(_('The file name "%s" is not compatible with FFmpeg.  Please convert this file by itself.'), 'utf8')
+                    self.memo.AppendText(prompt % filename + '\n')
+                    continue
+            # Find out what the file is made of
+            info = GetMediaInfo(filename)
+            # If the file doesn't have the stream the format needs ...
+            if ((ext in ['.mpg', '.mp4', '.mov', '.jpg']) and not info['vidStream']) or \
+               ((ext in ['.mp3', '.wav']) and not info['audStream']):
+                # ... skip the file
+                prompt = unicode(_('File "%s" cannot be converted to this format.'), 'utf8')
+                self.memo.AppendText(prompt % filename + '\n')
+                continue
+            # Build the conversion command, using the settings the form would select for this file by default
+            (videoSize, videoBitrate, audioBitrate, audioSampleRate) = DefaultSettings(info)
+            FFmpegCommand = self.BuildCommand(filename, ext, info, videoSize, videoBitrate, audioBitrate, audioSampleRate)
+            # Create the prompt for the conversion
+            prompt = unicode(_("Converting %s\n to %s"), 'utf8') % (filename, outputFile)
+            # Add the conversion to the list
+            jobs.append({'inputFile' : filename,
+                         'outputFile' : outputFile,
+                         'processCommand' : FFmpegCommand,
+                         'label' : prompt,
+                         'duration' : info['duration']})
+            outputFiles.append(outputFile)
+        # Destroy the Progress Dialog
+        progress.Destroy()
+
+        # If there's nothing to convert ...
+        if len(jobs) == 0:
+            # ... tell the user, and stop
+            self.memo.AppendText('\n' + unicode(_('No media files need to be converted.'), 'utf8') + '\n')
+        else:
+            # ... start the batch
+            self.StartBatch(jobs)
+
+    def StartBatch(self, jobs):
+        """ Start a batch of conversions.  jobs is a list of dictionaries whose keys are names of the Batch Progress
+            Dialog's AddJob() parameters. """
+        # The queue of conversions is saved as the batch goes, so an interrupted batch can be resumed
+        queueFilename = os.path.join(TransanaGlobal.configData.GetDefaultProfilePath(), CONVERSION_QUEUE_FILENAME)
+        # Create a Batch Progress Dialog, which runs the conversions and shows their progress
+        self.batchDlg = WaveformProgress.BatchProgress(self, unicode(_('Batch Media Conversion'), 'utf8'), onComplete=self.OnBatchComplete,
+                                                       queueFilename=queueFilename)
+        # Add each conversion to the batch
+        for job in jobs:
+            self.batchDlg.AddJob(job['inputFile'], job['outputFile'], mode='CustomConvert', label=job['label'],
+                                 processCommand=job['processCommand'], duration=job['duration'])
+        # Add the number of conversions and the number that run at once to the Memo
+        prompt = unicode(_('Converting %d media files, %d at a time'), 'utf8')
+        self.memo.AppendText('\n' + prompt % (len(jobs), self.batchDlg.processLimit) + '\n\n')
+        # Only one batch can run at a time, and the form can't be closed while it runs
+        self.btnBatchFiles.Enable(False)
+        self.btnBatchFolder.Enable(False)
+        self.btnClose.Enable(False)
+        # Start the conversions
+        self.batchDlg.Start()
+
+    def ResumeBatch(self):
+        """ If a batch of conversions was interrupted, offer to resume it """
+        # Get the conversions that hadn't finished when the batch was interrupted
+        queueFilename = os.path.join(TransanaGlobal.configData.GetDefaultProfilePath(), CONVERSION_QUEUE_FILENAME)
+        jobs = WaveformProgress.LoadBatchQueue(queueFilename)
+        # If there are any ...
+        if len(jobs) > 0:
+            # ... ask the user if they should be resumed
+            prompt = unicode(_('A batch of media file conversions was interrupted with %d files left to convert.  Do you want to resume it?'), 'utf8')
+            dlg = Dialogs.QuestionDialog(self, prompt % len(jobs))
+            result = dlg.LocalShowModal()
+            dlg.Destroy()
+            # Leave out files that no longer exist
+            jobs = [job for job in jobs if os.path.exists(job['inputFile'])]
+            # If the user wants to resume the batch ...
+            if (result == wx.ID_YES) and (len(jobs) > 0):
+                # ... start it again
+                self.StartBatch(jobs)
+            # Otherwise ...
+            else:
+                # ... forget it
+                try:
+                    os.remove(queueFilename)
+                except:
+                    print "MediaConvert.ResumeBatch():"
+                    print sys.exc_info()[0], sys.exc_info()[1]
+
+    def OnBatchComplete(self, batchDlg):
+        """ Called by the Batch Progress Dialog when all the conversions in a batch are done """
+        # The batch is done
+        self.batchDlg = None
+        # Get the conversions that succeeded
+        done = [job for job in batchDlg.jobs if job['status'] == 'Done']
+        # Report the results in the Memo
+        prompt = unicode(_('%d of %d media files converted.'), 'utf8')
+        self.memo.AppendText(prompt % (len(done), len(batchDlg.jobs)) + '\n\n')
+        # Re-enable the batch buttons
+        self.btnBatchFiles.Enable(True)
+        self.btnBatchFolder.Enable(True)
+        # If no single-file conversions are running, the form can be closed again
+        if len(self.runningConversions) == 0:
+            self.btnClose.Enable(True)
+
+        # Get the media files that were created.  (Still images aren't media files.)
+        done = [job for job in done if not '%06d' in job['outputFile']]
+        # If we are embedded in Transana, not running stand-alone, and we converted media files ...
+        if (__name__ != '__main__') and (len(done) > 0):
+            # ... prompt about updating media file references
+            updateDlg = Dialogs.QuestionDialog(self, _("Do you want to update all media file references in the database?"), noDefault=True)
+            # If the user wants to update all references ...
+            if updateDlg.LocalShowModal() == wx.ID_YES:
+                # Note whether any update fails
+                success = True
+                for job in done:
+                    # ... separate paths from file names for both source and destination
+                    (sourcePath, sourceFile) = os.path.split(job['inputFile'])
+                    (destPath, destFile) = os.path.split(job['outputFile'])
+                    # We need to process the file name like Database Data gets processed so the Queries will work!
+                    # (Batches only include cp1252 compatible file names.)
+                    sourceFile = DBInterface.ProcessDBDataForUTF8Encoding(sourceFile)
+                    # Update the source file in the Database with the new File Path AND the new File Name
+                    if not DBInterface.UpdateDBFilenames(self, destPath, [sourceFile], newName=destFile):
+                        success = False
+                # If an update failed ...
+                if not success:
+                    # ... display an error message
+                    infodlg = Dialogs.InfoDialog(self, _('Update Failed.  Some records that would be affected may be locked by another user.'))
+                    infodlg.ShowModal()
+                    infodlg.Destroy()
+            updateDlg.Destroy()
+
     def OnClose(self, event):
         """ Close Button Press """
         # If we have NO running conversions ...
-        if len(self.runningConversions) == 0:
+        if (len(self.runningConversions) == 0) and (self.batchDlg == None):
             # If we're on Windows ...
             if 'wxMSW' in wx.PlatformInfo:
                 # If the temporary path exists ...
@@ -1660,20 +2063,10 @@ class MediaConvert(wx.Dialog):
             # With Right-To-Left languages, we can't use the Translated version of the word "Analysis"!!
             else:
                 fn = fn + unicode('-Analysis', 'utf8')
-        # Based on the Format Selection (start of the text), determine the appropriate file extension.
+        # Based on the Format Selection, determine the appropriate file extension.
         # Remember it as a proxy for destination file type for later processing
-        if 'MPEG-1' in self.format.GetStringSelection():
-            self.ext = '.mpg'
-        elif 'MOV' in self.format.GetStringSelection():
-            self.ext = '.mov'
-        elif 'MPEG-4' in self.format.GetStringSelection():
-            self.ext = '.mp4'
-        elif 'MP3' in self.format.GetStringSelection():
-            self.ext = '.mp3'
-        elif 'WAV' in self.format.GetStringSelection():
-            self.ext = '.wav'
-        elif 'JPEG' in self.format.GetStringSelection():
-            self.ext = '.jpg'
+        if FormatExtension(self.format.GetStringSelection()) != '':
+            self.ext = FormatExtension(self.format.GetStringSelection())
         
         # Build a new file name, starting with the last path used
         newFilename = self.lastPath
@@ -79,6 +79,7 @@ MENU_TOOLS_COLORCONFIG          =  wx.NewId()
 MENU_TOOLS_BATCHWAVEFORM        =  wx.NewId()
 MENU_TOOLS_CHAT                 =  wx.NewId()
 MENU_TOOLS_RECORDLOCK           =  wx.NewId()
+MENU_TOOLS_QUERYSTATS           =  wx.NewId()
 
 # Options Menu
 MENU_OPTIONS_SETTINGS           =  wx.ID_PREFERENCES  # Constant used to improve Mac standardization
@@ -225,6 +226,7 @@ class MenuSetup(wx.MenuBar):
         if not TransanaConstants.singleUserVersion:
             self.toolsmenu.Append(MENU_TOOLS_CHAT, _("&Chat Window"))
             self.toolsmenu.Append(MENU_TOOLS_RECORDLOCK, _("&Record Lock Utility"))
+        self.toolsmenu.Append(MENU_TOOLS_QUERYSTATS, _("&Query Statistics"))
         self.Append(self.toolsmenu, _("Too&ls"))
         
         # Build the Options menu
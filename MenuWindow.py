@@ -77,6 +77,8 @@ if not TransanaConstants.singleUserVersion:
     import ChatWindow
 # import Transana Record Lock Utility
 import RecordLock
+# import Transana's Query Statistics Report
+import QueryStatisticsReport
 # import Media Conversion Tool
 import MediaConvert
 
@@ -626,6 +628,7 @@ class MenuWindow(wx.Frame):  # wx.MDIParentFrame
         wx.EVT_MENU(self, MenuSetup.MENU_TOOLS_CHAT, self.OnChat)
         # Define handler for Tools > Record Lock Utility
         wx.EVT_MENU(self, MenuSetup.MENU_TOOLS_RECORDLOCK, self.OnRecordLock)
+        wx.EVT_MENU(self, MenuSetup.MENU_TOOLS_QUERYSTATS, self.OnQueryStatistics)
 
         # Define handler for Options > Settings
         wx.EVT_MENU(self, MenuSetup.MENU_OPTIONS_SETTINGS, self.OnOptionsSettings)
@@ -1540,6 +1543,13 @@ class MenuWindow(wx.Frame):  # wx.MDIParentFrame
         recordLockWindow.ShowModal()
         recordLockWindow.Destroy()
 
+    def OnQueryStatistics(self, event):
+        """ Query Statistics Report Window """
+        # Create a Query Statistics Report window
+        queryStatisticsWindow = QueryStatisticsReport.QueryStatisticsReport(self, -1, _("Transana Query Statistics"))
+        queryStatisticsWindow.ShowModal()
+        queryStatisticsWindow.Destroy()
+
     def OnOptionsSettings(self, event):
         """ Handler for Options > Settings """
         # Assume that nothing will happen to trigger shutting down Transana
@@ -2216,6 +2226,7 @@ class MenuWindow(wx.Frame):  # wx.MDIParentFrame
         if not TransanaConstants.singleUserVersion:
             self.menuBar.toolsmenu.SetLabel(MenuSetup.MENU_TOOLS_CHAT, _("&Chat Window"))
             self.menuBar.toolsmenu.SetLabel(MenuSetup.MENU_TOOLS_RECORDLOCK, _("&Record Lock Utility"))
+        self.menuBar.toolsmenu.SetLabel(MenuSetup.MENU_TOOLS_QUERYSTATS, _("&Query Statistics"))
 
         self.menuBar.SetLabelTop(3, _("&Options"))
         self.menuBar.optionsmenu.SetLabel(MenuSetup.MENU_OPTIONS_SETTINGS, _("Program &Settings"))
@@ -362,6 +362,8 @@ class Note(DataObject.DataObject):
                 raise RecordNotFoundError, (self.id, len(data))
             # Close the temporary database cursor
             tempDBCursor.close()
+        # Update the Text Index for the saved text
+        DBInterface.UpdateTextIndex('Note', self.number, text, c)
         # Close the main database cursor
         c.close()
 
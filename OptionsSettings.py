@@ -23,6 +23,8 @@ __author__ = 'David Woods <dwoods@wcer.wisc.edu>, Rajas Sambhare'
 import wx
 # import the Styled Text Ctrl, to get some constants
 from wx import stc
+# import the Python multiprocessing module, to count computer cores
+import multiprocessing
 # import the Python os module
 import os
 # import the Python sys module
@@ -31,6 +33,8 @@ import sys
 import DBInterface
 # import Transana Dialogs
 import Dialogs
+# import Transana's Media Cache, which manages the Waveform Directory
+import MediaCache
 # import Transana's Constants
 import TransanaConstants
 # Import the Transana Global Variables
@@ -143,6 +147,28 @@ class OptionsSettings(wx.Dialog):
         # Add the Row Sizer to the Panel Sizer
         panelDirSizer.Add(r2Sizer, 0, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 10)
 
+        # Add the Waveform Directory Size Limit Label to the Directories Tab
+        lblWaveformCacheLimit = wx.StaticText(panelDirectories, -1, _("Waveform Directory Size Limit (MB, 0 for no limit)"), style=wx.ST_NO_AUTORESIZE)
+        # Add the label to the Panel Sizer
+        panelDirSizer.Add(lblWaveformCacheLimit, 0, wx.LEFT | wx.RIGHT, 10)
+        # Add a spacer
+        panelDirSizer.Add((0, 3))
+        # Create a Row Sizer
+        rCacheSizer = wx.BoxSizer(wx.HORIZONTAL)
+        # Add a SpinCtrl for the Waveform Directory Size Limit
+        self.waveformCacheLimit = wx.SpinCtrl(panelDirectories, -1, size=(100, -1), min=0, max=1000000, initial=TransanaGlobal.configData.waveformCacheLimit)
+        # Add the element to the Row Sizer
+        rCacheSizer.Add(self.waveformCacheLimit, 0, wx.RIGHT, 10)
+        # Add a spacer
+        rCacheSizer.Add((0, 0), 1)
+        # Add the Clean Up Waveform Directory Button to the Directories Tab
+        self.btnWaveformCleanup = wx.Button(panelDirectories, -1, _("Clean Up Waveform Directory"))
+        # Add the element to the Row Sizer
+        rCacheSizer.Add(self.btnWaveformCleanup, 0)
+        wx.EVT_BUTTON(self, self.btnWaveformCleanup.GetId(), self.OnWaveformCleanup)
+        # Add the Row Sizer to the Panel Sizer
+        panelDirSizer.Add(rCacheSizer, 0, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 10)
+
         # Add the Database Directory Label to the Directories Tab
         lblDatabaseDirectory = wx.StaticText(panelDirectories, -1, _("Database Directory"), style=wx.ST_NO_AUTORESIZE)
         # Add the element to the Panel Sizer
@@ -172,6 +198,42 @@ class OptionsSettings(wx.Dialog):
         # Add the Row Sizer to the Panel Sizer
         panelDirSizer.Add(r3Sizer, 0, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 10)
 
+        # sqlite databases can be set up to favor safety or speed.
+        if TransanaConstants.DBInstalled in ['sqlite3']:
+            # Add the Database Performance Label to the Directories Tab
+            lblDatabaseProfile = wx.StaticText(panelDirectories, -1, _("Database Performance"), style=wx.ST_NO_AUTORESIZE)
+            # Add the element to the Panel Sizer
+            panelDirSizer.Add(lblDatabaseProfile, 0, wx.LEFT | wx.RIGHT, 10)
+            # Add a spacer
+            panelDirSizer.Add((0, 3))
+            # Define the choices, in the order of TransanaConstants.SQLITE_PROFILE_NAMES
+            choices = [_("Compatible (default, slowest, works on network drives)"),
+                       _("Balanced (faster, not for network drives)"),
+                       _("Fast (data may be damaged if the computer loses power)")]
+            # Add the Database Performance Choice to the Directories Tab
+            self.databaseProfile = wx.Choice(panelDirectories, -1, choices=choices)
+            # Select the current profile
+            self.databaseProfile.SetSelection(TransanaConstants.SQLITE_PROFILE_NAMES.index(TransanaGlobal.configData.sqliteProfile))
+            # Add the element to the Panel Sizer
+            panelDirSizer.Add(self.databaseProfile, 0, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 10)
+
+        # Add the Simultaneous Media Conversions Label to the Directories Tab
+        lblConversionLimit = wx.StaticText(panelDirectories, -1, _("Simultaneous Media Conversions"), style=wx.ST_NO_AUTORESIZE)
+        # Add the element to the Panel Sizer
+        panelDirSizer.Add(lblConversionLimit, 0, wx.LEFT | wx.RIGHT, 10)
+        # Add a spacer
+        panelDirSizer.Add((0, 3))
+        # Define the choices.  The first choice (0) is one conversion per computer core.
+        choices = [unicode(_("One per computer core (%d)"), 'utf8') % multiprocessing.cpu_count()]
+        for x in range(1, 17):
+            choices.append('%d' % x)
+        # Add the Simultaneous Media Conversions Choice to the Directories Tab
+        self.conversionLimit = wx.Choice(panelDirectories, -1, choices=choices)
+        # Select the current setting
+        self.conversionLimit.SetSelection(min(TransanaGlobal.configData.conversionProcessLimit, len(choices) - 1))
+        # Add the element to the Panel Sizer
+        panelDirSizer.Add(self.conversionLimit, 0, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 10)
+
         # The Database Directory should not be visible for the Multi-user version of the program.
         # Let's just hide it so that the program doesn't crash for being unable to populate the control.
         if not TransanaConstants.singleUserVersion:
@@ -648,6 +710,20 @@ class OptionsSettings(wx.Dialog):
             TransanaGlobal.configData.databaseDir = self.databaseDirectory.GetValue() + os.sep
         else:
             TransanaGlobal.configData.databaseDir = self.databaseDirectory.GetValue()
+        # If we're using sqlite ...
+        if TransanaConstants.DBInstalled in ['sqlite3']:
+            # ... get the selected Database Performance profile
+            sqliteProfile = TransanaConstants.SQLITE_PROFILE_NAMES[self.databaseProfile.GetSelection()]
+            # If the profile has changed ...
+            if sqliteProfile != TransanaGlobal.configData.sqliteProfile:
+                # ... remember the new profile ...
+                TransanaGlobal.configData.sqliteProfile = sqliteProfile
+                # ... and apply it to the open database
+                DBInterface.ChangeSqliteProfile(sqliteProfile)
+        # Update the number of media conversions that may run at once
+        TransanaGlobal.configData.conversionProcessLimit = self.conversionLimit.GetSelection()
+        # Update the size limit for the Waveform Directory
+        TransanaGlobal.configData.waveformCacheLimit = self.waveformCacheLimit.GetValue()
         # If we're not in the LAB version and the Media Library Path has changed ...
         if (not self.lab) and (tempVideoPath != TransanaGlobal.configData.videoPath):
             # First, find out if there are Episodes or Clips that need to be changed in the Database
@@ -796,6 +872,25 @@ class OptionsSettings(wx.Dialog):
         # Destroy the Dialog
         dlg.Destroy
 
+    def OnWaveformCleanup(self, event):
+        """ Implements the "Clean Up Waveform Directory" button on the Directories Tab """
+        # Tidy the Waveform Directory shown on the form, using the size limit shown on the form
+        cache = MediaCache.MediaCache(self.waveformDirectory.GetValue(), self.waveformCacheLimit.GetValue() * 1048576)
+        # Cleaning up can take a moment, so show the busy cursor
+        busyCursor = wx.BusyCursor()
+        (filesRemoved, bytesFreed) = cache.Cleanup()
+        # Restore the normal cursor
+        del(busyCursor)
+        # Tell the user what was done
+        if 'unicode' in wx.PlatformInfo:
+            # Encode with UTF-8 rather than TransanaGlobal.encoding because this is a prompt, not DB Data.
+            prompt = unicode(_('%d files were removed from the Waveform Directory, freeing %0.1f MB.'), 'utf8')
+        else:
+            prompt = _('%d files were removed from the Waveform Directory, freeing %0.1f MB.')
+        infodlg = Dialogs.InfoDialog(self, prompt % (filesRemoved, bytesFreed / 1048576.0))
+        infodlg.ShowModal()
+        infodlg.Destroy()
+
     def OnScroll(self, event):
         """ Handle the Scroll Event for the Media Speed Slider. """
         # Update the Current Media Speed Label
@@ -33,6 +33,8 @@ import Quote
 import Collection
 # Import the Transana Database Interface
 import DBInterface
+# Import Transana's Dialogs
+import Dialogs
 # Import the Transana Search Dialog Box
 import SearchDialog
 # import Transana's Constants
@@ -42,6 +44,10 @@ import TransanaGlobal
 
 # Import the Python String module
 import string
+# Import the Python sys module
+import sys
+# Import the Python Threading module
+import threading
 
 
 class ProcessSearch(object):
@@ -56,6 +62,13 @@ class ProcessSearch(object):
         # Note the Database Tree that accepts Search Results
         self.dbTree = dbTree
         self.collectionList = []
+        # There is no Search Text unless the Search Dialog provides it
+        textQuery = ''
+        # The numbers of the objects whose text matches the Search Text, by object type, or None if there's no Search Text
+        self.textMatches = None
+        # The name of the saved Search being run, if any.  Saved Searches are brought up to date from their last
+        # results rather than re-evaluated from scratch.
+        self.savedSearch = None
         # If kwg and kw are None, we are doing a regular (full) search.
         if ((kwg == None) or (kw == None)) and (searchTerms == None):
             # Create the Search Dialog Box
@@ -78,6 +91,10 @@ class ProcessSearch(object):
                 self.collectionList = dlg.GetCollectionList(collTree, collNode, True)
                 # ... and get the search terms from the dialog
                 searchTerms = dlg.searchQuery.GetValue().split('\n')
+                # Get the Search Text from the dialog
+                textQuery = dlg.textQuery.GetValue().strip()
+                # Find out if this is a saved Search
+                self.savedSearch = dlg.GetSavedSearchName()
                 # Get the includeDocuments info
                 includeDocuments = dlg.includeDocuments.IsChecked()
                 # Get the includeEpisodes info
@@ -166,185 +183,108 @@ class ProcessSearch(object):
                 #  Parameters to be used with the queries.  Parameters are not integrated into the queries 
                 #  in order to allow for automatic processing of apostrophes and other text that could 
                 #  otherwise interfere with the SQL execution.)
-                (documentQuery, episodeQuery, quoteQuery, clipQuery, wholeSnapshotQuery, snapshotCodingQuery, params) = \
-                    self.BuildQueries(searchTerms)
+                # A Text Search may not have any keyword Search Terms.
+                if len(''.join(searchTerms).strip()) > 0:
+                    (documentQuery, episodeQuery, quoteQuery, clipQuery, wholeSnapshotQuery, snapshotCodingQuery, params) = \
+                        self.BuildQueries(searchTerms)
+                # If there are no keyword Search Terms, GetSearchResults() uses the Text Search results alone
+                else:
+                    (documentQuery, episodeQuery, quoteQuery, clipQuery, wholeSnapshotQuery, snapshotCodingQuery, params) = \
+                        (None, None, None, None, None, None, [])
+
+                # If there is Search Text, find the objects whose text matches it using the Text Index
+                if textQuery != '':
+                    self.textMatches = DBInterface.TextIndexSearch(textQuery)
+                    # If the Text Index can't be used ...
+                    if self.textMatches == None:
+                        # ... tell the user.  Nothing can match the Search Text.
+                        prompt = unicode(_('The text of this database has not been indexed, so the Search Text cannot be found.\nPlease try closing and re-opening the database.'), 'utf8')
+                        dlg = Dialogs.ErrorDialog(None, prompt)
+                        dlg.ShowModal()
+                        dlg.Destroy()
+                        self.textMatches = {}
+                # If there's no Search Text, the results are not limited by text
+                else:
+                    self.textMatches = None
+
+                # Make a list of the queries for the types of objects included in the search.  The Whole Snapshot
+                # and Snapshot Coding queries both find Snapshots.
+                queries = []
+                if includeEpisodes:
+                    queries.append(('Episode', episodeQuery))
+                if includeDocuments:
+                    queries.append(('Document', documentQuery))
+                if includeQuotes:
+                    queries.append(('Quote', quoteQuery))
+                if includeClips:
+                    queries.append(('Clip', clipQuery))
+                if includeSnapshots:
+                    queries.append(('Snapshot', wholeSnapshotQuery))
+                    queries.append(('SnapshotCoding', snapshotCodingQuery))
+                # Run all the queries at once, and wait for all the results before adding anything to the tree
+                searchResults = self.RunSearchQueries(queries, params, searchTerms)
 
-                # Get a Database Cursor
-                dbCursor = DBInterface.get_db().cursor()
+                # Group the results by the tree nodes they belong under, so the Search Results can be added to the
+                # Database Tree in a single pass.  (See DatabaseTreeTab._DBTreeCtrl.add_SearchResults().)
+                searchNodes = {}
+                # Collections are used by many results, so remember the ones we've loaded
+                self.collections = {}
 
                 if includeEpisodes:
-                    # Adjust query for sqlite, if needed
-                    episodeQuery = DBInterface.FixQuery(episodeQuery)
-                    # Execute the Library/Episode query
-                    dbCursor.execute(episodeQuery, tuple(params))
-
-                    # Process the results of the Library/Episode query
-                    for line in DBInterface.fetchall_named(dbCursor):
-                        # Add the new Transcript(s) to the Database Tree Tab.
-                        # To add a Transcript, we need to build the node list for the tree's add_Node method to climb.
-                        # We need to add the Library, Episode, and Transcripts to our Node List, so we'll start by loading
-                        # the current Library and Episode
-                        tempLibrary = Library.Library(line['SeriesNum'])
-                        tempEpisode = Episode.Episode(line['EpisodeNum'])
-                        # Add the Search Root Node, the Search Name, and the current Library and Episode Names.
-                        nodeList = (_('Search'), searchName, tempLibrary.id, tempEpisode.id)
+                    # Process the results of the Library/Episode search
+                    for line in searchResults['Episode']:
+                        # Get the Library and Episode names
+                        tempLibraryName = DBInterface.ProcessDBDataForUTF8Encoding(line['SeriesID'])
+                        tempEpisodeName = DBInterface.ProcessDBDataForUTF8Encoding(line['EpisodeID'])
                         # Find out what Transcripts exist for each Episode
-                        transcriptList = DBInterface.list_transcripts(tempLibrary.id, tempEpisode.id)
-                        # If the Episode HAS defined transcripts ...
-                        if len(transcriptList) > 0:
-                            # Add each Transcript to the Database Tree
-                            for (transcriptNum, transcriptID, episodeNum) in transcriptList:
-                                # Add the Transcript Node to the Tree.  
-                                self.dbTree.add_Node('SearchTranscriptNode', nodeList + (transcriptID,), transcriptNum, episodeNum)
-                        # If the Episode has no transcripts, it still has the keywords and SHOULD be displayed!
-                        else:
-                            # Add the Transcript-less Episode Node to the Tree.  
-                            self.dbTree.add_Node('SearchEpisodeNode', nodeList, tempEpisode.number, tempLibrary.number)
+                        transcriptList = DBInterface.list_transcripts(tempLibraryName, tempEpisodeName)
+                        # If there is Search Text, only the Transcripts that include it belong in the results
+                        if self.textMatches != None:
+                            transcriptList = [transcript for transcript in transcriptList
+                                              if transcript[0] in self.textMatches.get('Transcript', set())]
+                        # Add the Library Node and the Episode Node to the Search Results
+                        libraryBranch = self.AddSearchNode(searchNodes, 'SearchLibraryNode', tempLibraryName, line['SeriesNum'], 0)
+                        episodeBranch = self.AddSearchNode(libraryBranch, 'SearchEpisodeNode', tempEpisodeName, line['EpisodeNum'], line['SeriesNum'])
+                        # Add each Transcript below the Episode.  (If the Episode has no transcripts, it still has
+                        # the keywords and SHOULD be displayed!)
+                        for (transcriptNum, transcriptID, episodeNum) in transcriptList:
+                            self.AddSearchNode(episodeBranch, 'SearchTranscriptNode', transcriptID, transcriptNum, episodeNum)
 
                 if includeDocuments:
-                    # Adjust query for sqlite, if needed
-                    documentQuery = DBInterface.FixQuery(documentQuery)
-                    # Execute the Library/Document query
-                    dbCursor.execute(documentQuery, tuple(params))
-
-                    # Process the results of the Library/Document query
-                    for line in DBInterface.fetchall_named(dbCursor):
-                        # Add the new Document(s) to the Database Tree Tab.
-                        # To add a Document, we need to build the node list for the tree's add_Node method to climb.
-                        # We need to add the Library and Documents to our Node List, so we'll start by loading
-                        # the current Library
+                    # Process the results of the Library/Document search
+                    for line in searchResults['Document']:
+                        # Get the Library and Document names
                         tempLibraryName = DBInterface.ProcessDBDataForUTF8Encoding(line['SeriesID'])
-                        tempDocument = Document.Document(line['DocumentNum'])
-                        # Add the Search Root Node, the Search Name, and the current Library Name.
-                        nodeList = (_('Search'), searchName, tempLibraryName)
-                        # Add the Document Node to the Tree.
-                        self.dbTree.add_Node('SearchDocumentNode', nodeList + (tempDocument.id,), tempDocument.number, tempDocument.library_num)
+                        tempDocumentName = DBInterface.ProcessDBDataForUTF8Encoding(line['DocumentID'])
+                        # Add the Library Node and the Document Node to the Search Results
+                        libraryBranch = self.AddSearchNode(searchNodes, 'SearchLibraryNode', tempLibraryName, line['LibraryNum'], 0)
+                        self.AddSearchNode(libraryBranch, 'SearchDocumentNode', tempDocumentName, line['DocumentNum'], line['LibraryNum'])
 
+                # Quotes, Clips, and Snapshots all go below their Collections, with their Sort Orders
+                collectionResults = []
                 if includeQuotes:
-                    # Adjust query for sqlite, if needed
-                    quoteQuery = DBInterface.FixQuery(quoteQuery)
-                    # Execute the Collection/Quote query
-                    dbCursor.execute(quoteQuery, params)
-
-                    # Process all results of the Collection/Quote query 
-                    for line in DBInterface.fetchall_named(dbCursor):
-                        # Add the new Quote to the Database Tree Tab.
-                        # To add a Quote, we need to build the node list for the tree's add_Node method to climb.
-                        # We need to add all of the Collection Parents to our Node List, so we'll start by loading
-                        # the current Collection
-                        tempCollection = Collection.Collection(line['CollectNum'])
-
-                        # Add the current Collection Node Data
-                        nodeList = tempCollection.GetNodeData()                        
-                        # Get the DB Values
-                        tempID = line['QuoteID']
-                        # If we're in Unicode mode, format the strings appropriately
-                        if 'unicode' in wx.PlatformInfo:
-                            tempID = DBInterface.ProcessDBDataForUTF8Encoding(tempID)
-                        # Now add the Search Root Node and the Search Name to the front of the Node List and the
-                        # Quote Name to the back of the Node List
-                        nodeList = (_('Search'), searchName) + nodeList + (tempID, )
-
-                        # Add the Node to the Tree
-                        self.dbTree.add_Node('SearchQuoteNode', nodeList, line['QuoteNum'], line['CollectNum'], sortOrder=line['SortOrder'])
-
+                    collectionResults.append(('SearchQuoteNode', searchResults['Quote'], 'QuoteNum', 'QuoteID'))
                 if includeClips:
-                    # Adjust query for sqlite, if needed
-                    clipQuery = DBInterface.FixQuery(clipQuery)
-                    # Execute the Collection/Clip query
-                    dbCursor.execute(clipQuery, params)
-
-                    # Process all results of the Collection/Clip query 
-                    for line in DBInterface.fetchall_named(dbCursor):
-                        # Add the new Clip to the Database Tree Tab.
-                        # To add a Clip, we need to build the node list for the tree's add_Node method to climb.
-                        # We need to add all of the Collection Parents to our Node List, so we'll start by loading
-                        # the current Collection
-                        tempCollection = Collection.Collection(line['CollectNum'])
-
-                        # Add the current Collection Node Data
-                        nodeList = tempCollection.GetNodeData()                        
-                        # Get the DB Values
-                        tempID = line['ClipID']
-                        # If we're in Unicode mode, format the strings appropriately
-                        if 'unicode' in wx.PlatformInfo:
-                            tempID = DBInterface.ProcessDBDataForUTF8Encoding(tempID)
-                        # Now add the Search Root Node and the Search Name to the front of the Node List and the
-                        # Clip Name to the back of the Node List
-                        nodeList = (_('Search'), searchName) + nodeList + (tempID, )
-
-                        # Add the Node to the Tree
-                        self.dbTree.add_Node('SearchClipNode', nodeList, line['ClipNum'], line['CollectNum'], sortOrder=line['SortOrder'])
-
+                    collectionResults.append(('SearchClipNode', searchResults['Clip'], 'ClipNum', 'ClipID'))
+                # Snapshots come from two searches.  Since we key nodes by record number, a Snapshot found by both
+                # is only added once.
                 if includeSnapshots:
-                    # Adjust query for sqlite, if needed
-                    wholeSnapshotQuery = DBInterface.FixQuery(wholeSnapshotQuery)
-                    # Execute the Whole Snapshot query
-                    dbCursor.execute(wholeSnapshotQuery, params)
-
-                    # Since we have two sources of Snapshots that get included, we need to track what we've already
-                    # added so we don't add the same Snapshot twice
-                    addedSnapshots = []
-
-                    # Process all results of the Whole Snapshot query 
-                    for line in DBInterface.fetchall_named(dbCursor):
-                        # Add the new Snapshot to the Database Tree Tab.
-                        # To add a Snapshot, we need to build the node list for the tree's add_Node method to climb.
-                        # We need to add all of the Collection Parents to our Node List, so we'll start by loading
-                        # the current Collection
-                        tempCollection = Collection.Collection(line['CollectNum'])
-
-                        # Add the current Collection Node Data
-                        nodeList = tempCollection.GetNodeData()                        
+                    collectionResults.append(('SearchSnapshotNode', searchResults['Snapshot'], 'SnapshotNum', 'SnapshotID'))
+                    collectionResults.append(('SearchSnapshotNode', searchResults['SnapshotCoding'], 'SnapshotNum', 'SnapshotID'))
+                for (nodeType, results, numField, idField) in collectionResults:
+                    for line in results:
+                        # Get the node for the item's Collection, and all of its parent Collections
+                        collectionBranch = self.GetSearchCollectionBranch(searchNodes, line['CollectNum'])
                         # Get the DB Values
-                        tempID = line['SnapshotID']
+                        tempID = line[idField]
                         # If we're in Unicode mode, format the strings appropriately
                         if 'unicode' in wx.PlatformInfo:
                             tempID = DBInterface.ProcessDBDataForUTF8Encoding(tempID)
-                        # Now add the Search Root Node and the Search Name to the front of the Node List and the
-                        # Clip Name to the back of the Node List
-                        nodeList = (_('Search'), searchName) + nodeList + (tempID, )
-
-                        # Add the Node to the Tree
-                        self.dbTree.add_Node('SearchSnapshotNode', nodeList, line['SnapshotNum'], line['CollectNum'], sortOrder=line['SortOrder'])
-                        # Add the Snapshot to the list of Snapshots added to the Search Result
-                        addedSnapshots.append(line['SnapshotNum'])
-                        
-                        tmpNode = self.dbTree.select_Node(nodeList[:-1], 'SearchCollectionNode', ensureVisible=False)
-                        self.dbTree.SortChildren(tmpNode)
-                    # Adjust query for sqlite if needed
-                    snapshotCodingQuery = DBInterface.FixQuery(snapshotCodingQuery)
-                    # Execute the Snapshot Coding query
-                    dbCursor.execute(snapshotCodingQuery, params)
-
-                    # Process all results of the Snapshot Coding query 
-                    for line in DBInterface.fetchall_named(dbCursor):
-                        # If the Snapshot is NOT already in the Search Results ...
-                        if not (line['SnapshotNum'] in addedSnapshots):
-                            # Add the new Snapshot to the Database Tree Tab.
-                            # To add a Snapshot, we need to build the node list for the tree's add_Node method to climb.
-                            # We need to add all of the Collection Parents to our Node List, so we'll start by loading
-                            # the current Collection
-                            tempCollection = Collection.Collection(line['CollectNum'])
-
-                            # Add the current Collection Node Data
-                            nodeList = tempCollection.GetNodeData()                        
-                            # Get the DB Values
-                            tempID = line['SnapshotID']
-                            # If we're in Unicode mode, format the strings appropriately
-                            if 'unicode' in wx.PlatformInfo:
-                                tempID = DBInterface.ProcessDBDataForUTF8Encoding(tempID)
-                            # Now add the Search Root Node and the Search Name to the front of the Node List and the
-                            # Clip Name to the back of the Node List
-                            nodeList = (_('Search'), searchName) + nodeList + (tempID, )
-
-                            # Add the Node to the Tree
-                            self.dbTree.add_Node('SearchSnapshotNode', nodeList, line['SnapshotNum'], line['CollectNum'], sortOrder=line['SortOrder'])
-                            # Add the Snapshot to the list of Snapshots added to the Search Result
-                            addedSnapshots.append(line['SnapshotNum'])
-                            
-                            tmpNode = self.dbTree.select_Node(nodeList[:-1], 'SearchCollectionNode', ensureVisible=False)
-                            self.dbTree.SortChildren(tmpNode)
+                        # Add the Quote, Clip, or Snapshot Node below the Collection
+                        self.AddSearchNode(collectionBranch, nodeType, tempID, line[numField], line['CollectNum'], sortOrder=line['SortOrder'])
+
+                # Add all the Search Results to the Database Tree
+                self.dbTree.add_SearchResults(nodeListBase, searchNodes)
 
             else:
                 self.searchCount = searchCount
@@ -354,12 +294,121 @@ class ProcessSearch(object):
             self.searchCount = searchCount
 
 
+    def AddSearchNode(self, searchNodes, nodeType, nodeText, recNum, parent, sortOrder=None):
+        """ Add a node to the grouped Search Results in searchNodes, unless it's already there, and return the
+            dictionary that holds the node's children """
+        # Nodes are identified by their Node Type and Record Number
+        key = (nodeType, recNum)
+        # If the node hasn't been added yet ...
+        if not searchNodes.has_key(key):
+            # ... add it, with no children
+            searchNodes[key] = [nodeText, parent, sortOrder, {}]
+        return searchNodes[key][3]
+
+    def GetSearchCollectionBranch(self, searchNodes, collectNum):
+        """ Add the Search Collection Node for Collection collectNum, and the nodes for all of its parent Collections,
+            to the grouped Search Results in searchNodes, and return the dictionary that holds the Collection's children """
+        # Build a list of the Collection and its parents, starting with the top-level Collection
+        collections = []
+        while collectNum != 0:
+            # If we haven't loaded this Collection yet, load it
+            if not self.collections.has_key(collectNum):
+                self.collections[collectNum] = Collection.Collection(collectNum)
+            collections.insert(0, self.collections[collectNum])
+            # Move on to the parent Collection
+            collectNum = self.collections[collectNum].parent
+        # Add each Collection below its parent.  (Search Collections need a numeric Sort Order, as the tree sorts
+        # them together with the Search Quotes, Clips and Snapshots by Sort Order.  0 keeps them at the top.)
+        for tempCollection in collections:
+            searchNodes = self.AddSearchNode(searchNodes, 'SearchCollectionNode', tempCollection.id, tempCollection.number,
+                                             tempCollection.parent, sortOrder=0)
+        return searchNodes
+
     def GetSearchCount(self):
         """ This method is called to determine whether the Search Counter was incremented, that is, whether the
             search was performed or cancelled. """
         return self.searchCount
 
 
+    def RunSearchQueries(self, queries, params, searchTerms):
+        """ Run the search queries for several types of objects at the same time, each in its own thread with its own
+            database connection from the DBInterface Connection Pool, so the search takes about as long as the slowest
+            query rather than the total of all of them.  queries is a list of (objType, query) pairs.  Returns a
+            dictionary of the results of GetSearchResults(), keyed by objType. """
+        # Start with no results
+        results = {}
+        # Note any object types whose queries couldn't be run in a thread
+        failed = []
+
+        def runQuery(objType, query):
+            """ Run one object type's query on a pooled database connection.  This runs in its own thread. """
+            try:
+                # Check out a database connection for this thread
+                with DBInterface.pooled_db() as db:
+                    # Get a Database Cursor
+                    dbCursor = db.cursor()
+                    try:
+                        # Get the Search Results for this type of object
+                        results[objType] = self.GetSearchResults(dbCursor, objType, query, params, searchTerms)
+                    finally:
+                        # Close the Database Cursor
+                        dbCursor.close()
+            except:
+                # If anything goes wrong, report it.  The query will be run again on the main connection.
+                print "ProcessSearch.RunSearchQueries():", objType
+                print sys.exc_info()[0], sys.exc_info()[1]
+                failed.append(objType)
+
+        # If there's more than one query, run them in parallel
+        if len(queries) > 1:
+            # Create a thread for each query
+            threads = [threading.Thread(target=runQuery, args=(objType, query)) for (objType, query) in queries]
+            # Start all the threads
+            for thread in threads:
+                thread.start()
+            # Wait for all of them to finish.  (The Connection Pool limits how many run at once.)
+            for thread in threads:
+                thread.join()
+        # If there's only one query, or a query couldn't be run in a thread ...
+        if (len(queries) == 1) or (len(failed) > 0):
+            # ... get a Database Cursor for the main connection
+            dbCursor = DBInterface.get_db().cursor()
+            # Run the queries that don't have results yet, one at a time
+            for (objType, query) in queries:
+                if not results.has_key(objType):
+                    results[objType] = self.GetSearchResults(dbCursor, objType, query, params, searchTerms)
+            # Close the Database Cursor
+            dbCursor.close()
+        return results
+
+    def GetSearchResults(self, dbCursor, objType, query, params, searchTerms):
+        """ Get the Search Results for one type of object.  The DBInterface Keyword Index answers the search from
+            memory if it can.  Otherwise, the SQL query from BuildQueries() is used.  If there is Search Text, only
+            objects whose text matches are included.  If there is no query, the Text Search results are used alone. """
+        # If there's Search Text, get the numbers of the objects of this type whose text matches
+        if self.textMatches != None:
+            textMatches = self.textMatches.get(objType, set())
+        # If there is no keyword query, this is a Text Search only
+        if query == None:
+            # Get the Search Results data for the objects that match the Search Text
+            return DBInterface.SearchResultRows(dbCursor, objType, textMatches, self.collectionList)
+        # Try the Keyword Index first
+        results = DBInterface.KeywordIndexSearch(objType, searchTerms, self.collectionList, self.savedSearch)
+        # If the Keyword Index can't answer the search ...
+        if results == None:
+            # ... adjust the query for sqlite, if needed
+            query = DBInterface.FixQuery(query)
+            # Execute the query
+            dbCursor.execute(query, tuple(params))
+            # Get the results
+            results = DBInterface.fetchall_named(dbCursor)
+        # If there's Search Text, keep only the objects whose text matches
+        if self.textMatches != None:
+            # Get the name of the object number field
+            numField = DBInterface.KEYWORD_SEARCH_QUERIES[objType][1].split('.')[1]
+            results = [row for row in results if row[numField] in textMatches]
+        return results
+
     def BuildQueries(self, queryText):
         """ Convert natural language search terms (as structured by the Transana Search Dialog) into
             executable SQL that runs on MySQL. """
@@ -0,0 +1,358 @@
+# Copyright (C) 2002 - 2015 The Board of Regents of the University of Wisconsin System
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of version 2 of the GNU General Public License as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""This module times the database queries Transana makes, so we can find out which queries are slow
+for a given user action.  When Query Profiling is turned on, DBInterface.get_db() returns an
+InstrumentedConnection, whose cursors record every query in a QueryStatistics object."""
+
+__author__ = 'David Woods <dwoods@wcer.wisc.edu>'
+
+# import Python's logging handlers for the rolling Slow Query Log
+import logging
+import logging.handlers
+# import Python's os module
+import os
+# import Python's regular expression module
+import re
+# import Python's sys module
+import sys
+# import Python's threading module
+import threading
+# import Python's time module
+import time
+
+# Regular expressions used to normalize SQL.  Quoted strings become "?" ...
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+# ... as do numbers that aren't part of a name (like the "2" in "Clips2") ...
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+# ... and MySQL-style parameter markers.
+PARAMETER_MARKER = re.compile(r"%s")
+# Lists of markers, as in "IN (?, ?, ?)", are shortened so queries with different list lengths match
+MARKER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+# Runs of white space become a single space
+WHITE_SPACE = re.compile(r"\s+")
+
+def NormalizeQuery(query):
+    """ Return the query with its literal values and parameter markers replaced by "?" and its white space
+        collapsed, so that all the executions of a query can be counted together. """
+    query = STRING_LITERAL.sub('?', query)
+    query = NUMBER_LITERAL.sub('?', query)
+    query = PARAMETER_MARKER.sub('?', query)
+    query = MARKER_LIST.sub('(?, ...)', query)
+    return WHITE_SPACE.sub(' ', query).strip()
+
+def ParameterShape(args, many=False):
+    """ Describe the parameters passed with a query by their types, without recording their values """
+    # No parameters
+    if args == None:
+        return ''
+    # For executemany(), describe the first row and give the number of rows
+    if many:
+        args = list(args)
+        if len(args) == 0:
+            return '0 rows'
+        return '%d rows of %s' % (len(args), ParameterShape(args[0]))
+    # A dictionary of named parameters
+    if isinstance(args, dict):
+        return '{%s}' % ', '.join(['%s: %s' % (key, type(args[key]).__name__) for key in sorted(args.keys())])
+    # A single parameter that isn't a sequence
+    if not isinstance(args, (tuple, list)):
+        return type(args).__name__
+    # Describe each parameter by its type, but don't list hundreds of them
+    types = [type(arg).__name__ for arg in args[:8]]
+    if len(args) > 8:
+        types.append('... %d in all' % len(args))
+    return '(%s)' % ', '.join(types)
+
+def CallSite():
+    """ Return a description of the code that executed the query:  the calling function, and, when that
+        function is in DBInterface, the first function outside DBInterface that led to the call. """
+    # Skip this function and the Instrumented Cursor methods that called it
+    frame = sys._getframe(3)
+    # Get the name of a frame's function, as "Module.function"
+    def describe(frame):
+        return '%s.%s' % (os.path.splitext(os.path.basename(frame.f_code.co_filename))[0], frame.f_code.co_name)
+    # Describe the calling function
+    caller = describe(frame)
+    # If the call comes from DBInterface ...
+    if caller.startswith('DBInterface.'):
+        # ... look back up the stack for the code outside DBInterface that asked for the data
+        origin = frame.f_back
+        while (origin != None) and (describe(origin).startswith('DBInterface.')):
+            origin = origin.f_back
+        # If there is one, add it to the description
+        if origin != None:
+            caller = '%s (%s)' % (caller, describe(origin))
+    return caller
+
+
+class QueryStatistics(object):
+    """ Accumulates the count, elapsed time, and row count of the queries run through Instrumented Cursors,
+        by normalized query and call site, and writes queries that take longer than the Slow Query
+        Threshold to a rolling log file. """
+
+    def __init__(self):
+        """ Initialize the Query Statistics """
+        # Query Profiling is off until it is requested
+        self.enabled = False
+        # Queries taking this many milliseconds or more are written to the Slow Query Log
+        self.slowQueryThreshold = 250
+        # The Slow Query Log, or None if there isn't one
+        self.log = None
+        # The name of the Slow Query Log file
+        self.logFilename = ''
+        # The Connection Pool lets background threads run queries too, so protect the statistics with a Lock
+        self.lock = threading.Lock()
+        # Statistics for each (normalized query, call site), and the time statistics collection started
+        self.reset()
+
+    def reset(self):
+        """ Discard all the statistics collected so far """
+        self.lock.acquire()
+        try:
+            # Each value is a list:  [count, total seconds, maximum seconds, total rows, parameter shape]
+            self.entries = {}
+            # Note when we started collecting statistics
+            self.startTime = time.time()
+        finally:
+            self.lock.release()
+
+    def configure(self, enabled, slowQueryThreshold=None, logFilename=None):
+        """ Turn Query Profiling on or off, and optionally change the Slow Query Threshold (in milliseconds)
+            and the Slow Query Log file.  The log is rolled over at 1 MB, keeping 3 old files. """
+        self.enabled = enabled
+        if slowQueryThreshold != None:
+            self.slowQueryThreshold = slowQueryThreshold
+        # If we have a new log file name ...
+        if (logFilename != None) and (logFilename != self.logFilename):
+            # ... close the old log, if there was one ...
+            if self.log != None:
+                for handler in self.log.handlers[:]:
+                    handler.close()
+                    self.log.removeHandler(handler)
+                self.log = None
+            # ... and open the new one
+            self.logFilename = logFilename
+            if logFilename != '':
+                try:
+                    handler = logging.handlers.RotatingFileHandler(logFilename, maxBytes=1048576, backupCount=3)
+                    handler.setFormatter(logging.Formatter('%(asctime)s  %(message)s'))
+                    self.log = logging.getLogger('Transana.SlowQueries')
+                    self.log.propagate = False
+                    self.log.setLevel(logging.INFO)
+                    self.log.addHandler(handler)
+                # If the log can't be opened, we can still collect statistics
+                except:
+                    print "QueryProfiler.QueryStatistics.configure():  Exception opening %s" % logFilename
+                    print sys.exc_info()[0], sys.exc_info()[1]
+                    self.log = None
+
+    def record(self, query, shape, caller, elapsed, rows):
+        """ Record one execution of a query.  elapsed is in seconds. """
+        # Normalize the query so all its executions are counted together
+        normalized = NormalizeQuery(query)
+        self.lock.acquire()
+        try:
+            # Get this query's statistics, or start them
+            entry = self.entries.setdefault((normalized, caller), [0, 0.0, 0.0, 0, shape])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+            entry[3] += max(rows, 0)
+            entry[4] = shape
+        finally:
+            self.lock.release()
+        # If the query was slow, add it to the Slow Query Log
+        if (self.log != None) and (elapsed * 1000.0 >= self.slowQueryThreshold):
+            self.log.info('%8.1f ms  %6d rows  %s  [%s]  %s' % (elapsed * 1000.0, rows, caller, shape, normalized))
+
+    def summary(self, maxQueries=50):
+        """ Return a list of (normalized query, call site, count, total seconds, maximum seconds, total rows,
+            parameter shape) tuples for the queries with the most total time, and the number of seconds
+            over which the statistics were collected. """
+        self.lock.acquire()
+        try:
+            results = [(query, caller) + tuple(entry) for ((query, caller), entry) in self.entries.items()]
+        finally:
+            self.lock.release()
+        # Sort by total time, longest first
+        results.sort(key=lambda result: result[3], reverse=True)
+        return (results[:maxQueries], time.time() - self.startTime)
+
+
+class InstrumentedConnection(object):
+    """ Wraps a database connection so that its cursors are Instrumented Cursors.  Everything else is
+        passed through to the connection. """
+
+    def __init__(self, connection, statistics):
+        """ Wrap the connection, recording queries in statistics """
+        self._connection = connection
+        self._statistics = statistics
+
+    def cursor(self, *args):
+        """ Return an Instrumented Cursor for the connection """
+        return InstrumentedCursor(self._connection.cursor(*args), self._statistics)
+
+    def __getattr__(self, name):
+        """ Pass everything else through to the connection """
+        return getattr(self._connection, name)
+
+    def __setattr__(self, name, value):
+        """ Pass settings such as sqlite's text_factory through to the connection """
+        # Our own attributes stay on the wrapper
+        if name in ['_connection', '_statistics']:
+            object.__setattr__(self, name, value)
+        # Everything else is set on the connection itself
+        else:
+            setattr(self._connection, name, value)
+
+
+class InstrumentedCursor(object):
+    """ Wraps a database cursor to time its queries.  A query's time includes fetching its results, as
+        sqlite does much of its work during the fetch.  Each query is recorded when the next query is
+        executed, when all its rows have been fetched, or when the cursor is closed. """
+
+    def __init__(self, cursor, statistics):
+        """ Wrap the cursor, recording queries in statistics """
+        self._cursor = cursor
+        self._statistics = statistics
+        # The query that has been executed but not yet recorded:  [query, shape, caller, seconds, rows fetched]
+        self._pending = None
+
+    def _finish(self):
+        """ Record the pending query, if there is one """
+        if self._pending != None:
+            (query, shape, caller, elapsed, rows) = self._pending
+            self._pending = None
+            # If no rows were fetched, the cursor's rowcount tells how many rows were changed
+            if rows == 0:
+                try:
+                    rows = max(self._cursor.rowcount, 0)
+                except:
+                    rows = 0
+            self._statistics.record(query, shape, caller, elapsed, rows)
+
+    def _run(self, method, query, args, many):
+        """ Time a call to execute() or executemany() """
+        # Record the previous query
+        self._finish()
+        # Note where this query came from
+        caller = CallSite()
+        start = time.time()
+        try:
+            if args == None:
+                result = method(query)
+            else:
+                result = method(query, args)
+        finally:
+            # Even if the query fails, record how long it took
+            self._pending = [query, ParameterShape(args, many), caller, time.time() - start, 0]
+        # sqlite's execute() returns the cursor itself.  Return the Instrumented Cursor instead.
+        if result is self._cursor:
+            return self
+        return result
+
+    def execute(self, query, args=None):
+        """ Execute a query """
+        return self._run(self._cursor.execute, query, args, False)
+
+    def executemany(self, query, args):
+        """ Execute a query for each set of parameters in args """
+        return self._run(self._cursor.executemany, query, args, True)
+
+    def _fetch(self, method, *args):
+        """ Time a call to one of the fetch methods, adding the time and rows to the pending query """
+        start = time.time()
+        result = method(*args)
+        if self._pending != None:
+            self._pending[3] += time.time() - start
+        return result
+
+    def fetchone(self):
+        """ Fetch the next row """
+        row = self._fetch(self._cursor.fetchone)
+        if self._pending != None:
+            # If there are no more rows, the query is done
+            if row == None:
+                self._finish()
+            else:
+                self._pending[4] += 1
+        return row
+
+    def fetchmany(self, *args):
+        """ Fetch the next set of rows """
+        rows = self._fetch(self._cursor.fetchmany, *args)
+        if self._pending != None:
+            self._pending[4] += len(rows)
+        return rows
+
+    def fetchall(self):
+        """ Fetch all the remaining rows, which completes the query """
+        rows = self._fetch(self._cursor.fetchall)
+        if self._pending != None:
+            self._pending[4] += len(rows)
+            self._finish()
+        return rows
+
+    def __iter__(self):
+        """ Iterate through the rows """
+        return iter(self.fetchone, None)
+
+    def close(self):
+        """ Record the pending query and close the cursor """
+        self._finish()
+        self._cursor.close()
+
+    def __del__(self):
+        """ Record the pending query if the cursor is discarded without being closed """
+        try:
+            self._finish()
+        except:
+            pass
+
+    def __getattr__(self, name):
+        """ Pass everything else (description, rowcount, lastrowid, ...) through to the cursor """
+        return getattr(self._cursor, name)
+
+
+# For testing purposes, this module can run stand-alone.
+if __name__ == '__main__':
+    import sqlite3
+    import tempfile
+
+    statistics = QueryStatistics()
+    logFilename = os.path.join(tempfile.gettempdir(), 'QueryProfilerTest.log')
+    statistics.configure(True, slowQueryThreshold=0, logFilename=logFilename)
+    db = InstrumentedConnection(sqlite3.connect(':memory:'), statistics)
+
+    def loadEpisodes(cursor):
+        cursor.execute("CREATE TABLE Episodes2 (EpisodeNum INTEGER, EpisodeID VARCHAR(100))")
+        cursor.executemany("INSERT INTO Episodes2 VALUES (?, ?)", [(n, 'Episode %d' % n) for n in range(1000)])
+        for n in range(10):
+            cursor.execute("SELECT EpisodeID FROM Episodes2 WHERE EpisodeNum = %d" % n)
+            cursor.fetchall()
+        cursor.execute("SELECT * FROM Episodes2   WHERE EpisodeNum IN (?, ?, ?)", (1, 2, 3))
+        for row in cursor:
+            pass
+        cursor.close()
+
+    loadEpisodes(db.cursor())
+    (results, seconds) = statistics.summary()
+    for (query, caller, count, total, maximum, rows, shape) in results:
+        print '%4d x %8.3f ms %6d rows  %-20s %-30s %s' % (count, total * 1000, rows, caller, shape, query)
+    print
+    print 'Slow Query Log:'
+    print open(logFilename).read()
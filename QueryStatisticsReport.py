@@ -0,0 +1,146 @@
+# Copyright (C) 2003 - 2015 The Board of Regents of the University of Wisconsin System 
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of version 2 of the GNU General Public License as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+""" A Utility Program to turn Query Profiling on and off and report which database queries are taking the most time. """
+
+__author__ = 'David Woods <dwoods@wcer.wisc.edu>'
+
+DEBUG = False
+if DEBUG:
+    print "QueryStatisticsReport DEBUG is ON!"
+
+
+# import wxPython
+import wx
+
+# import Transana's Database Interface
+import DBInterface
+# import Transana's Global module
+import TransanaGlobal
+
+class QueryStatisticsReport(wx.Dialog):
+    """ This window displays the Query Statistics Report form. """
+    def __init__(self,parent,id,title):
+        # Define the main Frame for the Query Statistics Report
+        wx.Dialog.__init__(self, parent, -1, title, size = (710,650), style=wx.DEFAULT_DIALOG_STYLE|wx.RESIZE_BORDER|wx.NO_FULL_REPAINT_ON_RESIZE)
+        # Set the background to White
+        self.SetBackgroundColour(wx.WHITE)
+        # To look right, the Mac needs the Small Window Variant.
+        if "__WXMAC__" in wx.PlatformInfo:
+            self.SetWindowVariant(wx.WINDOW_VARIANT_SMALL)
+
+        # Create a Sizer for the form
+        box = wx.BoxSizer(wx.VERTICAL)
+
+        # Create a sizer for the Buttons
+        boxButtons = wx.BoxSizer(wx.HORIZONTAL)
+
+        # Add an "Update Report" button
+        self.btnUpdate = wx.Button(self, -1, _("Update Report"))
+        # Add the Update button to the Buttons sizer
+        boxButtons.Add(self.btnUpdate, 0, wx.LEFT, 6)
+        # Bind the OnUpdate event to the Update button's press event
+        self.btnUpdate.Bind(wx.EVT_BUTTON, self.OnUpdate)
+        
+        # Add a "Reset" button
+        self.btnReset = wx.Button(self, -1, _("Reset"))
+        # Add the Reset button to the Buttons sizer
+        boxButtons.Add(self.btnReset, 0, wx.LEFT, 6)
+        # Bind the OnReset event to the Reset button's press event
+        self.btnReset.Bind(wx.EVT_BUTTON, self.OnReset)
+
+        # Add a spacer
+        boxButtons.Add((1, 1), 1, wx.EXPAND)
+
+        # Add a "Record Query Timing" checkbox
+        self.queryProfiling = wx.CheckBox(self, -1, _("Record Query Timing"))
+        # Initialize the checkbox from the Configuration Data
+        self.queryProfiling.SetValue(TransanaGlobal.configData.queryProfiling)
+        # Add the checkbox to the Button sizer
+        boxButtons.Add(self.queryProfiling, 0, wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, 12)
+        # Bind the Query Profiling Checkbox to an event
+        self.queryProfiling.Bind(wx.EVT_CHECKBOX, self.OnSettingsChange)
+
+        # Create a label for the Slow Query Threshold
+        txtThreshold = wx.StaticText(self, -1, _("Log queries slower than (ms)"))
+        # Add the label to the Button sizer
+        boxButtons.Add(txtThreshold, 0, wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, 3)
+        # Add a SpinCtrl for the Slow Query Threshold, in milliseconds
+        self.slowQueryThreshold = wx.SpinCtrl(self, -1, size=(80, -1), min=1, max=600000, initial=TransanaGlobal.configData.slowQueryThreshold)
+        # Add the SpinCtrl to the Button sizer
+        boxButtons.Add(self.slowQueryThreshold, 0, wx.RIGHT, 6)
+        # Bind the Slow Query Threshold to an event
+        self.slowQueryThreshold.Bind(wx.EVT_SPINCTRL, self.OnSettingsChange)
+        
+        # Create a Sizer for the Memo section
+        boxMemo = wx.BoxSizer(wx.VERTICAL)
+        # Create a label for the Memo section
+        txtMemo = wx.StaticText(self, -1, _("Query Statistics"))
+        # Put the label in the Memo Sizer, with a little padding below
+        boxMemo.Add(txtMemo, 0, wx.BOTTOM, 3)
+        # Add a TextCtrl for the Report text.  This is read only, as it is filled programmatically.
+        self.memo = wx.TextCtrl(self, -1, style = wx.TE_MULTILINE | wx.TE_DONTWRAP | wx.TE_READONLY)
+        # Put the Memo control in the Memo Sizer
+        boxMemo.Add(self.memo, 1, wx.EXPAND)
+
+        # Add the Buttons Sizer to the Form Sizer
+        box.Add(boxButtons, 0, wx.EXPAND | wx.ALL, 4)
+        # Put the Memo Sizer in the form sizer
+        box.Add(boxMemo, 1, wx.EXPAND | wx.ALL, 4)
+
+        # Attach the Form's Main Sizer to the form
+        self.SetSizer(box)
+        # Set AutoLayout on
+        self.SetAutoLayout(True)
+        # Lay out the form
+        self.Layout()
+        # Set the minimum size for the form.
+        self.SetSizeHints(minW = 600, minH = 440)
+        # Center the form on the screen
+        self.CentreOnScreen()
+        # Populate the report
+        self.OnUpdate(None)
+
+    def OnUpdate(self, event):
+        """ Update Report handler """
+        # Change to the Wait Cursor
+        self.SetCursor(wx.StockCursor(wx.CURSOR_WAIT))
+        # Clear the old Report data
+        self.memo.Clear()
+        # Get the new Query Statistics Report text from the Database Interface and put it in the Memo
+        self.memo.AppendText(DBInterface.ReportQueryStatistics())
+        # Move back to the top of the report
+        self.memo.SetInsertionPoint(0)
+        # Change back to the Arrow Cursor
+        self.SetCursor(wx.StockCursor(wx.CURSOR_ARROW))
+
+    def OnReset(self, event):
+        """ Reset button handler """
+        # Discard the statistics collected so far
+        DBInterface.ResetQueryStatistics()
+        # Update the report, which will now be empty
+        self.OnUpdate(event)
+
+    def OnSettingsChange(self, event):
+        """ Handle changes to the Query Profiling settings """
+        # Save the new settings in the Configuration Data so they are remembered next time
+        TransanaGlobal.configData.queryProfiling = self.queryProfiling.GetValue()
+        TransanaGlobal.configData.slowQueryThreshold = self.slowQueryThreshold.GetValue()
+        TransanaGlobal.configData.SaveConfiguration()
+        # Apply the new settings to database queries
+        DBInterface.ConfigureQueryProfiling(TransanaGlobal.configData.queryProfiling, TransanaGlobal.configData.slowQueryThreshold)
+        # Update the report so it reflects the new settings
+        self.OnUpdate(event)
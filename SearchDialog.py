@@ -63,6 +63,8 @@ class SearchDialog(wx.Dialog):
         # Let's create an "Undo Stack" for the search terms
         self.ClearSearchStack()
         self.configName = ''
+        # The Search Query text of the saved Search that was last loaded or saved
+        self.savedSearchText = ''
         self.reportType = 15
 
         # Specify the minimum acceptable width and height for this window
@@ -191,22 +193,20 @@ class SearchDialog(wx.Dialog):
             selectionNotebook.SetBackgroundColour(wx.WHITE)
 
 
-            # *********************************************************************************************************
             # Add a Panel to the Notebook for Text Search information
-#            panelText = wx.Panel(selectionNotebook, -1)
-#            panelText.SetBackgroundColour(wx.RED)
+            panelText = wx.Panel(selectionNotebook, -1)
 
             # Add a Sizer to the Text Search Panel
-#            panelTextSizer = wx.BoxSizer(wx.VERTICAL)
+            panelTextSizer = wx.BoxSizer(wx.VERTICAL)
 
+            # Add the Search Text label, box, and instructions to the Text Search Panel
+            self.AddTextSearch(panelText, panelTextSizer)
 
+            # Add the Text Search Sizer to the Text Search Panel
+            panelText.SetSizer(panelTextSizer)
 
-            # Add the Text Search Sizer to the Collections Panel
-#            panelText.SetSizer(panelTextSizer)
-
-            # Add the Text Search Panel to the Notebook as the initial page
-#            selectionNotebook.AddPage(panelText, _("Text Search"), True)
-            # *********************************************************************************************************
+            # Add the Text Search Panel to the Notebook
+            selectionNotebook.AddPage(panelText, _("Text Search"), False)
 
             # Add a Panel to the Notebook for Collection information
             panelCollections = wx.Panel(selectionNotebook, -1)
@@ -477,12 +477,10 @@ class SearchDialog(wx.Dialog):
             # Add the Notebook to the form's Main Sizer
             mainSizer.Add(selectionNotebook, 5, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 10)
 
-            # *****************************************************************************************************
             # Set the Text Search Panel to AutoLayout
-#            panelText.SetAutoLayout(True)
+            panelText.SetAutoLayout(True)
             # Lay Out the Text Search Panel
-#            panelText.Layout()
-            # *****************************************************************************************************
+            panelText.Layout()
 
             # Set the Collection Panel to AutoLayout
             panelCollections.SetAutoLayout(True)
@@ -496,6 +494,9 @@ class SearchDialog(wx.Dialog):
 
         # TRADITIONAL Keywords Only Interface
         else:
+
+            # Add the Search Text label, box, and instructions to the form
+            self.AddTextSearch(self, mainSizer)
             
             # Add Boolean Operators Label
             operatorsText = wx.StaticText(self, -1, _('Operators:'))
@@ -694,6 +695,40 @@ class SearchDialog(wx.Dialog):
         if len(self.kw_list) > 0:
             self.kw_lb.SetSelection(0)
 
+    def AddTextSearch(self, parent, sizer):
+        """ Add the Search Text label, box, and instructions to parent, using sizer """
+        # Add Search Text Label
+        searchTextText = wx.StaticText(parent, -1, _('Search Text:'))
+        sizer.Add(searchTextText, 0, wx.TOP | wx.LEFT | wx.RIGHT, 10)
+        sizer.Add((0, 3))
+
+        # Add Search Text Box
+        self.textQuery = wx.TextCtrl(parent, -1)
+        sizer.Add(self.textQuery, 0, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 10)
+        # Check whether the Search can be done whenever the Search Text changes
+        self.textQuery.Bind(wx.EVT_TEXT, self.OnTextQuery)
+
+        # Add instructions for the Search Text
+        prompt = _('Transcripts, Documents, Quotes, and Clips whose text includes all of the words will be included.\nPut a phrase in quotation marks, as in "the red car".  End a word with * to find words that start\nwith it, as in photo*.  If there is also a keyword Search Query, items must match both.')
+        instructions = wx.StaticText(parent, -1, prompt)
+        sizer.Add(instructions, 0, wx.LEFT | wx.RIGHT | wx.BOTTOM, 10)
+
+    def OnTextQuery(self, event):
+        """ Event Handler for when the Search Text changes """
+        # See if the Search can be done now
+        self.EnableTextSearch()
+
+    def EnableTextSearch(self):
+        """ A Text Search doesn't need a keyword Search Query.  If there's no keyword Search Query, enable the
+            Search button when there's Search Text and at least one of the "Include" checkboxes is checked. """
+        # If there is no keyword Search Query ...
+        if len(self.searchQuery.GetValue().strip()) == 0:
+            # ... the Search can be done if there is Search Text and something to include in the results
+            self.btnSearch.Enable((len(self.textQuery.GetValue().strip()) > 0) and
+                                  (self.includeDocuments.IsChecked() or self.includeEpisodes.IsChecked() or
+                                   self.includeQuotes.IsChecked() or self.includeClips.IsChecked() or
+                                   self.includeSnapshots.IsChecked()))
+
     def OnCollectionsChecked(self, event):
         """ Event Handler for when a Collection is checked un-checked """
         # Get the item that has been checked/unchecked
@@ -961,6 +996,8 @@ class SearchDialog(wx.Dialog):
             self.btnSearch.Enable(False)
             # and the save button
             self.btnFileSave.Enable(False)
+        # A Text Search can be done without a keyword Search Query
+        self.EnableTextSearch()
             
 
     def OnKeywordGroupSelect(self, event):
@@ -1116,6 +1153,8 @@ class SearchDialog(wx.Dialog):
                 searchText = searchText.decode(TransanaGlobal.encoding)
                 # Replace the Search Query with the value from the database.
                 self.searchQuery.SetValue(searchText)
+                # Remember the saved Search Query
+                self.savedSearchText = searchText
                 # Only valid searches can be saved, so we know the desired state of the interface buttons
                 # Disable the "Add" button
                 self.btnAdd.Enable(False)
@@ -1171,6 +1210,14 @@ class SearchDialog(wx.Dialog):
             # update the Collections Check Tree based on this configuration
             self.UpdateCollectionList(self.ctcCollections, self.ctcRoot, collectionsToSkip)
 
+    def GetSavedSearchName(self):
+        """ Return the name of the saved Search being run, or None if the Search Query is not a saved Search
+            or has been changed since it was loaded or saved """
+        if (self.configName != '') and (self.searchQuery.GetValue() == self.savedSearchText):
+            return self.configName
+        else:
+            return None
+
     def GetCollectionList(self, collTree, collNode, checkedVal):
         """ Recursively builds a list of all nodes for the Search Collections checkbox tree that match checkedVal """
         # Initialize a list of results to hold the Checked Collection records
@@ -1297,6 +1344,9 @@ class SearchDialog(wx.Dialog):
                     DBCursor.execute(query, values)
                     # Close the cursor
                     DBCursor.close()
+                    # This is now the saved Search
+                    self.configName = configName
+                    self.savedSearchText = filterData
 
                 # If we can't proceed with the save ...
                 else:
@@ -520,19 +520,22 @@ class Snapshot(DataObject.DataObject):
             # Execute the query
             c.execute(query, (self.number, ))
 
+        # Record the normalized image file name that is used to find Snapshots by file path
+        DBInterface.UpdateMediaPathKeys(c, 'Snapshots2', 'SnapshotNum', self.number)
+
         # Initialize a blank error prompt
         prompt = ''
-        # Add the Snapshot keywords back.  Iterate through the Keyword List
-        for kws in self._kwlist:
-            # Try to add the Snapshot Keyword record.  If it is NOT added, the keyword has been changed by another user!
-            if not DBInterface.insert_clip_keyword(0, 0, 0, 0, self.number, kws.keywordGroup, kws.keyword, kws.example):
-                # if the prompt isn't blank ...
-                if prompt != '':
-                    # ... add a couple of line breaks to it
-                    prompt += u'\n\n'
-                # Add the current keyword to the error prompt
-                # Encode with UTF-8 rather than TransanaGlobal.encoding because this is a prompt, not DB Data.
-                prompt += unicode(_('Keyword "%s : %s" cannot be added to Snapshot "%s".\nAnother user must have edited the keyword while you were adding it.'), 'utf8') % (kws.keywordGroup, kws.keyword, self.id)
+        # Add the Snapshot keywords back, all at once.  If a keyword is NOT added, the keyword has been changed by another user!
+        keywordList = [('Snapshot', self.number, kws.keywordGroup, kws.keyword, kws.example) for kws in self._kwlist]
+        # Iterate through the keywords that could not be added
+        for (objType, objNum, kwg, kw, example) in DBInterface.insert_clip_keywords(keywordList, mode='new', use_transactions=False):
+            # if the prompt isn't blank ...
+            if prompt != '':
+                # ... add a couple of line breaks to it
+                prompt += u'\n\n'
+            # Add the current keyword to the error prompt
+            # Encode with UTF-8 rather than TransanaGlobal.encoding because this is a prompt, not DB Data.
+            prompt += unicode(_('Keyword "%s : %s" cannot be added to Snapshot "%s".\nAnother user must have edited the keyword while you were adding it.'), 'utf8') % (kwg, kw, self.id)
 
         # If there is an error prompt ...
         if prompt != '':
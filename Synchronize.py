@@ -30,16 +30,22 @@ import time
 # Import wxPython
 import wx
 
+# Import Transana's Audio Alignment module, for finding the offset between media files automatically
+import AudioAlignment
 # Import Transana Dialogs
 import Dialogs
 # Import Transana's Graphics Control Class for making the waveforms
 import GraphicsControlClass
+# Import Transana's Media Cache, which names wave files for the contents of their media files
+import MediaCache
 # Import Transana's Miscellaneous module for time formatting functions
 import Misc
 # Import Transana's Globals
 import TransanaGlobal
 # Import Transana's Images
 import TransanaImages
+# Import Transana's Wave Reader
+import WaveReader
 # Import the Video Player module
 import video_player
 # Import Transana's module for creating Waveform Graphics
@@ -437,6 +443,10 @@ class Synchronize(wx.Dialog):
             print "Waveform FAIL for", filename2.encode('utf8')
             # .. and exit the Synchronize routine.
             return
+        # Open both wave files once, rather than every time the waveform is redrawn during playback.  Each redraw
+        # reads only the frames it shows.
+        self.waveReader1 = WaveReader.WaveReader(self.waveFile1)
+        self.waveReader2 = WaveReader.WaveReader(self.waveFile2)
         # Add the waveform to the sizer
         hSizer.Add(self.waveform1, 10)
         # Add a spacer
@@ -454,6 +464,12 @@ class Synchronize(wx.Dialog):
 
         # Add the offset text to the button sizer
         btnSizer.Add(self.txtOffset, 0, wx.ALL, 6)
+        # Create an Auto Align button, which finds the offset by comparing the media files' sound
+        self.btnAutoAlign = wx.Button(self.pnl, -1, _("Auto Align"))
+        # Add the Auto Align button to the button sizer
+        btnSizer.Add(self.btnAutoAlign, 0, wx.TOP | wx.RIGHT | wx.BOTTOM, 6)
+        # Bind a handler to the Auto Align button
+        self.btnAutoAlign.Bind(wx.EVT_BUTTON, self.OnAutoAlign)
         # Add a horizontal spacer to the button sizer
         btnSizer.Add((0, 0), 1)
         # Create an OK button
@@ -500,6 +516,8 @@ class Synchronize(wx.Dialog):
         wx.EVT_KEY_DOWN(self.waveform1, self.OnKeyDown)
         wx.EVT_KEY_UP(self.txtOffset, self.OnKeyUp)
         wx.EVT_KEY_DOWN(self.txtOffset, self.OnKeyDown)
+        wx.EVT_KEY_UP(self.btnAutoAlign, self.OnKeyUp)
+        wx.EVT_KEY_DOWN(self.btnAutoAlign, self.OnKeyDown)
         wx.EVT_KEY_UP(self.btnOK, self.OnKeyUp)
         wx.EVT_KEY_DOWN(self.btnOK, self.OnKeyDown)
         wx.EVT_KEY_UP(self.btnCancel, self.OnKeyUp)
@@ -537,8 +555,13 @@ class Synchronize(wx.Dialog):
 
     def GetData(self):
         """ Shows the Synchronize Dialog (modally) and returns the offset between the files """
+        # Show the dialog
+        result = self.ShowModal()
+        # Close the wave files, so they can be replaced if the media files are re-extracted
+        self.waveReader1.close()
+        self.waveReader2.close()
         # If the user pressed OK ...
-        if self.ShowModal() == wx.ID_OK:
+        if result == wx.ID_OK:
             # ... return the difference between the two media file positions
             return (self.pos1 - self.pos2, self.mp2.GetMediaLength())
         # Otherwise ...
@@ -684,13 +707,15 @@ class Synchronize(wx.Dialog):
             # You can only EXIT the form if both players are paused!  (This makes the synch more accurate, and prevents Destroy problems.)
             self.btnOK.Enable(True)
             self.btnCancel.Enable(True)
+            self.btnAutoAlign.Enable(True)
         # If either player is playing ...
         else:
             # ... change the middle button to Pause ...
             self.btnPlay2.SetLabel(_("Pause Both"))
-            # ... and disable the OK and Cancel buttons!
+            # ... and disable the OK, Cancel, and Auto Align buttons!
             self.btnOK.Enable(False)
             self.btnCancel.Enable(False)
+            self.btnAutoAlign.Enable(False)
         # Update the Waveforms
         self.UpdateWaveforms()
 
@@ -885,6 +910,45 @@ class Synchronize(wx.Dialog):
         # Update the offset text box
         self.txtOffset.SetValue(Misc.time_in_ms_to_str(self.pos1 - self.pos2, True))
 
+    def OnAutoAlign(self, event):
+        """ Find the offset between the media files by comparing their sound, and position the media files to match """
+        # Comparing the sound takes a moment, so show the busy cursor
+        busyCursor = wx.BusyCursor()
+        try:
+            # Find the offset, and how confident we can be of it
+            (offset, confidence) = AudioAlignment.FindOffset(self.waveReader1, self.waveReader2)
+        except:
+            print "Synchronize.OnAutoAlign():"
+            print sys.exc_info()[0], sys.exc_info()[1]
+            (offset, confidence) = (None, 0.0)
+        # Restore the normal cursor
+        del(busyCursor)
+        # If no reliable offset was found ...
+        if (offset == None) or (confidence < AudioAlignment.ALIGN_MIN_CONFIDENCE):
+            # ... tell the user, and leave the media files where they are
+            if 'unicode' in wx.PlatformInfo:
+                # Encode with UTF-8 rather than TransanaGlobal.encoding because this is a prompt, not DB Data.
+                prompt = unicode(_('Transana could not find a reliable match between the sound of these media files.\nPlease synchronize them manually.'), 'utf8')
+            else:
+                prompt = _('Transana could not find a reliable match between the sound of these media files.\nPlease synchronize them manually.')
+            errordlg = Dialogs.ErrorDialog(self, prompt)
+            errordlg.ShowModal()
+            errordlg.Destroy()
+            return
+        # Position the media files at the offset found, 15 seconds in so the waveform cursor can be centered in the waveform
+        if offset > 0:
+            self.pos1 = offset + 15000
+            self.pos2 = 15000
+        else:
+            self.pos1 = 15000
+            self.pos2 = abs(offset) + 15000
+        self.mp1.SetCurrentVideoPosition(self.pos1)
+        self.mp2.SetCurrentVideoPosition(self.pos2)
+        # Update the waveforms to reflect the change
+        self.UpdateWaveforms()
+        # Update the offset text box
+        self.txtOffset.SetValue(Misc.time_in_ms_to_str(self.pos1 - self.pos2, True))
+
     def OnSlider(self, event):
         """ Event handler for the Zoom Sliders """
         # Call the underlying parent event.  (Mac wasn't letting go of the handles!)
@@ -992,17 +1056,15 @@ class Synchronize(wx.Dialog):
 
     def LoadWaveform(self, mediaFile):
         """ Load a Waveform, based on the mediaFile, into the GraphicControl """
-        # Separate the path from the file name
-        (path1, fn1) = os.path.split(mediaFile)
-        # Separate the file name from the extension
-        (fnroot1, ext1) = os.path.splitext(fn1)
-        # Determine the correct WAV file name
-        waveFilename1 = os.path.join(TransanaGlobal.configData.visualizationPath, fnroot1 + '.wav')
+        # Get the Media Cache for the Waveforms Directory
+        waveformCache = MediaCache.MediaCache(TransanaGlobal.configData.visualizationPath, TransanaGlobal.configData.waveformCacheLimit * 1048576)
+        # Determine the correct WAV file name, which depends on the media file's contents, and whether it exists
+        (waveFilename1, waveFileExists) = waveformCache.WaveFilename(mediaFile)
 
         # We just have to assume that audio extraction worked.  Signal success!
         dllvalue = 0
         # If the WAV file does NOT exist, we need to do Audio Extraction.
-        if not os.path.exists(waveFilename1):
+        if not waveFileExists:
             # Start Exception Handling
             try:
                 # If the Waveforms Directory does not exist, create it.
@@ -1018,8 +1080,9 @@ class Synchronize(wx.Dialog):
                     prompt = _("Extracting %s\nfrom %s")
                 # Create the Waveform Progress Dialog
                 progressDialog = WaveformProgress.WaveformProgress(self, prompt % (waveFilename1, mediaFile))
-                # Tell the Waveform Progress Dialog to handle the audio extraction modally.
-                progressDialog.Extract(mediaFile, waveFilename1)
+                # Tell the Waveform Progress Dialog to handle the audio extraction modally, streaming it so
+                # the waveform is shown while it is extracted.
+                progressDialog.Extract(mediaFile, waveFilename1, mode='AudioExtraction-Stream')
                 # Get the Error Log that may have been created
                 errorLog = progressDialog.GetErrorMessages()
                 # Okay, we're done with the Progress Dialog here!
@@ -1028,6 +1091,10 @@ class Synchronize(wx.Dialog):
                 if (len(errorLog) == 1) and (errorLog[0] == 'Cancelled'):
                     # ... signal that the WAV file was NOT created!
                     dllvalue = 1  
+                # If the WAV file was created ...
+                elif os.path.exists(waveFilename1):
+                    # ... add it to the Media Cache
+                    waveformCache.Add(mediaFile, waveFilename1)
             # handle exceptions
             except UnicodeDecodeError:
                 if DEBUG:
@@ -1113,8 +1180,8 @@ class Synchronize(wx.Dialog):
             # If topLeft is checked ...
             if self.topLeft.IsChecked():
                 # Determine the file names so that LEFT (Red) will be on top
-                filenames = [{'filename' : self.waveFile1, 'offset' : diff1, 'length' : self.mp1.GetMediaLength()},
-                             {'filename' : self.waveFile2, 'offset' : diff2, 'length' : self.mp2.GetMediaLength()}]
+                filenames = [{'filename' : self.waveFile1, 'reader' : self.waveReader1, 'offset' : diff1, 'length' : self.mp1.GetMediaLength()},
+                             {'filename' : self.waveFile2, 'reader' : self.waveReader2, 'offset' : diff2, 'length' : self.mp2.GetMediaLength()}]
                 # Determine the color order
                 waveformColors = (wx.BLUE, wx.RED)
                 # Load the new graphic into the Waveform Control.  (Passing ":memory:" rather than a filename causes WaveformGraphic to return a Bitmap object rather than saving it to a file!)
@@ -1122,8 +1189,8 @@ class Synchronize(wx.Dialog):
             # if topLeft is NOT checked (i.e. topRight is checked) ...
             else:
                 # Determine the file names so that RIGHT (Blue) will be on top
-                filenames = [{'filename' : self.waveFile2, 'offset' : diff2, 'length' : self.mp2.GetMediaLength()},
-                             {'filename' : self.waveFile1, 'offset' : diff1, 'length' : self.mp1.GetMediaLength()}]
+                filenames = [{'filename' : self.waveFile2, 'reader' : self.waveReader2, 'offset' : diff2, 'length' : self.mp2.GetMediaLength()},
+                             {'filename' : self.waveFile1, 'reader' : self.waveReader1, 'offset' : diff1, 'length' : self.mp1.GetMediaLength()}]
                 # Determine the color order
                 waveformColors = (wx.RED, wx.BLUE)
                 # Load the new graphic into the Waveform Control.  (Passing ":memory:" rather than a filename causes WaveformGraphic to return a Bitmap object rather than saving it to a file!)
@@ -0,0 +1,295 @@
+# Copyright (C) 2002 - 2015 The Board of Regents of the University of Wisconsin System
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of version 2 of the GNU General Public License as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""This module prepares Transcript, Document, Quote, and Note text for the Text Index, which allows searching
+for words, phrases, and word prefixes without reading the text of every object.  DBInterface stores the index
+in the TextIndex table and uses these functions to build it and to answer Text Searches."""
+
+__author__ = 'David Woods <dwoods@wcer.wisc.edu>'
+
+# import Python's htmlentitydefs module to decode XML character entities
+import htmlentitydefs
+# import Python's Regular Expression module
+import re
+
+# The character that starts a Time Code.  (This must match TransanaConstants.TIMECODE_CHAR, but this module
+# does not import wxPython, so it can be used and tested on its own.)
+TIMECODE_CHAR = u'\xa4'
+
+# Words longer than this are not indexed.  (They are usually data, not words.)
+MAX_TOKEN_LENGTH = 50
+
+# A Time Code is the Time Code character followed by the time in milliseconds in angle brackets
+TIMECODE_PATTERN = re.compile(TIMECODE_CHAR + u'<[\d]*>')
+# A word is a run of letters and digits, in any language
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+# A Text Search is made up of "quoted phrases" and unquoted words
+QUERY_PATTERN = re.compile(r'"([^"]*)"?|(\S+)', re.UNICODE)
+
+# The parts of an RTF document:  control words (\word, \word123), hex characters (\'a4), control symbols (\~, \{),
+# braces, line breaks (which RTF ignores), and everything else, which is text.
+RTF_PATTERN = re.compile(r"\\([a-z]{1,32})(-?\d{1,10})?[ ]?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+|(.)", re.I | re.S)
+# RTF groups that hold formatting information or embedded objects rather than text
+RTF_DESTINATIONS = set(['aftncn', 'aftnsep', 'aftnsepc', 'annotation', 'atnauthor', 'atndate', 'atnicn', 'atnid',
+                        'atnparent', 'atnref', 'atntime', 'atrfend', 'atrfstart', 'author', 'background', 'bkmkend',
+                        'bkmkstart', 'buptim', 'colortbl', 'comment', 'creatim', 'doccomm', 'fonttbl', 'footer',
+                        'footerf', 'footerl', 'footerr', 'footnote', 'ftncn', 'ftnsep', 'ftnsepc', 'header', 'headerf',
+                        'headerl', 'headerr', 'info', 'keywords', 'listtable', 'listoverridetable', 'object', 'operator',
+                        'pict', 'printim', 'private', 'revtim', 'rxe', 'stylesheet', 'subject', 'tc', 'title', 'txe',
+                        'xe'])
+# RTF control words that stand for text
+RTF_SPECIAL_CHARACTERS = {'par' : u'\n', 'sect' : u'\n', 'page' : u'\n', 'line' : u'\n', 'tab' : u'\t',
+                          'emdash' : u'\u2014', 'endash' : u'\u2013', 'emspace' : u' ', 'enspace' : u' ',
+                          'bullet' : u'\u2022', 'lquote' : u'\u2018', 'rquote' : u'\u2019',
+                          'ldblquote' : u'\u201c', 'rdblquote' : u'\u201d'}
+
+# Embedded images in wxRichTextCtrl XML hold their data as text, which must not be indexed
+XML_IMAGE_PATTERN = re.compile(r'<image\b.*?</image>', re.S)
+# wxRichTextCtrl XML puts quotes around text that starts or ends with a space
+XML_QUOTED_TEXT_PATTERN = re.compile(r'(<text\b[^>]*>)"(.*?)"(</text>)', re.S)
+# Paragraph tags separate words
+XML_PARAGRAPH_PATTERN = re.compile(r'</?paragraph\b[^>]*>')
+# All other tags just hold formatting.  (A word can be split between two formatted runs of text.)
+XML_TAG_PATTERN = re.compile(r'<[^>]*>')
+# XML character entities (&lt;, &#164;, &#xA4;)
+XML_ENTITY_PATTERN = re.compile(r'&(#x[0-9a-fA-F]+|#[0-9]+|[a-zA-Z]+);')
+
+
+def PlainText(text, encoding='utf8'):
+    """ Return the plain text of a Transcript, Document, Quote, or Note, which may be in RTF, in wxRichTextCtrl XML,
+        or plain text, without formatting or Time Codes.  Encoded text is decoded using encoding. """
+    # If there's no text, there's nothing to index
+    if not text:
+        return u''
+    # Decode text from the database.  Very old records may not use the database's encoding.
+    if isinstance(text, str):
+        try:
+            text = text.decode(encoding)
+        except UnicodeDecodeError:
+            text = text.decode('latin-1')
+    # Remove the markup from RTF ...
+    if text[:5].lower() == u'{\\rtf':
+        text = RTFToText(text)
+    # ... or from XML
+    elif text[:5].lower() == u'<?xml':
+        text = XMLToText(text)
+    # Remove the Time Codes
+    return TIMECODE_PATTERN.sub(u' ', text)
+
+def RTFToText(text):
+    """ Return the text of an RTF document without formatting """
+    # Keep track of the (skip count, ignorable) state for each open group
+    stack = []
+    # Is the current group one that holds no text?
+    ignorable = False
+    # How many characters follow a \u Unicode character as its non-Unicode equivalent?
+    ucskip = 1
+    # How many of those characters remain to be skipped?
+    curskip = 0
+    # Collect the text
+    out = []
+    for match in RTF_PATTERN.finditer(text):
+        (word, arg, hexChar, symbol, brace, char) = match.groups()
+        # A brace opens or closes a group
+        if brace:
+            curskip = 0
+            if brace == u'{':
+                stack.append((ucskip, ignorable))
+            elif len(stack) > 0:
+                (ucskip, ignorable) = stack.pop()
+        # A control symbol
+        elif symbol:
+            curskip = 0
+            # \~ is a non-breaking space
+            if symbol == u'~':
+                if not ignorable:
+                    out.append(u' ')
+            # \{, \}, and \\ are the characters themselves
+            elif symbol in u'{}\\':
+                if not ignorable:
+                    out.append(symbol)
+            # \* marks a group that can be ignored
+            elif symbol == u'*':
+                ignorable = True
+        # A control word
+        elif word:
+            curskip = 0
+            if word in RTF_DESTINATIONS:
+                ignorable = True
+            elif ignorable:
+                pass
+            elif word in RTF_SPECIAL_CHARACTERS:
+                out.append(RTF_SPECIAL_CHARACTERS[word])
+            elif (word == 'uc') and (arg != None):
+                ucskip = int(arg)
+            elif (word == 'u') and (arg != None):
+                # RTF writes Unicode characters above 32767 as negative numbers
+                c = int(arg)
+                if c < 0:
+                    c += 0x10000
+                out.append(unichr(c))
+                curskip = ucskip
+        # A hex character
+        elif hexChar:
+            if curskip > 0:
+                curskip -= 1
+            elif not ignorable:
+                # Transana's RTF uses the Windows character set, where \'a4 is the Time Code character
+                out.append(chr(int(hexChar, 16)).decode('cp1252', 'replace'))
+        # Plain text
+        elif char:
+            if curskip > 0:
+                curskip -= 1
+            elif not ignorable:
+                out.append(char)
+    return u''.join(out)
+
+def XMLToText(text):
+    """ Return the text of a wxRichTextCtrl XML document without formatting """
+    # Remove embedded images
+    text = XML_IMAGE_PATTERN.sub(u' ', text)
+    # Remove the quotes around text that starts or ends with a space
+    text = XML_QUOTED_TEXT_PATTERN.sub(r'\1\2\3', text)
+    # Paragraphs end with a line break
+    text = XML_PARAGRAPH_PATTERN.sub(u'\n', text)
+    # Remove all other tags
+    text = XML_TAG_PATTERN.sub(u'', text)
+    # Decode the character entities.  This must come last, so that &lt; and &gt; in the text aren't taken for tags.
+    return XML_ENTITY_PATTERN.sub(_decodeEntity, text)
+
+def _decodeEntity(match):
+    """ Return the character for an XML character entity """
+    entity = match.group(1)
+    try:
+        if entity[:2].lower() == u'#x':
+            return unichr(int(entity[2:], 16))
+        elif entity[:1] == u'#':
+            return unichr(int(entity[1:]))
+        elif entity in htmlentitydefs.name2codepoint:
+            return unichr(htmlentitydefs.name2codepoint[entity])
+    except ValueError:
+        pass
+    # Leave anything we don't recognize alone
+    return match.group(0)
+
+def Tokenize(text):
+    """ Return the list of words in plain text, in lower case.  Words too long to index are included, so that
+        word positions match the text, but the index will skip them. """
+    return TOKEN_PATTERN.findall(text.lower())
+
+def TokenPositions(text, encoding='utf8'):
+    """ Return a dictionary of the positions of each word in a Transcript, Document, Quote, or Note, keyed by word """
+    positions = {}
+    for (position, token) in enumerate(Tokenize(PlainText(text, encoding))):
+        if len(token) <= MAX_TOKEN_LENGTH:
+            positions.setdefault(token, []).append(position)
+    return positions
+
+def EncodePositions(positions):
+    """ Convert a list of word positions to the string stored in the Text Index """
+    return ' '.join(['%d' % position for position in positions])
+
+def DecodePositions(positions):
+    """ Convert the string stored in the Text Index to a set of word positions """
+    return set(map(int, positions.split()))
+
+def ParseTextQuery(queryText):
+    """ Convert a Text Search into a list of terms, all of which must be found.  A term is a list of (word, prefix)
+        pairs that must appear next to each other in the text.  An unquoted word is a term of its own.  (If it holds
+        punctuation, as in "mother-in-law", it is treated as a phrase.)  A "quoted phrase" is one term.  A word, or
+        the last word of a phrase, that ends with "*" matches any word that starts with it. """
+    terms = []
+    for (phrase, word) in QUERY_PATTERN.findall(queryText):
+        # Whichever we found, a phrase or a word, is the text of the term
+        termText = phrase or word
+        # Break the term into words
+        tokens = Tokenize(termText)
+        # Skip terms that hold no words, or words too long to have been indexed
+        if (len(tokens) == 0) or (max([len(token) for token in tokens]) > MAX_TOKEN_LENGTH):
+            continue
+        # Only the last word can be a prefix, and only if the term ends with the "*"
+        prefix = termText.rstrip().endswith('*') and termText.rstrip().lower().endswith(tokens[-1] + '*')
+        terms.append([(token, False) for token in tokens[:-1]] + [(tokens[-1], prefix)])
+    return terms
+
+def MatchTerm(wordPositions):
+    """ Given, for each word in a term, a dictionary of position sets keyed by object, return the set of objects
+        where the words appear next to each other in order """
+    # Only objects that have all the words can match
+    objects = set(wordPositions[0].keys())
+    for positions in wordPositions[1:]:
+        objects &= set(positions.keys())
+    # A single word needs no position check
+    if len(wordPositions) == 1:
+        return objects
+    matches = set()
+    for obj in objects:
+        # Start from the word that appears least often in the object
+        counts = [len(positions[obj]) for positions in wordPositions]
+        anchor = counts.index(min(counts))
+        # Look for a position of that word where all the other words are in place around it
+        for position in wordPositions[anchor][obj]:
+            start = position - anchor
+            for offset in range(len(wordPositions)):
+                if not (start + offset) in wordPositions[offset][obj]:
+                    break
+            else:
+                matches.add(obj)
+                break
+    return matches
+
+
+# For testing purposes, this module can run stand-alone.
+if __name__ == '__main__':
+    import random
+    import time
+
+    # Check the text extraction
+    rtf = "{\\rtf1\\ansi\\ansicpg1252{\\fonttbl{\\f0 Courier New;}}{\\colortbl;\\red255\\green0\\blue0;}" + \
+          "\\f0 {\\cf1 \\'a4<12345>}The caf\\'e9 sign\\par said \\u8220?open\\u8221? \\{all\\} day{\\*\\bkmkstart x}\\tab ok}"
+    print "RTF:  %r" % PlainText(rtf)
+    xml = '<?xml version="1.0" encoding="UTF-8"?>\n<richtext version="1.0.0.0"><paragraphlayout><paragraph>' + \
+          '<text textcolor="#FF0000">&#164;</text><text textcolor="#FFFFFF">&lt;1234&gt;</text><text>"Hello, Wor"</text>' + \
+          '<text fontweight="92">ld &amp; caf\xc3\xa9</text></paragraph><paragraph><image imagetype="15"><data>89504E47</data>' + \
+          '</image><text>Second line</text></paragraph></paragraphlayout></richtext>'
+    print "XML:  %r" % PlainText(xml)
+    print "Query:", ParseTextQuery(u'photo* "the red car" mother-in-law "sun* shi*" ""')
+
+    # Build 50 documents of 20,000 words each from a 5,000 word vocabulary
+    random.seed(1)
+    vocabulary = ['word%d' % x for x in range(5000)]
+    documents = {}
+    for docNum in range(50):
+        documents[docNum] = ' '.join([random.choice(vocabulary) for x in range(20000)])
+    startTime = time.time()
+    index = {}
+    for (docNum, text) in documents.items():
+        for (token, positions) in TokenPositions(text).items():
+            index.setdefault(token, {})[docNum] = DecodePositions(EncodePositions(positions))
+    print "Indexed %d words:  %0.3f seconds" % (20000 * len(documents), time.time() - startTime)
+
+    # Compare phrase searches to a scan of the text
+    for x in range(20):
+        docNum = random.choice(documents.keys())
+        words = documents[docNum].split()
+        start = random.randint(0, len(words) - 3)
+        phrase = ' '.join(words[start:start + random.randint(1, 3)])
+        term = ParseTextQuery('"%s"' % phrase)[0]
+        startTime = time.time()
+        result = MatchTerm([index.get(token, {}) for (token, prefix) in term])
+        elapsed = time.time() - startTime
+        expected = set([num for (num, text) in documents.items() if (' %s ' % phrase) in (' %s ' % text)])
+        print "%3d documents in %6.2f ms, matches a scan: %s   %s" % (len(result), elapsed * 1000.0, result == expected, phrase)
@@ -105,6 +105,32 @@ USESRTC = True
 # Indicate if the Partial Transcript Editing fix should be applied
 partialTranscriptEdit = False
 
+# The maximum number of database connections the DBInterface Connection Pool will open for background threads.
+# (This is in addition to the main connection.)  Multi-user MySQL servers may limit connections per user.
+# A search runs up to six queries at once, one for each type of object searched.
+dbConnectionPoolSize = 6
+
+# sqlite Performance Profiles.  Each profile lists the settings applied to every sqlite connection when it is opened.
+#   cached_statements   the number of prepared statements Python keeps for re-use on each connection
+#   journal_mode        WAL (write-ahead logging) lets saves append to a log instead of rewriting a rollback journal.
+#                       WAL needs shared memory, so it does not work for databases on network drives.
+#   synchronous         how often sqlite waits for the disk.  NORMAL in WAL mode can lose the last few saves, but not
+#                       the database, if the computer loses power.  OFF can damage the database if the computer loses power.
+#   cache_size          the page cache size.  Negative numbers are in KB.
+#   mmap_size           how many bytes of the database file sqlite may read through memory mapping
+#   temp_store          where temporary tables and indexes for sorting go
+SQLITE_PROFILES = {'Compatible' : [('cached_statements', 100), ('journal_mode', 'DELETE'), ('synchronous', 'FULL'),
+                                   ('cache_size', -2000), ('mmap_size', 0), ('temp_store', 'DEFAULT')],
+                   'Balanced'   : [('cached_statements', 250), ('journal_mode', 'WAL'), ('synchronous', 'NORMAL'),
+                                   ('cache_size', -16000), ('mmap_size', 67108864), ('temp_store', 'MEMORY')],
+                   'Fast'       : [('cached_statements', 500), ('journal_mode', 'WAL'), ('synchronous', 'OFF'),
+                                   ('cache_size', -64000), ('mmap_size', 268435456), ('temp_store', 'MEMORY')]}
+# The order in which sqlite Performance Profiles are offered to the user
+SQLITE_PROFILE_NAMES = ['Compatible', 'Balanced', 'Fast']
+# The sqlite Performance Profile used unless the user selects another.  This keeps sqlite's own rollback journal
+# and full disk synchronization, so databases are not switched to WAL unless the user asks for it.
+SQLITE_PROFILE_DEFAULT = 'Compatible'
+
 # IDs for the Visualization Window
 VISUAL_BUTTON_ZOOMIN            =  wx.NewId()
 VISUAL_BUTTON_ZOOMOUT           =  wx.NewId()
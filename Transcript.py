@@ -560,6 +560,8 @@ class Transcript(DataObject.DataObject):
                 raise RecordNotFoundError, (self.id, len(recs))
             # Close the temporary database cursor
             tempDBCursor.close()
+        # Update the Text Index for the saved text
+        DBInterface.UpdateTextIndex('Transcript', self.number, self.text, c)
 
         # For Partial Transcript Editing, update the Paragraph Information for long transcripts
         self.UpdateParagraphs()
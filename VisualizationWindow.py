@@ -46,6 +46,8 @@ import Episode
 import GraphicsControlClass
 # Import Transana's Keyword Map Class, responsible for Keyword Visualizations
 import KeywordMapClass
+# Import Transana's Media Cache, which names wave files for the contents of their media files
+import MediaCache
 # Import Transana's Miscellaneous Functions
 import Misc
 # Import Transana's Quote Object
@@ -128,6 +130,8 @@ class VisualizationWindow(wx.Dialog):
 
         # redrawWhenIdle signals that the Waveform picture needs to be drawn when the CPU has time
         self.redrawWhenIdle = False
+        # The Waveform Renderer calculates waveforms in the background, so drawing them doesn't hold up the program
+        self.waveformRenderer = WaveformGraphic.WaveformRenderer(self.OnWaveformRefresh)
         # Initialize a list structure to hold wave file information
         self.waveFilename = []
         # Let's keep track of time since last redraw too
@@ -457,6 +461,13 @@ class VisualizationWindow(wx.Dialog):
         # Call the OnIdle handler's method explicitly, so this is in fact handled in real time rather than waiting for Idle time.
         self.OnIdle(None)
 
+    def OnWaveformRefresh(self):
+        """ The Waveform Renderer calls this when more of the waveform being shown has been calculated """
+        # If the window still exists and is showing a waveform ...
+        if self and (self.VisualizationType in ['Waveform', 'Hybrid']) and (len(self.waveFilename) > 0):
+            # ... signal that the Waveform needs to be redrawn
+            self.redrawWhenIdle = True
+
     def UpdateKeywordVisualization(self, textChangeOnly = False):
         """ Update the Keyword Visualization based on some sort of change in the data.  If this is called based on a change
             in the TEXT of a Document or Transcript, due to editing, the Coding involved won't have changed, so we can skip
@@ -570,8 +581,8 @@ class VisualizationWindow(wx.Dialog):
                         # ... add a "Show" variable to the waveform filename dictionary in the waveFilename list
                         #     that indicates if that waveform should be shown 
                         self.waveFilename[x]['Show'] = checkboxData[x][1]
-                    # Create the waveform graphic
-                    waveformGraphicImage = WaveformGraphic.WaveformGraphicCreate(self.waveFilename, ':memory:', start, length, self.waveform.canvassize, style='waveform')
+                    # Create the waveform graphic.  Any parts not yet calculated are drawn roughly, and will be drawn again when ready.
+                    waveformGraphicImage = self.waveformRenderer.Render(self.waveFilename, start, length, self.waveform.canvassize)
                     # If a waveform graphic was created ...
                     if waveformGraphicImage != None:
                         # ... clear the waveform
@@ -1317,18 +1328,16 @@ class VisualizationWindow(wx.Dialog):
                 os.makedirs(TransanaGlobal.configData.visualizationPath)
             # Initialize a result for the Waveform prompt
             result = wx.ID_NO
+            # Get the Media Cache for the Waveforms Directory
+            waveformCache = MediaCache.MediaCache(TransanaGlobal.configData.visualizationPath, TransanaGlobal.configData.waveformCacheLimit * 1048576)
             # Let's do audio extraction of all the files first
             for filenameItem in filenameList:
-                # Separate path and filename
-                (path, filename) = os.path.split(filenameItem['filename'])
-                # break filename into root filename and extension
-                (filenameroot, extension) = os.path.splitext(filename)
-                # Build the correct filename for the Wave File
-                waveFilename = os.path.join(TransanaGlobal.configData.visualizationPath, filenameroot + '.wav')
+                # Get the correct filename for the Wave File, which depends on the media file's contents, and whether it exists
+                (waveFilename, waveFileExists) = waveformCache.WaveFilename(filenameItem['filename'])
                 # Add information to the Waveform Filename list.  Offsets get adjusted for the largest negative value, so they are all 0 or higher!
                 self.waveFilename.append({'filename' : waveFilename, 'offset' : filenameItem['offset'] + abs(minVal), 'length' : filenameItem['length']})
                 # Create a Wave File if none exists!
-                if not(os.path.exists(waveFilename)):
+                if not waveFileExists:
                     # The user only needs to say Yes once, but will be asked for each file if they say No.  See if they've already said Yes.
                     if result != wx.ID_YES:
 
@@ -1373,8 +1382,9 @@ class VisualizationWindow(wx.Dialog):
                                 prompt = _("Extracting %s\nfrom %s")
                             # Create the Waveform Progress Dialog
                             self.progressDialog = WaveformProgress.WaveformProgress(self, prompt % (waveFilename, filenameItem['filename']))
-                            # Tell the Waveform Progress Dialog to handle the audio extraction modally.
-                            self.progressDialog.Extract(filenameItem['filename'], waveFilename)
+                            # Tell the Waveform Progress Dialog to handle the audio extraction modally, streaming it so
+                            # the waveform is shown while it is extracted.
+                            self.progressDialog.Extract(filenameItem['filename'], waveFilename, mode='AudioExtraction-Stream')
                             # Get the Error Log that may have been created
                             errorLog = self.progressDialog.GetErrorMessages()
                             # Okay, we're done with the Progress Dialog here!
@@ -1402,6 +1412,10 @@ class VisualizationWindow(wx.Dialog):
                                 if (len(errorLog) == 1) and (errorLog[0] == 'Cancelled'):
                                     # ... signal that the WAV file was NOT created!
                                     dllvalue = 1
+                            # If the Wave File was created ...
+                            if os.path.exists(waveFilename):
+                                # ... add it to the Media Cache
+                                waveformCache.Add(filenameItem['filename'], waveFilename)
                             # On OS X, if you do extraction from a multi-media Episode, Transana will crash soon after.  (eg. create Quick Clip.)
                             # This appears to prevent that!!
                             wx.YieldIfNeeded()
@@ -0,0 +1,218 @@
+# Copyright (C) 2002 - 2015 The Board of Regents of the University of Wisconsin System
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of version 2 of the GNU General Public License as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""This module implements a Wave Reader, which gives random access to any time range of a PCM wave file
+(such as the wave files Transana extracts for waveform display) without reading what comes before it."""
+
+__author__ = 'David Woods <dwoods@wcer.wisc.edu>'
+
+# Import Python's mmap module
+import mmap
+# Import Python's os module
+import os
+# Import Python's struct module
+import struct
+# Import Python's wave module, for its exception type
+import wave
+
+# import the numpy module
+import numpy
+
+# The wave file format tags for plain PCM data, and for PCM data described by a WAVE_FORMAT_EXTENSIBLE header
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def DecodeSamples(frames, sampleWidth):
+    """ Convert wave file frames (a string or a numpy array of bytes) with samples sampleWidth bytes wide into a
+        numpy array of samples, scaled so that full volume is -1.0 to 1.0.  Samples from all channels remain interleaved. """
+    # 8-bit samples are unsigned, with 128 being silence
+    if sampleWidth == 1:
+        return (numpy.frombuffer(frames, dtype=numpy.uint8).astype(numpy.float32) - 128.0) / 128.0
+    # 16-bit samples are signed little-endian integers
+    elif sampleWidth == 2:
+        return numpy.frombuffer(frames, dtype='<i2').astype(numpy.float32) / 32768.0
+    # 24-bit samples are signed little-endian integers, which numpy has no type for
+    elif sampleWidth == 3:
+        # Break the data into 3-byte samples
+        bytes = numpy.frombuffer(frames, dtype=numpy.uint8).reshape(-1, 3).astype(numpy.int32)
+        # Combine the bytes of each sample ...
+        samples = bytes[:, 0] | (bytes[:, 1] << 8) | (bytes[:, 2] << 16)
+        # ... and restore the sign of negative values
+        samples = numpy.where(samples >= 0x800000, samples - 0x1000000, samples)
+        return samples.astype(numpy.float32) / 8388608.0
+    # 32-bit samples are signed little-endian integers
+    elif sampleWidth == 4:
+        return numpy.frombuffer(frames, dtype='<i4').astype(numpy.float32) / 2147483648.0
+    else:
+        raise ValueError('Unsupported wave file sample width:  %d bytes' % sampleWidth)
+
+
+class WaveReader(object):
+    """ A Wave Reader memory-maps the sample data of a PCM wave file and returns numpy arrays that look directly
+        into that data, so getting the frames for a time range costs the same no matter where in the file it is,
+        and only the pages actually used are ever read from disk.
+
+        The arrays returned by frames() share memory with the file and are read-only.  They remain valid after
+        the Wave Reader is closed, as the file stays mapped until the last of them is gone.  (On Windows, a
+        mapped file can't be replaced, so Wave Readers shouldn't be kept longer than they're needed.) """
+
+    def __init__(self, filename):
+        """ Open a PCM wave file.  Raises wave.Error if it isn't one. """
+        # Remember the file name
+        self.filename = filename
+        # Open the file and find its format and sample data
+        waveFile = open(filename, 'rb')
+        try:
+            # Determine the file size, so we can cope with a data chunk whose size wasn't filled in
+            fileSize = os.fstat(waveFile.fileno()).st_size
+            # A wave file is a RIFF file of type WAVE
+            header = waveFile.read(12)
+            if (len(header) < 12) or (header[:4] != 'RIFF') or (header[8:] != 'WAVE'):
+                raise wave.Error('%s is not a wave file' % filename)
+            formatChunk = None
+            dataOffset = None
+            # Go through the file's chunks until we find the data chunk
+            while dataOffset == None:
+                chunkHeader = waveFile.read(8)
+                # If we run out of chunks, there's no data chunk
+                if len(chunkHeader) < 8:
+                    raise wave.Error('%s has no data chunk' % filename)
+                (chunkID, chunkSize) = struct.unpack('<4sI', chunkHeader)
+                # Remember the format chunk
+                if chunkID == 'fmt ':
+                    formatChunk = waveFile.read(chunkSize)
+                # Note where the data chunk's samples are.  The data chunk must come after the format chunk.
+                elif chunkID == 'data':
+                    dataOffset = waveFile.tell()
+                    dataSize = min(chunkSize, fileSize - dataOffset)
+                    continue
+                # Skip any other chunk
+                else:
+                    waveFile.seek(chunkSize, 1)
+                # Chunks are padded to an even number of bytes
+                if chunkSize % 2 == 1:
+                    waveFile.seek(1, 1)
+            # Interpret the format chunk
+            if (formatChunk == None) or (len(formatChunk) < 16):
+                raise wave.Error('%s has no format chunk' % filename)
+            (formatTag, self.channels, self.frameRate, byteRate, blockAlign, bitsPerSample) = struct.unpack('<HHIIHH', formatChunk[:16])
+            # Extensible wave files keep the real format tag at the start of their SubFormat GUID
+            if (formatTag == WAVE_FORMAT_EXTENSIBLE) and (len(formatChunk) >= 26):
+                formatTag = struct.unpack('<H', formatChunk[24:26])[0]
+            # We only handle PCM data
+            if (formatTag != WAVE_FORMAT_PCM) or (self.channels == 0) or (bitsPerSample not in [8, 16, 24, 32]):
+                raise wave.Error('%s is not a supported PCM wave file' % filename)
+            self.sampleWidth = bitsPerSample / 8
+            self.frameSize = self.channels * self.sampleWidth
+            self.dataOffset = dataOffset
+            self.frameCount = dataSize / self.frameSize
+            # Map the file into memory.  (An empty file can't be mapped, and there'd be nothing to read anyway.)
+            if self.frameCount > 0:
+                self._map = mmap.mmap(waveFile.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._map = None
+        finally:
+            # The mapping doesn't need the file to stay open
+            waveFile.close()
+
+    def close(self):
+        """ Release the Wave Reader's hold on the file.  Arrays already returned remain valid. """
+        # Drop our reference to the mapping.  It's unmapped once the arrays that use it are gone, too.
+        self._map = None
+
+    def frameAt(self, ms):
+        """ Return the number of the frame at time ms (in milliseconds), limited to the file's frames """
+        return max(0, min(int(float(ms) / 1000.0 * self.frameRate), self.frameCount))
+
+    def frames(self, startFrame, frameCount):
+        """ Return up to frameCount frames from startFrame on, as a read-only numpy array that shares memory with
+            the file, with one row per frame and one column per channel.  (24-bit samples can't be represented
+            directly, so they have a third dimension holding each sample's 3 bytes.)  Nothing is copied or read
+            from disk until the array's values are used. """
+        # Limit the range to the frames that exist
+        startFrame = max(0, min(startFrame, self.frameCount))
+        frameCount = max(0, min(frameCount, self.frameCount - startFrame))
+        # Determine the type of the samples
+        if self.sampleWidth == 1:
+            dtype = numpy.uint8
+        elif self.sampleWidth == 2:
+            dtype = numpy.dtype('<i2')
+        elif self.sampleWidth == 4:
+            dtype = numpy.dtype('<i4')
+        else:
+            dtype = numpy.uint8
+        # If there's nothing to return, return an empty array of the right shape
+        if (frameCount == 0) or (self._map == None):
+            data = numpy.zeros(0, dtype=dtype)
+        # Otherwise, look directly into the mapped file
+        else:
+            data = numpy.frombuffer(self._map, dtype=dtype, count=frameCount * self.frameSize / numpy.dtype(dtype).itemsize,
+                                    offset=self.dataOffset + startFrame * self.frameSize)
+        # Arrange the data by frame and channel
+        if self.sampleWidth == 3:
+            return data.reshape(-1, self.channels, 3)
+        else:
+            return data.reshape(-1, self.channels)
+
+    def samples(self, startFrame, frameCount):
+        """ Return up to frameCount frames from startFrame on as a new numpy array of samples scaled so that full
+            volume is -1.0 to 1.0, with one row per frame and one column per channel.  Only the frames requested
+            are read. """
+        return DecodeSamples(self.frames(startFrame, frameCount), self.sampleWidth).reshape(-1, self.channels)
+
+
+# For testing purposes, this module can run stand-alone.
+if __name__ == '__main__':
+    import random
+    import sys
+    import tempfile
+    import time
+
+    # Create a three hour wave file in the format Transana extracts:  8-bit mono at 2756 Hz
+    filename = os.path.join(tempfile.gettempdir(), 'WaveReaderTest.wav')
+    waveFile = wave.open(filename, 'w')
+    waveFile.setnchannels(1)
+    waveFile.setsampwidth(1)
+    waveFile.setframerate(2756)
+    random.seed(1)
+    block = ''.join([chr(random.randint(0, 255)) for x in range(2756 * 60)])
+    for minute in range(180):
+        waveFile.writeframes(block)
+    waveFile.close()
+
+    # Compare the Wave Reader's samples to those read with the wave module
+    reader = WaveReader(filename)
+    waveFile = wave.open(filename, 'r')
+    for (startMs, lengthMs) in [(0, 1000), (9000000, 30000), (10799000, 5000), (10800000, 1000)]:
+        waveFile.setpos(min(reader.frameAt(startMs), waveFile.getnframes()))
+        expected = DecodeSamples(waveFile.readframes(reader.frameAt(lengthMs)), 1)
+        actual = reader.samples(reader.frameAt(startMs), reader.frameAt(lengthMs))
+        print "%8d ms for %5d ms:  %6d frames, %s" % (startMs, lengthMs, len(actual), numpy.array_equal(expected, actual[:, 0]) and 'match' or 'MISMATCH')
+    waveFile.close()
+
+    # Time getting a 30 second clip at 2.5 hours, the old way and the new way
+    startTime = time.time()
+    waveFile = wave.open(filename, 'r')
+    waveFile.readframes(reader.frameAt(9000000))
+    waveFile.readframes(reader.frameAt(30000))
+    waveFile.close()
+    print "30 seconds at 2.5 hours, reading up to it:  %0.4f seconds" % (time.time() - startTime)
+    startTime = time.time()
+    WaveReader(filename).samples(reader.frameAt(9000000), reader.frameAt(30000))
+    print "30 seconds at 2.5 hours, Wave Reader:       %0.4f seconds" % (time.time() - startTime)
+    reader.close()
+    os.remove(filename)
@@ -25,16 +25,696 @@ if DEBUG:
 import wx
 # Import Transana's Dialogs
 import Dialogs
+# Import Python's os module
+import os
+# Import Python's Queue module, for passing work to the Waveform Renderer's thread
+import Queue
+# Import Python's struct module
+import struct
 # Import Python's sys module
 import sys
-# Import Python's wave module for processing Wave files
+# Import Python's threading module
+import threading
+# Import Python's time module
+import time
+# Import Python's wave module, for writing Wave files
 import wave
 
+# import the numpy module
+import numpy
+
+# Import Transana's Wave Reader, for processing Wave files
+import WaveReader
+
+# The number of wave frames read from the wave file at a time.  Reading large blocks is much faster than reading
+# one pixel's worth of frames at a time, but we don't want to read an entire multi-hour file into memory at once.
+READ_BLOCK_FRAMES = 1048576
+
+
+def ColumnPeaks(samples, samplesPerColumn):
+    """ Divide the samples into columns of samplesPerColumn samples (the last column may be shorter) and return
+        numpy arrays of the lowest and highest sample in each column """
+    # Determine how many full columns there are
+    fullColumns = len(samples) / samplesPerColumn
+    # Arrange the samples of the full columns in rows, one row per column, and find each row's extremes
+    grid = samples[:fullColumns * samplesPerColumn].reshape(fullColumns, samplesPerColumn)
+    mins = grid.min(axis=1)
+    maxs = grid.max(axis=1)
+    # If there's a partial column at the end, add it too
+    if len(samples) > fullColumns * samplesPerColumn:
+        mins = numpy.append(mins, samples[fullColumns * samplesPerColumn:].min())
+        maxs = numpy.append(maxs, samples[fullColumns * samplesPerColumn:].max())
+    return (mins, maxs)
+
+# Peak Files hold the lowest and highest sample values of successive blocks of a wave file, at successively
+# coarser resolutions, so a waveform can be drawn at any zoom level without reading the whole wave file.
+# The header identifies the format and records the size and modification time of the wave file summarized.
+PEAK_FILE_ID = 'TPKS'
+PEAK_FILE_VERSION = 1
+PEAK_FILE_HEADER = '<4sIqdqII'
+# The number of wave frames summarized by each block of the finest level of a Peak File.  Each coarser level
+# has blocks twice as long as the level below it.
+PEAK_BASE_BLOCK = 32
+# The minimum number of blocks used for each pixel column.  A column's peaks come from whole blocks, so they may
+# include up to a block of frames on either side of the column.  Using several blocks per column keeps that small.
+PEAK_BLOCKS_PER_COLUMN = 8
+
+def PeakFilename(waveFilename):
+    """ Return the name of the Peak File for a wave file """
+    return os.path.splitext(waveFilename)[0] + '.pks'
+
+def CreatePeakFile(waveFilename):
+    """ Create the Peak File for a wave file, replacing any existing one.  Returns True if successful. """
+    try:
+        # Open the Wave File
+        reader = WaveReader.WaveReader(waveFilename)
+        try:
+            frameCount = reader.frameCount
+            # Find the lowest and highest values for each block of the finest level, reading the wave file in
+            # large pieces.  (READ_BLOCK_FRAMES is a multiple of PEAK_BASE_BLOCK, so only the last block can be short.)
+            minList = []
+            maxList = []
+            for blockFrame in range(0, frameCount, READ_BLOCK_FRAMES):
+                (mins, maxs) = ColumnPeaks(reader.samples(blockFrame, READ_BLOCK_FRAMES).ravel(), PEAK_BASE_BLOCK * reader.channels)
+                minList.append(mins)
+                maxList.append(maxs)
+        finally:
+            reader.close()
+        # Write the Peak File
+        WritePeakFile(waveFilename, frameCount, minList, maxList)
+        return True
+    except:
+        # The Peak File only speeds things up, so report the problem and carry on without it
+        print "WaveformGraphic.CreatePeakFile():", waveFilename
+        print sys.exc_info()[0], sys.exc_info()[1]
+        return False
+
+def WritePeakFile(waveFilename, frameCount, minList, maxList):
+    """ Write the Peak File for a finished wave file of frameCount frames, replacing any existing one.  minList and
+        maxList are lists of numpy arrays holding the lowest and highest sample values (-1.0 to 1.0) of each
+        PEAK_BASE_BLOCK frames, in order. """
+    peakFilename = PeakFilename(waveFilename)
+    # Note the size and modification time of the wave file
+    waveSize = os.path.getsize(waveFilename)
+    waveTime = os.path.getmtime(waveFilename)
+    # Store the finest level as 16-bit integers, rounding outwards so peaks are never understated
+    if len(minList) > 0:
+        mins = numpy.floor(numpy.concatenate(minList) * 32767.0)
+        maxs = numpy.ceil(numpy.concatenate(maxList) * 32767.0)
+    else:
+        mins = maxs = numpy.zeros(0)
+    levels = [numpy.clip(numpy.column_stack((mins, maxs)), -32768, 32767).astype('<i2')]
+    # Build each coarser level by combining pairs of blocks from the level below, until one block covers the file
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        # If there's an odd number of blocks, the last block has no partner
+        if len(level) % 2 == 1:
+            level = numpy.vstack((level, level[-1:]))
+        levels.append(numpy.column_stack((numpy.minimum(level[0::2, 0], level[1::2, 0]),
+                                          numpy.maximum(level[0::2, 1], level[1::2, 1]))).astype('<i2'))
+    # Write the Peak File under a temporary name, so an incomplete Peak File is never used
+    tempFilename = peakFilename + '.tmp'
+    peakFile = open(tempFilename, 'wb')
+    try:
+        # Write the header, followed by the number of blocks in each level
+        peakFile.write(struct.pack(PEAK_FILE_HEADER, PEAK_FILE_ID, PEAK_FILE_VERSION, waveSize, waveTime, frameCount,
+                                   PEAK_BASE_BLOCK, len(levels)))
+        peakFile.write(struct.pack('<%dq' % len(levels), *[len(level) for level in levels]))
+        # Write the levels, finest first
+        for level in levels:
+            peakFile.write(level.tostring())
+    finally:
+        peakFile.close()
+    # Replace any old Peak File with the new one
+    if os.path.exists(peakFilename):
+        os.remove(peakFilename)
+    os.rename(tempFilename, peakFilename)
+
+class PeakStream(object):
+    """ A Peak Stream takes a wave file's frames as they are extracted, writes them to the wave file, and finds
+        their peaks as it goes, so the Peak File is ready as soon as the wave file is, without reading it again.
+        The peaks found so far are available from peaks() while the extraction is still running. """
+
+    def __init__(self, waveFilename, channels=1, sampleWidth=1, frameRate=2756):
+        """ Create the wave file, with the format of the frames that will be written """
+        # Remember the wave file name and format
+        self.waveFilename = waveFilename
+        self.channels = channels
+        self.sampleWidth = sampleWidth
+        # Create the wave file
+        self.waveFile = wave.open(waveFilename, 'wb')
+        self.waveFile.setnchannels(channels)
+        self.waveFile.setsampwidth(sampleWidth)
+        self.waveFile.setframerate(frameRate)
+        # Initialize the number of bytes and whole frames written
+        self.byteCount = 0
+        self.frameCount = 0
+        # Initialize the data not yet summarized, which is less than one block
+        self.pending = ''
+        # Initialize the lists of block peaks
+        self.minList = []
+        self.maxList = []
+
+    def write(self, data):
+        """ Add frames to the wave file.  data may end part way through a frame. """
+        # Write the data to the wave file, and count the whole frames written
+        self.waveFile.writeframesraw(data)
+        self.byteCount += len(data)
+        self.frameCount = self.byteCount / (self.channels * self.sampleWidth)
+        # Add it to the data not yet summarized
+        data = self.pending + data
+        # Summarize as many whole blocks as there are, keeping the rest for later
+        blockBytes = PEAK_BASE_BLOCK * self.channels * self.sampleWidth
+        wholeBytes = len(data) / blockBytes * blockBytes
+        if wholeBytes > 0:
+            (mins, maxs) = ColumnPeaks(WaveReader.DecodeSamples(data[:wholeBytes], self.sampleWidth), PEAK_BASE_BLOCK * self.channels)
+            self.minList.append(mins)
+            self.maxList.append(maxs)
+        self.pending = data[wholeBytes:]
+
+    def peaks(self):
+        """ Return numpy arrays of the lowest and highest sample values (-1.0 to 1.0) of each PEAK_BASE_BLOCK frames
+            written so far.  This may be called from another thread while frames are still being written. """
+        # Only use the blocks both lists have, as write() may be adding to them right now
+        blocks = min(len(self.minList), len(self.maxList))
+        if blocks == 0:
+            return (numpy.zeros(0), numpy.zeros(0))
+        return (numpy.concatenate(self.minList[:blocks]), numpy.concatenate(self.maxList[:blocks]))
+
+    def close(self, writePeakFile=True):
+        """ Finish the wave file, and, unless writePeakFile is False, write its Peak File.  Returns True if successful. """
+        # Summarize the whole frames of the last, partial block
+        frameBytes = self.channels * self.sampleWidth
+        lastBytes = len(self.pending) / frameBytes * frameBytes
+        if lastBytes > 0:
+            (mins, maxs) = ColumnPeaks(WaveReader.DecodeSamples(self.pending[:lastBytes], self.sampleWidth), PEAK_BASE_BLOCK * self.channels)
+            self.minList.append(mins)
+            self.maxList.append(maxs)
+        self.pending = ''
+        # Finish the wave file, which fills in its header
+        self.waveFile.close()
+        # If requested, write the Peak File
+        if writePeakFile:
+            try:
+                WritePeakFile(self.waveFilename, self.frameCount, self.minList, self.maxList)
+            except:
+                # The Peak File only speeds things up, so report the problem and carry on without it
+                print "WaveformGraphic.PeakStream.close():", self.waveFilename
+                print sys.exc_info()[0], sys.exc_info()[1]
+                return False
+        return True
+
+def LoadPeakFile(waveFilename, create=True):
+    """ Return a PeakFile object for a wave file's Peak File, or None if it doesn't exist or is out of date.
+        If create is True, a missing or out of date Peak File is created. """
+    try:
+        return PeakFile(waveFilename)
+    except:
+        # If we should, (re-)create the Peak File and try again
+        if create and CreatePeakFile(waveFilename):
+            try:
+                return PeakFile(waveFilename)
+            except:
+                pass
+        return None
+
+class PeakFile(object):
+    """ Reads the lowest and highest sample values for ranges of a wave file from its Peak File """
+
+    def __init__(self, waveFilename):
+        """ Open the Peak File for waveFilename.  Raises an exception if it doesn't exist or doesn't match the wave file. """
+        # Remember the Peak File Name
+        self.filename = PeakFilename(waveFilename)
+        # Read the header
+        peakFile = open(self.filename, 'rb')
+        try:
+            header = peakFile.read(struct.calcsize(PEAK_FILE_HEADER))
+            (fileID, version, waveSize, waveTime, self.frameCount, self.baseBlock, levelCount) = \
+                struct.unpack(PEAK_FILE_HEADER, header)
+            # Make sure this is a Peak File we know how to read
+            if (fileID != PEAK_FILE_ID) or (version != PEAK_FILE_VERSION):
+                raise ValueError('%s is not a version %d Peak File' % (self.filename, PEAK_FILE_VERSION))
+            # Make sure the wave file hasn't changed since the Peak File was created
+            if (waveSize != os.path.getsize(waveFilename)) or (waveTime != os.path.getmtime(waveFilename)):
+                raise ValueError('%s is out of date' % self.filename)
+            # Read the number of blocks in each level
+            self.levelSizes = struct.unpack('<%dq' % levelCount, peakFile.read(struct.calcsize('<%dq' % levelCount)))
+        finally:
+            peakFile.close()
+        # Calculate the file position of each level.  Each block holds two 2-byte values.
+        self.levelPositions = []
+        position = struct.calcsize(PEAK_FILE_HEADER) + struct.calcsize('<%dq' % levelCount)
+        for levelSize in self.levelSizes:
+            self.levelPositions.append(position)
+            position += levelSize * 4
+
+    def columnPeaks(self, startFrame, framesPerColumn, columns, blocksPerColumn=PEAK_BLOCKS_PER_COLUMN):
+        """ Return numpy arrays of the lowest and highest sample values, scaled from -1.0 to 1.0, for up to
+            columns pixel columns of framesPerColumn frames each, starting at frame startFrame.  Each value
+            comes from whole blocks, so it may include a few frames just outside the column.  Only about
+            blocksPerColumn blocks per column are read, however long the wave file is.  (Fewer blocks per
+            column is faster but less accurate.) """
+        # Don't read past the end of the wave file
+        endFrame = min(startFrame + columns * framesPerColumn, self.frameCount)
+        # If there's nothing to read, return empty results
+        if (startFrame >= endFrame) or (len(self.levelSizes) == 0):
+            return (numpy.zeros(0), numpy.zeros(0))
+        # Use the coarsest level that has at least blocksPerColumn blocks in a pixel column
+        level = 0
+        while (level + 1 < len(self.levelSizes)) and ((self.baseBlock << (level + 1)) * blocksPerColumn <= framesPerColumn):
+            level += 1
+        blockSize = self.baseBlock << level
+        # Determine which blocks cover the frames needed
+        firstBlock = startFrame / blockSize
+        lastBlock = min((endFrame - 1) / blockSize + 1, self.levelSizes[level])
+        # Read those blocks from the Peak File
+        peakFile = open(self.filename, 'rb')
+        try:
+            peakFile.seek(self.levelPositions[level] + firstBlock * 4)
+            blocks = numpy.fromfile(peakFile, dtype='<i2', count=(lastBlock - firstBlock) * 2).reshape(-1, 2)
+        finally:
+            peakFile.close()
+        # Determine the first and last block of each pixel column
+        columnStarts = numpy.arange(startFrame, endFrame, framesPerColumn)
+        columnEnds = numpy.minimum(columnStarts + framesPerColumn, endFrame)
+        firstBlocks = numpy.minimum(columnStarts / blockSize - firstBlock, len(blocks) - 1)
+        lastBlocks = numpy.minimum((columnEnds - 1) / blockSize - firstBlock, len(blocks) - 1)
+        # Combine the blocks from each column's first block up to the next column's first block.  A column's last
+        # block may also be the next column's first block, so include it separately.  (If blocks are longer than
+        # columns, neighbouring columns start in the same block, and reduceat just uses that block.)
+        mins = numpy.minimum(numpy.minimum.reduceat(blocks[:, 0], firstBlocks), blocks[lastBlocks, 0])
+        maxs = numpy.maximum(numpy.maximum.reduceat(blocks[:, 1], firstBlocks), blocks[lastBlocks, 1])
+        return (mins / 32767.0, maxs / 32767.0)
+
+def DrawPeaks(dc, firstColumn, mins, maxs, graphicSize):
+    """ Draw a vertical line for each pixel column from firstColumn on, from the lowest to the highest sample value,
+        with all lines drawn in a single call """
+    # The horizontal values are the pixel column positions
+    x = numpy.arange(firstColumn, firstColumn + len(mins))
+    # The vertical values represent the divergence of the samples from the center of the graphic
+    y1 = numpy.round(graphicSize[1] / 2.0 - maxs * graphicSize[1] / 2.0)
+    y2 = numpy.round(graphicSize[1] / 2.0 - mins * graphicSize[1] / 2.0)
+    # Draw all the lines on the Device Context at once
+    dc.DrawLineList(numpy.column_stack((x, y1, x, y2)).astype(int).tolist())
+
+# The default number of frames analyzed by each Fourier transform of a spectrogram.  Larger sizes show frequency
+# more precisely but time less precisely.
+SPECTROGRAM_FFT_SIZE = 256
+# The most windows analyzed for each pixel column of a spectrogram.  Zoomed out, a pixel column covers much more
+# than one window, so the spectrogram takes this many evenly spaced samples of it rather than analyzing all of it.
+SPECTROGRAM_WINDOWS_PER_COLUMN = 8
+# The range of loudness, in decibels below the loudest point shown, that the spectrogram colors cover
+SPECTROGRAM_DYNAMIC_RANGE = 80.0
+# The number of rendered spectrograms kept in memory, so redrawing an unchanged view doesn't recalculate it
+SPECTROGRAM_CACHE_SIZE = 8
+# Rendered spectrograms, as a list of (key, RGB data) pairs, most recently used last
+_spectrogramCache = []
+
+def SpectrogramColormap(colormap):
+    """ Return the color lookup table for a spectrogram color map, as a 256 x 3 numpy array of RGB values for
+        loudness levels from quietest to loudest.  colormap is 'gray' (white to black) or 'heat' (black through
+        red and yellow to white). """
+    level = numpy.arange(256) / 255.0
+    if colormap == 'gray':
+        table = numpy.column_stack((1.0 - level, 1.0 - level, 1.0 - level))
+    elif colormap == 'heat':
+        table = numpy.column_stack((numpy.clip(level * 3.0, 0.0, 1.0),
+                                    numpy.clip(level * 3.0 - 1.0, 0.0, 1.0),
+                                    numpy.clip(level * 3.0 - 2.0, 0.0, 1.0)))
+    else:
+        raise ValueError('Unknown spectrogram color map:  %s' % colormap)
+    return numpy.round(table * 255.0).astype(numpy.uint8)
+
+def SpectrogramData(reader, startFrame, framesPerColumn, columns, height, fftSize=SPECTROGRAM_FFT_SIZE, colormap='gray'):
+    """ Return a spectrogram of columns pixel columns of framesPerColumn frames each, starting at frame startFrame of
+        the Wave Reader's file, as a height x columns x 3 numpy array of RGB values, with low frequencies at the bottom.
+        All channels are mixed together.  Each column is the average power of up to SPECTROGRAM_WINDOWS_PER_COLUMN
+        overlapping Hann-windowed Fourier transforms of fftSize frames centered in the column, all calculated together. """
+    # Don't go past the end of the wave file
+    columns = max(0, min(columns, (reader.frameCount - startFrame + framesPerColumn - 1) / framesPerColumn))
+    # If there's nothing to show, return an empty spectrogram
+    if columns == 0:
+        return numpy.zeros((height, 0, 3), dtype=numpy.uint8)
+    # Determine how many windows to analyze per column.  Windows are spaced at most half a window apart, so they overlap.
+    windowsPerColumn = max(1, min(framesPerColumn * 2 / fftSize, SPECTROGRAM_WINDOWS_PER_COLUMN))
+    # Determine the first frame of each window, relative to the start frame.  Each window is centered in an equal share
+    # of its column.
+    centers = (numpy.arange(columns * windowsPerColumn) * framesPerColumn + framesPerColumn / 2) / windowsPerColumn
+    windowStarts = centers - fftSize / 2
+    # Get a view of the frames being shown.  Only the frames the windows use are actually read.
+    frames = reader.frames(startFrame, columns * framesPerColumn)
+    # Prepare the Hann window, which keeps the edges of each window from showing up as false high frequencies
+    hann = numpy.hanning(fftSize).astype(numpy.float32)
+    # Calculate the power spectrum of each column, a block of columns at a time to limit the memory used
+    power = numpy.zeros((columns, fftSize / 2 + 1))
+    columnsPerBlock = max(READ_BLOCK_FRAMES / (windowsPerColumn * fftSize), 1)
+    for blockStart in range(0, columns, columnsPerBlock):
+        blockColumns = min(columnsPerBlock, columns - blockStart)
+        # Determine the frame positions of every sample in the block's windows
+        positions = windowStarts[blockStart * windowsPerColumn:(blockStart + blockColumns) * windowsPerColumn, numpy.newaxis] + \
+                    numpy.arange(fftSize)
+        # Windows that reach past either end of the frames shown are padded with silence
+        outside = (positions < 0) | (positions >= len(frames))
+        positions = numpy.clip(positions, 0, len(frames) - 1)
+        # Get the samples, mix the channels, and remove any DC offset so it doesn't swamp the lowest frequencies
+        samples = WaveReader.DecodeSamples(numpy.ascontiguousarray(frames[positions.ravel()]), reader.sampleWidth)
+        samples = samples.reshape(positions.shape[0], fftSize, reader.channels).mean(axis=2)
+        samples[outside] = 0.0
+        samples -= samples.mean(axis=1)[:, numpy.newaxis]
+        # Transform all of the block's windows at once, and average the power of each column's windows
+        spectra = numpy.abs(numpy.fft.rfft(samples * hann, axis=1)) ** 2
+        power[blockStart:blockStart + blockColumns] = spectra.reshape(blockColumns, windowsPerColumn, -1).mean(axis=1)
+    # Convert the power to decibels, and scale it to the color map's levels
+    decibels = 10.0 * numpy.log10(power + 1e-12)
+    loudest = decibels.max()
+    levels = numpy.clip((decibels - (loudest - SPECTROGRAM_DYNAMIC_RANGE)) / SPECTROGRAM_DYNAMIC_RANGE * 255.0, 0, 255).astype(numpy.uint8)
+    # Choose the frequency shown in each pixel row, with the lowest frequency at the bottom
+    rows = numpy.round(numpy.arange(height - 1, -1, -1) * (fftSize / 2) / float(max(height - 1, 1))).astype(int)
+    # Look up the color of each pixel
+    return SpectrogramColormap(colormap)[levels[:, rows].T]
+
+def DrawSpectrogram(dc, firstColumn, reader, startFrame, framesPerColumn, columns, graphicSize, fftSize=SPECTROGRAM_FFT_SIZE, colormap='gray'):
+    """ Draw a spectrogram on the Device Context, from pixel column firstColumn on, as a single bitmap.  Recently drawn
+        spectrograms are kept in memory, so redrawing the same view doesn't recalculate it. """
+    # Identify this spectrogram, including the wave file's modification time so a replaced wave file isn't shown
+    key = (reader.filename, os.path.getmtime(reader.filename), startFrame, framesPerColumn, columns, graphicSize[1], fftSize, colormap)
+    # Look for the spectrogram in the cache
+    for (index, (cacheKey, rgb)) in enumerate(_spectrogramCache):
+        if cacheKey == key:
+            # Move it to the end of the cache, as it's now the most recently used
+            del _spectrogramCache[index]
+            break
+    # If it's not in the cache, create it
+    else:
+        rgb = SpectrogramData(reader, startFrame, framesPerColumn, columns, graphicSize[1], fftSize, colormap)
+        # Remove the least recently used spectrogram if the cache is full
+        if len(_spectrogramCache) >= SPECTROGRAM_CACHE_SIZE:
+            del _spectrogramCache[0]
+    _spectrogramCache.append((key, rgb))
+    # If there's anything to draw, draw it
+    if rgb.shape[1] > 0:
+        dc.DrawBitmap(wx.BitmapFromBuffer(rgb.shape[1], rgb.shape[0], rgb.tostring()), firstColumn, 0)
+
+def WaveformPosition(wavFile, startPoint, mediaLength, graphicSize, frameRate):
+    """ Determine where the wave file described by wavFile (a dictionary with its offset and length) belongs in a
+        waveform graphic graphicSize pixels wide showing mediaLength ms from startPoint on.  Returns the first pixel
+        column, the pixel column after the last, the wave file frame shown in the first column, and the number
+        of frames shown in each column. """
+    # Read the appropriate number of frames to position properly in the wave file
+    # Number of seconds into the file * Frame Rate
+
+    # Start at the beginning of the wave file unless the clip starts after this media file begins
+    startFrame = 0
+
+    # If we are at the beginning of the virtual media file ...
+    if startPoint == 0:
+        # ... the start point for THIS media file needs to be adjusted for its offset
+        sp = int((float(wavFile['offset']) / float(mediaLength)) * (graphicSize[0] - 1))
+        # ... and the end point for THIS media file needs to be determined based on offset and length
+        ep = int((float(wavFile['offset'] + wavFile['length']) / float(mediaLength)) * (graphicSize[0] - 1)) + 2
+    # If we are NOT at the beginning of the virtual media file ...
+    else:
+        # ... Adjust the offset for THIS media file by the value of the Clip starting point
+
+        # Hmmmm.  I don't understand this.  If the offset is negative, we need to ignore it, as it shifts the
+        # waveform, but if it's positive, we need to compensate for it.
+
+#                    if wavFile['offset'] < 0:
+#                        print "***********     ALERT     WaveformGraphic.OnIdle() change     ALERT     ****************"
+            
+#                    indent = max(0, wavFile['offset']) - startPoint
+        indent = wavFile['offset'] - startPoint
+
+        # If we have a positive value ...
+        if indent >= 0:
+            # ... then we can use that.
+            sp = int((float(indent) / float(mediaLength)) * (graphicSize[0] - 1))
+        # If we have a negative value (clip starts before this media file's start) ...
+        else:
+            # ... then set the media to the beginning.  It'll join in later.
+            sp = 0
+
+            if DEBUG:
+                print "read to ",float(abs(indent)) / 1000.0 * frameRate,"frames"
+
+            # Skip the appropriate number of frames to get to the right part of the wave file
+            startFrame = int(float(abs(indent)) / 1000.0 * frameRate)
+
+#                        print "**", startPoint, indent, float(abs(indent)) / 1000.0 * waveFile.getframerate(), float(indent) / 1000.0 * waveFile.getframerate()
 
-# import numpy
+        # If we're in a clip, the ending point can be determined by looking at the waveform's WIDTH!!
+        ep = graphicSize[0] - 1
+
+    # Calculate the total number of frames in the wave file
+    totalFramesToRead = float(mediaLength)/1000.0 * frameRate
+
+    # Calculate the number of WAVE data chunks to be read per line displayed in the graphic,
+    # This value must be at least 1.
+    ChunkSize = max(int(round(totalFramesToRead / graphicSize[0])), 1)
+
+    if DEBUG and (totalFramesToRead / graphicSize[0] < 1):
+        print "\n\nTODO:  Zoomed in so that Number of Lines is less than Graphic Width!!\n\n"
+
+    return (sp, ep, startFrame, ChunkSize)
+
+# Waveforms in the Visualization Window are put together from tiles of this many pixel columns, calculated in the
+# background, so scrolling and returning to an earlier zoom level can reuse the tiles already calculated.
+WAVEFORM_TILE_WIDTH = 256
+# The number of waveform tiles a Waveform Renderer remembers
+WAVEFORM_TILE_CACHE_SIZE = 256
+# The longest time, in seconds, that finished waveform tiles wait before they are reported
+WAVEFORM_TILE_REPORT_INTERVAL = 0.25
+
+def WaveformTilePeaks(waveFilename, framesPerColumn, tileIndex, coarse=False):
+    """ Return numpy arrays of the lowest and highest sample values for the pixel columns of a waveform tile, the
+        tileIndex'th group of WAVEFORM_TILE_WIDTH columns of framesPerColumn frames from the start of the wave file.
+        A coarse tile comes quickly from an existing Peak File, or is None if there isn't one.  Otherwise, the
+        Peak File is used (and created if necessary) if it is accurate enough, and the wave file is read if not. """
+    # Determine the first frame of the tile
+    startFrame = tileIndex * WAVEFORM_TILE_WIDTH * framesPerColumn
+    # If we want a coarse tile, use a single Peak File block per column, but don't take the time to create a Peak File
+    if coarse:
+        peakFile = LoadPeakFile(waveFilename, create=False)
+        if peakFile == None:
+            return None
+        return peakFile.columnPeaks(startFrame, framesPerColumn, WAVEFORM_TILE_WIDTH, blocksPerColumn=1)
+    # If we're zoomed out far enough for the Peak File to be accurate, try to use the Peak File
+    if framesPerColumn >= PEAK_BASE_BLOCK * PEAK_BLOCKS_PER_COLUMN:
+        peakFile = LoadPeakFile(waveFilename)
+        if peakFile != None:
+            return peakFile.columnPeaks(startFrame, framesPerColumn, WAVEFORM_TILE_WIDTH)
+    # Otherwise, read the tile's frames from the wave file, about READ_BLOCK_FRAMES frames at a time
+    reader = WaveReader.WaveReader(waveFilename)
+    try:
+        minList = [numpy.zeros(0)]
+        maxList = [numpy.zeros(0)]
+        columnsPerBlock = max(READ_BLOCK_FRAMES / framesPerColumn, 1)
+        for blockStart in range(0, WAVEFORM_TILE_WIDTH, columnsPerBlock):
+            # Get the samples for the block's columns.  (Samples from all channels are interleaved.)
+            columns = min(columnsPerBlock, WAVEFORM_TILE_WIDTH - blockStart)
+            samples = reader.samples(startFrame + blockStart * framesPerColumn, columns * framesPerColumn).ravel()
+            # Stop at the end of the wave file
+            if len(samples) == 0:
+                break
+            # Find the lowest and highest sample value for each pixel column, across all channels
+            (mins, maxs) = ColumnPeaks(samples, framesPerColumn * reader.channels)
+            minList.append(mins)
+            maxList.append(maxs)
+    finally:
+        reader.close()
+    return (numpy.concatenate(minList), numpy.concatenate(maxList))
+
+class WaveformRenderer(object):
+    """ A Waveform Renderer draws waveforms for the Visualization Window without keeping it waiting.  Waveforms are
+        put together from tiles of WAVEFORM_TILE_WIDTH pixel columns.  Tiles that haven't been calculated yet are
+        drawn from a coarse version right away and calculated on a separate thread, and onRefresh is called
+        (on the main thread) when some of them are ready, so the waveform can be drawn again.  The most recently
+        used tiles are remembered, by wave file, frames per pixel column and position, so scrolling back and forth
+        or returning to an earlier zoom level doesn't recalculate them. """
+
+    def __init__(self, onRefresh):
+        """ Create a Waveform Renderer.  onRefresh is called with no parameters when tiles become available. """
+        # Remember the method to call when tiles are ready
+        self.onRefresh = onRefresh
+        # The tile cache is a list of (key, (mins, maxs)) tuples, least recently used first
+        self.tiles = []
+        # Each call to Render() gets a new generation number, so the thread can skip work that's out of date
+        self.generation = 0
+        # The keys of the tiles the latest Render() is waiting for
+        self.pending = []
+        # Requests for the thread are (generation, list of tile keys) tuples
+        self.requests = Queue.Queue()
+        # The thread is started when it's first needed
+        self.thread = None
+
+    def GetTile(self, key):
+        """ Return a tile's (mins, maxs) from the cache, or None if it isn't there """
+        for index in range(len(self.tiles) - 1, -1, -1):
+            if self.tiles[index][0] == key:
+                # Move the tile to the end of the list, as the most recently used
+                tile = self.tiles.pop(index)
+                self.tiles.append(tile)
+                return tile[1]
+        return None
+
+    def AddTile(self, key, peaks):
+        """ Add a tile's (mins, maxs) to the cache, removing the least recently used tile if the cache is full """
+        if len(self.tiles) >= WAVEFORM_TILE_CACHE_SIZE:
+            del self.tiles[0]
+        self.tiles.append((key, peaks))
+
+    def Render(self, waveFilename, startPoint, mediaLength, graphicSize, colors = (wx.CYAN, wx.GREEN, wx.BLUE, wx.RED)):
+        """ Return a wx.Image of the waveforms for waveFilename, a list of dictionaries like those taken by
+            WaveformGraphicCreate(), showing mediaLength ms from startPoint on.  Tiles that aren't ready are drawn
+            coarsely, or left out, and are calculated in the background. """
+        # This request supersedes any earlier ones
+        self.generation += 1
+        # Start a list of the tiles we need calculated
+        jobs = []
+        # Create an Empty Bitmap
+        theBitmap = wx.EmptyBitmap(graphicSize[0], graphicSize[1])
+        # Create a Device Context on which to actually draw
+        dc = wx.BufferedDC(None, theBitmap)
+        # Set the background color of the Device Context
+        dc.SetBackground(wx.Brush(wx.WHITE))
+        # Clear the Device Context
+        dc.Clear()
+        # Begin drawing to the Device Context
+        dc.BeginDrawing()
+        # Define the waveform colors, selecting just the number needed from the list, right-justified
+        waveformColors = colors[-len(waveFilename):]
+        # Initialize the Color Index
+        colorIndex = 0
+        # Iterate through the wave files to be processed, in reverse order
+        for wavFileIndex in range(len(waveFilename) - 1, -1, -1):
+            # Draw this waveform unless it has a "Show" value that is set to False
+            if (not waveFilename[wavFileIndex].has_key('Show')) or waveFilename[wavFileIndex]['Show']:
+                # Get the wave file name
+                wavFile = waveFilename[wavFileIndex]
+                # Set a pen in the color this waveform should appear in
+                dc.SetPen(wx.Pen(waveformColors[colorIndex], 1, wx.SOLID))
+                # Get the wave file's format.  Nothing is read from the file but its header.
+                reader = WaveReader.WaveReader(wavFile['filename'])
+                reader.close()
+                # If we don't know the media file length, calculate it from the length of the wave file
+                if mediaLength <= 0:
+                    mediaLength = reader.frameCount * 1000
+                # Determine where this wave file goes in the graphic, and how many frames each pixel column shows
+                (sp, ep, startFrame, framesPerColumn) = WaveformPosition(wavFile, startPoint, mediaLength, graphicSize, reader.frameRate)
+                # Tiles start at the beginning of the wave file, so the first column shown is the one that holds startFrame
+                firstColumn = startFrame / framesPerColumn
+                columns = ep - sp
+                # Tiles from an older version of the wave file are no good
+                waveTime = os.path.getmtime(wavFile['filename'])
+                # Draw each tile the waveform needs
+                for tileIndex in range(firstColumn / WAVEFORM_TILE_WIDTH, (firstColumn + columns - 1) / WAVEFORM_TILE_WIDTH + 1):
+                    key = (wavFile['filename'], waveTime, framesPerColumn, tileIndex)
+                    peaks = self.GetTile(key)
+                    # If the tile hasn't been calculated yet ...
+                    if peaks == None:
+                        # ... ask for it ...
+                        jobs.append(key)
+                        # ... and use the coarse version for now, calculating it if necessary
+                        peaks = self.GetTile(key + ('coarse',))
+                        if peaks == None:
+                            try:
+                                peaks = WaveformTilePeaks(wavFile['filename'], framesPerColumn, tileIndex, coarse=True)
+                            except:
+                                print "WaveformGraphic.WaveformRenderer.Render():", wavFile['filename']
+                                print sys.exc_info()[0], sys.exc_info()[1]
+                                peaks = None
+                            # If there's no Peak File yet, there's no coarse version, so leave this part of the waveform blank for now
+                            if peaks == None:
+                                continue
+                            self.AddTile(key + ('coarse',), peaks)
+                    (mins, maxs) = peaks
+                    # Determine which of the tile's columns are shown ...
+                    tileColumn = tileIndex * WAVEFORM_TILE_WIDTH
+                    first = max(firstColumn - tileColumn, 0)
+                    last = min(firstColumn + columns - tileColumn, len(mins))
+                    # ... and draw them
+                    if last > first:
+                        DrawPeaks(dc, sp + tileColumn + first - firstColumn, mins[first:last], maxs[first:last], graphicSize)
+            # Iterate the color index, so the next waveform will be in the next color
+            colorIndex += 1
 
+        # Draw a black line down the center of the Waveform to show the true center
+        dc.SetPen(wx.Pen(wx.BLACK, 1, wx.SOLID))
+        dc.DrawLine(0, int(round(graphicSize[1]/2.0)), int(graphicSize[0]-1), int(round(graphicSize[1]/2.0)))
+        # Signal that drawing is complete
+        dc.EndDrawing()
 
-def WaveformGraphicCreate(waveFilename, waveformFilename, startPoint, mediaLength, graphicSize, colors = (wx.CYAN, wx.GREEN, wx.BLUE, wx.RED), style='waveform'):
+        # Remember which tiles we're waiting for
+        self.pending = jobs
+        # If there are tiles to calculate ...
+        if len(jobs) > 0:
+            # ... pass them to the thread, starting it if necessary
+            self.requests.put((self.generation, jobs))
+            if self.thread == None:
+                self.thread = threading.Thread(target=self.CalculateTiles)
+                # Don't let the thread keep Transana from closing
+                self.thread.setDaemon(True)
+                self.thread.start()
+
+        # If we have a good Bitmap ...
+        if theBitmap.Ok():
+            # ... convert it to an Image and return it
+            return theBitmap.ConvertToImage()
+        # If we do NOT have a good image ...
+        else:
+            # ... return None to signal failure
+            return None
+
+    def CalculateTiles(self):
+        """ Calculate requested tiles, reporting them to the main thread as they're finished.  This runs on the
+            Waveform Renderer's thread, which does nothing else.  """
+        while True:
+            # Wait for a request
+            (generation, jobs) = self.requests.get()
+            finished = []
+            reportTime = time.time()
+            for key in jobs:
+                # If a newer request has been made, drop this one.  The newer request asks for whatever it still needs.
+                if generation != self.generation:
+                    break
+                try:
+                    peaks = WaveformTilePeaks(key[0], key[2], key[3])
+                except:
+                    print "WaveformGraphic.WaveformRenderer.CalculateTiles():", key[0]
+                    print sys.exc_info()[0], sys.exc_info()[1]
+                    # Remember that there's nothing to draw, so we don't keep trying
+                    peaks = (numpy.zeros(0), numpy.zeros(0))
+                finished.append((key, peaks))
+                # Report finished tiles every so often, so the waveform improves as we go
+                if time.time() - reportTime >= WAVEFORM_TILE_REPORT_INTERVAL:
+                    self.ReportTiles(finished)
+                    finished = []
+                    reportTime = time.time()
+            # Report any remaining finished tiles
+            if len(finished) > 0:
+                self.ReportTiles(finished)
+
+    def ReportTiles(self, finished):
+        """ Pass a list of (key, peaks) tuples from the thread to the main thread """
+        try:
+            wx.CallAfter(self.OnTilesReady, finished)
+        # If Transana is closing, there's no one to report to
+        except:
+            pass
+
+    def OnTilesReady(self, finished):
+        """ Add tiles calculated by the thread to the cache, and call onRefresh if the current waveform needs any of them """
+        refresh = False
+        for (key, peaks) in finished:
+            self.AddTile(key, peaks)
+            if key in self.pending:
+                self.pending.remove(key)
+                refresh = True
+        if refresh:
+            self.onRefresh()
+
+def WaveformGraphicCreate(waveFilename, waveformFilename, startPoint, mediaLength, graphicSize, colors = (wx.CYAN, wx.GREEN, wx.BLUE, wx.RED), style='waveform',
+                          fftSize=SPECTROGRAM_FFT_SIZE, colormap='gray'):
     try:
         # Create an Empty Bitmap
         theBitmap = wx.EmptyBitmap(graphicSize[0], graphicSize[1])
@@ -71,160 +751,65 @@ def WaveformGraphicCreate(waveFilename, waveformFilename, startPoint, mediaLengt
                 # Set the pen in the device context
                 dc.SetPen(pen)
                 
-                # Open the Wave File  (NOTE:  Python 2.4.2 can take a Unicode filename here.  Python 2.3.5 can't.)
-                waveFile = wave.open(wavFile['filename'], 'r')            
+                # If the caller has the Wave File open already, use its Wave Reader
+                if wavFile.has_key('reader'):
+                    reader = wavFile['reader']
+                # Otherwise, open the Wave File.  Only the frames we draw will be read from it.
+                else:
+                    reader = WaveReader.WaveReader(wavFile['filename'])
                   
                 # Added for Batch Waveform Generation, when we don't know the media file length
                 if mediaLength <= 0:
                     # Calculate it from the length of the wave file
-                    mediaLength = waveFile.getnframes() * 1000
-
-                # Read the appropriate number of frames to position properly in the wave file
-                # Number of seconds into the file * Frame Rate
-
-                # If we are at the beginning of the virtual media file ...
-                if startPoint == 0:
-                    # ... the start point for THIS media file needs to be adjusted for its offset
-                    sp = int((float(wavFile['offset']) / float(mediaLength)) * (graphicSize[0] - 1))
-                    # ... and the end point for THIS media file needs to be determined based on offset and length
-                    ep = int((float(wavFile['offset'] + wavFile['length']) / float(mediaLength)) * (graphicSize[0] - 1)) + 2
-                # If we are NOT at the beginning of the virtual media file ...
-                else:
-                    # ... Adjust the offset for THIS media file by the value of the Clip starting point
-
-                    # Hmmmm.  I don't understand this.  If the offset is negative, we need to ignore it, as it shifts the
-                    # waveform, but if it's positive, we need to compensate for it.
+                    mediaLength = reader.frameCount * 1000
 
-#                    if wavFile['offset'] < 0:
-#                        print "***********     ALERT     WaveformGraphic.OnIdle() change     ALERT     ****************"
-                        
-#                    indent = max(0, wavFile['offset']) - startPoint
-                    indent = wavFile['offset'] - startPoint
-
-                    # If we have a positive value ...
-                    if indent >= 0:
-                        # ... then we can use that.
-                        sp = int((float(indent) / float(mediaLength)) * (graphicSize[0] - 1))
-                    # If we have a negative value (clip starts before this media file's start) ...
-                    else:
-                        # ... then set the media to the beginning.  It'll join in later.
-                        sp = 0
-
-                        if DEBUG:
-                            print "read to ",float(abs(indent)) / 1000.0 * waveFile.getframerate(),"frames"
-
-                        # Indent the wave file the appropriate number of frames to get to the right part of the wave file
-                        frames = waveFile.readframes(int(float(abs(indent)) / 1000.0 * waveFile.getframerate()))
-
-#                        print "**", startPoint, indent, float(abs(indent)) / 1000.0 * waveFile.getframerate(), float(indent) / 1000.0 * waveFile.getframerate()
+                # Determine where this wave file goes in the graphic, and how many frames each pixel column shows
+                (sp, ep, startFrame, ChunkSize) = WaveformPosition(wavFile, startPoint, mediaLength, graphicSize, reader.frameRate)
 
-                    # If we're in a clip, the ending point can be determined by looking at the waveform's WIDTH!!
-                    ep = graphicSize[0] - 1
-
-                # Calculate the total number of frames in the wave file
-                totalFramesToRead = float(mediaLength)/1000.0 * waveFile.getframerate()
-
-                # Calculate the number of WAVE data chunks to be read per line displayed in the graphic,
-                # This value must be at least 1.
-                ChunkSize = max(int(round(totalFramesToRead / graphicSize[0])), 1)
-
-                if DEBUG and (totalFramesToRead / graphicSize[0] < 1):
-                    print "\n\nTODO:  Zoomed in so that Number of Lines is less than Graphic Width!!\n\n"
-
-
-                max1 = min1 = 0
-                
-                # Draw the actual WaveForm
-                # for each pixel position in the graphic's width ...
-                for loop in range(sp, ep):
-                    # Read the appropriate number of chunks from the wave file
-                    frames = waveFile.readframes(ChunkSize)
+                # If we're drawing a waveform zoomed out far enough for the Peak File to be accurate, try to use the Peak File,
+                # which is much faster than reading the wave file
+                if (style == 'waveform') and (ChunkSize >= PEAK_BASE_BLOCK * PEAK_BLOCKS_PER_COLUMN):
+                    peakFile = LoadPeakFile(wavFile['filename'])
+                else:
+                    peakFile = None
+                # If we have a Peak File ...
+                if peakFile != None:
+                    # ... get the lowest and highest values for each pixel column from it, and draw them
+                    (mins, maxs) = peakFile.columnPeaks(startFrame, ChunkSize, ep - sp)
+                    DrawPeaks(dc, sp, mins, maxs, graphicSize)
+                    # Skip reading the wave file
+                    ep = sp
+                # If we're drawing a spectrogram ...
+                elif style == 'spectrogram':
+                    # ... draw it all at once
+                    DrawSpectrogram(dc, sp, reader, startFrame, ChunkSize, ep - sp, graphicSize, fftSize, colormap)
+                    # Skip drawing a waveform
+                    ep = sp
+
+                # Get the number of channels in the wave file
+                channels = reader.channels
+                # Read enough pixel columns' worth of frames at a time to read about READ_BLOCK_FRAMES frames
+                columnsPerBlock = max(READ_BLOCK_FRAMES / ChunkSize, 1)
+
+                # Draw the actual WaveForm, one block of pixel columns at a time
+                for blockStart in range(sp, ep, columnsPerBlock):
+                    # Determine the number of pixel columns in this block
+                    columns = min(columnsPerBlock, ep - blockStart)
+                    # Get the samples for all of the block's columns at once.  (Samples from all channels are interleaved.)
+                    samples = reader.samples(startFrame + (blockStart - sp) * ChunkSize, columns * ChunkSize).ravel()
 
                     # Don't break all of Transana if we couldn't extract the wave
-                    if len(frames) == 0:
+                    if len(samples) == 0:
                         break
 
-                    # Determine the largest value in the data read (this produces the best-looking graph!)
-                    frame = max(frames)
-                    # Process the data differently based on the Bytes Per Sample value of the Wave File
-                    if waveFile.getsampwidth() == 1:
-                        if style == 'waveform':
-                            #This is for the 8-bit Bytes per Sample setting
-                            # The byte value represents sound, with 128 being silence and deviation from it being louder.
-                            # Therefore, determine the distance the Byte Value (frame) differs from silence.
-                            if ord(frame) > 128:
-                               amplitude = ord(frame) - 128
-                            else:
-                               amplitude = 128 - ord(frame)
-                            # Adjust the raw amplitude (0 .. 255 range) for the size of the graphic canvas
-                            amplitude = round(amplitude * graphicSize[1] / 256.0)
-                            # Determine the coordinates for drawing the amplitude line on the Device Context
-                            # The horizontal value equals the value of the loop
-                            x = loop
-                            # The vertical values represent the divergence of amplitude from the center of the graphic
-                            y1 = round((graphicSize[1]/2.0 - amplitude))
-                            y2 = round((graphicSize[1]/2.0 + amplitude))
-
-                            # draw the line on the Device Context
-                            dc.DrawLine(int(x), int(y1), int(x), int(y2))
-                        elif style == 'spectrogram':
-
-#                            print "Waveform style = spectrogram", sp, ep, ep-sp
-
-#                            print frames, type(frames), len(frames)
-#                            print
-
-                            sigList = []
-                            for loop2 in range(len(frames)):
-
-                                val = ord(frames[loop2])
-                                if val > 128:
-                                    sigList.append(val - 128)
-                                else:
-                                    sigList.append(128 - val)
-
-#                            print sigList
-#                            print
-
-                            max1 = max(max1, max(sigList))
-                            min1 = min(min1, min(sigList))
-
-                            sig = numpy.array(sigList)
-                            
-#                            print sig
-#                            print
-
-                            spectrum = 10*numpy.log10(abs(numpy.fft.rfft(sig)))
-
-#                            print spectrum, len(spectrum)
-
-#                            print "Max =", max1, "Min =", min1
-
-                            x = loop
-                            for loop2 in range(len(spectrum)):
-
-#                                print loop2, spectrum[loop2], type(spectrum[loop2]),
-
-                                if spectrum[loop2] in [numpy.inf, -numpy.inf]:
-                                    n = 0
-                                else:
-                                    n = max(0, int(5 * spectrum[loop2]))
-
-#                                    print 5 * spectrum[loop2], n
-
-                                    n = max(0, int(5 * spectrum[loop2]))
-                                
-                                pen.SetColour(wx.Colour(255-n, 255-n, 255-n))
-                                dc.SetPen(pen)
-                                dc.DrawPoint(x, loop2)
-                                              
-                        
-                    else:
-                        #This is for the 16-bit Bytes per Sample setting
-                        print "Waveform for 16-bit wave files not yet implemented."
-
-                # Close the Wave File   
-                waveFile.close()
+                    # Find the lowest and highest sample value for each pixel column, across all channels
+                    (mins, maxs) = ColumnPeaks(samples, ChunkSize * channels)
+                    # Draw all of the block's lines on the Device Context at once
+                    DrawPeaks(dc, blockStart, mins, maxs, graphicSize)
+
+                # If we opened the Wave File, close it
+                if not wavFile.has_key('reader'):
+                    reader.close()
             # Iterate the color index, so the next waveform will be in the next color
             colorIndex += 1
 
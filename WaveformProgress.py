@@ -25,6 +25,16 @@ if DEBUG:
 
 import wx      # import wxPython
 import os, sys
+# import Python's multiprocessing module, to count computer cores
+import multiprocessing
+# import Python's pickle module, for saving the queue of a batch of conversions
+import pickle
+# import Python's regular expression module
+import re
+# import Python's subprocess module
+import subprocess
+# import Python's threading module
+import threading
 # import Python's time module
 import time
 
@@ -32,13 +42,22 @@ if __name__ == '__main__':
     # This module expects i18n.  Enable it here.
     __builtins__._ = wx.GetTranslation
 
+# Import Transana's Dialogs
+import Dialogs
 # Import Transana's Miscellaneous functions
 import Misc
 # Import Transana's Global Variables
 import TransanaGlobal
+# Import Transana's Waveform Graphic module, which creates Peak Files
+import WaveformGraphic
 
 ID_BTNCANCEL    =  wx.NewId()
 
+# The version of the format of the files that hold the queue of a batch of conversions
+BATCH_QUEUE_VERSION = 1
+# The parts of each conversion that are saved in a queue file, enough to start the conversion again
+BATCH_QUEUE_KEYS = ['inputFile', 'outputFile', 'mode', 'label', 'processCommand', 'clipStart', 'clipDuration', 'duration']
+
 
 class WaveformProgress(wx.Dialog):
     """ This class implements the Progress Dialog for Waveform Creation. 
@@ -49,9 +68,12 @@ class WaveformProgress(wx.Dialog):
 
         The new way is that it is used to actually handle the audio extraction.  In this case it is modal.
         To use it this way, you create it, then call the Extract() method, which will show it modally and handle updating itself.
-        Then Destroy() it. """
+        Then Destroy() it.
+
+        With showDialog=False (and showModally=False), the dialog is never shown.  Progress is reported to the parent's
+        OnConvertProgress() method instead, so the parent can show the progress of several conversions together. """
 
-    def __init__(self, parent, label='', clipStart=0, clipDuration=0, showModally=True):
+    def __init__(self, parent, label='', clipStart=0, clipDuration=0, showModally=True, showDialog=True):
         """ Initialize the Progress Dialog """
 
         # There's a bug.  I think it's an interaction between OS X 10.7.5 and earlier (but not 10.8.4), wxPython (version
@@ -69,12 +91,18 @@ class WaveformProgress(wx.Dialog):
         self.parent = parent
         # Remember whether we're MODAL or ALLOWING MULTIPLE THREADS
         self.showModally = showModally
+        # Remember whether the dialog should be shown at all
+        self.showDialog = showDialog
         # Remember the start time and duration, if they are passed in.
         self.clipStart = clipStart
         self.clipDuration = clipDuration
 
         # Define the process variable
         self.process = None
+        # Define the streaming extraction process variable
+        self.streamProcess = None
+        # Define the Peak Stream, which collects the waveform of a streaming extraction
+        self.peakStream = None
         # Initialize a list to collect error messages
         self.errorMessages = []
 
@@ -100,6 +128,13 @@ class WaveformProgress(wx.Dialog):
         self.progressBar = wx.Gauge(self, -1, 100, style=wx.GA_HORIZONTAL | wx.GA_SMOOTH)
         sizer.Add(self.progressBar, 0, wx.ALIGN_CENTER | wx.LEFT | wx.RIGHT | wx.EXPAND, 10)
 
+        # Waveform Preview, which shows the waveform while it is being extracted.  Only streaming extractions use it.
+        self.waveformPreview = wx.Panel(self, -1, size=(-1, 60), style=wx.SUNKEN_BORDER)
+        self.waveformPreview.SetBackgroundColour(wx.WHITE)
+        self.waveformPreview.Bind(wx.EVT_PAINT, self.OnPaintWaveformPreview)
+        sizer.Add(self.waveformPreview, 0, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.TOP, 10)
+        self.waveformPreview.Hide()
+
         # Seconds Processed label
         # Encode the prompt
         prompt = unicode(_("%d:%02d:%02d of %d:%02d:%02d processed"), 'utf8')
@@ -153,6 +188,20 @@ class WaveformProgress(wx.Dialog):
         """ Cancel Button Event Handler """
         # Disable the Cancel button to prevent multiple presses while processing occurs
         self.btnCancel.Enable(False)
+        # Cancel the conversion
+        self.Cancel()
+
+    def Cancel(self):
+        """ Stop the conversion, deleting any partial output """
+        # If a streaming extraction is running ...
+        if self.streamProcess is not None:
+            # ... signal the calling routine through the Error Message process ...
+            self.errorMessages = ['Cancelled']
+            # ... and kill the process.  OnStreamTimer() cleans up once the process has ended.
+            try:
+                self.streamProcess.kill()
+            except OSError:
+                pass
         # If the process exists ...
         if self.process is not None:
             # ... kill the process
@@ -168,50 +217,56 @@ class WaveformProgress(wx.Dialog):
     def Update(self, percent, seconds, total=0):
         """ This method allows the contents of this form to be "updated" in the Wave Extraction Callback process """
 
-        # Update the Progress Bar
-        self.progressBar.SetValue(percent)
-        # Calculate the time values to be displayed
-        timeProcessed = seconds
-        secondsProcessed = (timeProcessed % 60)
-        timeProcessed = timeProcessed - secondsProcessed
-        hoursProcessed = (timeProcessed / (60 * 60))
-        timeProcessed = timeProcessed - (hoursProcessed * 60 * 60)
-        minutesProcessed = (timeProcessed / 60)
-        # Update the amount of time processed
-        if total == 0:
-            self.lblTime.SetLabel(_("%d:%02d:%02d processed") % (hoursProcessed, minutesProcessed, secondsProcessed))
+        # If the dialog isn't being shown ...
+        if not self.showDialog:
+            # ... report the progress to the parent instead
+            self.parent.OnConvertProgress(self, percent, seconds, total)
+        # Otherwise ...
         else:
+            # Update the Progress Bar
+            self.progressBar.SetValue(percent)
             # Calculate the time values to be displayed
-            totTimeProcessed = total
-            totSecondsProcessed = (totTimeProcessed % 60)
-            totTimeProcessed = totTimeProcessed - totSecondsProcessed
-            totHoursProcessed = (totTimeProcessed / (60 * 60))
-            totTimeProcessed = totTimeProcessed - (totHoursProcessed * 60 * 60)
-            totMinutesProcessed = (totTimeProcessed / 60)
-            # Include total time in the label if it is known
-            self.lblTime.SetLabel(_("%d:%02d:%02d of %d:%02d:%02d processed") % (hoursProcessed, minutesProcessed, secondsProcessed,
-                                                                                 totHoursProcessed, totMinutesProcessed, totSecondsProcessed))
+            timeProcessed = seconds
+            secondsProcessed = (timeProcessed % 60)
+            timeProcessed = timeProcessed - secondsProcessed
+            hoursProcessed = (timeProcessed / (60 * 60))
+            timeProcessed = timeProcessed - (hoursProcessed * 60 * 60)
+            minutesProcessed = (timeProcessed / 60)
+            # Update the amount of time processed
+            if total == 0:
+                self.lblTime.SetLabel(_("%d:%02d:%02d processed") % (hoursProcessed, minutesProcessed, secondsProcessed))
+            else:
+                # Calculate the time values to be displayed
+                totTimeProcessed = total
+                totSecondsProcessed = (totTimeProcessed % 60)
+                totTimeProcessed = totTimeProcessed - totSecondsProcessed
+                totHoursProcessed = (totTimeProcessed / (60 * 60))
+                totTimeProcessed = totTimeProcessed - (totHoursProcessed * 60 * 60)
+                totMinutesProcessed = (totTimeProcessed / 60)
+                # Include total time in the label if it is known
+                self.lblTime.SetLabel(_("%d:%02d:%02d of %d:%02d:%02d processed") % (hoursProcessed, minutesProcessed, secondsProcessed,
+                                                                                     totHoursProcessed, totMinutesProcessed, totSecondsProcessed))
             
-        # Display % processed
-        self.lblPercent.SetLabel("%d %%" % percent)
-
-        # If we've made SOME progress ...
-        if percent > 0:
-            # ... calculate time elapsed ...
-            t1 = (time.time() - self.progressStartTime)
-            # ... calculate total estimated time for completion
-            t2 = t1 * 100.0 / percent
-            # Display elapsed time
-            self.lblElapsed.SetLabel(_("%s elapsed") % Misc.TimeMsToStr(t1 * 1000))
-            # Display time remaining
-            self.lblRemaining.SetLabel(_("%s remaining") % Misc.TimeMsToStr((t2 - t1) * 1000))
-
-        # wxYield tells the OS to process all messages in the queue, such as GUI updates, so the label change will show up.
-        # But under some circumstances, it produces an error saying it's been called recursively.  We'll have to trap that.
-        try:
-            wx.Yield()
-        except:
-            pass
+            # Display % processed
+            self.lblPercent.SetLabel("%d %%" % percent)
+
+            # If we've made SOME progress ...
+            if percent > 0:
+                # ... calculate time elapsed ...
+                t1 = (time.time() - self.progressStartTime)
+                # ... calculate total estimated time for completion
+                t2 = t1 * 100.0 / percent
+                # Display elapsed time
+                self.lblElapsed.SetLabel(_("%s elapsed") % Misc.TimeMsToStr(t1 * 1000))
+                # Display time remaining
+                self.lblRemaining.SetLabel(_("%s remaining") % Misc.TimeMsToStr((t2 - t1) * 1000))
+
+            # wxYield tells the OS to process all messages in the queue, such as GUI updates, so the label change will show up.
+            # But under some circumstances, it produces an error saying it's been called recursively.  We'll have to trap that.
+            try:
+                wx.Yield()
+            except:
+                pass
 
         # If we have processed more video than we should have (probably Snapshot not ending properly!) ...
         if (self.clipDuration > 0) and (seconds > self.clipDuration):
@@ -255,7 +310,10 @@ class WaveformProgress(wx.Dialog):
             wx.SetDefaultPyEncoding('mbcs')
             
         # Build the command line for the appropriate media conversion call
-        if mode == 'AudioExtraction':
+        if mode == 'AudioExtraction-Stream':
+            # This mode doesn't use wxProcess.  See StreamExtract().
+            pass
+        elif mode == 'AudioExtraction':
             # -i              input file
             # -vn             disable video
             # -ar 2756        Audio Sampling rate 2756 Hz
@@ -293,24 +351,36 @@ class WaveformProgress(wx.Dialog):
 
         self.destFile = outputFile
         
-        # Create a wxProcess object
-        self.process = wx.Process(self)
-        # Call the wxProcess Object's Redirect method.  This allows us to capture the process's output!
-        self.process.Redirect()
-        # Encode the filenames to UTF8 so that unicode files are handled properly
-        process = process.encode('utf8')
-
-        if DEBUG:
-            print "WaveformProgress.Extract():"
-            st = process % (tempMediaFilename, tempWaveFilename)
-            if isinstance(st, unicode):
-                print st.encode('utf8')
-            else:
-                print st
-            print
+        # If we're streaming the extraction ...
+        if mode == 'AudioExtraction-Stream':
+            # ... start the extraction process and the threads that read from it
+            self.StreamExtract(inputFile, outputFile)
+            # If the Progress Dialog will be seen ...
+            if self.showDialog:
+                # ... show the waveform as it is extracted
+                self.waveformPreview.Show()
+                self.Fit()
+                TransanaGlobal.CenterOnPrimary(self)
+        # Otherwise ...
+        else:
+            # Create a wxProcess object
+            self.process = wx.Process(self)
+            # Call the wxProcess Object's Redirect method.  This allows us to capture the process's output!
+            self.process.Redirect()
+            # Encode the filenames to UTF8 so that unicode files are handled properly
+            process = process.encode('utf8')
 
-        # Call the Audio Extraction program using wxExecute, capturing the output via wxProcess.  This call MUST be asynchronous. 
-        self.pid = wx.Execute(process % (tempMediaFilename, tempWaveFilename), wx.EXEC_ASYNC, self.process)
+            if DEBUG:
+                print "WaveformProgress.Extract():"
+                st = process % (tempMediaFilename, tempWaveFilename)
+                if isinstance(st, unicode):
+                    print st.encode('utf8')
+                else:
+                    print st
+                print
+
+            # Call the Audio Extraction program using wxExecute, capturing the output via wxProcess.  This call MUST be asynchronous. 
+            self.pid = wx.Execute(process % (tempMediaFilename, tempWaveFilename), wx.EXEC_ASYNC, self.process)
 
         # On Windows ...
         if 'wxMSW' in wx.PlatformInfo:
@@ -326,11 +396,168 @@ class WaveformProgress(wx.Dialog):
         if self.showModally:
             # ... show the Progress Dialog modally
             self.ShowModal()
-        # If we're allowing multiple threads ...
-        else:
+        # If we're allowing multiple threads, and the Progress Dialog should be seen ...
+        elif self.showDialog:
             # ... show the Progress Dialog non-modally
             self.Show()
 
+    def StreamExtract(self, inputFile, outputFile):
+        """ Start a streaming audio extraction.  FFmpeg writes 8-bit mono samples at 2756 Hz to its standard output
+            rather than to a file.  A thread writes them to the wave file and finds their peaks as they arrive, so
+            the Peak File is written along with the wave file, and the wave file is never read back.  FFmpeg's
+            messages, which include the media file's duration, are read from its standard error by another thread. """
+        programStr = os.path.join(TransanaGlobal.programDir, 'ffmpeg_Transana')
+        if 'wxMSW' in wx.PlatformInfo:
+            programStr += '.exe'
+        # -i              input file
+        # -vn             disable video
+        # -ar 2756        Audio Sampling rate 2756 Hz
+        # -ac 1           Audio Channels 1 (mono)
+        # -acodec pcm_u8  8-bit PCM audio codec
+        # -f u8           raw samples, without a wave header
+        # pipe:1          write to standard output
+        command = [programStr, '-i', inputFile, '-vn', '-ar', '2756', '-ac', '1', '-acodec', 'pcm_u8', '-f', 'u8', 'pipe:1']
+        # Encode the command for the file system, so that unicode file names are handled properly
+        command = [arg.encode(sys.getfilesystemencoding()) if isinstance(arg, unicode) else arg for arg in command]
+        # Create the wave file, which will also collect the peaks
+        self.peakStream = WaveformGraphic.PeakStream(outputFile)
+        # Initialize the media duration, in seconds, which FFmpeg reports before it starts
+        self.streamDuration = 0
+        # Initialize the flag that indicates the samples could not be written
+        self.streamWriteFailed = False
+        # On Windows, FFmpeg is a console program.  Don't let it open a console window.
+        if 'wxMSW' in wx.PlatformInfo:
+            startupInfo = subprocess.STARTUPINFO()
+            startupInfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            startupInfo.wShowWindow = subprocess.SW_HIDE
+        else:
+            startupInfo = None
+        # Start FFmpeg.  (Standard input is a pipe so FFmpeg doesn't wait for keyboard commands.)
+        self.streamProcess = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                              startupinfo=startupInfo)
+        # Start the threads that read FFmpeg's output
+        self.streamThreads = [threading.Thread(target=self.ReadStreamSamples), threading.Thread(target=self.ReadStreamMessages)]
+        for thread in self.streamThreads:
+            thread.setDaemon(True)
+            thread.start()
+
+    def ReadStreamSamples(self):
+        """ Thread that writes the samples FFmpeg sends to the wave file """
+        try:
+            while True:
+                # Read whatever is available, so progress is reported steadily
+                data = os.read(self.streamProcess.stdout.fileno(), 65536)
+                if len(data) == 0:
+                    break
+                self.peakStream.write(data)
+        except:
+            # Record the problem, so the extraction is reported as failed
+            self.streamWriteFailed = True
+            self.errorMessages.append('%s %s' % (sys.exc_info()[0], sys.exc_info()[1]))
+            # Stop FFmpeg, so it doesn't wait for us to read more
+            try:
+                self.streamProcess.kill()
+            except OSError:
+                pass
+
+    def ReadStreamMessages(self):
+        """ Thread that collects FFmpeg's messages, and finds the media file's duration in them """
+        text = ''
+        while True:
+            # Read whatever is available.  (Progress lines end in carriage returns rather than new lines.)
+            data = os.read(self.streamProcess.stderr.fileno(), 4096)
+            if len(data) == 0:
+                break
+            text += data
+            lines = re.split('[\r\n]', text)
+            # Keep the last, incomplete, line for later
+            text = lines[-1]
+            for line in lines[:-1]:
+                # Look for the media file's duration ...
+                duration = re.search('Duration: (\d+):(\d+):(\d+\.?\d*)', line)
+                if duration and (self.streamDuration == 0):
+                    self.streamDuration = int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3))
+                # ... and keep all but the progress lines, which are of no use once the extraction is done
+                if (line.strip() != '') and (not line.startswith('size=')):
+                    self.errorMessages.append(line)
+        # Keep any final line
+        if text.strip() != '':
+            self.errorMessages.append(text)
+
+    def OnStreamTimer(self):
+        """ Report the progress of a streaming extraction, and clean up when it ends """
+        # Determine how much has been extracted, in seconds
+        seconds = self.peakStream.frameCount / 2756.0
+        # If the process is still running ...
+        if self.streamProcess.poll() is None:
+            # ... report the progress, if we know how long the media file is
+            if self.streamDuration > 0:
+                self.Update(min(int(seconds / self.streamDuration * 100), 100), long(seconds), int(self.streamDuration))
+            # If the Progress Dialog is shown, draw the waveform extracted so far
+            if self.showDialog:
+                self.waveformPreview.Refresh()
+            return
+        # Wait for the threads to read the last of FFmpeg's output
+        for thread in self.streamThreads:
+            thread.join()
+        # If the samples couldn't all be written to the wave file, it is incomplete.  (FFmpeg was stopped.)
+        if self.streamWriteFailed:
+            failed = True
+        # If FFmpeg failed, the wave file is incomplete even if it isn't empty
+        elif (self.streamProcess.returncode != 0) and (self.errorMessages[:1] != ['Cancelled']):
+            self.errorMessages.append('FFmpeg exit code %s' % self.streamProcess.returncode)
+            failed = True
+        else:
+            failed = False
+        # If the extraction was cancelled, failed, or FFmpeg produced nothing ...
+        if (self.errorMessages[:1] == ['Cancelled']) or failed or (self.peakStream.frameCount == 0):
+            # ... close the wave file without writing its Peak File ...
+            try:
+                self.peakStream.close(writePeakFile=False)
+            except:
+                # (If the wave file couldn't be written, it may not be able to be closed either.)
+                print "WaveformProgress.OnStreamTimer():", self.destFile
+                print sys.exc_info()[0], sys.exc_info()[1]
+            # ... and delete it, so the calling routine knows it wasn't created
+            if os.path.exists(self.destFile):
+                os.remove(self.destFile)
+            # If it was cancelled, signal the calling routine the usual way
+            if self.errorMessages[:1] == ['Cancelled']:
+                self.errorMessages = ['Cancelled']
+        # Otherwise ...
+        else:
+            # ... finish the wave file and write its Peak File
+            self.peakStream.close()
+        # The process is done
+        self.streamProcess = None
+        # Finish the same way as other extractions
+        self.Finish()
+
+    def OnPaintWaveformPreview(self, event):
+        """ Draw the waveform extracted so far in the Waveform Preview """
+        # Create a Device Context for the Waveform Preview, and clear it
+        dc = wx.PaintDC(self.waveformPreview)
+        dc.SetBackground(wx.Brush(wx.WHITE))
+        dc.Clear()
+        # If nothing has been extracted yet, there's nothing more to draw
+        if self.peakStream is None:
+            return
+        # Get the lowest and highest sample values of each block of frames extracted so far
+        (mins, maxs) = self.peakStream.peaks()
+        (width, height) = self.waveformPreview.GetClientSize()
+        if (len(mins) == 0) or (width <= 0):
+            return
+        # Once we know how long the media file is, the whole file fills the preview, so the waveform grows from left to
+        # right.  Until then, what we have fills the preview.
+        totalBlocks = max(len(mins), int(self.streamDuration * 2756 / WaveformGraphic.PEAK_BASE_BLOCK) + 1)
+        # Combine the blocks into pixel columns
+        blocksPerColumn = (totalBlocks + width - 1) / width
+        columnMins = WaveformGraphic.ColumnPeaks(mins, blocksPerColumn)[0]
+        columnMaxs = WaveformGraphic.ColumnPeaks(maxs, blocksPerColumn)[1]
+        # Draw the waveform in the color the Visualization Window uses for a single media file
+        dc.SetPen(wx.Pen(wx.RED, 1, wx.SOLID))
+        WaveformGraphic.DrawPeaks(dc, 0, columnMins, columnMaxs, (width, height))
+
     def OnEndProcess(self, event):
         """ End of wx.Process event handler """
         # Stop the Progress Timer
@@ -360,15 +587,31 @@ class WaveformProgress(wx.Dialog):
             # De-reference the process
             self.process = None
             wx.YieldIfNeeded()
-            # If we're allowing multiple threads ...
-            if not self.showModally:
-                # ... inform the PARENT that this thread is complete for cleanup
-                self.parent.OnConvertComplete(self)
-            # Close the Progress Dialog
-            self.Close()
+            # If we've just extracted a wave file, and the extraction wasn't cancelled ...
+            if (self.mode in ['AudioExtraction', 'AudioExtraction-OLD']) and (self.errorMessages != ['Cancelled']) and \
+               os.path.exists(self.destFile):
+                # ... create its Peak File now, so the waveform can be drawn quickly at any zoom level
+                WaveformGraphic.CreatePeakFile(self.destFile)
+            # Finish up
+            self.Finish()
+
+    def Finish(self):
+        """ Let the parent know the conversion is done, and close the Progress Dialog """
+        # If we're allowing multiple threads ...
+        if not self.showModally:
+            # ... inform the PARENT that this thread is complete for cleanup
+            self.parent.OnConvertComplete(self)
+        # Close the Progress Dialog
+        self.Close()
 
     def OnTimer(self, event):
         """ Handle the EVT_TIMER event, which updates the progress dialog """
+        # If we're streaming the extraction ...
+        if self.mode == 'AudioExtraction-Stream':
+            # ... if the process is still being handled, check on it
+            if self.streamProcess is not None:
+                self.OnStreamTimer()
+            return
         # If the process exists ...
         if self.process is not None:
             # Get the process input stream
@@ -419,6 +662,374 @@ class WaveformProgress(wx.Dialog):
                     # ... just do output so I'll notice during testing and handle it!
 #                    print ' WaveformProgress.OnTimer() --> ', progress
 
+class BatchProgress(wx.Dialog):
+    """ This class implements the Progress Dialog for a batch of media conversions.  It runs several conversions at
+        once, up to the number set in Options > Settings (one per computer core by default), each in a hidden
+        WaveformProgress object, and shows the progress of every file in a single list.  The user can cancel the
+        selected files or the whole batch.  When the batch is done, any files that couldn't be converted are listed.
+
+        To use it, create it, call AddJob() for each file, and then call Start().  The dialog is not modal.  When
+        the batch is done, the dialog calls onComplete (if given) with itself and destroys itself.
+
+        If a queueFilename is given, the conversions that haven't finished are saved in that file whenever one starts
+        or ends, so a batch that is interrupted can be resumed later.  LoadBatchQueue() reads them back.  The file is
+        removed when the batch is done. """
+
+    def __init__(self, parent, title, onComplete=None, queueFilename=None):
+        """ Initialize the Batch Progress Dialog """
+        # Remember the Parent
+        self.parent = parent
+        # Remember the function to call when the batch is done
+        self.onComplete = onComplete
+        # Remember the name of the file that holds the queue, if there is one
+        self.queueFilename = queueFilename
+        # Initialize the list of conversions (jobs), each a dictionary, in the order they were added
+        self.jobs = []
+        # Initialize the dictionary of running conversions, from job number to WaveformProgress object
+        self.running = {}
+        # Note that the batch isn't finished
+        self.finished = False
+        # Initialize the number of seconds of media processed by the conversions that have finished
+        self.processedSeconds = 0.0
+        # Determine how many conversions may run at once.  0 means one per computer core.
+        if TransanaGlobal.configData.conversionProcessLimit > 0:
+            self.processLimit = TransanaGlobal.configData.conversionProcessLimit
+        else:
+            self.processLimit = multiprocessing.cpu_count()
+
+        # Define the Dialog Box
+        wx.Dialog.__init__(self, parent, -1, title, size=(500, 400), style=wx.CAPTION | wx.RESIZE_BORDER)
+
+        # To look right, the Mac needs the Small Window Variant.
+        if "__WXMAC__" in wx.PlatformInfo:
+            self.SetWindowVariant(wx.WINDOW_VARIANT_SMALL)
+
+        # Create the main Sizer, which is Vertical
+        sizer = wx.BoxSizer(wx.VERTICAL)
+
+        # Overall progress label
+        self.lbl = wx.StaticText(self, -1, '', style=wx.ST_NO_AUTORESIZE)
+        sizer.Add(self.lbl, 0, wx.EXPAND | wx.ALL, 10)
+
+        # Overall Progress Bar
+        self.progressBar = wx.Gauge(self, -1, 100, style=wx.GA_HORIZONTAL | wx.GA_SMOOTH)
+        sizer.Add(self.progressBar, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 10)
+
+        elapsedSizer = wx.BoxSizer(wx.HORIZONTAL)
+        # Time Elapsed label
+        prompt = unicode(_("%s elapsed"), 'utf8')
+        self.lblElapsed = wx.StaticText(self, -1, prompt % '0:00:00', style=wx.ST_NO_AUTORESIZE | wx.ALIGN_LEFT)
+        elapsedSizer.Add(self.lblElapsed, 0, wx.ALIGN_LEFT | wx.LEFT, 10)
+        elapsedSizer.Add((0, 5), 1, wx.EXPAND)
+        # Time Remaining label
+        prompt = unicode(_("%s remaining"), 'utf8')
+        self.lblRemaining = wx.StaticText(self, -1, prompt % '0:00:00', style=wx.ST_NO_AUTORESIZE | wx.ALIGN_RIGHT)
+        elapsedSizer.Add(self.lblRemaining, 0, wx.ALIGN_RIGHT | wx.RIGHT, 10)
+        sizer.Add(elapsedSizer, 0, wx.EXPAND | wx.TOP | wx.BOTTOM, 4)
+
+        # Throughput label, showing how much media has been processed and how fast
+        self.lblThroughput = wx.StaticText(self, -1, '', style=wx.ST_NO_AUTORESIZE)
+        sizer.Add(self.lblThroughput, 0, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 10)
+
+        # List of files, with the progress of each
+        self.fileList = wx.ListCtrl(self, -1, style=wx.LC_REPORT)
+        self.fileList.InsertColumn(0, unicode(_("File"), 'utf8'))
+        self.fileList.InsertColumn(1, unicode(_("Progress"), 'utf8'))
+        self.fileList.SetColumnWidth(0, 340)
+        self.fileList.SetColumnWidth(1, 120)
+        sizer.Add(self.fileList, 1, wx.EXPAND | wx.LEFT | wx.RIGHT, 10)
+
+        btnSizer = wx.BoxSizer(wx.HORIZONTAL)
+        # Cancel Selected button
+        self.btnCancelSelected = wx.Button(self, -1, unicode(_("Cancel Selected"), 'utf8'))
+        btnSizer.Add(self.btnCancelSelected, 0, wx.RIGHT, 10)
+        self.btnCancelSelected.Bind(wx.EVT_BUTTON, self.OnCancelSelected)
+        # Cancel All button
+        self.btnCancelAll = wx.Button(self, -1, unicode(_("Cancel All"), 'utf8'))
+        btnSizer.Add(self.btnCancelAll, 0)
+        self.btnCancelAll.Bind(wx.EVT_BUTTON, self.OnCancelAll)
+        sizer.Add(btnSizer, 0, wx.ALIGN_CENTER | wx.ALL, 10)
+
+        self.SetSizer(sizer)
+        # Set this as the minimum size for the form.
+        sizer.SetMinSize(wx.Size(500, 400))
+        # Call Layout to "place" the widgits
+        self.Layout()
+        self.SetAutoLayout(True)
+        self.Fit()
+
+        # Create a Timer that starts waiting conversions and updates the time estimates
+        self.timer = wx.Timer()
+        self.timer.Bind(wx.EVT_TIMER, self.OnTimer)
+
+        TransanaGlobal.CenterOnPrimary(self)
+
+    def AddJob(self, inputFile, outputFile, mode='AudioExtraction', label='', processCommand=None, clipStart=0, clipDuration=0, duration=0):
+        """ Add a conversion to the batch.  The parameters are those of WaveformProgress and its Extract() and
+            SetProcessCommand() methods, plus the duration of the media in seconds, if it's known, which makes the
+            time remaining more accurate. """
+        # Remember everything about the conversion
+        self.jobs.append({'inputFile' : inputFile,
+                          'outputFile' : outputFile,
+                          'mode' : mode,
+                          'label' : label,
+                          'processCommand' : processCommand,
+                          'clipStart' : clipStart,
+                          'clipDuration' : clipDuration,
+                          'duration' : duration,
+                          'status' : 'Waiting',
+                          'percent' : 0,
+                          'seconds' : 0,
+                          'errorMessages' : []})
+        # Add the file to the list
+        self.fileList.InsertStringItem(len(self.jobs) - 1, os.path.basename(inputFile))
+        self.ShowStatus(len(self.jobs) - 1)
+
+    def Start(self):
+        """ Show the dialog and start converting """
+        # Note the time when the batch started
+        self.progressStartTime = time.time()
+        # Show the dialog
+        self.Show()
+        # Start the timer
+        self.timer.Start(500)
+        # Start as many conversions as are allowed
+        self.StartJobs()
+
+    def StartJobs(self):
+        """ Start waiting conversions until the process limit is reached.  If nothing is waiting or running, finish. """
+        # Go through the waiting conversions, in order
+        for jobNum in range(len(self.jobs)):
+            # If we're running as many conversions as we're allowed, stop
+            if len(self.running) >= self.processLimit:
+                break
+            job = self.jobs[jobNum]
+            if job['status'] == 'Waiting':
+                # Create a hidden Progress Dialog to run the conversion.  It reports to OnConvertProgress() and OnConvertComplete().
+                progressDlg = WaveformProgress(self, job['label'], job['clipStart'], job['clipDuration'], showModally=False, showDialog=False)
+                # Have the Progress Dialog remember which conversion it's running
+                progressDlg.jobNum = jobNum
+                # If there's a conversion command, pass it on
+                if job['processCommand'] != None:
+                    progressDlg.SetProcessCommand(job['processCommand'])
+                # Note that the conversion is running
+                job['status'] = 'Running'
+                self.running[jobNum] = progressDlg
+                self.ShowStatus(jobNum)
+                # Start the conversion
+                try:
+                    progressDlg.Extract(job['inputFile'], job['outputFile'], mode=job['mode'])
+                except:
+                    # If the conversion couldn't be started, record the failure
+                    job['status'] = 'Failed'
+                    job['errorMessages'] = ['%s %s' % (sys.exc_info()[0], sys.exc_info()[1])]
+                    del(self.running[jobNum])
+                    progressDlg.Destroy()
+                    self.ShowStatus(jobNum)
+        # Update the overall progress
+        self.UpdateTotals()
+        # Save the conversions that haven't finished
+        self.SaveQueue()
+        # If nothing is waiting or running, the batch is done.  (Finish once the conversion that just ended has closed.)
+        if (not self.finished) and (len(self.running) == 0) and (not 'Waiting' in [job['status'] for job in self.jobs]):
+            self.finished = True
+            wx.CallAfter(self.Finish)
+
+    def ShowStatus(self, jobNum):
+        """ Show a conversion's status in the file list """
+        job = self.jobs[jobNum]
+        if job['status'] == 'Waiting':
+            status = unicode(_("Waiting"), 'utf8')
+        elif job['status'] == 'Running':
+            status = "%d %%" % job['percent']
+        elif job['status'] == 'Done':
+            status = unicode(_("Done"), 'utf8')
+        elif job['status'] == 'Failed':
+            status = unicode(_("Failed"), 'utf8')
+        else:
+            status = unicode(_("Cancelled"), 'utf8')
+        self.fileList.SetStringItem(jobNum, 1, status)
+
+    def UpdateTotals(self):
+        """ Update the overall progress label, progress bar, throughput, and time estimates """
+        # Count the files that are finished, one way or another
+        finished = len([job for job in self.jobs if job['status'] in ['Done', 'Failed', 'Cancelled']])
+        # Count the running files as the fraction of them that's done
+        fraction = (finished + sum([self.jobs[jobNum]['percent'] for jobNum in self.running]) / 100.0) / max(len(self.jobs), 1)
+        # Update the label and the progress bar
+        prompt = unicode(_("%d of %d files processed, %d running"), 'utf8')
+        self.lbl.SetLabel(prompt % (finished, len(self.jobs), len(self.running)))
+        self.progressBar.SetValue(min(int(fraction * 100), 100))
+        # Update the time estimates
+        t1 = time.time() - self.progressStartTime
+        self.lblElapsed.SetLabel(unicode(_("%s elapsed"), 'utf8') % Misc.TimeMsToStr(t1 * 1000))
+        # Determine how many seconds of media have been processed by all the conversions together, and how fast
+        seconds = self.processedSeconds + sum([self.jobs[jobNum]['seconds'] for jobNum in self.running])
+        if t1 > 0:
+            throughput = seconds / t1
+        else:
+            throughput = 0.0
+        if seconds > 0:
+            prompt = unicode(_("%s of media processed, %0.1f times real time"), 'utf8')
+            self.lblThroughput.SetLabel(prompt % (Misc.TimeMsToStr(seconds * 1000), throughput))
+        # Determine how many seconds of media are left to process.  If every remaining file's duration is known, the time
+        # remaining is that divided by the throughput, which doesn't assume that all files take the same time.
+        remaining = [job for job in self.jobs if job['status'] in ['Waiting', 'Running']]
+        if (throughput > 0) and (len(remaining) > 0) and (min([job['duration'] for job in remaining]) > 0):
+            remainingSeconds = sum([max(job['duration'] - job['seconds'], 0) for job in remaining])
+            self.lblRemaining.SetLabel(unicode(_("%s remaining"), 'utf8') % Misc.TimeMsToStr(remainingSeconds / throughput * 1000))
+        # Otherwise, estimate the time remaining from the fraction of files processed
+        elif fraction > 0:
+            self.lblRemaining.SetLabel(unicode(_("%s remaining"), 'utf8') % Misc.TimeMsToStr(t1 * (1.0 - fraction) / fraction * 1000))
+
+    def OnTimer(self, event):
+        """ Update the time estimates periodically, even when no conversion reports progress """
+        self.UpdateTotals()
+
+    def OnConvertProgress(self, progressDlg, percent, seconds, total):
+        """ Progress report from a running conversion """
+        job = self.jobs[progressDlg.jobNum]
+        # Remember the progress and show it
+        job['percent'] = percent
+        job['seconds'] = seconds
+        # If we didn't know how long the media file is, we do now
+        if (job['duration'] == 0) and (total > 0):
+            job['duration'] = total
+        self.ShowStatus(progressDlg.jobNum)
+
+    def OnConvertComplete(self, progressDlg):
+        """ A conversion has ended, successfully or not """
+        job = self.jobs[progressDlg.jobNum]
+        # Get the Error Log that may have been created
+        job['errorMessages'] = progressDlg.GetErrorMessages()
+        # Determine the output file name.  (For still images, that's the first image.)
+        outputFile = job['outputFile']
+        if '%06d' in outputFile:
+            outputFile = outputFile % 1
+        # If the conversion was cancelled ...
+        if (job['status'] == 'Cancelled') or (job['errorMessages'] == ['Cancelled']):
+            job['status'] = 'Cancelled'
+        # If no output file was created, the conversion failed
+        elif (not os.path.exists(outputFile)) or (os.path.getsize(outputFile) == 0):
+            job['status'] = 'Failed'
+        # Otherwise, it succeeded
+        else:
+            job['status'] = 'Done'
+            job['percent'] = 100
+            # Count the media it processed towards the throughput
+            self.processedSeconds += max(job['duration'], job['seconds'])
+        self.ShowStatus(progressDlg.jobNum)
+        # The conversion is no longer running
+        del(self.running[progressDlg.jobNum])
+        # Destroy the Progress Dialog once it's done closing itself
+        wx.CallAfter(progressDlg.Destroy)
+        # Start the next conversion, if there is one
+        self.StartJobs()
+
+    def OnCancelSelected(self, event):
+        """ Cancel Selected Button Event Handler """
+        # Cancel each selected file
+        jobNum = self.fileList.GetFirstSelected()
+        while jobNum > -1:
+            self.CancelJob(jobNum)
+            jobNum = self.fileList.GetNextSelected(jobNum)
+        # If that leaves nothing to do, finish
+        self.StartJobs()
+
+    def OnCancelAll(self, event):
+        """ Cancel All Button Event Handler """
+        # Cancel every file
+        for jobNum in range(len(self.jobs)):
+            self.CancelJob(jobNum)
+        # If that leaves nothing to do, finish
+        self.StartJobs()
+
+    def CancelJob(self, jobNum):
+        """ Cancel a conversion that is waiting or running """
+        job = self.jobs[jobNum]
+        # A waiting conversion is simply never started
+        if job['status'] == 'Waiting':
+            job['status'] = 'Cancelled'
+            self.ShowStatus(jobNum)
+        # A running conversion is stopped.  It reports back to OnConvertComplete() when it ends.
+        elif job['status'] == 'Running':
+            job['status'] = 'Cancelled'
+            self.running[jobNum].Cancel()
+
+    def SaveQueue(self):
+        """ Save the conversions that are waiting or running in the queue file, if there is one.  Once there are none,
+            remove the file. """
+        # If the batch has no queue file, there's nothing to do
+        if self.queueFilename == None:
+            return
+        # Get the conversions that haven't finished
+        jobs = [dict([(key, job[key]) for key in BATCH_QUEUE_KEYS]) for job in self.jobs if job['status'] in ['Waiting', 'Running']]
+        try:
+            # If every conversion has finished ...
+            if len(jobs) == 0:
+                # ... there's nothing to resume, so remove the queue file
+                if os.path.exists(self.queueFilename):
+                    os.remove(self.queueFilename)
+            else:
+                # Write the queue under a temporary name, so an incomplete queue is never read
+                tempFilename = self.queueFilename + '.tmp'
+                queueFile = open(tempFilename, 'wb')
+                try:
+                    pickle.dump({'version' : BATCH_QUEUE_VERSION, 'jobs' : jobs}, queueFile, pickle.HIGHEST_PROTOCOL)
+                finally:
+                    queueFile.close()
+                # Replace the old queue with the new one
+                if os.path.exists(self.queueFilename):
+                    os.remove(self.queueFilename)
+                os.rename(tempFilename, self.queueFilename)
+        except:
+            # The queue only allows an interrupted batch to be resumed, so report the problem and carry on without it
+            print "BatchProgress.SaveQueue():"
+            print sys.exc_info()[0], sys.exc_info()[1]
+
+    def Finish(self):
+        """ Summarize the batch, notify the caller, and close the dialog """
+        # Stop the timer
+        self.timer.Stop()
+        # If any files failed ...
+        failures = [job for job in self.jobs if job['status'] == 'Failed']
+        if len(failures) > 0:
+            # ... list them, with the last message from each conversion
+            prompt = unicode(_("%d of %d files could not be processed:"), 'utf8') % (len(failures), len(self.jobs)) + '\n\n'
+            for job in failures:
+                prompt += job['inputFile']
+                if len(job['errorMessages']) > 0:
+                    prompt += '\n    ' + job['errorMessages'][-1]
+                prompt += '\n'
+            errordlg = Dialogs.ErrorDialog(self, prompt)
+            errordlg.ShowModal()
+            errordlg.Destroy()
+        # Let the caller know the batch is done
+        if self.onComplete != None:
+            self.onComplete(self)
+        # Close the dialog
+        self.Destroy()
+
+
+def LoadBatchQueue(queueFilename):
+    """ Read the conversions saved in a Batch Progress Dialog's queue file.  Returns a list of dictionaries whose
+        keys are the names of BatchProgress.AddJob()'s parameters, which is empty if there's no queue to resume.
+        Conversions that were running when the batch was interrupted are started again from the beginning. """
+    try:
+        queueFile = open(queueFilename, 'rb')
+        try:
+            queue = pickle.load(queueFile)
+        finally:
+            queueFile.close()
+        # Ignore a queue file from a different version of the Batch Progress Dialog
+        if queue['version'] == BATCH_QUEUE_VERSION:
+            return queue['jobs']
+    except:
+        # If there's no queue file (or it can't be read), there's nothing to resume
+        pass
+    return []
+
+
 # If running in stand-alone mode for testing ...
 if __name__ == '__main__':
     # Create a PySimpleApp
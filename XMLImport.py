@@ -831,6 +831,8 @@ class XMLImport(Dialogs.GenForm):
                                data = (currentObj['EpisodeNum'], currentObj['ClipNum'], tmpFilename, currentObj['VidLength'], currentObj['Offset'], currentObj['Audio'])
                                # Execute the query
                                dbCursor.execute(query, data)
+                               # Record the normalized media file name that is used to find records by media file path
+                               DBInterface.UpdateMediaPathKeys(dbCursor, 'AdditionalVids2')
 
                            elif  objectType == 'CoreData':
                                currentObj.number = 0
@@ -1913,6 +1915,16 @@ class XMLImport(Dialogs.GenForm):
            # Execute the COMMIT or ROLLBACK
            dbCursor.execute(SQLText)
            dbCursor.close()
+           # The import has changed many tables, so discard cached query results and the Keyword Index
+           DBInterface.InvalidateQueryCache()
+           # If the import was committed, add the imported text to the Text Index
+           if contin:
+               try:
+                   DBInterface.IndexMissingText()
+               except:
+                   # The imported data is fine.  The Text Index will be completed the next time this is done.
+                   print "XMLImport:  Exception updating the Text Index"
+                   print sys.exc_info()[0], sys.exc_info()[1]
 
        # Handle IO Errors
        except IOError, e: